@@ -0,0 +1,8 @@
+"""
+セルフホスト用のエージェントサーバー
+分析・観光スポット検索エージェントを Agent Engine 互換の create_session / stream_query（SSE）で提供する
+"""
+
+from .server import ConcurrencyLimiter, create_app
+
+__all__ = ['ConcurrencyLimiter', 'create_app']
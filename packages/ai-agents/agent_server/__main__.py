@@ -0,0 +1,34 @@
+"""
+エージェントサーバーの起動
+    python -m agent_server
+ワーカー数・ポートなどは環境変数で指定する（各ワーカーがエージェントを1回ずつ読み込む）
+"""
+
+import os
+
+import uvicorn
+
+AGENT_SERVER_HOST = os.getenv('AGENT_SERVER_HOST', '0.0.0.0')
+AGENT_SERVER_PORT = int(os.getenv('AGENT_SERVER_PORT', '8080'))
+AGENT_SERVER_WORKERS = int(os.getenv('AGENT_SERVER_WORKERS', '1'))
+# 受け付け待ちの接続数（listenのbacklog）と、ワーカーごとの接続数の上限（超えたら503、未設定なら上限なし）
+AGENT_SERVER_BACKLOG = int(os.getenv('AGENT_SERVER_BACKLOG', '128'))
+AGENT_SERVER_MAX_CONNECTIONS = os.getenv('AGENT_SERVER_MAX_CONNECTIONS')
+
+
+def main():
+    if AGENT_SERVER_WORKERS > 1 and os.getenv('SESSION_BACKEND', 'memory').lower() != 'sqlite':
+        print("⚠️ 複数ワーカーではセッションがワーカー間で共有されません。SESSION_BACKEND=sqlite を指定してください")
+    uvicorn.run(
+        'agent_server.server:app',
+        host=AGENT_SERVER_HOST,
+        port=AGENT_SERVER_PORT,
+        workers=AGENT_SERVER_WORKERS,
+        backlog=AGENT_SERVER_BACKLOG,
+        limit_concurrency=int(AGENT_SERVER_MAX_CONNECTIONS) if AGENT_SERVER_MAX_CONNECTIONS else None,
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+セルフホスト用のエージェントサーバー（ASGI）
+分析・観光スポット検索の root_agent をワーカーごとに1回だけ読み込み、Agent Engine と同じ形の
+create_session（:query）・stream_query（:streamQuery、SSE）のエンドポイントで提供する。
+
+- 同時実行数はワーカーごとに AGENT_SERVER_MAX_CONCURRENCY まで。超えた要求は AGENT_SERVER_MAX_WAITING 件まで
+  AGENT_SERVER_WAIT_TIMEOUT_MS だけ待ち、それも超えたら 503（Retry-After付き）を返す（際限なく溜めない）
+- セッションは session_store.create_session_service()（SESSION_BACKEND=sqlite で複数ワーカー間で共有）
+"""
+
+import asyncio
+import importlib
+import json
+import os
+import time
+from contextlib import asynccontextmanager, aclosing
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from google.adk.runners import Runner
+from starlette.background import BackgroundTask
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from agent_telemetry import telemetry
+from session_store import create_session_service
+
+# 提供するエージェント（URLの名前 → root_agent を持つモジュール）
+AGENT_MODULES = {
+    'analysis': 'analysis_agent.agent',
+    'tourism': 'tourism_spots_agent.agent',
+}
+# 読み込むエージェント（カンマ区切り）
+AGENT_SERVER_AGENTS = os.getenv('AGENT_SERVER_AGENTS', ','.join(AGENT_MODULES))
+# ワーカーごとの stream_query の同時実行数と、空きを待てる要求の数・待ち時間
+AGENT_SERVER_MAX_CONCURRENCY = int(os.getenv('AGENT_SERVER_MAX_CONCURRENCY', '8'))
+AGENT_SERVER_MAX_WAITING = int(os.getenv('AGENT_SERVER_MAX_WAITING', '0'))
+AGENT_SERVER_WAIT_TIMEOUT_MS = float(os.getenv('AGENT_SERVER_WAIT_TIMEOUT_MS', '0'))
+# 1回の stream_query の上限時間（イベントの合間に確認する）
+AGENT_SERVER_REQUEST_TIMEOUT = float(os.getenv('AGENT_SERVER_REQUEST_TIMEOUT', '120'))
+AGENT_SERVER_CORS_ORIGINS = os.getenv('AGENT_SERVER_CORS_ORIGINS', '*')
+# 503 の Retry-After（秒）
+RETRY_AFTER_SECONDS = 1
+
+
+class ConcurrencyLimiter:
+    """同時実行数の上限。空きがなく待ち行列も一杯なら、待たずに拒否する"""
+
+    def __init__(self, limit: int, max_waiting: int = 0, wait_timeout: float = 0.0):
+        self.limit = max(1, limit)
+        self.max_waiting = max(0, max_waiting)
+        self.wait_timeout = max(0.0, wait_timeout)
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        """枠を確保できたら True、拒否したら False"""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_waiting or self.wait_timeout <= 0:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self.accepted += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            'limit': self.limit, 'in_flight': self.in_flight, 'waiting': self.waiting,
+            'accepted': self.accepted, 'rejected': self.rejected,
+        }
+
+
+class _Slot:
+    """確保した1枠。ストリームの終了・切断・レスポンス送信後のどれから解放しても1回だけ解放する"""
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter.release()
+
+
+def load_runners(names: str, session_service) -> Dict[str, Runner]:
+    """エージェントを読み込み、名前ごとのRunnerを作る（ワーカーの起動時に1回）"""
+    runners = {}
+    for name in (n.strip() for n in names.split(',') if n.strip()):
+        if name not in AGENT_MODULES:
+            raise ValueError(f"未知のエージェント: {name}（{', '.join(AGENT_MODULES)}）")
+        start = time.perf_counter()
+        module = importlib.import_module(AGENT_MODULES[name])
+        runners[name] = Runner(agent=module.root_agent, app_name=name, session_service=session_service)
+        print(f"✅ {name}: {module.root_agent.name} を読み込みました（{time.perf_counter() - start:.2f}秒）")
+    return runners
+
+
+def to_content(message: Any) -> types.Content:
+    """stream_query の message（文字列 または Content の辞書）"""
+    if isinstance(message, str):
+        return types.Content(role='user', parts=[types.Part(text=message)])
+    if isinstance(message, dict):
+        return types.Content.model_validate(message)
+    raise ValueError('message は文字列または Content の辞書を指定してください')
+
+
+def _error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({'error': message}, status_code=status, headers=headers)
+
+
+def _session_output(session) -> Dict[str, Any]:
+    # フロントエンドの ADKSessionInfo と同じキャメルケース
+    return session.model_dump(mode='json', by_alias=True)
+
+
+def create_app(
+    agents: str = AGENT_SERVER_AGENTS,
+    session_service=None,
+    limiter: Optional[ConcurrencyLimiter] = None,
+    request_timeout: float = AGENT_SERVER_REQUEST_TIMEOUT,
+) -> FastAPI:
+    """エージェントサーバーのASGIアプリ（エージェントは起動時＝ワーカーごとに読み込む）"""
+    state: Dict[str, Any] = {}
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        service = session_service or create_session_service()
+        state['runners'] = load_runners(agents, service)
+        state['limiter'] = limiter or ConcurrencyLimiter(
+            AGENT_SERVER_MAX_CONCURRENCY, AGENT_SERVER_MAX_WAITING, AGENT_SERVER_WAIT_TIMEOUT_MS / 1000
+        )
+        print(f"🚀 エージェントサーバー pid={os.getpid()} 同時実行数 {state['limiter'].limit}")
+        try:
+            yield
+        finally:
+            # ワーカーの停止・再起動時に、キューに残ったセッションの書き込みを失わないよう先に書き切る
+            # （このアプリで作ったセッションサービスは閉じる。渡されたものは書き込むだけで、閉じるのは呼び出し側）
+            await service.flush()
+            if session_service is None and hasattr(service, 'aclose'):
+                await service.aclose()
+            for runner in state['runners'].values():
+                await runner.close()
+
+    app = FastAPI(title='ADK Agent Server', lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware, allow_origins=[o.strip() for o in AGENT_SERVER_CORS_ORIGINS.split(',')],
+        allow_methods=['*'], allow_headers=['*'],
+    )
+
+    async def read_body(request: Request) -> Dict[str, Any]:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            raise ValueError('リクエストボディがJSONではありません')
+        if not isinstance(body, dict) or not isinstance(body.get('input', {}), dict):
+            raise ValueError('{"class_method": ..., "input": {...}} の形式で指定してください')
+        return body
+
+    @app.get('/healthz')
+    async def healthz():
+        return {'status': 'ok', 'pid': os.getpid(), 'agents': list(state['runners']), **state['limiter'].snapshot()}
+
+    @app.get('/metrics')
+    async def metrics():
+        snapshot = state['limiter'].snapshot()
+        lines = [
+            '# HELP adk_server_in_flight stream_query in progress on this worker',
+            '# TYPE adk_server_in_flight gauge',
+            f"adk_server_in_flight {snapshot['in_flight']}",
+            '# HELP adk_server_requests_total stream_query requests by result',
+            '# TYPE adk_server_requests_total counter',
+            f'adk_server_requests_total{{result="accepted"}} {snapshot["accepted"]}',
+            f'adk_server_requests_total{{result="rejected"}} {snapshot["rejected"]}',
+        ]
+        return PlainTextResponse(telemetry.render_prometheus() + '\n'.join(lines) + '\n')
+
+    @app.post('/agents/{agent_name}:query')
+    async def query(agent_name: str, request: Request):
+        """Agent Engine の :query 相当（create_session / get_session / list_sessions / delete_session）"""
+        runner = state['runners'].get(agent_name)
+        if runner is None:
+            return _error(404, f"エージェントがありません: {agent_name}")
+        try:
+            body = await read_body(request)
+            method, params = body.get('class_method'), body.get('input', {})
+            service = runner.session_service
+            if method == 'create_session':
+                session = await service.create_session(
+                    app_name=runner.app_name, user_id=params['user_id'],
+                    session_id=params.get('session_id'), state=params.get('state'),
+                )
+                return {'output': _session_output(session)}
+            if method == 'get_session':
+                session = await service.get_session(
+                    app_name=runner.app_name, user_id=params['user_id'], session_id=params['session_id']
+                )
+                if session is None:
+                    return _error(404, f"セッションがありません: {params['session_id']}")
+                return {'output': _session_output(session)}
+            if method == 'list_sessions':
+                response = await service.list_sessions(app_name=runner.app_name, user_id=params['user_id'])
+                return {'output': {'sessions': [_session_output(session) for session in response.sessions]}}
+            if method == 'delete_session':
+                await service.delete_session(
+                    app_name=runner.app_name, user_id=params['user_id'], session_id=params['session_id']
+                )
+                return {'output': None}
+            return _error(400, f"未対応の class_method: {method}")
+        except KeyError as e:
+            return _error(400, f"input に {e.args[0]} がありません")
+        except ValueError as e:
+            return _error(400, str(e))
+
+    @app.post('/agents/{agent_name}:streamQuery')
+    async def stream_query(agent_name: str, request: Request, alt: Optional[str] = None):
+        """Agent Engine の :streamQuery 相当（?alt=sse ならSSE、それ以外は1行1イベントのJSON）"""
+        runner = state['runners'].get(agent_name)
+        if runner is None:
+            return _error(404, f"エージェントがありません: {agent_name}")
+        try:
+            body = await read_body(request)
+            params = body.get('input', {})
+            if body.get('class_method', 'stream_query') != 'stream_query':
+                raise ValueError(f"未対応の class_method: {body.get('class_method')}")
+            user_id = params['user_id']
+            content = to_content(params['message'])
+        except KeyError as e:
+            return _error(400, f"input に {e.args[0]} がありません")
+        except ValueError as e:
+            return _error(400, str(e))
+
+        # 枠を確保できなければストリームを始める前に 503 を返す
+        limiter: ConcurrencyLimiter = state['limiter']
+        if not await limiter.acquire():
+            return _error(503, 'サーバーが混雑しています。しばらくしてから再試行してください',
+                          headers={'Retry-After': str(RETRY_AFTER_SECONDS)})
+        slot = _Slot(limiter)
+        try:
+            service = runner.session_service
+            session_id = params.get('session_id')
+            if session_id:
+                # 存在確認だけなのでイベントは読まない
+                session = await service.get_session(
+                    app_name=runner.app_name, user_id=user_id, session_id=session_id,
+                    config=GetSessionConfig(num_recent_events=0),
+                )
+                if session is None:
+                    slot.release()
+                    return _error(404, f"セッションがありません: {session_id}")
+            else:
+                session_id = (await service.create_session(app_name=runner.app_name, user_id=user_id)).id
+        except BaseException:
+            slot.release()
+            raise
+
+        sse = alt == 'sse'
+        events = stream_events(runner, user_id, session_id, content, slot, sse, request_timeout)
+        return StreamingResponse(
+            events, media_type='text/event-stream' if sse else 'application/json',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            # ストリームが始まる前に切断された場合も枠を解放する
+            background=BackgroundTask(slot.release),
+        )
+
+    return app
+
+
+def _format_event(payload: str, sse: bool) -> str:
+    return f"data: {payload}\n\n" if sse else f"{payload}\n"
+
+
+async def stream_events(
+    runner: Runner, user_id: str, session_id: str, content: types.Content, slot: _Slot, sse: bool, timeout: float,
+) -> AsyncIterator[str]:
+    """エージェントのイベントを1件ずつ送る。クライアントが切断したら実行を止めて枠を解放する"""
+    deadline = time.monotonic() + timeout
+    try:
+        async with aclosing(runner.run_async(user_id=user_id, session_id=session_id, new_message=content)) as events:
+            # partial（観光スポットのカードの逐次表示など）もそのまま送る
+            async for event in events:
+                yield _format_event(event.model_dump_json(exclude_none=True), sse)
+                if time.monotonic() > deadline:
+                    print(f"⚠️ stream_query が{timeout:.0f}秒を超えたため打ち切りました: {session_id}")
+                    yield _format_event(json.dumps({'error': 'timeout'}), sse)
+                    return
+    except asyncio.CancelledError:
+        print(f"⚠️ クライアントが切断しました: {session_id}")
+        raise
+    except Exception as e:
+        print(f"❌ stream_query でエラー: {e}")
+        yield _format_event(json.dumps({'error': str(e)}, ensure_ascii=False), sse)
+    finally:
+        slot.release()
+
+
+app = create_app()
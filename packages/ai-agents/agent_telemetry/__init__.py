@@ -0,0 +1,8 @@
+"""
+エージェント共通の計測モジュール
+before/after コールバックで実行時間・トークン数・リトライ・stateサイズを記録する
+"""
+
+from .telemetry import Telemetry, instrument, telemetry, telemetry_enabled, value_bytes
+
+__all__ = ['Telemetry', 'instrument', 'telemetry', 'telemetry_enabled', 'value_bytes']
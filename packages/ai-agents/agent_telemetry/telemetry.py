@@ -0,0 +1,498 @@
+"""
+エージェントの計測（before/after コールバック）
+エージェント単位の実行時間・モデル呼び出しのレイテンシ・入出力トークン数・リトライ回数・
+stateに書き込まれた値のバイト数・入力の射影前後のトークン数・
+ワークフローの最初のカードまでの時間と全体レイテンシを記録し、Prometheusテキスト形式とJSON構造化ログで出力する
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# ヒストグラムのバケット上限
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+TOKEN_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# 完了しなかった（例外で終了した）呼び出しの計測中エントリを保持する上限
+MAX_IN_FLIGHT = 10000
+
+# JSONログの粒度: invocation（呼び出しごとに1行） / agent（エージェント・モデル呼び出しごと） / off
+LOG_LEVELS = ('invocation', 'agent', 'off')
+
+
+class Histogram:
+    """累積バケット・合計・件数を持つヒストグラム（ラベルの組ごとに1つ）"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield _format_value(bound), total
+        yield '+Inf', self.count
+
+
+class _Invocation:
+    """1回のinvocationの集計（最上位エージェントの完了時に1行のJSONログにまとめる）"""
+
+    __slots__ = ('trace_id', 'root', 'started', 'agents', 'models', 'state_bytes', 'retries', 'errors')
+
+    def __init__(self, trace_id: str, root: str):
+        self.trace_id = trace_id
+        self.root = root
+        self.started = time.perf_counter()
+        self.agents: Dict[str, float] = {}
+        self.models: Dict[str, Dict[str, float]] = {}
+        self.state_bytes: Dict[str, int] = {}
+        self.retries = 0
+        self.errors = 0
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else f"{value:.1f}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def value_bytes(value: Any) -> int:
+    """stateに書き込まれた値のバイト数（文字列はUTF-8、それ以外はJSONシリアライズ後）"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bytes):
+        return len(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return len(str(value).encode('utf-8'))
+
+
+def _add_callback(existing: Any, callback: Callable) -> List[Callable]:
+    """既存のコールバック（None / 単体 / リスト）の後ろに追加"""
+    if existing is None:
+        return [callback]
+    if isinstance(existing, list):
+        return [*existing, callback]
+    return [existing, callback]
+
+
+def _usage_tokens(usage: Any) -> Tuple[int, int]:
+    """usage_metadataから（入力トークン数, 出力トークン数）"""
+    if usage is None:
+        return 0, 0
+    return int(getattr(usage, 'prompt_token_count', 0) or 0), int(getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+class Telemetry:
+    """エージェントのコールバックから計測値を集計するレジストリ（プロセス内で共有）"""
+
+    def __init__(
+        self,
+        log_level: str = 'invocation',
+        log_sink: Optional[Callable[[str], None]] = None,
+        prometheus_file: Optional[str] = None,
+        prometheus_interval: float = 10.0
+    ):
+        self.log_level = log_level if log_level in LOG_LEVELS else 'invocation'
+        self.log_sink = log_sink or print
+        self.prometheus_file = prometheus_file
+        self.prometheus_interval = prometheus_interval
+        self._lock = threading.Lock()
+        self._invocations: Dict[str, _Invocation] = {}
+        self._agent_started: Dict[Tuple[str, str], float] = {}
+        self._model_started: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self._last_export = 0.0
+        self.reset()
+
+    @classmethod
+    def from_env(cls) -> 'Telemetry':
+        """AGENT_TELEMETRY_LOG / AGENT_TELEMETRY_PROMETHEUS_FILE / AGENT_TELEMETRY_PROMETHEUS_INTERVAL から生成"""
+        return cls(
+            log_level=os.getenv('AGENT_TELEMETRY_LOG', 'invocation'),
+            prometheus_file=os.getenv('AGENT_TELEMETRY_PROMETHEUS_FILE') or None,
+            prometheus_interval=float(os.getenv('AGENT_TELEMETRY_PROMETHEUS_INTERVAL', '10'))
+        )
+
+    def __getstate__(self):
+        # ロック・計測中のエントリはpickleできないため、デプロイ先では設定のみ引き継ぐ
+        return {
+            'log_level': self.log_level,
+            'prometheus_file': self.prometheus_file,
+            'prometheus_interval': self.prometheus_interval
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def reset(self) -> None:
+        """集計値を初期化"""
+        with self._lock:
+            self.agent_duration: Dict[Tuple[str], Histogram] = {}
+            self.model_duration: Dict[Tuple[str, str], Histogram] = {}
+            self.state_bytes: Dict[Tuple[str, str], Histogram] = {}
+            self.agent_runs: Dict[Tuple[str], int] = {}
+            self.model_calls: Dict[Tuple[str, str, str], int] = {}
+            self.tokens: Dict[Tuple[str, str, str], int] = {}
+            self.retries: Dict[Tuple[str], int] = {}
+            self.projection_tokens: Dict[Tuple[str, str], Histogram] = {}
+            self.time_to_first_card: Dict[Tuple[str], Histogram] = {}
+            self.workflow_latency: Dict[Tuple[str], Histogram] = {}
+
+    # ===== エージェントへの取り付け =====
+
+    def instrument(self, agent: Any) -> Any:
+        """エージェントツリー全体に計測コールバックを追加（既存のコールバックは維持）"""
+        agent.before_agent_callback = _add_callback(agent.before_agent_callback, self.before_agent)
+        agent.after_agent_callback = _add_callback(agent.after_agent_callback, self.after_agent)
+        if hasattr(agent, 'before_model_callback'):
+            agent.before_model_callback = _add_callback(agent.before_model_callback, self.before_model)
+            agent.after_model_callback = _add_callback(agent.after_model_callback, self.after_model)
+        if hasattr(agent, 'on_model_error_callback'):
+            agent.on_model_error_callback = _add_callback(agent.on_model_error_callback, self.on_model_error)
+        for sub_agent in agent.sub_agents:
+            self.instrument(sub_agent)
+        return agent
+
+    def trace_id(self, invocation_id: str) -> Optional[str]:
+        """invocationのトレースID（計測中のみ）"""
+        invocation = self._invocations.get(invocation_id)
+        return invocation.trace_id if invocation else None
+
+    # ===== コールバック =====
+
+    def before_agent(self, callback_context) -> None:
+        invocation_id = callback_context.invocation_id
+        agent_name = callback_context.agent_name
+        now = time.perf_counter()
+        with self._lock:
+            if invocation_id not in self._invocations:
+                self._invocations[invocation_id] = _Invocation(uuid.uuid4().hex, agent_name)
+                if len(self._invocations) > MAX_IN_FLIGHT:
+                    del self._invocations[next(iter(self._invocations))]
+            if getattr(callback_context, 'attempt_count', 1) > 1:
+                self._increment(self.retries, (agent_name,))
+                self._invocations[invocation_id].retries += 1
+            self._agent_started[(invocation_id, agent_name)] = now
+            if len(self._agent_started) > MAX_IN_FLIGHT:
+                del self._agent_started[next(iter(self._agent_started))]
+        return None
+
+    def after_agent(self, callback_context) -> None:
+        invocation_id = callback_context.invocation_id
+        agent_name = callback_context.agent_name
+        now = time.perf_counter()
+        written = self._state_writes(callback_context, agent_name)
+
+        finished: Optional[_Invocation] = None
+        with self._lock:
+            started = self._agent_started.pop((invocation_id, agent_name), None)
+            invocation = self._invocations.get(invocation_id)
+            if started is None or invocation is None:
+                return None
+            duration = now - started
+            self._observe(self.agent_duration, (agent_name,), duration, DURATION_BUCKETS)
+            self._increment(self.agent_runs, (agent_name,))
+            invocation.agents[agent_name] = round(duration * 1000, 2)
+            for key, size in written.items():
+                self._observe(self.state_bytes, (agent_name, key), size, BYTES_BUCKETS)
+                invocation.state_bytes[key] = size
+            if agent_name == invocation.root:
+                finished = self._invocations.pop(invocation_id)
+                for key in [k for k in self._agent_started if k[0] == invocation_id]:
+                    del self._agent_started[key]
+
+        if self.log_level == 'agent':
+            self._log({
+                'event': 'agent_end', 'trace_id': invocation.trace_id, 'invocation_id': invocation_id,
+                'agent': agent_name, 'duration_ms': round(duration * 1000, 2), 'state_bytes': written
+            })
+        if finished is not None:
+            self._finish_invocation(invocation_id, finished, now)
+        return None
+
+    def before_model(self, callback_context, llm_request) -> None:
+        with self._lock:
+            self._model_started[(callback_context.invocation_id, callback_context.agent_name)] = (
+                time.perf_counter(), str(getattr(llm_request, 'model', '') or '')
+            )
+            if len(self._model_started) > MAX_IN_FLIGHT:
+                del self._model_started[next(iter(self._model_started))]
+        return None
+
+    def after_model(self, callback_context, llm_response) -> None:
+        # ストリーミング中の途中応答は最後の応答でまとめて記録
+        if getattr(llm_response, 'partial', False):
+            return None
+        self._finish_model_call(callback_context, llm_response=llm_response)
+        return None
+
+    def on_model_error(self, callback_context, llm_request, error) -> None:
+        self._finish_model_call(callback_context, error=error)
+        return None
+
+    def _finish_model_call(self, callback_context, llm_response: Any = None, error: Optional[Exception] = None) -> None:
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        with self._lock:
+            entry = self._model_started.pop(key, None)
+        if entry is None:
+            return
+        started, model = entry
+        self.record_model_call(
+            callback_context.invocation_id,
+            callback_context.agent_name,
+            model,
+            time.perf_counter() - started,
+            usage=getattr(llm_response, 'usage_metadata', None),
+            error=error
+        )
+
+    # ===== 記録 =====
+
+    def record_model_call(
+        self,
+        invocation_id: str,
+        agent_name: str,
+        model: str,
+        duration: float,
+        usage: Any = None,
+        error: Optional[Exception] = None
+    ) -> None:
+        """モデル呼び出し1回分を記録（LlmAgentを使わずモデルを直接呼ぶエージェントからも利用する）"""
+        input_tokens, output_tokens = _usage_tokens(usage)
+        status = 'error' if error is not None else 'ok'
+        with self._lock:
+            self._observe(self.model_duration, (agent_name, model), duration, DURATION_BUCKETS)
+            self._increment(self.model_calls, (agent_name, model, status))
+            if input_tokens:
+                self._increment(self.tokens, (agent_name, model, 'input'), input_tokens)
+            if output_tokens:
+                self._increment(self.tokens, (agent_name, model, 'output'), output_tokens)
+            invocation = self._invocations.get(invocation_id)
+            if invocation is not None:
+                stats = invocation.models.setdefault(
+                    agent_name, {'calls': 0, 'latency_ms': 0.0, 'input_tokens': 0, 'output_tokens': 0}
+                )
+                stats['calls'] += 1
+                stats['latency_ms'] = round(stats['latency_ms'] + duration * 1000, 2)
+                stats['input_tokens'] += input_tokens
+                stats['output_tokens'] += output_tokens
+                if error is not None:
+                    invocation.errors += 1
+        if self.log_level == 'agent':
+            record = {
+                'event': 'model_call', 'trace_id': invocation.trace_id if invocation else None,
+                'invocation_id': invocation_id, 'agent': agent_name, 'model': model,
+                'duration_ms': round(duration * 1000, 2), 'input_tokens': input_tokens, 'output_tokens': output_tokens
+            }
+            if error is not None:
+                record['error'] = f"{type(error).__name__}: {error}"
+            self._log(record, severity='ERROR' if error is not None else 'INFO')
+
+    def record_projection(self, invocation_id: str, agent_name: str, original_tokens: int, projected_tokens: int) -> None:
+        """入力の射影（state projection）前後のプロンプトのトークン数を記録"""
+        with self._lock:
+            self._observe(self.projection_tokens, (agent_name, 'original'), original_tokens, TOKEN_BUCKETS)
+            self._observe(self.projection_tokens, (agent_name, 'projected'), projected_tokens, TOKEN_BUCKETS)
+            invocation = self._invocations.get(invocation_id)
+        if self.log_level == 'agent':
+            self._log({
+                'event': 'state_projection', 'trace_id': invocation.trace_id if invocation else None,
+                'invocation_id': invocation_id, 'agent': agent_name,
+                'original_tokens': original_tokens, 'projected_tokens': projected_tokens
+            })
+
+    def record_workflow_latency(
+        self,
+        agent_name: str,
+        total_latency: float,
+        time_to_first_card: Optional[float] = None
+    ) -> None:
+        """ワークフロー1回分の全体レイテンシと最初のカードまでの時間を記録（カードを送出しなかった場合はNone）"""
+        with self._lock:
+            self._observe(self.workflow_latency, (agent_name,), total_latency, DURATION_BUCKETS)
+            if time_to_first_card is not None:
+                self._observe(self.time_to_first_card, (agent_name,), time_to_first_card, DURATION_BUCKETS)
+
+    @staticmethod
+    def _state_writes(callback_context, agent_name: str) -> Dict[str, int]:
+        """このinvocationでエージェントがstate_deltaに書き込んだキーごとのバイト数"""
+        try:
+            events = callback_context.session.events
+        except (AttributeError, ValueError):
+            return {}
+        invocation_id = callback_context.invocation_id
+        written: Dict[str, int] = {}
+        # 末尾から現在のinvocationのイベントだけを遡る
+        for event in reversed(events):
+            if event.invocation_id != invocation_id:
+                break
+            if event.author != agent_name or not event.actions or not event.actions.state_delta:
+                continue
+            for key, value in event.actions.state_delta.items():
+                written.setdefault(key, value_bytes(value))
+        return written
+
+    @staticmethod
+    def _observe(metric: Dict, labels: Tuple, value: float, buckets: Tuple[float, ...]) -> None:
+        histogram = metric.get(labels)
+        if histogram is None:
+            histogram = metric[labels] = Histogram(buckets)
+        histogram.observe(value)
+
+    @staticmethod
+    def _increment(metric: Dict, labels: Tuple, amount: int = 1) -> None:
+        metric[labels] = metric.get(labels, 0) + amount
+
+    # ===== 出力 =====
+
+    def _log(self, record: Dict[str, Any], severity: str = 'INFO') -> None:
+        if self.log_level == 'off':
+            return
+        # Cloud Loggingは1行のJSONをjsonPayloadとして取り込む
+        record = {'severity': severity, 'time': time.time(), **record}
+        self.log_sink(json.dumps(record, ensure_ascii=False, default=str))
+
+    def _finish_invocation(self, invocation_id: str, invocation: _Invocation, now: float) -> None:
+        self._log({
+            'event': 'invocation_end',
+            'trace_id': invocation.trace_id,
+            'invocation_id': invocation_id,
+            'agent': invocation.root,
+            'duration_ms': round((now - invocation.started) * 1000, 2),
+            'agents_ms': invocation.agents,
+            'models': invocation.models,
+            'input_tokens': sum(m['input_tokens'] for m in invocation.models.values()),
+            'output_tokens': sum(m['output_tokens'] for m in invocation.models.values()),
+            'state_bytes': invocation.state_bytes,
+            'retries': invocation.retries,
+            'model_errors': invocation.errors
+        }, severity='WARNING' if invocation.errors else 'INFO')
+
+        if self.prometheus_file and now - self._last_export >= self.prometheus_interval:
+            self._last_export = now
+            self.write_prometheus(self.prometheus_file)
+
+    def render_prometheus(self) -> str:
+        """Prometheusテキスト形式（exposition format 0.0.4）"""
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, label_names: Tuple[str, ...], metric: Dict) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in sorted(metric.items()):
+                for bound, count in h.cumulative():
+                    le = 'le="' + bound + '"'
+                    lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {count}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {h.sum}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {h.count}")
+
+        def counter(name: str, help_text: str, label_names: Tuple[str, ...], metric: Dict) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(metric.items()):
+                lines.append(f"{name}{_labels(label_names, labels)} {value}")
+
+        with self._lock:
+            histogram('adk_agent_duration_seconds', 'エージェントの実行時間', ('agent',), self.agent_duration)
+            counter('adk_agent_runs_total', 'エージェントの実行回数', ('agent',), self.agent_runs)
+            counter('adk_agent_retries_total', 'エージェントの再試行回数', ('agent',), self.retries)
+            histogram('adk_model_duration_seconds', 'モデル呼び出しのレイテンシ', ('agent', 'model'), self.model_duration)
+            counter('adk_model_calls_total', 'モデル呼び出し回数', ('agent', 'model', 'status'), self.model_calls)
+            counter('adk_model_tokens_total', 'モデルの入出力トークン数', ('agent', 'model', 'direction'), self.tokens)
+            histogram('adk_state_write_bytes', 'stateに書き込まれた値のバイト数', ('agent', 'key'), self.state_bytes)
+            histogram(
+                'adk_prompt_projection_tokens', '入力の射影前後のプロンプトのトークン数（概算）', ('agent', 'input'),
+                self.projection_tokens
+            )
+            histogram(
+                'adk_workflow_time_to_first_card_seconds', '最初のカードを送出するまでの時間', ('agent',),
+                self.time_to_first_card
+            )
+            histogram('adk_workflow_latency_seconds', 'ワークフローの全体レイテンシ', ('agent',), self.workflow_latency)
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        """node_exporterのtextfileコレクタ向けに書き出し（一時ファイル経由で置き換え）"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Prometheusメトリクスの書き出しに失敗しました: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """集計値のJSON互換の要約（エージェント・モデルごとの件数・平均・合計トークン）"""
+        with self._lock:
+            return {
+                'agents': {
+                    labels[0]: {'runs': h.count, 'mean_ms': round(h.sum / h.count * 1000, 2) if h.count else 0.0}
+                    for labels, h in self.agent_duration.items()
+                },
+                'models': {
+                    f"{agent}/{model}": {
+                        'calls': h.count,
+                        'mean_ms': round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                        'input_tokens': self.tokens.get((agent, model, 'input'), 0),
+                        'output_tokens': self.tokens.get((agent, model, 'output'), 0)
+                    }
+                    for (agent, model), h in self.model_duration.items()
+                },
+                'retries': {labels[0]: count for labels, count in self.retries.items()},
+                'projection_tokens': {
+                    f"{agent}/{kind}": {'calls': h.count, 'mean_tokens': round(h.sum / h.count) if h.count else 0}
+                    for (agent, kind), h in self.projection_tokens.items()
+                },
+                'workflows': {
+                    labels[0]: {
+                        'runs': h.count,
+                        'mean_ms': round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                        'first_cards': self.time_to_first_card[labels].count if labels in self.time_to_first_card else 0
+                    }
+                    for labels, h in self.workflow_latency.items()
+                },
+                'state_bytes': {
+                    f"{agent}/{key}": {'writes': h.count, 'mean_bytes': round(h.sum / h.count) if h.count else 0}
+                    for (agent, key), h in self.state_bytes.items()
+                }
+            }
+
+
+def telemetry_enabled() -> bool:
+    return os.getenv('AGENT_TELEMETRY', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+
+# プロセス内で共有する計測レジストリ
+telemetry = Telemetry.from_env()
+
+
+def instrument(agent: Any) -> Any:
+    """共有レジストリの計測コールバックをエージェントツリーに追加（AGENT_TELEMETRY=off で無効）"""
+    if telemetry_enabled():
+        telemetry.instrument(agent)
+    return agent
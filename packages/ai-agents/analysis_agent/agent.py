@@ -3,12 +3,69 @@ Analysis Agent - 分析レポート専用エージェント
 データ分析と詳細レポート作成に特化したAgent
 """
 
+import os
+
 from google.adk.agents import LlmAgent
 
-root_agent = LlmAgent(
+from agent_telemetry import instrument
+
+from .dataset_cache import inject_dataset_context, preload_dataset, remember_overview
+from .map_reduce import MapReduceAnalysisAgent
+from .stats_tools import STATS_TOOLS
+
+MODEL = "gemini-2.0-flash-exp"
+
+# 分析モード: auto（入力が閾値を超えたらmap-reduce、デフォルト） / single（常に1回の呼び出し） / map_reduce（常にmap-reduce）
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'auto')
+
+# map-reduceに切り替える入力の文字数
+MAP_REDUCE_THRESHOLD_CHARS = int(os.getenv('ANALYSIS_MAP_REDUCE_THRESHOLD_CHARS', '40000'))
+
+# 1チャンクの最大文字数
+CHUNK_CHARS = int(os.getenv('ANALYSIS_CHUNK_CHARS', '20000'))
+
+# 部分分析の同時実行数上限
+MAP_CONCURRENCY = int(os.getenv('ANALYSIS_MAP_CONCURRENCY', '4'))
+
+# レポートの出力形式（1回の分析・map-reduceの統合で共通）
+REPORT_FORMAT = """## 分析結果サマリー
+[主要な発見事項を3-5点で要約]
+
+## 詳細分析
+### 1. データ概要
+[対象データの特徴と範囲]
+
+### 2. 主要な傾向
+[発見されたパターンやトレンド]
+
+### 3. 統計的分析
+[数値的な分析結果]
+
+### 4. 課題と機会
+[特定された問題点と改善機会]
+
+## 推奨事項
+### 優先度: 高
+[即座に実行すべき改善策]
+
+### 優先度: 中
+[中期的に検討すべき施策]
+
+### 優先度: 低
+[長期的な改善案]
+
+## 次のステップ
+[具体的なアクションプラン]"""
+
+analysis_specialist = LlmAgent(
     name="analysis_specialist",
-    model="gemini-2.0-flash-exp",
+    model=MODEL,
     description="データ分析と詳細レポート作成の専門エージェント。トレンド分析、統計処理、実行可能な推奨事項の提案が可能",
+    tools=STATS_TOOLS,
+    # 貼り付けられた表の読み込み・同じデータの成果物（解析済みの表・データ概要）の再利用
+    before_agent_callback=preload_dataset,
+    before_model_callback=inject_dataset_context,
+    after_model_callback=remember_overview,
     instruction="""あなたはデータ分析の専門家です。
 
 以下の手順で分析を実行してください：
@@ -25,40 +82,58 @@ root_agent = LlmAgent(
 - KPI・指標の評価
 - 改善提案の策定
 
+数値の扱い：
+- 表形式のデータ（CSV / JSON）が与えられたら、最初に load_dataset で読み込む
+- 平均・合計・増減率・傾き・相関などの数値は自分で計算せず、describe_columns / group_by / rolling_window / linear_trend / correlation の結果を引用する
+- レポートに書く数値には、どのツールの結果か（例: group_by の sum）を添える
+- ツールがエラーを返した場合は列名・引数を見直して再実行する
+- データが文章中の数値だけの場合は、その数値を並べたCSVを作って load_dataset に渡す
+
 応答原則：
 - 日本語で応答する
-- 根拠に基づく分析結果を提供する
+- 根拠に基づく分析結果を提供する（数値はツールの計算結果のみ）
 - データに基づいた客観的な評価
 - 実行可能で具体的な推奨事項
 - 構造化された読みやすいレポート形式
 
 出力形式：
-## 分析結果サマリー
-[主要な発見事項を3-5点で要約]
+""" + REPORT_FORMAT
+)
 
-## 詳細分析
-### 1. データ概要
-[対象データの特徴と範囲]
+MAP_INSTRUCTION = """あなたはデータ分析の専門家です。
+大きな入力を分割した1チャンクを受け取ります。依頼に沿って、このチャンクだけの部分分析を作成してください。
 
-### 2. 主要な傾向
-[発見されたパターンやトレンド]
+- 件数・範囲・合計・平均などの数値は、チャンク内のデータから読み取れるものだけを書く
+- 主要な傾向、目立つ値・異常値、チャンク内での変化を箇条書きにする
+- 他のチャンクとの比較・全体の結論・推奨事項は書かない
+- 日本語で、400文字以内"""
 
-### 3. 統計的分析
-[数値的な分析結果]
+REDUCE_INSTRUCTION = """あなたはデータ分析の専門家です。
+大きな入力をチャンクごとに分析した部分分析を受け取ります。それらを統合し、入力全体の分析レポートを作成してください。
 
-### 4. 課題と機会
-[特定された問題点と改善機会]
-
-## 推奨事項
-### 優先度: 高
-[即座に実行すべき改善策]
+- 部分分析どうしで重複する内容はまとめ、矛盾する場合はその旨を書く
+- 入力全体の記述統計が与えられた場合、件数・平均・合計・範囲などの数値はそれを引用する
+- 部分分析に失敗したチャンクがある場合は、データ概要にその旨を書く
+- 日本語で応答する
 
-### 優先度: 中
-[中期的に検討すべき施策]
+出力形式：
+""" + REPORT_FORMAT
 
-### 優先度: 低
-[長期的な改善案]
+if ANALYSIS_MODE == 'single':
+    root_agent = analysis_specialist
+else:
+    # 入力が閾値以下なら analysis_specialist をそのまま実行
+    root_agent = MapReduceAnalysisAgent(
+        name="analysis_map_reduce",
+        model=MODEL,
+        map_instruction=MAP_INSTRUCTION,
+        reduce_instruction=REDUCE_INSTRUCTION,
+        chunk_chars=CHUNK_CHARS,
+        threshold_chars=0 if ANALYSIS_MODE == 'map_reduce' else MAP_REDUCE_THRESHOLD_CHARS,
+        max_concurrency=MAP_CONCURRENCY,
+        sub_agents=[analysis_specialist],
+        description="大きな入力を分割して部分分析を並列実行し、統合したレポートを作成"
+    )
 
-## 次のステップ
-[具体的なアクションプラン]"""
-)
\ No newline at end of file
+# 実行時間・トークン数・stateサイズの計測コールバックを追加（AGENT_TELEMETRY=off で無効）
+instrument(root_agent)
@@ -0,0 +1,357 @@
+"""
+分析用の表データ（列ごとのNumPy配列）と読み込み
+CSV / JSON（レコードの配列・列ごとの配列・JSON Lines）をパースし、列の型（数値・日時・文字列）を推定する
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 欠損値として扱う文字列
+MISSING_VALUES = frozenset(('', 'na', 'n/a', 'nan', 'null', 'none', '-', '#n/a'))
+
+# 大文字・小文字の表記ゆれを含めた欠損値の表記（小文字化せずに照合するため）
+MISSING_TOKENS = sorted({variant for value in MISSING_VALUES for variant in (value, value.upper(), value.title())})
+
+# 列の型の判定に使う先頭の値の件数
+TYPE_SAMPLE_SIZE = 1000
+
+# 日時として扱う値（YYYY-MM / YYYY-MM-DD / YYYY/MM/DD、時刻付き）
+DATE_PATTERN = re.compile(r'^\d{4}[-/]\d{2}(?:[-/]\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?)?)?$')
+
+# 貼り付けられたテキストを表とみなす最小のデータ行数
+MIN_TABLE_ROWS = 20
+
+# 同時に保持するデータセット数（古いものから破棄）
+MAX_DATASETS = int(os.getenv('ANALYSIS_MAX_DATASETS', '8'))
+
+# ファイルからの読み込みを許可するディレクトリ（未設定ならインラインのテキストのみ）
+DATA_DIR = os.getenv('ANALYSIS_DATA_DIR')
+
+
+class DatasetError(ValueError):
+    """データセットの読み込み・列指定の誤り（ツールの応答としてモデルに返す）"""
+
+
+class Table:
+    """列名 -> 1次元配列（数値はfloat64・欠損はNaN、日時はdatetime64[s]・欠損はNaT、文字列はstr・欠損は空文字）"""
+
+    def __init__(self, columns: Mapping[str, np.ndarray]):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise DatasetError("列の長さが揃っていません")
+        self.columns: Dict[str, np.ndarray] = dict(columns)
+        self.row_count = lengths.pop() if lengths else 0
+        self._factorized: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # 元データの内容ハッシュ（dataset_cache で設定）
+        self.fingerprint: Optional[str] = None
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    def column(self, name: str) -> np.ndarray:
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise DatasetError(f"列が見つかりません: {name}（列: {', '.join(self.columns)}）") from None
+
+    def kind(self, name: str) -> str:
+        return column_kind(self.column(name))
+
+    def numeric(self, name: str) -> np.ndarray:
+        """数値として扱える列（日時はUNIX秒に変換）"""
+        values = self.column(name)
+        kind = column_kind(values)
+        if kind == 'number':
+            return values
+        if kind == 'datetime':
+            seconds = values.astype('int64').astype(np.float64)
+            seconds[np.isnat(values)] = np.nan
+            return seconds
+        raise DatasetError(f"数値列ではありません: {name}")
+
+    def missing(self, name: str) -> np.ndarray:
+        values = self.column(name)
+        kind = column_kind(values)
+        if kind == 'number':
+            return np.isnan(values)
+        if kind == 'datetime':
+            return np.isnat(values)
+        return values == ''
+
+    def factorize(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """列 -> (一意な値, 各行のコード)。同じ列のグループ化を繰り返すためキャッシュする"""
+        factorized = self._factorized.get(name)
+        if factorized is None:
+            factorized = np.unique(self.column(name), return_inverse=True)
+            self._factorized[name] = factorized
+        return factorized
+
+    def schema(self) -> List[Dict[str, Any]]:
+        return [
+            {'name': name, 'type': column_kind(values), 'missing': int(self.missing(name).sum())}
+            for name, values in self.columns.items()
+        ]
+
+    def preview(self, rows: int = 3) -> List[Dict[str, Any]]:
+        return [
+            {name: to_json_value(values[i]) for name, values in self.columns.items()}
+            for i in range(min(rows, self.row_count))
+        ]
+
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+
+def column_kind(values: np.ndarray) -> str:
+    if values.dtype.kind == 'f':
+        return 'number'
+    if values.dtype.kind == 'M':
+        return 'datetime'
+    return 'string'
+
+
+def to_json_value(value: Any) -> Any:
+    """NumPyの値をJSON互換の値に変換（欠損はNone、浮動小数は有効数字6桁）"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, np.str_):
+        return str(value)
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else str(value)
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None
+        return float(f"{float(value):.6g}")
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def infer_column(raw: Sequence[Any]) -> np.ndarray:
+    """値の列を数値・日時・文字列のいずれかの配列に変換"""
+    values = raw if isinstance(raw, np.ndarray) else np.array(raw, dtype=object)
+    if values.dtype.kind == 'f':
+        return values.astype(np.float64)
+    if values.dtype != object:
+        values = values.astype(object)
+    elif any(not isinstance(v, str) for v in values):
+        values = np.array(['' if v is None else str(v) for v in values], dtype=object)
+    return _infer_text(values)
+
+
+def _infer_text(values: np.ndarray) -> np.ndarray:
+    """文字列のobject配列の型を推定
+
+    文字列からの数値・日時変換はobject配列の方が速いため、str配列は欠損判定などの文字列処理にだけ使う
+    """
+    # 欠損のない数値・日時列は一括変換で済ませる
+    fast_paths = [np.float64]
+    if len(values) and all(DATE_PATTERN.match(v) for v in values[:TYPE_SAMPLE_SIZE]):
+        fast_paths.append('datetime64[s]')
+    for dtype in fast_paths:
+        try:
+            return values.astype(dtype)
+        except (ValueError, TypeError):
+            continue
+    return _infer_strings(np.char.strip(values.astype(np.str_)))
+
+
+def _infer_strings(values: np.ndarray) -> np.ndarray:
+    """欠損を含む文字列配列を数値・日時・文字列に変換（型は先頭の値で判定）"""
+    missing = np.isin(values, MISSING_TOKENS)
+    present = values[~missing]
+    if len(present) == 0:
+        return np.full(len(values), np.nan)
+
+    sample = present[:TYPE_SAMPLE_SIZE]
+    candidate = None
+    if _converts(sample, np.float64):
+        candidate = (np.float64, present)
+    elif _converts(np.char.replace(sample, ',', ''), np.float64):
+        # 桁区切りのカンマ
+        candidate = (np.float64, np.char.replace(present, ',', ''))
+    elif all(DATE_PATTERN.match(v) for v in sample):
+        candidate = ('datetime64[s]', np.char.replace(present, '/', '-'))
+    if candidate is not None:
+        dtype, prepared = candidate
+        try:
+            converted = prepared.astype(object).astype(dtype)
+        except (ValueError, TypeError):
+            # 先頭以降に変換できない値がある場合は文字列列とする
+            converted = None
+        if converted is not None:
+            result = np.full(len(values), np.nan if dtype == np.float64 else np.datetime64('NaT'), dtype=dtype)
+            result[~missing] = converted
+            return result
+
+    values[missing] = ''
+    return values
+
+
+def _converts(values: np.ndarray, dtype: Any) -> bool:
+    try:
+        values.astype(dtype)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def parse_csv(text: str) -> Table:
+    sample = text[:4096]
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=',\t;').delimiter
+    except csv.Error:
+        delimiter = ','
+    stream = io.StringIO(text)
+    header_line = stream.readline()
+    header = [name.strip() or f"column{i + 1}" for i, name in enumerate(next(csv.reader([header_line], delimiter=delimiter), []))]
+    if not header:
+        raise DatasetError("CSVにデータがありません")
+
+    try:
+        # 列数の揃ったCSVはNumPyのCパーサで一括読み込み
+        body = np.loadtxt(
+            stream, delimiter=delimiter, dtype=object, quotechar='"', comments=None, ndmin=2
+        )
+        if body.size and body.shape[1] != len(header):
+            raise ValueError("列数がヘッダーと一致しません")
+        if not body.size:
+            body = np.empty((0, len(header)), dtype=object)
+        columns = [body[:, j] for j in range(len(header))]
+    except ValueError:
+        # 列数が不揃いな行は空欄で補う
+        rows = [row for row in csv.reader(io.StringIO(text[len(header_line):]), delimiter=delimiter) if row]
+        width = len(header)
+        rows = [row if len(row) == width else (row + [''] * width)[:width] for row in rows]
+        columns = [np.array(values, dtype=object) for values in zip(*rows)] if rows else [np.array([], dtype=object)] * width
+    return Table({name: _infer_text(values) for name, values in zip(header, columns)})
+
+
+def find_table_span(lines: Sequence[str], min_rows: int = MIN_TABLE_ROWS) -> Optional[Tuple[int, int]]:
+    """文章中に貼り付けられた表: 区切り文字（, / タブ）の数が揃った最長の連続行 -> (ヘッダー行, 終了行)
+
+    データ行が min_rows 行未満ならNone
+    """
+    best = None
+    for delimiter in (',', '\t'):
+        counts = [line.count(delimiter) for line in lines]
+        common = Counter(c for c in counts if c > 0).most_common(1)
+        if not common:
+            continue
+        width = common[0][0]
+        start = None
+        for i, count in enumerate(counts + [-1]):
+            if count == width and start is None:
+                start = i
+            elif count != width and start is not None:
+                if best is None or i - start > best[1] - best[0]:
+                    best = (start, i)
+                start = None
+    if best is None or best[1] - best[0] - 1 < min_rows:
+        return None
+    return best
+
+
+def parse_json(text: str) -> Table:
+    text = text.strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # JSON Lines
+        try:
+            data = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise DatasetError(f"JSONの解析に失敗しました: {e}") from None
+
+    if isinstance(data, dict):
+        # {"data": [...]} のようにレコード配列を1つだけ包んだ形式
+        lists = [v for v in data.values() if isinstance(v, list)]
+        if len(data) == 1 and lists and lists[0] and isinstance(lists[0][0], dict):
+            data = lists[0]
+        else:
+            # 列ごとの配列
+            if not lists or len(lists) != len(data):
+                raise DatasetError("JSONは レコードの配列 または 列名 -> 値の配列 の形式にしてください")
+            return Table({str(name): infer_column(values) for name, values in data.items()})
+
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise DatasetError("JSONは レコードの配列 または 列名 -> 値の配列 の形式にしてください")
+    names: Dict[str, None] = {}
+    for row in data:
+        names.update(dict.fromkeys(row))
+    return Table({str(name): infer_column([row.get(name) for row in data]) for name in names})
+
+
+def read_source(source: str) -> str:
+    """インラインのテキスト、またはANALYSIS_DATA_DIR配下のファイルの内容"""
+    candidate = source.strip()
+    if '\n' in candidate or not candidate:
+        return source
+    if DATA_DIR and not candidate.startswith(('{', '[')):
+        base = os.path.realpath(DATA_DIR)
+        path = os.path.realpath(os.path.join(base, candidate))
+        if os.path.commonpath([base, path]) != base:
+            raise DatasetError("ANALYSIS_DATA_DIR の外のファイルは読み込めません")
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8-sig') as f:
+                return f.read()
+    return source
+
+
+def parse_table(text: str, format: str = 'auto') -> Table:
+    if format == 'auto':
+        format = 'json' if text.lstrip().startswith(('{', '[')) else 'csv'
+    if format == 'json':
+        return parse_json(text)
+    if format == 'csv':
+        return parse_csv(text)
+    raise DatasetError(f"未対応の形式です: {format}（csv / json）")
+
+
+class DatasetStore:
+    """読み込んだデータセットをプロセス内に保持（LRUで件数を制限）"""
+
+    def __init__(self, max_datasets: int = MAX_DATASETS):
+        self.max_datasets = max_datasets
+        self._lock = threading.Lock()
+        self._tables: 'OrderedDict[str, Table]' = OrderedDict()
+        self._counter = 0
+
+    def put(self, table: Table, name: Optional[str] = None) -> str:
+        with self._lock:
+            if not name:
+                self._counter += 1
+                name = f"dataset{self._counter}"
+            self._tables[name] = table
+            self._tables.move_to_end(name)
+            while len(self._tables) > self.max_datasets:
+                self._tables.popitem(last=False)
+        return name
+
+    def get(self, name: str) -> Table:
+        with self._lock:
+            table = self._tables.get(name)
+            if table is None:
+                available = ', '.join(self._tables) or 'なし'
+                raise DatasetError(f"データセットが見つかりません: {name}（読み込み済み: {available}）")
+            self._tables.move_to_end(name)
+            return table
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._tables)
+
+
+dataset_store = DatasetStore()
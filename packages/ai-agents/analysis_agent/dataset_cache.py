@@ -0,0 +1,223 @@
+"""
+データセットのフィンガープリントキャッシュ
+入力データの内容ハッシュをキーに、解析済みの表・統計ツールの結果・部分分析・「データ概要」節を保持し、
+同じデータに対する質問違いの再実行（同じセッションの続きの質問を含む）で再利用する。サイズ上限を超えたらLRUで破棄
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from .dataset import DatasetError, Table, dataset_store, find_table_span, parse_table
+
+# キャッシュの上限（解析済みの表のメモリ量 + 文字列・統計のサイズの合計）
+MAX_CACHE_BYTES = int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+MAX_CACHE_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '32'))
+
+# データセットのフィンガープリントを保持するstateキー（同じセッションの続きの質問で参照）
+STATE_KEY = 'analysis_dataset'
+
+# レポートの「データ概要」節（次の見出しまで）
+OVERVIEW_PATTERN = re.compile(r'###\s*1\.\s*データ概要\s*\n(.*?)(?=\n#{2,3}\s|\Z)', re.DOTALL)
+
+
+def fingerprint(text: str) -> str:
+    """データの内容ハッシュ（改行コード・前後の空白の違いは同じデータとみなす）"""
+    normalized = text.replace('\r\n', '\n').strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+def dataset_name(fp: str) -> str:
+    """フィンガープリントから決まるデータセット名（同じデータなら同じ名前）"""
+    return f"data_{fp[:8]}"
+
+
+def extract_overview(report: str) -> Optional[str]:
+    match = OVERVIEW_PATTERN.search(report or '')
+    overview = match.group(1).strip() if match else ''
+    return overview or None
+
+
+@dataclass
+class DatasetArtifacts:
+    """1つのデータセットから作った再利用可能な成果物"""
+
+    fingerprint: str
+    table: Optional[Table] = None
+    # 統計ツールの結果など（キー -> JSON互換の値）
+    statistics: Dict[str, Any] = field(default_factory=dict)
+    # 部分分析（チャンクと依頼文のハッシュ -> 部分分析）
+    partials: Dict[str, str] = field(default_factory=dict)
+    # レポートの「データ概要」節
+    overview: Optional[str] = None
+
+    def nbytes(self) -> int:
+        size = self.table.nbytes() if self.table is not None else 0
+        size += len(json.dumps(self.statistics, ensure_ascii=False, default=str).encode('utf-8'))
+        size += sum(len(p.encode('utf-8')) for p in self.partials.values())
+        size += len((self.overview or '').encode('utf-8'))
+        return size
+
+
+class DatasetCache:
+    """フィンガープリント -> 成果物のLRUキャッシュ（件数とサイズで上限）"""
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES, max_entries: int = MAX_CACHE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # fingerprint -> (成果物, 計上済みサイズ)
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fp: str) -> Optional[DatasetArtifacts]:
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(fp)
+            return entry[0]
+
+    def peek(self, fp: str) -> Optional[DatasetArtifacts]:
+        """ヒット・ミスの集計やLRU順を変えずに参照"""
+        with self._lock:
+            entry = self._entries.get(fp)
+            return entry[0] if entry else None
+
+    def get_or_create(self, fp: str) -> DatasetArtifacts:
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                entry = [DatasetArtifacts(fingerprint=fp), 0]
+                self._entries[fp] = entry
+            self._entries.move_to_end(fp)
+            return entry[0]
+
+    def update(self, artifacts: DatasetArtifacts) -> None:
+        """成果物を追加した後にサイズを計上し直し、上限を超えた分を古いものから破棄"""
+        size = artifacts.nbytes()
+        with self._lock:
+            entry = self._entries.get(artifacts.fingerprint)
+            if entry is None:
+                return
+            self._total_bytes += size - entry[1]
+            entry[1] = size
+            while self._entries and (
+                self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries
+            ):
+                fp, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+                if fp == artifacts.fingerprint:
+                    # 1件で上限を超える成果物は保持しない
+                    break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+dataset_cache = DatasetCache()
+
+
+def load_cached_table(text: str, format: str = 'auto') -> Tuple[DatasetArtifacts, bool]:
+    """データのテキスト -> (成果物, キャッシュから取得したか)。同じ内容のデータは解析せずに解析済みの表を返す"""
+    fp = fingerprint(text)
+    artifacts = dataset_cache.get(fp)
+    cached = artifacts is not None and artifacts.table is not None
+    if not cached:
+        table = parse_table(text, format)
+        if len(table) == 0:
+            raise DatasetError("データ行がありません")
+        artifacts = dataset_cache.get_or_create(fp)
+        artifacts.table = table
+        dataset_cache.update(artifacts)
+    artifacts.table.fingerprint = fp
+    return artifacts, cached
+
+
+def register_dataset(artifacts: DatasetArtifacts, name: str = '') -> str:
+    """解析済みの表をデータセットストアに登録（ストアから破棄されていても再登録）"""
+    return dataset_store.put(artifacts.table, name or dataset_name(artifacts.fingerprint))
+
+
+# ===== analysis_specialist のコールバック =====
+
+def _message_text(content) -> str:
+    return ''.join(part.text for part in (content.parts if content else None) or [] if part.text)
+
+
+def preload_dataset(callback_context) -> None:
+    """before_agent_callback: 依頼文に貼り付けられた表を読み込み（同じデータは解析済みの表を再利用）、stateに記録"""
+    lines = _message_text(callback_context.user_content).splitlines()
+    span = find_table_span(lines)
+    if span is None:
+        return None
+    try:
+        artifacts, cached = load_cached_table('\n'.join(lines[span[0]:span[1]]), 'csv')
+    except DatasetError as e:
+        print(f"表の読み込み失敗: {e}")
+        return None
+    name = register_dataset(artifacts)
+    callback_context.state[STATE_KEY] = {'fingerprint': artifacts.fingerprint, 'dataset': name, 'rows': len(artifacts.table)}
+    print(f"📦 貼り付けられた表を読み込み: {name}（{len(artifacts.table):,}行{'・キャッシュ' if cached else ''}）")
+    return None
+
+
+def inject_dataset_context(callback_context, llm_request) -> None:
+    """before_model_callback: このセッションで読み込んだデータセット名と、前回作成したデータ概要をシステム指示に追加"""
+    current = callback_context.state.get(STATE_KEY)
+    if not isinstance(current, dict):
+        return None
+    artifacts = dataset_cache.peek(current.get('fingerprint', ''))
+    if artifacts is None or artifacts.table is None:
+        return None
+    table = artifacts.table
+    name = register_dataset(artifacts, current.get('dataset', ''))
+    columns = ', '.join(f"{c['name']}({c['type']})" for c in table.schema())
+    instructions = [
+        f"読み込み済みのデータセット: {name}（{len(table):,}行、列: {columns}）。"
+        f"このデータは load_dataset を呼ばずに、統計ツールの dataset に {name} を指定してください。"
+    ]
+    if artifacts.overview:
+        instructions.append(f"同じデータの前回の分析で作成した「データ概要」（そのまま使ってよい）:\n{artifacts.overview}")
+    llm_request.append_instructions(instructions)
+    return None
+
+
+def remember_overview(callback_context, llm_response) -> None:
+    """after_model_callback: レポートの「データ概要」節をデータセットの成果物として保存"""
+    current = callback_context.state.get(STATE_KEY)
+    if not isinstance(current, dict) or not llm_response.content:
+        return None
+    artifacts = dataset_cache.peek(current.get('fingerprint', ''))
+    if artifacts is None or artifacts.overview:
+        return None
+    overview = extract_overview(_message_text(llm_response.content))
+    if overview:
+        artifacts.overview = overview
+        dataset_cache.update(artifacts)
+    return None
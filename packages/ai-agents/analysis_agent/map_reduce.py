@@ -0,0 +1,341 @@
+"""
+大きな入力のmap-reduce分析
+貼り付けられたデータ・ログを分割し、チャンクごとの部分分析（map）を同時実行数を制限して並列に実行、
+部分分析を統合してレポート形式の最終分析（reduce）を作る
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple, Union
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models import BaseLlm, LLMRegistry, LlmRequest
+from google.genai import types
+from pydantic import PrivateAttr
+
+from agent_telemetry import telemetry, telemetry_enabled
+
+from .dataset import DatasetError, Table, find_table_span, to_json_value
+from .dataset_cache import (
+    STATE_KEY, DatasetArtifacts, dataset_cache, extract_overview, fingerprint, load_cached_table, register_dataset
+)
+
+# 日本語テキストのおおよその1トークンあたり文字数（スループットの推定用）
+CHARS_PER_TOKEN = 2.0
+
+# 各チャンクに添える依頼文の最大文字数
+MAX_REQUEST_CHARS = 1000
+
+# reduceに渡す記述統計の最大列数
+MAX_STATISTICS_COLUMNS = 30
+
+# 計測コールバック（モデル呼び出しの記録）: AGENT_TELEMETRY=off で無効
+TELEMETRY_ENABLED = telemetry_enabled()
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """分割された入力の1区間（表の場合は各チャンクにヘッダー行を付ける）"""
+
+    index: int
+    text: str
+    rows: int
+
+    @property
+    def chars(self) -> int:
+        return len(self.text)
+
+
+@dataclass(frozen=True)
+class SplitInput:
+    """入力の分割結果: 依頼文（データ以外の行）、チャンク、行数、表の場合はヘッダー付きの表全体"""
+
+    request: str
+    chunks: List[Chunk]
+    rows: int = 0
+    table_text: Optional[str] = None
+
+    @property
+    def is_table(self) -> bool:
+        return self.table_text is not None
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _pack(pieces: Sequence[str], max_chars: int, prefix: str = '') -> List[Tuple[str, int]]:
+    """行を順に詰めて max_chars 以下の区間にまとめる -> [(テキスト, 行数)]"""
+    packed = []
+    current: List[str] = []
+    size = len(prefix)
+    for piece in pieces:
+        if current and size + len(piece) + 1 > max_chars:
+            packed.append((prefix + '\n'.join(current), len(current)))
+            current, size = [], len(prefix)
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        packed.append((prefix + '\n'.join(current), len(current)))
+    return packed
+
+
+def split_input(text: str, max_chars: int) -> SplitInput:
+    """入力をチャンクに分割
+
+    区切り文字の数が揃った行が続く部分（find_table_span）は表として行単位で分割し、各チャンクにヘッダー行を付ける。
+    それ以外は行単位（長すぎる行は max_chars ごと）で分割する
+    """
+    lines = text.splitlines()
+    span = find_table_span(lines)
+    if span:
+        start, end = span
+        header, rows = lines[start], lines[start + 1:end]
+        request = '\n'.join(line for line in lines[:start] + lines[end:] if line.strip())
+        packed = _pack(rows, max_chars, prefix=header + '\n')
+        chunks = [Chunk(index=i, text=chunk, rows=count) for i, (chunk, count) in enumerate(packed)]
+        return SplitInput(
+            request=request[:MAX_REQUEST_CHARS], chunks=chunks, rows=len(rows), table_text='\n'.join(lines[start:end])
+        )
+
+    pieces = [
+        line[i:i + max_chars]
+        for line in lines
+        for i in range(0, max(len(line), 1), max_chars)
+    ]
+    packed = _pack(pieces, max_chars)
+    chunks = [Chunk(index=i, text=chunk, rows=count) for i, (chunk, count) in enumerate(packed)]
+    request = next((line for line in lines if line.strip()), '')
+    return SplitInput(request=request[:MAX_REQUEST_CHARS], chunks=chunks, rows=len(lines))
+
+
+def table_statistics(table: Table) -> Dict[str, Any]:
+    """表全体の記述統計（数値列の件数・平均・最小・最大・合計、日時列の範囲、文字列列の種類数）"""
+    columns = {}
+    for name in table.names[:MAX_STATISTICS_COLUMNS]:
+        kind = table.kind(name)
+        missing = table.missing(name)
+        values = table.column(name)[~missing]
+        summary: Dict[str, Any] = {'type': kind, 'count': int(len(values)), 'missing': int(missing.sum())}
+        if len(values) and kind in ('number', 'datetime'):
+            summary.update(min=to_json_value(values.min()), max=to_json_value(values.max()))
+            if kind == 'number':
+                summary.update(mean=to_json_value(values.mean()), sum=to_json_value(values.sum()))
+        elif kind == 'string':
+            uniques, _ = table.factorize(name)
+            summary['unique'] = int((uniques != '').sum())
+        columns[name] = summary
+    return {'rows': len(table), 'columns': columns}
+
+
+def _input_artifacts(split: SplitInput, text: str) -> Tuple[DatasetArtifacts, Optional[Dict[str, Any]]]:
+    """入力データの成果物と表全体の記述統計（表の解析・統計は同じデータなら再利用）"""
+    if split.is_table:
+        try:
+            artifacts, _ = load_cached_table(split.table_text, 'csv')
+        except DatasetError:
+            return dataset_cache.get_or_create(fingerprint(split.table_text)), None
+        statistics = artifacts.statistics.get('table_statistics')
+        if statistics is None:
+            statistics = table_statistics(artifacts.table)
+            artifacts.statistics['table_statistics'] = statistics
+            dataset_cache.update(artifacts)
+        return artifacts, statistics
+    fp = fingerprint(text)
+    return dataset_cache.get_or_create(fp), None
+
+
+class MapReduceAnalysisAgent(BaseAgent):
+    """入力が大きい場合にmap-reduceで分析するエージェント
+
+    sub_agents[0]: 入力が小さい場合にそのまま実行する分析エージェント
+    """
+
+    model: Union[str, BaseLlm]
+    map_instruction: str
+    reduce_instruction: str
+    chunk_chars: int
+    threshold_chars: int
+    max_concurrency: int
+
+    _llm: Union[BaseLlm, None] = PrivateAttr(default=None)
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def llm(self) -> BaseLlm:
+        if self._llm is None:
+            self._llm = self.model if isinstance(self.model, BaseLlm) else LLMRegistry.new_llm(self.model)
+        return self._llm
+
+    async def _generate(
+        self, ctx: InvocationContext, instruction: str, prompt: str, usage_totals: Dict[str, int]
+    ) -> str:
+        """1回のモデル呼び出し（LlmAgentを経由しないため、モデル呼び出しの計測はここで記録）"""
+        llm_request = LlmRequest(
+            model=self.llm.model,
+            contents=[types.Content(role='user', parts=[types.Part(text=prompt)])],
+            config=types.GenerateContentConfig(system_instruction=instruction)
+        )
+        text = ''
+        usage = None
+        started = time.perf_counter()
+        try:
+            async for llm_response in self.llm.generate_content_async(llm_request):
+                if llm_response.usage_metadata:
+                    usage = llm_response.usage_metadata
+                if llm_response.content and llm_response.content.parts:
+                    text += ''.join(
+                        part.text for part in llm_response.content.parts
+                        if part.text and not part.thought
+                    )
+        except Exception as e:
+            if TELEMETRY_ENABLED:
+                telemetry.record_model_call(
+                    ctx.invocation_id, self.name, llm_request.model, time.perf_counter() - started, error=e
+                )
+            raise
+        if TELEMETRY_ENABLED:
+            telemetry.record_model_call(
+                ctx.invocation_id, self.name, llm_request.model, time.perf_counter() - started, usage=usage
+            )
+        usage_totals['input_tokens'] += (usage.prompt_token_count if usage else None) or int(len(prompt) / CHARS_PER_TOKEN)
+        usage_totals['output_tokens'] += (usage.candidates_token_count if usage else None) or int(len(text) / CHARS_PER_TOKEN)
+        if not text.strip():
+            raise ValueError("空の応答が返されました")
+        return text.strip()
+
+    async def _map(
+        self, ctx: InvocationContext, split: SplitInput, artifacts: DatasetArtifacts, usage_totals: Dict[str, int]
+    ) -> Tuple[List[str], int]:
+        """チャンクごとの部分分析 -> (部分分析, キャッシュから再利用した数)
+
+        同時実行数を制限し、失敗したチャンクはその旨を記録して続行する。同じチャンク・依頼文の部分分析は再利用する
+        """
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        total = len(split.chunks)
+        reused = 0
+
+        async def analyze(chunk: Chunk) -> str:
+            nonlocal reused
+            prompt_key = fingerprint(f"{split.request}\n{chunk.text}")
+            cached = artifacts.partials.get(prompt_key)
+            if cached is not None:
+                reused += 1
+                return cached
+            kind = f"データ行 {chunk.rows:,}行" if split.is_table else f"{chunk.rows:,}行"
+            prompt = (
+                f"依頼: {split.request or '（指定なし）'}\n"
+                f"チャンク {chunk.index + 1}/{total}（{kind}）:\n{chunk.text}"
+            )
+            async with semaphore:
+                try:
+                    partial = await self._generate(ctx, self.map_instruction, prompt, usage_totals)
+                except Exception as e:
+                    print(f"❌ チャンク{chunk.index + 1}/{total}の部分分析失敗: {e}")
+                    return f"（チャンク{chunk.index + 1}: 部分分析に失敗したため未反映）"
+            artifacts.partials[prompt_key] = partial
+            return partial
+
+        partials = list(await asyncio.gather(*(analyze(chunk) for chunk in split.chunks)))
+        dataset_cache.update(artifacts)
+        return partials, reused
+
+    async def _reduce(
+        self,
+        ctx: InvocationContext,
+        split: SplitInput,
+        partials: List[str],
+        statistics: Optional[Dict[str, Any]],
+        overview: Optional[str],
+        usage_totals: Dict[str, int]
+    ) -> Tuple[str, int]:
+        """部分分析を統合して最終レポートを作る -> (レポート, 統合の段数)
+
+        部分分析の合計が chunk_chars を超える場合は、収まるまで中間統合を繰り返す
+        """
+        levels = 0
+        while sum(len(p) for p in partials) > self.chunk_chars and len(partials) > 1:
+            groups = [text for text, _ in _pack(partials, self.chunk_chars)]
+            if len(groups) == len(partials):
+                break
+            levels += 1
+            semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+            async def merge(group: str) -> str:
+                async with semaphore:
+                    prompt = f"依頼: {split.request or '（指定なし）'}\n以下の部分分析を1つの部分分析に統合してください:\n{group}"
+                    return await self._generate(ctx, self.map_instruction, prompt, usage_totals)
+
+            partials = list(await asyncio.gather(*(merge(group) for group in groups)))
+
+        sections = [f"依頼: {split.request or '（指定なし）'}"]
+        if statistics:
+            sections.append(f"入力全体の記述統計（計算済み、数値はこれを引用）:\n{compact_json(statistics)}")
+        if overview:
+            sections.append(f"データ概要（同じデータの前回の分析で作成済み、そのまま使う）:\n{overview}")
+        sections.append('\n\n'.join(f"### 部分分析 {i + 1}\n{p}" for i, p in enumerate(partials)))
+        report = await self._generate(ctx, self.reduce_instruction, '\n\n'.join(sections), usage_totals)
+        return report, levels + 1
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        text = ''.join(part.text for part in (ctx.user_content.parts if ctx.user_content else []) or [] if part.text)
+        if len(text) <= self.threshold_chars:
+            async for event in self.sub_agents[0].run_async(ctx):
+                yield event
+            return
+
+        started = time.perf_counter()
+        split = split_input(text, self.chunk_chars)
+        # 表の場合は全体の記述統計をローカルで計算し、reduceに渡す（同じデータなら解析・統計・部分分析・データ概要を再利用）
+        artifacts, statistics = _input_artifacts(split, text)
+        print(
+            f"🧩 map-reduce分析: {len(text):,}文字 → {len(split.chunks)}チャンク"
+            f"（{'表 ' + format(split.rows, ',') + '行' if split.is_table else 'テキスト'}、同時実行 {self.max_concurrency}）"
+        )
+
+        usage_totals = {'input_tokens': 0, 'output_tokens': 0}
+        partials, reused = await self._map(ctx, split, artifacts, usage_totals)
+        map_seconds = time.perf_counter() - started
+        overview = artifacts.overview
+        report, reduce_levels = await self._reduce(ctx, split, partials, statistics, overview, usage_totals)
+        if overview is None:
+            artifacts.overview = extract_overview(report)
+            dataset_cache.update(artifacts)
+        elapsed = time.perf_counter() - started
+
+        stats = {
+            'input_chars': len(text),
+            'chunks': len(split.chunks),
+            'rows': split.rows,
+            'reduce_levels': reduce_levels,
+            'cached_partials': reused,
+            'cached_overview': overview is not None,
+            'map_seconds': round(map_seconds, 3),
+            'total_seconds': round(elapsed, 3),
+            'rows_per_second': round(split.rows / elapsed, 1) if elapsed else 0.0,
+            'input_tokens_per_second': round(usage_totals['input_tokens'] / elapsed, 1) if elapsed else 0.0,
+            **usage_totals,
+        }
+        print(
+            f"✅ map-reduce分析完了: {elapsed:.2f}秒（map {map_seconds:.2f}秒・部分分析の再利用 {reused}/{len(partials)}）"
+            f" {stats['rows_per_second']:,.0f}行/秒・入力{stats['input_tokens_per_second']:,.0f}トークン/秒"
+        )
+        state_delta = {'analysis_map_reduce': stats}
+        if artifacts.table is not None:
+            # 同じセッションの続きの質問では、解析済みの表を統計ツールで参照できるようにする
+            name = register_dataset(artifacts)
+            state_delta[STATE_KEY] = {'fingerprint': artifacts.fingerprint, 'dataset': name, 'rows': len(artifacts.table)}
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role='model', parts=[types.Part(text=report)]),
+            actions=EventActions(state_delta=state_delta)
+        )
@@ -0,0 +1,556 @@
+"""
+分析用の統計ツール（モデルが数値を生成せず、ツールで計算した値を引用するため）
+すべてNumPyの列単位の演算で計算し、モデルに返すのは件数を絞った要約だけにする
+"""
+
+import functools
+import inspect
+import json
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.adk.tools import ToolContext
+
+from .dataset import DatasetError, Table, column_kind, dataset_store, read_source, to_json_value
+from .dataset_cache import STATE_KEY, dataset_cache, load_cached_table, register_dataset
+
+# group_by の集計方法
+AGGREGATIONS = ('count', 'sum', 'mean', 'std', 'min', 'max', 'median')
+
+# group_by の日時キーの丸め単位
+PERIODS = {'year': 'datetime64[Y]', 'month': 'datetime64[M]', 'week': 'datetime64[W]', 'day': 'datetime64[D]'}
+
+# rolling_window の統計量
+ROLLING_STATISTICS = ('mean', 'sum', 'std', 'min', 'max')
+
+# 応答に含める件数の上限（コンテキストを圧迫しないため）
+MAX_GROUPS = 50
+MAX_POINTS = 100
+MAX_MATRIX_COLUMNS = 8
+
+SECONDS_PER_DAY = 86400.0
+
+
+def stats_tool(func: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+    """データセット・列指定の誤りをエラー応答に変換し、計算時間を付ける
+
+    引数に dataset を取るツールの結果は、データの内容ハッシュと引数をキーに dataset_cache に保存して再利用する
+    """
+    signature = inspect.signature(func)
+    cacheable = 'dataset' in signature.parameters
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Dict[str, Any]:
+        start = time.perf_counter()
+        artifacts, cache_key = None, None
+        try:
+            if cacheable:
+                artifacts, cache_key = _cached_result_key(func.__name__, signature, args, kwargs)
+                if artifacts is not None and cache_key in artifacts.statistics:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    print(f"📐 {func.__name__}: キャッシュ {elapsed_ms:.1f}ms")
+                    return {'status': 'success', **artifacts.statistics[cache_key], 'cached': True,
+                            'elapsed_ms': round(elapsed_ms, 1)}
+            result = func(*args, **kwargs)
+        except (DatasetError, ValueError, TypeError) as e:
+            # 引数の型の誤りなどもツールの失敗として返し、エージェントの実行は止めない
+            print(f"❌ {func.__name__}: {e}")
+            return {'status': 'error', 'error_message': str(e)}
+        if artifacts is not None:
+            artifacts.statistics[cache_key] = result
+            dataset_cache.update(artifacts)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"📐 {func.__name__}: {elapsed_ms:.1f}ms")
+        return {'status': 'success', **result, 'elapsed_ms': round(elapsed_ms, 1)}
+
+    return wrapper
+
+
+def _int_arg(value: Any, name: str) -> int:
+    """ツールの整数引数（関数呼び出しの引数は 3.0 や '3' で届くことがある）"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise DatasetError(f"{name} には整数を指定してください: {value!r}")
+
+
+def _cached_result_key(name: str, signature: inspect.Signature, args: tuple, kwargs: dict) -> Tuple[Any, Optional[str]]:
+    """(データセットの成果物, ツール名と引数のキー)。フィンガープリントのない表は (None, None)"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    table = dataset_store.get(arguments.pop('dataset'))
+    arguments.pop('tool_context', None)
+    if table.fingerprint is None:
+        return None, None
+    artifacts = dataset_cache.get_or_create(table.fingerprint)
+    if artifacts.table is None:
+        artifacts.table = table
+    key = f"{name}:{json.dumps(arguments, ensure_ascii=False, sort_keys=True, default=str)}"
+    return artifacts, key
+
+
+def _round(value: Any) -> Any:
+    return to_json_value(value)
+
+
+def _split_names(names: Optional[List[str]]) -> List[str]:
+    """["a", "b"] / ["a,b"] のどちらの指定も列名のリストにする"""
+    return [name.strip() for item in names or [] for name in str(item).split(',') if name.strip()]
+
+
+def _numeric_summary(values: np.ndarray) -> Dict[str, Any]:
+    present = values[~np.isnan(values)]
+    if len(present) == 0:
+        return {'count': 0}
+    q = np.percentile(present, [0, 25, 50, 75, 100])
+    return {
+        'count': int(len(present)),
+        'mean': _round(present.mean()),
+        'std': _round(present.std(ddof=1)) if len(present) > 1 else None,
+        'min': _round(q[0]),
+        'p25': _round(q[1]),
+        'median': _round(q[2]),
+        'p75': _round(q[3]),
+        'max': _round(q[4]),
+        'sum': _round(present.sum()),
+    }
+
+
+def _top_values(table: Table, name: str, limit: int = 5) -> Tuple[int, List[Dict[str, Any]]]:
+    """文字列列の種類数と頻出値（欠損の空文字は除く）"""
+    uniques, codes = table.factorize(name)
+    counts = np.bincount(codes, minlength=len(uniques))
+    counts[uniques == ''] = 0
+    order = np.argsort(-counts, kind='stable')[:limit]
+    return int((counts > 0).sum()), [{'value': _round(uniques[i]), 'count': int(counts[i])} for i in order if counts[i]]
+
+
+@stats_tool
+def load_dataset(
+    data: str, name: str = '', format: str = 'auto', tool_context: Optional[ToolContext] = None
+) -> Dict[str, Any]:
+    """CSVまたはJSONのデータを読み込み、以降の統計ツールで使うデータセット名を返します。
+
+    Args:
+        data: CSV/JSONのテキスト（ANALYSIS_DATA_DIR 配下のファイル名も指定可）
+        name: データセット名（省略時はデータの内容から決まる名前）
+        format: auto / csv / json
+
+    Returns:
+        データセット名・行数・列の型と欠損数・先頭3行（同じ内容のデータは解析済みの表を再利用）
+    """
+    artifacts, cached = load_cached_table(read_source(data), format)
+    table = artifacts.table
+    name = register_dataset(artifacts, name)
+    if tool_context is not None:
+        # 同じセッションの続きの質問でデータを貼り直さなくても参照できるようにする
+        tool_context.state[STATE_KEY] = {'fingerprint': artifacts.fingerprint, 'dataset': name, 'rows': len(table)}
+    return {
+        'dataset': name,
+        'rows': len(table),
+        'columns': table.schema(),
+        'preview': table.preview(),
+        'cached': cached,
+    }
+
+
+@stats_tool
+def describe_columns(dataset: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """列ごとの記述統計（件数・欠損・平均・標準偏差・最小・四分位・最大、文字列は種類数と頻出値）を計算します。
+
+    Args:
+        dataset: load_dataset が返したデータセット名
+        columns: 対象の列名（省略時は全列）
+
+    Returns:
+        列名ごとの記述統計
+    """
+    table = dataset_store.get(dataset)
+    names = _split_names(columns) or table.names
+    summaries = {}
+    for name in names:
+        values = table.column(name)
+        kind = column_kind(values)
+        missing = table.missing(name)
+        if kind == 'number':
+            summary = _numeric_summary(values)
+        elif kind == 'datetime':
+            present = values[~missing]
+            summary = {'count': int(len(present))}
+            if len(present):
+                summary.update(min=_round(present.min()), max=_round(present.max()))
+        else:
+            unique, top = _top_values(table, name)
+            summary = {'count': int((~missing).sum()), 'unique': unique, 'top': top}
+        summaries[name] = {'type': kind, 'missing': int(missing.sum()), **summary}
+    return {'dataset': dataset, 'rows': len(table), 'columns': summaries}
+
+
+def _group_keys(table: Table, by: List[str], period: str) -> Tuple[np.ndarray, List[np.ndarray], np.ndarray]:
+    """キー列 -> (各行のグループコード, キー列ごとの各グループの値, キーが揃っている行のマスク)"""
+    if period and period not in PERIODS:
+        raise DatasetError(f"未対応の期間です: {period}（{' / '.join(PERIODS)}）")
+    valid = np.ones(len(table), dtype=np.bool_)
+    for name in by:
+        valid &= ~table.missing(name)
+
+    codes = np.zeros(int(valid.sum()), dtype=np.int64)
+    key_uniques = []
+    for name in by:
+        if period and table.kind(name) == 'datetime':
+            uniques, inverse = np.unique(table.column(name)[valid].astype(PERIODS[period]), return_inverse=True)
+        else:
+            uniques, inverse = table.factorize(name)
+            inverse = inverse[valid]
+        codes = codes * len(uniques) + inverse
+        key_uniques.append(uniques)
+
+    # 複数キーの組み合わせを出現したものだけに詰める
+    group_codes, codes = np.unique(codes, return_inverse=True)
+    group_keys = []
+    for uniques in reversed(key_uniques):
+        group_keys.append(uniques[group_codes % len(uniques)])
+        group_codes = group_codes // len(uniques)
+    return codes, group_keys[::-1], valid
+
+
+def _aggregate(codes: np.ndarray, values: np.ndarray, group_count: int, aggregation: str) -> np.ndarray:
+    """グループコードごとの集計（ソートせずにbincount、min/max/medianはコード順に並べて区間ごとに計算）"""
+    counts = np.bincount(codes, minlength=group_count).astype(np.float64)
+    if aggregation == 'count':
+        return counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sums = np.bincount(codes, weights=values, minlength=group_count)
+        if aggregation == 'sum':
+            return sums
+        means = sums / counts
+        if aggregation == 'mean':
+            return means
+        if aggregation == 'std':
+            # 分散はずらしても変わらないため、全体平均を引いてから二乗和をとる（桁落ち対策）
+            shifted = values - values.mean() if len(values) else values
+            shifted_means = means - (values.mean() if len(values) else 0.0)
+            squares = np.bincount(codes, weights=shifted * shifted, minlength=group_count)
+            variance = (squares - counts * shifted_means * shifted_means) / (counts - 1)
+            return np.sqrt(np.maximum(variance, 0.0))
+
+    order = np.lexsort((values, codes)) if aggregation == 'median' else np.argsort(codes, kind='stable')
+    ordered = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts[:-1]))).astype(np.int64)
+    result = np.full(group_count, np.nan)
+    present = counts > 0
+    if aggregation == 'min':
+        result[present] = np.minimum.reduceat(ordered, starts[present])
+    elif aggregation == 'max':
+        result[present] = np.maximum.reduceat(ordered, starts[present])
+    else:
+        sizes = counts[present].astype(np.int64)
+        lower = starts[present] + (sizes - 1) // 2
+        upper = starts[present] + sizes // 2
+        result[present] = (ordered[lower] + ordered[upper]) / 2
+    return result
+
+
+@stats_tool
+def group_by(
+    dataset: str,
+    by: List[str],
+    value: str = '',
+    aggregations: Optional[List[str]] = None,
+    period: str = '',
+    sort_by: str = '',
+    top_n: int = 20
+) -> Dict[str, Any]:
+    """キー列ごとに値列を集計します（count / sum / mean / std / min / max / median）。
+
+    Args:
+        dataset: load_dataset が返したデータセット名
+        by: グループ化するキー列（複数可）
+        value: 集計する数値列（省略時は件数のみ）
+        aggregations: 集計方法のリスト（省略時は count, sum, mean）
+        period: 日時のキー列を丸める単位（year / month / week / day）
+        sort_by: 並べ替えに使う集計方法（省略時は最初の集計の降順、key でキーの昇順）
+        top_n: 返すグループ数の上限
+
+    Returns:
+        グループごとの集計値（上位 top_n 件）とグループ総数
+    """
+    table = dataset_store.get(dataset)
+    keys = _split_names(by)
+    if not keys:
+        raise DatasetError("by にキー列を指定してください")
+    aggregations = _split_names(aggregations) or (['count', 'sum', 'mean'] if value else ['count'])
+    unknown = [a for a in aggregations if a not in AGGREGATIONS]
+    if unknown:
+        raise DatasetError(f"未対応の集計方法です: {', '.join(unknown)}（{' / '.join(AGGREGATIONS)}）")
+    if not value and aggregations != ['count']:
+        raise DatasetError("count 以外の集計には value に数値列を指定してください")
+
+    codes, group_keys, valid = _group_keys(table, keys, period)
+    group_count = len(group_keys[0])
+    values = np.zeros(len(codes))
+    if value:
+        values = table.numeric(value)[valid]
+        present = ~np.isnan(values)
+        codes, values = codes[present], values[present]
+
+    results = {a: _aggregate(codes, values, group_count, a) for a in aggregations}
+    sort_by = sort_by or aggregations[0]
+    if sort_by == 'key':
+        order = np.arange(group_count)
+    elif sort_by in results:
+        order = np.argsort(-np.nan_to_num(results[sort_by], nan=-np.inf), kind='stable')
+    else:
+        raise DatasetError(f"sort_by には key または集計方法（{', '.join(aggregations)}）を指定してください")
+
+    limit = max(1, min(_int_arg(top_n, 'top_n'), MAX_GROUPS))
+    groups = [
+        {
+            **{key: _round(uniques[i]) for key, uniques in zip(keys, group_keys)},
+            **{a: int(result[i]) if a == 'count' else _round(result[i]) for a, result in results.items()},
+        }
+        for i in order[:limit]
+    ]
+    response = {
+        'dataset': dataset,
+        'by': keys,
+        'value': value or None,
+        'group_count': group_count,
+        'groups': groups,
+        'truncated': group_count > limit,
+    }
+    if value and 'sum' in results:
+        response['total'] = _round(results['sum'].sum())
+    return response
+
+
+def _series(table: Table, value: str, order_by: str, aggregate: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(値の系列, 並び順の列の値) 。order_by の値が重複する行は aggregate で1点にまとめる"""
+    values = table.numeric(value)
+    if not order_by:
+        return values[~np.isnan(values)], None
+    if aggregate not in ('sum', 'mean', 'count'):
+        raise DatasetError("aggregate には sum / mean / count を指定してください")
+    keys = table.column(order_by)
+    valid = ~np.isnan(values) & ~table.missing(order_by)
+    uniques, codes = np.unique(keys[valid], return_inverse=True)
+    return _aggregate(codes, values[valid], len(uniques), aggregate), uniques
+
+
+def _rolling(values: np.ndarray, window: int, statistic: str) -> np.ndarray:
+    """長さ len(values) - window + 1 の移動統計量（累積和・スライディングウィンドウで計算）"""
+    if statistic in ('min', 'max'):
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        return windows.min(axis=1) if statistic == 'min' else windows.max(axis=1)
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    sums = cumsum[window:] - cumsum[:-window]
+    if statistic == 'sum':
+        return sums
+    means = sums / window
+    if statistic == 'mean':
+        return means
+    # 分散は平均からの偏差で計算（二乗和の差による桁落ちを避けるため値をずらす）
+    shifted = values - values.mean()
+    squares = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    shifted_sums = np.concatenate(([0.0], np.cumsum(shifted)))
+    window_squares = squares[window:] - squares[:-window]
+    window_sums = shifted_sums[window:] - shifted_sums[:-window]
+    variance = (window_squares - window_sums * window_sums / window) / max(window - 1, 1)
+    return np.sqrt(np.maximum(variance, 0.0))
+
+
+@stats_tool
+def rolling_window(
+    dataset: str,
+    value: str,
+    window: int,
+    order_by: str = '',
+    statistic: str = 'mean',
+    aggregate: str = 'sum',
+    points: int = 30
+) -> Dict[str, Any]:
+    """値列の移動統計量（移動平均など）を計算し、等間隔に間引いた点と要約を返します。
+
+    Args:
+        dataset: load_dataset が返したデータセット名
+        value: 数値列
+        window: ウィンドウの点数（order_by 指定時は order_by の値の個数、例: 日付なら日数）
+        order_by: 並び順の列（日付など。省略時は行の順）。同じ値の行は aggregate でまとめる
+        statistic: mean / sum / std / min / max
+        aggregate: order_by の値が重複する行のまとめ方（sum / mean / count）
+        points: 返す点の数
+
+    Returns:
+        間引いた移動統計量の点と、最初・最後・最小・最大の値
+    """
+    if statistic not in ROLLING_STATISTICS:
+        raise DatasetError(f"未対応の統計量です: {statistic}（{' / '.join(ROLLING_STATISTICS)}）")
+    window, points = _int_arg(window, 'window'), _int_arg(points, 'points')
+    table = dataset_store.get(dataset)
+    series, keys = _series(table, value, order_by, aggregate)
+    if window < 1 or window > len(series):
+        raise DatasetError(f"window は1以上{len(series)}以下にしてください")
+
+    rolled = _rolling(series, window, statistic)
+    # ウィンドウの最後の点の位置
+    positions = np.arange(window - 1, len(series))
+    count = max(2, min(points, MAX_POINTS))
+    sampled = np.unique(np.linspace(0, len(rolled) - 1, num=min(count, len(rolled))).round().astype(np.int64))
+
+    def label(index: int) -> Any:
+        position = int(positions[index])
+        return _round(keys[position]) if keys is not None else position
+
+    lowest, highest = int(np.argmin(rolled)), int(np.argmax(rolled))
+    first, last = rolled[0], rolled[-1]
+    return {
+        'dataset': dataset,
+        'value': value,
+        'order_by': order_by or None,
+        'statistic': statistic,
+        'window': window,
+        'series_length': int(len(series)),
+        'points': [{'at': label(i), 'value': _round(rolled[i])} for i in sampled],
+        'summary': {
+            'first': {'at': label(0), 'value': _round(first)},
+            'last': {'at': label(len(rolled) - 1), 'value': _round(last)},
+            'min': {'at': label(lowest), 'value': _round(rolled[lowest])},
+            'max': {'at': label(highest), 'value': _round(rolled[highest])},
+            'change': _round(last - first),
+            'change_rate': _round((last - first) / abs(first)) if first else None,
+        },
+    }
+
+
+@stats_tool
+def linear_trend(dataset: str, y: str, x: str = '') -> Dict[str, Any]:
+    """最小二乗法で y = slope * x + intercept の直線を当てはめ、傾き・決定係数・有意性を返します。
+
+    Args:
+        dataset: load_dataset が返したデータセット名
+        y: 目的変数の数値列
+        x: 説明変数の数値列または日時列（省略時は行番号。日時の場合の傾きは1日あたり）
+
+    Returns:
+        傾き・切片・決定係数・傾きの標準誤差・t値・p値（正規近似）と、期間全体の変化量
+    """
+    table = dataset_store.get(dataset)
+    y_values = table.numeric(y)
+    x_unit = 'row'
+    if x:
+        x_values = table.numeric(x)
+        if table.kind(x) == 'datetime':
+            x_values = x_values / SECONDS_PER_DAY
+            x_unit = 'day'
+        else:
+            x_unit = x
+    else:
+        x_values = np.arange(len(y_values), dtype=np.float64)
+
+    valid = ~np.isnan(x_values) & ~np.isnan(y_values)
+    x_values, y_values = x_values[valid], y_values[valid]
+    n = len(x_values)
+    if n < 3:
+        raise DatasetError("回帰には欠損のない行が3行以上必要です")
+
+    # 平均を引いてから積和をとる（日時のような大きな値でも桁落ちしないため）
+    x_mean, y_mean = x_values.mean(), y_values.mean()
+    dx, dy = x_values - x_mean, y_values - y_mean
+    sxx, sxy, syy = float(dx @ dx), float(dx @ dy), float(dy @ dy)
+    if sxx == 0:
+        raise DatasetError(f"{x or '行番号'} の値がすべて同じため傾きを計算できません")
+    slope = sxy / sxx
+    intercept = y_mean - slope * x_mean
+    residual = max(syy - slope * sxy, 0.0)
+    r2 = 1.0 - residual / syy if syy else 1.0
+    stderr = math.sqrt(residual / (n - 2) / sxx)
+    t_value = slope / stderr if stderr else math.inf
+    p_value = math.erfc(abs(t_value) / math.sqrt(2)) if math.isfinite(t_value) else 0.0
+
+    x_min, x_max = x_values.min(), x_values.max()
+    start, end = intercept + slope * x_min, intercept + slope * x_max
+    return {
+        'dataset': dataset,
+        'y': y,
+        'x': x or None,
+        'x_unit': x_unit,
+        'n': n,
+        'slope': _round(slope),
+        'intercept': _round(intercept),
+        'r2': _round(r2),
+        'slope_stderr': _round(stderr),
+        't_value': _round(t_value) if math.isfinite(t_value) else None,
+        'p_value': _round(p_value),
+        'fitted_start': _round(start),
+        'fitted_end': _round(end),
+        'fitted_change': _round(end - start),
+        'fitted_change_rate': _round((end - start) / abs(start)) if start else None,
+    }
+
+
+def _average_ranks(values: np.ndarray) -> np.ndarray:
+    """同順位は平均順位にした順位（Spearmanの相関用）"""
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    return (ends - (counts - 1) / 2.0)[inverse]
+
+
+@stats_tool
+def correlation(
+    dataset: str,
+    columns: Optional[List[str]] = None,
+    method: str = 'pearson',
+    top_n: int = 10
+) -> Dict[str, Any]:
+    """数値列どうしの相関係数を計算し、絶対値の大きい組み合わせを返します。
+
+    Args:
+        dataset: load_dataset が返したデータセット名
+        columns: 対象の数値列（省略時は全数値列）
+        method: pearson（線形） / spearman（順位）
+        top_n: 返す組み合わせ数の上限
+
+    Returns:
+        相関の強い列の組み合わせ（列数が少なければ相関行列も）。いずれかの列が欠損の行は除外
+    """
+    if method not in ('pearson', 'spearman'):
+        raise DatasetError("method には pearson / spearman を指定してください")
+    table = dataset_store.get(dataset)
+    names = _split_names(columns) or [name for name in table.names if table.kind(name) == 'number']
+    if len(names) < 2:
+        raise DatasetError("相関には数値列が2列以上必要です")
+
+    matrix = np.column_stack([table.numeric(name) for name in names])
+    matrix = matrix[~np.isnan(matrix).any(axis=1)]
+    if len(matrix) < 3:
+        raise DatasetError("相関には欠損のない行が3行以上必要です")
+    if method == 'spearman':
+        matrix = np.column_stack([_average_ranks(matrix[:, j]) for j in range(matrix.shape[1])])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coefficients = np.corrcoef(matrix, rowvar=False)
+
+    upper_i, upper_j = np.triu_indices(len(names), k=1)
+    pairs = coefficients[upper_i, upper_j]
+    order = np.argsort(-np.abs(np.nan_to_num(pairs, nan=0.0)), kind='stable')[:max(1, _int_arg(top_n, 'top_n'))]
+    response = {
+        'dataset': dataset,
+        'method': method,
+        'n': int(len(matrix)),
+        'pairs': [
+            {'a': names[upper_i[k]], 'b': names[upper_j[k]], 'r': _round(pairs[k])}
+            for k in order
+        ],
+    }
+    if len(names) <= MAX_MATRIX_COLUMNS:
+        response['matrix'] = {
+            names[i]: {names[j]: _round(coefficients[i, j]) for j in range(len(names))}
+            for i in range(len(names))
+        }
+    return response
+
+
+# analysis_agent に登録するツール
+STATS_TOOLS = [load_dataset, describe_columns, group_by, rolling_window, linear_trend, correlation]
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+エージェントパイプライン ステージ別レイテンシ ベンチマーク
+観光スポット検索・分析の root_agent をADK Runner（InMemorySessionService）で実行し、
+モデル呼び出しはスクリプト化されたローカルモデルで遅延・トークン数を模擬する。
+ステージ別・全体のp50/p95/p99をJSONに保存し、--baseline で過去の結果と比較できる
+
+環境変数（TOURISM_HTML_MODE / TOURISM_STREAM_CARDS など）はエージェント読み込み時に反映されるため、実行前に設定する
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 同じ要求の繰り返しで結果キャッシュがヒットしないよう、デフォルトでは無効化（--with-cache で有効）
+if '--with-cache' not in sys.argv:
+    os.environ['TOURISM_CACHE_BACKEND'] = 'none'
+
+from google.adk.agents import BaseAgent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from scripted_model import install_scripted_models, iter_agents
+from tourism_spots_agent.latency_metrics import percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# 観光スポット検索の入力（ルールベースで確定するもの・LLMフォールバックになるものを混在）
+TOURISM_MESSAGES = (
+    '春の京都で歴史を感じるスポット',
+    '東京で写真映えする現代的な場所',
+    '大阪の文化スポットを教えて',
+    '京都駅の近くで徒歩15分以内の観光地',
+    '秋に紅葉がきれいな自然スポット',
+    'おすすめの観光地を教えて',
+    '週末にのんびりできるところ',
+    '清水寺周辺で体験できるところ',
+)
+
+ANALYSIS_MESSAGES = (
+    '直近12か月の月次売上データ（1月: 120万円 ... 12月: 185万円）の傾向を分析してください',
+    'アンケート結果（満足度4.2、回答数350件、不満点: 待ち時間）から改善策を提案してください',
+    'Webサイトのアクセス数とコンバージョン率の推移を分析してください',
+)
+
+
+def _add_callback(existing: Any, callback: Callable) -> List[Callable]:
+    """既存のコールバック（None / 単体 / リスト）の後ろに追加"""
+    if existing is None:
+        return [callback]
+    if isinstance(existing, list):
+        return [*existing, callback]
+    return [existing, callback]
+
+
+class StageTimer:
+    """before/after_agent_callbackでエージェント（ステージ）ごとの実行時間を記録"""
+
+    def __init__(self):
+        self._started: Dict[Tuple[str, str], float] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self.order: List[str] = []
+
+    def install(self, root: BaseAgent) -> None:
+        for agent in iter_agents(root):
+            agent.before_agent_callback = _add_callback(agent.before_agent_callback, self.before)
+            agent.after_agent_callback = _add_callback(agent.after_agent_callback, self.after)
+            self.order.append(agent.name)
+
+    def before(self, callback_context) -> None:
+        self._started[(callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+
+    def after(self, callback_context) -> None:
+        started = self._started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if started is not None:
+            self.samples.setdefault(callback_context.agent_name, []).append(time.perf_counter() - started)
+
+    def reset(self) -> None:
+        self._started.clear()
+        self.samples.clear()
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """秒の値列をミリ秒のp50/p95/p99に集計"""
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 2) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+    }
+
+
+async def run_requests(
+    root: BaseAgent, messages: Tuple[str, ...], request_count: int, concurrency: int, verbose: bool
+) -> List[float]:
+    """request_count件の要求をconcurrency並列で実行し、1件ごとの全体レイテンシ（秒）を返す"""
+    runner = InMemoryRunner(agent=root, app_name='bench')
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+
+    async def run_one(index: int) -> None:
+        async with semaphore:
+            session = await runner.session_service.create_session(app_name='bench', user_id=f'user{index}')
+            message = types.Content(role='user', parts=[types.Part(text=messages[index % len(messages)])])
+            start = time.perf_counter()
+            async for _ in runner.run_async(user_id=f'user{index}', session_id=session.id, new_message=message):
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    # エージェントのprintログはベンチマークの出力を埋めるため、--verbose 以外は捨てる
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        await asyncio.gather(*(run_one(i) for i in range(request_count)))
+    return latencies
+
+
+def benchmark_agent(
+    root: BaseAgent,
+    messages: Tuple[str, ...],
+    args: argparse.Namespace
+) -> Dict[str, Any]:
+    models = install_scripted_models(
+        root,
+        seed=args.seed,
+        first_token_seconds=args.first_token_ms / 1000,
+        seconds_per_input_token=args.ms_per_input_token / 1000,
+        seconds_per_output_token=args.ms_per_token / 1000,
+        jitter=args.jitter
+    )
+    timer = StageTimer()
+    timer.install(root)
+
+    # ウォームアップ（モジュールの遅延初期化・インデックス構築を計測から除外）
+    asyncio.run(run_requests(root, messages, min(args.warmup, len(messages)), 1, args.verbose))
+    timer.reset()
+    for model in models.values():
+        model.reset_stats()
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run_requests(root, messages, args.requests, args.concurrency, args.verbose))
+    elapsed = time.perf_counter() - started
+
+    stages = {}
+    for name in timer.order:
+        samples = timer.samples.get(name)
+        if not samples:
+            continue
+        stage = summarize(samples)
+        model = models.get(name)
+        if model is not None:
+            stats = model.stats
+            stage['model'] = {
+                'calls': stats['calls'],
+                'prompt_tokens': stats['prompt_tokens'],
+                'output_tokens': stats['output_tokens'],
+                'simulated_ms': round(stats['simulated_seconds'] * 1000, 2)
+            }
+        stages[name] = stage
+
+    return {
+        'agent': root.name,
+        'requests': args.requests,
+        'throughput_rps': round(args.requests / elapsed, 2) if elapsed else 0.0,
+        'end_to_end': summarize(latencies),
+        'stages': stages
+    }
+
+
+def print_result(label: str, result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"\n📊 {label}（{result['agent']} / {result['requests']}件 / {result['throughput_rps']}件/秒）")
+    print(f"  {'ステージ':<32} {'件数':>5} {'p50':>10} {'p95':>10} {'p99':>10}  呼び出し/トークン(入力→出力)")
+
+    def row(name: str, stats: Dict[str, Any], base: Optional[Dict[str, Any]]) -> None:
+        line = f"  {name:<32} {stats['count']:>5} {stats['p50_ms']:>8.1f}ms {stats['p95_ms']:>8.1f}ms {stats['p99_ms']:>8.1f}ms"
+        model = stats.get('model')
+        if model:
+            line += f"  {model['calls']}回 / {model['prompt_tokens']:,}→{model['output_tokens']:,}"
+        if base:
+            line += f"  (p50 {stats['p50_ms'] - base['p50_ms']:+.1f}ms / p95 {stats['p95_ms'] - base['p95_ms']:+.1f}ms"
+            base_model = base.get('model')
+            if model and base_model and base_model['prompt_tokens']:
+                line += f" / 入力トークン {model['prompt_tokens'] / base_model['prompt_tokens'] - 1:+.0%}"
+            line += ")"
+        print(line)
+
+    base_stages = (baseline or {}).get('stages', {})
+    for name, stats in result['stages'].items():
+        row(name, stats, base_stages.get(name))
+    row('（全体）', result['end_to_end'], (baseline or {}).get('end_to_end'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エージェントパイプラインのステージ別レイテンシ ベンチマーク")
+    parser.add_argument('--agents', default='tourism,analysis', help="計測対象（tourism, analysis をカンマ区切り）")
+    parser.add_argument('--requests', type=int, default=50, help="エージェントごとの要求数")
+    parser.add_argument('--concurrency', type=int, default=1, help="同時実行数")
+    parser.add_argument('--warmup', type=int, default=3, help="計測前のウォームアップ要求数")
+    parser.add_argument('--first-token-ms', type=float, default=300.0, help="模擬モデルの最初のトークンまでの時間（ミリ秒）")
+    parser.add_argument('--ms-per-input-token', type=float, default=0.05, help="模擬モデルの入力1トークンあたりの時間（ミリ秒）")
+    parser.add_argument('--ms-per-token', type=float, default=5.0, help="模擬モデルの出力1トークンあたりの時間（ミリ秒）")
+    parser.add_argument('--jitter', type=float, default=0.25, help="遅延のゆらぎ（対数正規分布のσ、0で固定）")
+    parser.add_argument('--seed', type=int, default=0, help="遅延のゆらぎの乱数シード")
+    parser.add_argument('--with-cache', action='store_true', help="観光スポット検索の結果キャッシュを有効にする")
+    parser.add_argument('--output', help="結果JSONの保存先（省略時は benchmarks/results/pipeline_<日時>.json）")
+    parser.add_argument('--baseline', help="比較対象の過去の結果JSON")
+    parser.add_argument('--verbose', action='store_true', help="エージェントのログを表示")
+    args = parser.parse_args()
+
+    targets = {}
+    for name in (a.strip() for a in args.agents.split(',') if a.strip()):
+        if name == 'tourism':
+            from tourism_spots_agent.agent import root_agent as tourism_root
+            targets[name] = (tourism_root, TOURISM_MESSAGES)
+        elif name == 'analysis':
+            from analysis_agent.agent import root_agent as analysis_root
+            targets[name] = (analysis_root, ANALYSIS_MESSAGES)
+        else:
+            parser.error(f"未知のエージェント: {name}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print(
+        f"🚀 模擬モデル: 最初のトークン {args.first_token_ms:.0f}ms + 入力 {args.ms_per_input_token:.2f}ms/トークン"
+        f" + 出力 {args.ms_per_token:.1f}ms/トークン（ゆらぎσ={args.jitter}）"
+    )
+    results = {}
+    for name, (root, messages) in targets.items():
+        results[name] = benchmark_agent(root, messages, args)
+        print_result(name, results[name], (baseline or {}).get('agents', {}).get(name))
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            key: getattr(args, key)
+            for key in (
+                'requests', 'concurrency', 'warmup', 'first_token_ms', 'ms_per_input_token', 'ms_per_token',
+                'jitter', 'seed', 'with_cache'
+            )
+        },
+        'env': {key: value for key, value in os.environ.items() if key.startswith('TOURISM_')},
+        'agents': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果を保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
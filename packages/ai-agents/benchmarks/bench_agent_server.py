@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+エージェントサーバー ベンチマーク
+agent_server のアプリを模擬モデルでuvicorn上に起動し、同時に送る stream_query の数を段階的に増やして、
+受け付けた要求の最初のイベントまでの時間・完了までの時間と、上限を超えて 503 で拒否された件数を表示する
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from datetime import datetime
+
+import httpx
+import uvicorn
+
+# bench_agent_pipeline の import 時に結果キャッシュが無効化される
+from bench_agent_pipeline import RESULTS_DIR, TOURISM_MESSAGES, summarize
+from scripted_model import install_scripted_models
+from agent_server.server import ConcurrencyLimiter, create_app
+from tourism_spots_agent.agent import root_agent
+
+
+async def send_one(client: httpx.AsyncClient, index: int):
+    """1件の stream_query。(ステータス, 最初のイベントまでの秒, 完了までの秒)"""
+    body = {'class_method': 'stream_query',
+            'input': {'message': TOURISM_MESSAGES[index % len(TOURISM_MESSAGES)], 'user_id': f'user{index}'}}
+    start = time.perf_counter()
+    first = None
+    async with client.stream('POST', '/agents/tourism:streamQuery?alt=sse', json=body) as response:
+        async for chunk in response.aiter_text():
+            if first is None and 'data: ' in chunk:
+                first = time.perf_counter() - start
+    return response.status_code, first, time.perf_counter() - start
+
+
+async def run(args) -> list:
+    app = create_app(agents='tourism', limiter=ConcurrencyLimiter(args.limit, args.max_waiting, args.wait_timeout_ms / 1000))
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level='error'))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    steps = []
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{args.port}', timeout=120, limits=limits) as client:
+            for clients in (int(v) for v in args.clients.split(',') if v.strip()):
+                start = time.perf_counter()
+                results = await asyncio.gather(*[send_one(client, i) for i in range(clients)])
+                elapsed = time.perf_counter() - start
+                accepted = [r for r in results if r[0] == 200]
+                steps.append({
+                    'clients': clients,
+                    'accepted': len(accepted),
+                    'rejected_503': sum(1 for r in results if r[0] == 503),
+                    'seconds': round(elapsed, 2),
+                    'first_event': summarize([r[1] for r in accepted if r[1] is not None]),
+                    'total': summarize([r[2] for r in accepted]),
+                    'rejected_ms': summarize([r[2] for r in results if r[0] == 503]),
+                })
+    finally:
+        server.should_exit = True
+        await serve
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エージェントサーバーの同時実行上限と503のベンチマーク（模擬モデル）")
+    parser.add_argument('--clients', default='1,4,8,16,32', help="同時に送る stream_query の数（カンマ区切り）")
+    parser.add_argument('--limit', type=int, default=8, help="ワーカーの同時実行数の上限")
+    parser.add_argument('--max-waiting', type=int, default=0, help="空きを待てる要求の数")
+    parser.add_argument('--wait-timeout-ms', type=float, default=0, help="空きを待つ時間")
+    parser.add_argument('--first-token-ms', type=float, default=300, help="模擬モデルの最初のトークンまでの時間")
+    parser.add_argument('--port', type=int, default=8799, help="起動するポート")
+    parser.add_argument('--output', default=None, help="結果JSONの出力先")
+    args = parser.parse_args()
+
+    install_scripted_models(root_agent, first_token_seconds=args.first_token_ms / 1000, jitter=0)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        steps = asyncio.run(run(args))
+
+    print(f"\n📊 stream_query（同時実行の上限 {args.limit}、待ち {args.max_waiting}件・{args.wait_timeout_ms:.0f}ms）")
+    print(f"  {'同時':>5} {'受付':>5} {'503':>5} {'最初のイベント p50':>18} {'p99':>9} {'完了 p50':>10} {'p99':>9} {'503の応答':>10}")
+    for step in steps:
+        print(f"  {step['clients']:>5} {step['accepted']:>5} {step['rejected_503']:>5}"
+              f" {step['first_event']['p50_ms']:>16.0f}ms {step['first_event']['p99_ms']:>7.0f}ms"
+              f" {step['total']['p50_ms']:>8.0f}ms {step['total']['p99_ms']:>7.0f}ms {step['rejected_ms']['p50_ms']:>8.1f}ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"agent_server_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'args': vars(args), 'steps': steps}, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果を保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
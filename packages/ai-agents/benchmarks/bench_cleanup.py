@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+古いAgent Engine削除 ベンチマーク
+クォータを模擬するフェイクの ReasoningEngineServiceClient に対して、従来の直列削除（6秒間隔・レート制限時は60秒待って30秒間隔で1回リトライ）と
+engine_cleanup のスケジューラ（トークンバケット + AIMD同時実行数 + ジッター付き指数バックオフ）の所要時間を比較し、
+途中で中断したあとジャーナルから再開できることを確認する。時間は --time-scale 倍に縮めて実行し、結果は実時間換算（分）で表示する
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine_cleanup import (
+    BACKOFF_BASE_SECONDS, BACKOFF_CAP_SECONDS, BURST, INITIAL_CONCURRENCY, MAX_CONCURRENCY,
+    OPERATION_TIMEOUT_SECONDS, EngineDeleter, ProgressJournal, is_rate_limited
+)
+from fake_reasoning_engine_client import FakeReasoningEngineServiceClient
+
+
+def legacy_cleanup(client: FakeReasoningEngineServiceClient, names, scale: float) -> dict:
+    """従来の cleanup_old_agents の削除ループ（待ち時間は scale 倍）"""
+    deleted, failed, retry_list = 0, 0, []
+    for i, name in enumerate(names):
+        try:
+            client.delete_reasoning_engine(request={'name': name, 'force': True}).result()
+            deleted += 1
+            if i < len(names) - 1:
+                time.sleep(6 * scale)
+        except Exception as e:
+            if is_rate_limited(e):
+                retry_list.append(name)
+            else:
+                failed += 1
+    if retry_list:
+        time.sleep(60 * scale)
+        for i, name in enumerate(retry_list):
+            try:
+                client.delete_reasoning_engine(request={'name': name, 'force': True}).result()
+                deleted += 1
+                if i < len(retry_list) - 1:
+                    time.sleep(30 * scale)
+            except Exception:
+                failed += 1
+    return {'deleted': deleted, 'failed': failed}
+
+
+def make_client(args) -> FakeReasoningEngineServiceClient:
+    return FakeReasoningEngineServiceClient(
+        engines=args.engines,
+        requests_per_minute=args.quota_per_minute,
+        max_concurrent_operations=args.max_operations,
+        operation_seconds=args.operation_seconds,
+        transient_error_rate=args.error_rate,
+        time_scale=args.time_scale,
+        seed=args.seed
+    )
+
+
+def make_deleter(client, args, journal=None) -> EngineDeleter:
+    scale = args.time_scale
+    return EngineDeleter(
+        client,
+        rate_per_minute=args.rate_per_minute / scale,
+        burst=args.burst,
+        initial_concurrency=args.concurrency,
+        max_concurrency=args.max_concurrency,
+        backoff_base=BACKOFF_BASE_SECONDS * scale,
+        backoff_cap=BACKOFF_CAP_SECONDS * scale,
+        operation_timeout=OPERATION_TIMEOUT_SECONDS * scale,
+        journal=journal,
+        seed=args.seed
+    )
+
+
+def print_row(label: str, seconds: float, scale: float, deleted: int, total: int, requests: int, rate_limited: int) -> None:
+    minutes = seconds / scale / 60
+    print(f"  {label:<28} {minutes:8.1f}分 {deleted:>6}/{total:<6} {requests:>6} {rate_limited:>10} {deleted / max(minutes, 1e-9):>10.1f}")
+
+
+async def interrupted_run(deleter: EngineDeleter, names, seconds: float) -> None:
+    try:
+        await asyncio.wait_for(deleter.run(names), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="古いAgent Engine削除のベンチマーク（フェイククライアント、Vertex AI不要）")
+    parser.add_argument('--engines', type=int, default=300, help="削除するエンジン数")
+    parser.add_argument('--quota-per-minute', type=int, default=30, help="模擬する1分あたりの削除要求クォータ")
+    parser.add_argument('--max-operations', type=int, default=8, help="模擬する同時オペレーション数の上限")
+    parser.add_argument('--operation-seconds', type=float, default=20.0, help="模擬する削除オペレーションの平均所要時間（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.02, help="模擬する一時的な失敗（503）の割合")
+    parser.add_argument('--rate-per-minute', type=float, default=30.0, help="スケジューラの開始ペース（件/分）")
+    parser.add_argument('--burst', type=int, default=BURST, help="スケジューラのバースト数")
+    parser.add_argument('--concurrency', type=int, default=INITIAL_CONCURRENCY, help="スケジューラの同時実行数（開始値）")
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY, help="スケジューラの同時実行数の上限")
+    parser.add_argument('--time-scale', type=float, default=0.005, help="時間の縮尺（0.005なら実時間の1分を0.3秒で模擬）")
+    parser.add_argument('--seed', type=int, default=0, help="乱数シード")
+    parser.add_argument('--skip-legacy', action='store_true', help="従来の直列削除の計測を省略")
+    args = parser.parse_args()
+    scale = args.time_scale
+
+    print(f"🚀 エンジン {args.engines}個 / クォータ {args.quota_per_minute}件/分・同時オペレーション {args.max_operations}"
+          f" / オペレーション平均 {args.operation_seconds:.0f}秒 / 一時的な失敗 {args.error_rate:.0%}")
+    print("\n📊 結果（実時間換算）")
+    print(f"  {'方式':<28} {'所要時間':>9} {'削除':>13} {'要求':>6} {'レート制限':>10} {'件/分':>10}")
+
+    if not args.skip_legacy:
+        client = make_client(args)
+        names = [engine.name for engine in client.list_reasoning_engines()]
+        start = time.perf_counter()
+        legacy = legacy_cleanup(client, names, scale)
+        print_row("従来（直列・6秒間隔）", time.perf_counter() - start, scale, legacy['deleted'], len(names),
+                  client.stats['requests'], client.stats['rate_limited'])
+
+    client = make_client(args)
+    names = [engine.name for engine in client.list_reasoning_engines()]
+    result = asyncio.run(make_deleter(client, args).run(names))
+    print_row("スケジューラ", result.seconds, scale, len(result.deleted) + len(result.not_found), len(names),
+              client.stats['requests'], client.stats['rate_limited'])
+    print(f"    最大同時実行 {result.peak_concurrency} / 最終の同時実行上限 {result.final_concurrency:.1f}"
+          f" / 最終の開始ペース {result.final_rate_per_minute * scale:.1f}件/分 / リトライ {result.retries}回 / 失敗 {len(result.failed)}")
+
+    # 途中で中断して、同じジャーナルで再開
+    client = make_client(args)
+    names = [engine.name for engine in client.list_reasoning_engines()]
+    with tempfile.TemporaryDirectory() as tmp:
+        journal_path = os.path.join(tmp, 'cleanup_journal.jsonl')
+        start = time.perf_counter()
+        asyncio.run(interrupted_run(make_deleter(client, args, ProgressJournal(journal_path)), names, result.seconds / 2))
+        interrupted_seconds = time.perf_counter() - start
+        interrupted_deleted = client.stats['deleted']
+        resumed = asyncio.run(make_deleter(client, args, ProgressJournal(journal_path)).run(names))
+    print(f"\n🔁 中断・再開: {interrupted_seconds / scale / 60:.1f}分で中断（{interrupted_deleted}個削除済み）→ "
+          f"再開でジャーナルから{resumed.skipped}個を省略、{len(resumed.deleted) + len(resumed.not_found)}個を削除"
+          f"（{resumed.seconds / scale / 60:.1f}分）/ 残り {len(client.engines)}個")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+位置情報インデックス ベンチマーク
+合成データ（デフォルト10万地点）で GeoGridIndex の半径検索・k近傍検索のレイテンシを計測し、全件走査の結果と照合
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tourism_spots_agent.geo_index import GeoGridIndex, haversine_m, walking_route
+from tourism_spots_agent.latency_metrics import percentile
+
+# 京都市周辺（約50km四方）
+CENTER = (35.0, 135.75)
+SPAN_DEGREES = 0.45
+
+
+def generate_points(count: int):
+    """中心付近に密集する合成地点（観光地の分布に近い正規分布 + 一様分布の混合）"""
+    rng = random.Random(0)
+    for i in range(count):
+        if rng.random() < 0.7:
+            lat = rng.gauss(CENTER[0], SPAN_DEGREES / 8)
+            lon = rng.gauss(CENTER[1], SPAN_DEGREES / 8)
+        else:
+            lat = CENTER[0] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2)
+            lon = CENTER[1] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2)
+        yield lat, lon, i
+
+
+def measure(label: str, fn, queries) -> None:
+    for query in queries[:100]:
+        fn(*query)
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(*query)
+        samples.append(time.perf_counter() - start)
+    print(
+        f"  {label}: p50 {percentile(samples, 0.50) * 1e3:.3f}ms / "
+        f"p99 {percentile(samples, 0.99) * 1e3:.3f}ms / "
+        f"{len(samples) / sum(samples):,.0f} 回/秒"
+    )
+
+
+def brute_force_nearest(points, lat: float, lon: float, k: int):
+    return sorted((haversine_m(lat, lon, p_lat, p_lon), i) for p_lat, p_lon, i in points)[:k]
+
+
+def run_benchmark(point_count: int, queries_count: int, radius_m: float, k: int) -> None:
+    points = list(generate_points(point_count))
+    print(f"📦 インデックス構築中: {point_count:,}地点")
+    start = time.perf_counter()
+    index = GeoGridIndex(points)
+    print(f"  構築時間: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    rng = random.Random(1)
+    queries = [
+        (CENTER[0] + rng.uniform(-SPAN_DEGREES / 4, SPAN_DEGREES / 4),
+         CENTER[1] + rng.uniform(-SPAN_DEGREES / 4, SPAN_DEGREES / 4))
+        for _ in range(queries_count)
+    ]
+
+    # 全件走査との照合
+    for lat, lon in queries[:5]:
+        expected = [i for _, i in brute_force_nearest(points, lat, lon, k)]
+        actual = [i for _, i in index.nearest(lat, lon, k)]
+        assert expected == actual, "k近傍検索の結果が全件走査と一致しません"
+    start = time.perf_counter()
+    brute_force_nearest(points, *queries[0], k)
+    brute_force_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n📊 結果（{queries_count:,}回検索）")
+    measure(f"radius（半径{radius_m:,.0f}m）", lambda lat, lon: index.radius(lat, lon, radius_m), queries)
+    measure(f"nearest（k={k}）", lambda lat, lon: index.nearest(lat, lon, k), queries)
+    print(f"  参考: 全件走査のk近傍 {brute_force_ms:.1f}ms/回")
+
+    route_points = [(lat, lon) for lat, lon, _ in points[:6]]
+    start = time.perf_counter()
+    walking_route(route_points)
+    print(f"  walking_route（6地点、全順列）: {(time.perf_counter() - start) * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GeoGridIndex ベンチマーク")
+    parser.add_argument('--points', type=int, default=100000, help="地点数")
+    parser.add_argument('--queries', type=int, default=2000, help="検索回数")
+    parser.add_argument('--radius', type=float, default=1000, help="半径検索の半径（m）")
+    parser.add_argument('--k', type=int, default=10, help="k近傍検索の件数")
+    args = parser.parse_args()
+
+    run_benchmark(args.points, args.queries, args.radius, args.k)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Reasoning Engine インベントリ ベンチマーク
+複数のプロジェクト・リージョンにエンジンを持つフェイククライアントに対して、1対象ずつの一覧取得・スレッドプールでの同時取得・
+インベントリキャッシュからの読み込みの時間を比較し、最初のページが届くまでの時間（ページ単位の逐次処理）も表示する
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cleanup_old_agents import cleanup_old_agents
+from engine_inventory import get_inventory, stream_inventory
+from fake_reasoning_engine_client import FakeReasoningEngineServiceClient
+
+
+def measure_scan(label: str, client, targets, workers: int, page_size: int) -> None:
+    start = time.perf_counter()
+    first_page = None
+    engines = 0
+    for page in stream_inventory(targets, client_factory=lambda _: client, workers=workers, page_size=page_size):
+        if page.engines and first_page is None:
+            first_page = time.perf_counter() - start
+        engines += len(page.engines)
+    seconds = time.perf_counter() - start
+    print(f"  {label:<28} {seconds * 1000:9.1f}ms {(first_page or 0) * 1000:12.1f}ms {engines:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reasoning Engineインベントリのベンチマーク（フェイククライアント、Vertex AI不要）")
+    parser.add_argument('--engines', type=int, default=1800, help="全対象のエンジン数")
+    parser.add_argument('--projects', type=int, default=3, help="プロジェクト数")
+    parser.add_argument('--regions', default='us-central1,asia-northeast1,europe-west4', help="リージョン（カンマ区切り）")
+    parser.add_argument('--page-size', type=int, default=100, help="1ページの件数")
+    parser.add_argument('--page-ms', type=float, default=300.0, help="模擬する1ページの取得時間（ミリ秒）")
+    parser.add_argument('--workers', type=int, default=8, help="同時に一覧取得する対象数")
+    args = parser.parse_args()
+
+    projects = [f"project-{i}" for i in range(args.projects)]
+    regions = [r.strip() for r in args.regions.split(',') if r.strip()]
+    targets = [(p, r) for p in projects for r in regions]
+    client = FakeReasoningEngineServiceClient(
+        engines=args.engines, projects=projects, locations=regions, page_seconds=args.page_ms / 1000
+    )
+    print(f"🚀 {len(targets)}対象（{args.projects}プロジェクト × {len(regions)}リージョン）/ エンジン {args.engines}個"
+          f" / 1ページ {args.page_size}件・{args.page_ms:.0f}ms")
+
+    print("\n📊 一覧取得")
+    print(f"  {'方式':<28} {'全体':>11} {'最初のページ':>14} {'エンジン':>8}")
+    measure_scan("1対象ずつ", client, targets, 1, args.page_size)
+    measure_scan(f"スレッドプール（{args.workers}）", client, targets, args.workers, args.page_size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'engine_inventory.json')
+        start = time.perf_counter()
+        get_inventory(targets, cache_path, client_factory=lambda _: client, workers=args.workers, page_size=args.page_size)
+        scan_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        inventory, cached = get_inventory(targets, cache_path, client_factory=lambda _: client)
+        cache_seconds = time.perf_counter() - start
+        print(f"  {'キャッシュから読み込み':<28} {cache_seconds * 1000:9.1f}ms {'-':>14} {len(inventory.engines):>8}"
+              f"（一覧取得+保存 {scan_seconds * 1000:.1f}ms）")
+
+        # cleanup_old_agents のドライランを2回（2回目はキャッシュから）
+        print("\n🧹 cleanup_old_agents ドライラン")
+        for label in ("1回目（一覧取得）", "2回目（キャッシュ）"):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                cleanup_old_agents(dry_run=True, targets=targets, client_factory=lambda _: client,
+                                   inventory_path=os.path.join(tmp, 'cleanup_inventory.json'))
+            print(f"  {label:<28} {(time.perf_counter() - start) * 1000:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
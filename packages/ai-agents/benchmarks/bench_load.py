@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+同時セッション数の負荷試験（容量曲線）
+観光スポット検索・分析の root_agent を1プロセス・1イベントループのADK Runner（InMemorySessionService）で実行し、
+模擬モデル（scripted_model）の遅延分布の下で負荷を段階的に上げて、段階ごとのスループット・レイテンシ分位・
+イベントループの遅れ・セッションあたりのRSS増加を計測する。
+
+- closed: N個の仮想ユーザーがそれぞれ「セッション作成 → --turns 回の対話」を繰り返す（N = --sessions の各値）
+- open: 到着率 λ件/秒のポアソン到着で新しいセッションを開始する（λ = --rates の各値）。
+  レイテンシは予定到着時刻から計測し（遅れた到着の待ち時間も含む）、同時処理中が --max-in-flight を超えた到着は取りこぼしとして数える
+
+環境変数（TOURISM_HTML_MODE など）はエージェント読み込み時に反映されるため、実行前に設定する
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents import BaseAgent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+# bench_agent_pipeline の import 時に結果キャッシュが無効化される（--with-cache で有効）
+from bench_agent_pipeline import ANALYSIS_MESSAGES, RESULTS_DIR, TOURISM_MESSAGES, summarize
+from scripted_model import install_scripted_models
+from tourism_spots_agent.latency_metrics import percentile
+
+
+def rss_bytes() -> int:
+    """現在の常駐メモリ（Linux以外は最大常駐メモリで代用）"""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOSはバイト、Linuxはキロバイト
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class LoopLagMonitor:
+    """interval ごとに sleep し、予定より遅れて再開した時間をイベントループの遅れとして記録"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        samples = self.samples or [0.0]
+        return {
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+            'max_ms': round(max(samples) * 1000, 2),
+        }
+
+
+class LoadStep:
+    """1段階分の計測値"""
+
+    def __init__(self, runner: InMemoryRunner, messages: Tuple[str, ...], turns: int):
+        self.runner = runner
+        self.messages = messages
+        self.turns = max(1, turns)
+        self.latencies: List[float] = []
+        self.sessions = 0
+        self.errors = 0
+        self.dropped = 0
+        self._next_message = 0
+
+    def _message(self) -> types.Content:
+        text = self.messages[self._next_message % len(self.messages)]
+        self._next_message += 1
+        return types.Content(role='user', parts=[types.Part(text=text)])
+
+    async def new_session(self, user_id: str) -> str:
+        session = await self.runner.session_service.create_session(app_name='load', user_id=user_id)
+        self.sessions += 1
+        return session.id
+
+    async def turn(self, user_id: str, session_id: str, started: Optional[float] = None) -> None:
+        """1回の対話（started を指定した場合はその時刻からのレイテンシ）"""
+        started = time.perf_counter() if started is None else started
+        try:
+            async for _ in self.runner.run_async(user_id=user_id, session_id=session_id, new_message=self._message()):
+                pass
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ {user_id}: {e}", file=sys.stderr)
+            return
+        self.latencies.append(time.perf_counter() - started)
+
+    async def closed_loop(self, users: int, duration: float) -> None:
+        """users個の仮想ユーザーが duration 秒間、セッション作成と対話を繰り返す（開始済みの対話は最後まで待つ）"""
+        deadline = time.perf_counter() + duration
+
+        async def user(index: int) -> None:
+            while time.perf_counter() < deadline:
+                user_id = f'closed{users}_{index}_{self.sessions}'
+                session_id = await self.new_session(user_id)
+                for _ in range(self.turns):
+                    await self.turn(user_id, session_id)
+
+        await asyncio.gather(*(user(i) for i in range(users)))
+
+    async def open_loop(self, rate: float, duration: float, max_in_flight: int, rng: random.Random) -> None:
+        """到着率 rate件/秒のポアソン到着で duration 秒間セッションを開始する"""
+        tasks = set()
+        started = time.perf_counter()
+        arrival = started
+
+        async def arrive(index: int, scheduled: float) -> None:
+            user_id = f'open{rate:g}_{index}'
+            session_id = await self.new_session(user_id)
+            await self.turn(user_id, session_id, started=scheduled)
+            for _ in range(self.turns - 1):
+                await self.turn(user_id, session_id)
+
+        index = 0
+        while True:
+            arrival += rng.expovariate(rate)
+            if arrival - started >= duration:
+                break
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            if len(tasks) >= max_in_flight:
+                self.dropped += 1
+                continue
+            task = asyncio.ensure_future(arrive(index, arrival))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            index += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+async def run_step(
+    step: LoadStep, mode: str, level: float, args: argparse.Namespace, rng: random.Random
+) -> Dict[str, Any]:
+    gc.collect()
+    rss_before = rss_bytes()
+    monitor = LoopLagMonitor(args.lag_interval_ms / 1000)
+    monitor.start()
+    started = time.perf_counter()
+    if mode == 'closed':
+        await step.closed_loop(int(level), args.duration)
+    else:
+        await step.open_loop(level, args.duration, args.max_in_flight, rng)
+    elapsed = time.perf_counter() - started
+    lag = await monitor.stop()
+    gc.collect()
+    rss_after = rss_bytes()
+
+    return {
+        'level': level,
+        'sessions': step.sessions,
+        'completed': len(step.latencies),
+        'errors': step.errors,
+        'dropped': step.dropped,
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(step.latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency': summarize(step.latencies),
+        'loop_lag': lag,
+        'rss_mb': round(rss_after / 2**20, 1),
+        'rss_growth_kb_per_session': round((rss_after - rss_before) / 1024 / max(step.sessions, 1), 1),
+    }
+
+
+def capacity(steps: List[Dict[str, Any]], slo_ms: Optional[float]) -> Tuple[Optional[float], float]:
+    """(p99がSLO内に収まり、エラー・取りこぼしのない最大の負荷, 使ったSLO)。SLO未指定なら最小負荷のp99の2倍をレイテンシ崩壊の目安にする"""
+    measured = [step for step in steps if step['completed']]
+    if not measured:
+        return None, slo_ms or 0.0
+    limit = slo_ms if slo_ms else measured[0]['latency']['p99_ms'] * 2
+    within = [
+        step['level'] for step in measured
+        if step['latency']['p99_ms'] <= limit and not step['errors'] and not step['dropped']
+    ]
+    return (max(within) if within else None), limit
+
+
+def print_curve(name: str, mode: str, steps: List[Dict[str, Any]], slo_ms: Optional[float]) -> None:
+    unit = '同時セッション' if mode == 'closed' else '到着率(件/秒)'
+    print(f"\n📈 {name}（{'closed-loop' if mode == 'closed' else 'open-loop'}）")
+    print(f"  {unit:>12} {'完了':>6} {'件/秒':>8} {'p50':>9} {'p95':>9} {'p99':>9}"
+          f" {'ループ遅れp99':>12} {'最大':>8} {'RSS':>8} {'KB/セッション':>12} {'取りこぼし':>8} {'エラー':>6}")
+    for step in steps:
+        latency, lag = step['latency'], step['loop_lag']
+        print(f"  {step['level']:>12g} {step['completed']:>6} {step['throughput_rps']:>8.2f}"
+              f" {latency['p50_ms']:>7.0f}ms {latency['p95_ms']:>7.0f}ms {latency['p99_ms']:>7.0f}ms"
+              f" {lag['p99_ms']:>10.1f}ms {lag['max_ms']:>6.1f}ms {step['rss_mb']:>6.0f}MB"
+              f" {step['rss_growth_kb_per_session']:>12.1f} {step['dropped']:>8} {step['errors']:>6}")
+    level, limit = capacity(steps, slo_ms)
+    if level is None:
+        print(f"  ⚠️ p99 {limit:.0f}ms 以内に収まる段階がありません")
+    else:
+        print(f"  ✅ p99 {limit:.0f}ms 以内の最大負荷: {unit} {level:g}")
+
+
+async def benchmark_agent(
+    root: BaseAgent, messages: Tuple[str, ...], args: argparse.Namespace
+) -> List[Dict[str, Any]]:
+    install_scripted_models(
+        root,
+        seed=args.seed,
+        first_token_seconds=args.first_token_ms / 1000,
+        seconds_per_input_token=args.ms_per_input_token / 1000,
+        seconds_per_output_token=args.ms_per_token / 1000,
+        jitter=args.jitter,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor
+    )
+    # 段階をまたいでセッションを保持し続ける（セッションの蓄積によるメモリ増加も計測対象）
+    runner = InMemoryRunner(agent=root, app_name='load')
+    rng = random.Random(args.seed)
+    levels = args.sessions if args.mode == 'closed' else args.rates
+
+    # ウォームアップ（モジュールの遅延初期化・インデックス構築を計測から除外）
+    warmup = LoadStep(runner, messages, 1)
+    for i in range(args.warmup):
+        await warmup.turn(f'warmup{i}', await warmup.new_session(f'warmup{i}'))
+
+    steps = []
+    for level in levels:
+        steps.append(await run_step(LoadStep(runner, messages, args.turns), args.mode, level, args, rng))
+    return steps
+
+
+def parse_levels(text: str) -> List[float]:
+    return [float(v) for v in text.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同時セッション数の負荷試験（模擬モデル、Vertex AI不要）")
+    parser.add_argument('--agents', default='tourism,analysis', help="計測対象（tourism, analysis をカンマ区切り）")
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed', help="closed: 同時セッション数を固定 / open: 到着率を固定")
+    parser.add_argument('--sessions', type=parse_levels, default=parse_levels('1,4,16,64,128'), help="closed-loopの同時セッション数（カンマ区切り）")
+    parser.add_argument('--rates', type=parse_levels, default=parse_levels('1,5,10,20,40'), help="open-loopの到着率（件/秒、カンマ区切り）")
+    parser.add_argument('--duration', type=float, default=10.0, help="1段階の計測時間（秒）")
+    parser.add_argument('--turns', type=int, default=1, help="1セッションあたりの対話回数")
+    parser.add_argument('--max-in-flight', type=int, default=1000, help="open-loopで同時に処理する要求数の上限（超えた到着は取りこぼし）")
+    parser.add_argument('--warmup', type=int, default=3, help="計測前のウォームアップ要求数")
+    parser.add_argument('--first-token-ms', type=float, default=300.0, help="模擬モデルの最初のトークンまでの時間（ミリ秒）")
+    parser.add_argument('--ms-per-input-token', type=float, default=0.05, help="模擬モデルの入力1トークンあたりの時間（ミリ秒）")
+    parser.add_argument('--ms-per-token', type=float, default=5.0, help="模擬モデルの出力1トークンあたりの時間（ミリ秒）")
+    parser.add_argument('--jitter', type=float, default=0.25, help="遅延のゆらぎ（対数正規分布のσ、0で固定）")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="遅い応答の割合（0〜1）")
+    parser.add_argument('--slow-factor', type=float, default=5.0, help="遅い応答の遅延の倍率")
+    parser.add_argument('--lag-interval-ms', type=float, default=10.0, help="イベントループの遅れの計測間隔（ミリ秒）")
+    parser.add_argument('--slo-ms', type=float, help="容量の判定に使うp99（省略時は最小負荷のp99の2倍）")
+    parser.add_argument('--seed', type=int, default=0, help="乱数シード")
+    parser.add_argument('--with-cache', action='store_true', help="観光スポット検索の結果キャッシュを有効にする")
+    parser.add_argument('--output', help="結果JSONの保存先（省略時は benchmarks/results/load_<日時>.json）")
+    parser.add_argument('--verbose', action='store_true', help="エージェントのログを表示")
+    args = parser.parse_args()
+
+    targets = {}
+    for name in (a.strip() for a in args.agents.split(',') if a.strip()):
+        if name == 'tourism':
+            from tourism_spots_agent.agent import root_agent as tourism_root
+            targets[name] = (tourism_root, TOURISM_MESSAGES)
+        elif name == 'analysis':
+            from analysis_agent.agent import root_agent as analysis_root
+            targets[name] = (analysis_root, ANALYSIS_MESSAGES)
+        else:
+            parser.error(f"未知のエージェント: {name}")
+
+    print(
+        f"🚀 模擬モデル: 最初のトークン {args.first_token_ms:.0f}ms + 入力 {args.ms_per_input_token:.2f}ms/トークン"
+        f" + 出力 {args.ms_per_token:.1f}ms/トークン（ゆらぎσ={args.jitter}、遅い応答 {args.slow_rate:.0%} × {args.slow_factor:g}）"
+    )
+    print(f"  1段階 {args.duration:g}秒 / 1セッション {args.turns}回の対話")
+
+    results = {}
+    for name, (root, messages) in targets.items():
+        # エージェントのprintログは捨てる（StringIOに溜めるとRSSの計測に混ざるため /dev/null に出す）
+        with open(os.devnull, 'w') as devnull:
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+            with output:
+                steps = asyncio.run(benchmark_agent(root, messages, args))
+        results[name] = steps
+        print_curve(name, args.mode, steps, args.slo_ms)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            key: getattr(args, key)
+            for key in (
+                'mode', 'sessions', 'rates', 'duration', 'turns', 'max_in_flight', 'first_token_ms',
+                'ms_per_input_token', 'ms_per_token', 'jitter', 'slow_rate', 'slow_factor', 'slo_ms', 'seed', 'with_cache'
+            )
+        },
+        'env': {key: value for key, value in os.environ.items() if key.startswith(('TOURISM_', 'ANALYSIS_'))},
+        'agents': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果を保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
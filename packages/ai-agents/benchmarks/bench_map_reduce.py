@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+分析エージェント map-reduce ベンチマーク
+合成の売上CSV（デフォルト20万行）を貼り付けた依頼を、1回の呼び出し（single）と
+map-reduce（同時実行数ごと）で実行し、レイテンシと行・入力トークンのスループットを比較する。
+モデル呼び出しはスクリプト化されたローカルモデルで、入力・出力トークン数に比例した遅延を模擬する
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from analysis_agent.agent import MAP_REDUCE_THRESHOLD_CHARS, root_agent
+from analysis_agent.dataset_cache import dataset_cache
+from analysis_agent.map_reduce import MapReduceAnalysisAgent
+from scripted_model import install_scripted_models
+
+CATEGORIES = ('食品', '衣料', '家電', '雑貨')
+
+
+def generate_message(rows: int) -> str:
+    """依頼文 + 合成の売上CSV（date, store, category, sales, visitors）"""
+    rng = np.random.default_rng(0)
+    dates = np.datetime64('2024-01-01') + rng.integers(0, 365, rows).astype('timedelta64[D]')
+    stores = rng.integers(0, 50, rows)
+    categories = np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), rows)]
+    visitors = rng.poisson(250, rows)
+    sales = np.round(800 + visitors * 0.5 + rng.normal(0, 150, rows), 1)
+    lines = [
+        f"{d},S{s:03d},{c},{v},{p}"
+        for d, s, c, v, p in zip(dates.astype(str), stores, categories, sales, visitors)
+    ]
+    return "以下の売上データを分析し、店舗・カテゴリ別の傾向と改善策をまとめてください。\n" \
+        "date,store,category,sales,visitors\n" + '\n'.join(lines)
+
+
+async def run_once(root: MapReduceAnalysisAgent, message: str) -> Dict[str, Any]:
+    runner = InMemoryRunner(agent=root, app_name='bench')
+    session = await runner.session_service.create_session(app_name='bench', user_id='bench')
+    content = types.Content(role='user', parts=[types.Part(text=message)])
+    start = time.perf_counter()
+    async for _ in runner.run_async(user_id='bench', session_id=session.id, new_message=content):
+        pass
+    elapsed = time.perf_counter() - start
+    session = await runner.session_service.get_session(app_name='bench', user_id='bench', session_id=session.id)
+    return {'seconds': elapsed, 'map_reduce': session.state.get('analysis_map_reduce')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析エージェントのmap-reduceベンチマーク")
+    parser.add_argument('--rows', type=int, default=200_000, help="合成CSVの行数")
+    parser.add_argument('--concurrency', default='1,4,8', help="map-reduceの同時実行数（カンマ区切り）")
+    parser.add_argument('--chunk-chars', type=int, default=None, help="1チャンクの最大文字数（省略時はエージェントの設定）")
+    parser.add_argument('--first-token-ms', type=float, default=300.0, help="模擬モデルの最初のトークンまでの時間（ミリ秒）")
+    parser.add_argument('--ms-per-input-token', type=float, default=0.05, help="模擬モデルの入力1トークンあたりの時間（ミリ秒）")
+    parser.add_argument('--ms-per-token', type=float, default=5.0, help="模擬モデルの出力1トークンあたりの時間（ミリ秒）")
+    parser.add_argument('--skip-single', action='store_true', help="1回の呼び出しでの計測を省略")
+    parser.add_argument('--skip-cached', action='store_true', help="同じデータでの再実行（キャッシュ利用）の計測を省略")
+    parser.add_argument('--verbose', action='store_true', help="エージェントのログを表示")
+    args = parser.parse_args()
+
+    if not isinstance(root_agent, MapReduceAnalysisAgent):
+        parser.error("ANALYSIS_MODE=single ではmap-reduceを計測できません")
+    install_scripted_models(
+        root_agent,
+        jitter=0.0,
+        first_token_seconds=args.first_token_ms / 1000,
+        seconds_per_input_token=args.ms_per_input_token / 1000,
+        seconds_per_output_token=args.ms_per_token / 1000
+    )
+    if args.chunk_chars:
+        root_agent.chunk_chars = args.chunk_chars
+
+    message = generate_message(args.rows)
+    print(f"🚀 入力: {args.rows:,}行 / {len(message):,}文字（チャンク {root_agent.chunk_chars:,}文字）")
+
+    configs = [] if args.skip_single else [('single', None)]
+    configs += [(f"map-reduce 同時{c}", int(c)) for c in args.concurrency.split(',') if c.strip()]
+    if not args.skip_cached and len(configs) > (0 if args.skip_single else 1):
+        # 直前の設定のまま同じデータで再実行（部分分析・データ概要をキャッシュから再利用）
+        configs.append(("  └ 同じデータで再実行", configs[-1][1]))
+    print("\n📊 結果")
+    print(f"  {'モード':<20} {'時間':>9} {'チャンク':>8} {'再利用':>6} {'行/秒':>12} {'入力トークン/秒':>16}")
+    for label, concurrency in configs:
+        if not label.startswith(' '):
+            # 設定ごとの比較のため、前の実行で作られたデータセットの成果物を捨てる
+            dataset_cache.clear()
+        if concurrency is None:
+            # 閾値を入力より大きくして analysis_specialist を1回だけ呼び出す
+            root_agent.threshold_chars = len(message) + 1
+        else:
+            root_agent.threshold_chars = MAP_REDUCE_THRESHOLD_CHARS
+            root_agent.max_concurrency = concurrency
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            result = asyncio.run(run_once(root_agent, message))
+        seconds = result['seconds']
+        stats = result['map_reduce'] or {}
+        tokens = stats.get('input_tokens') or len(message) / 2.0
+        print(
+            f"  {label:<20} {seconds:8.2f}秒 {stats.get('chunks', 1):>8} {stats.get('cached_partials', 0):>6} "
+            f"{args.rows / seconds:>12,.0f} {tokens / seconds:>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
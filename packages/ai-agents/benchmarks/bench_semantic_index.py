@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+意味検索インデックス ベンチマーク
+合成スポット（デフォルト10万件）で全件内積（厳密）とIVF + int8量子化（近似）の検索レイテンシ・recall@kを比較
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tourism_spots_agent.latency_metrics import percentile
+from tourism_spots_agent.semantic_index import BruteForceVectorIndex, HashingEmbedder, IVFVectorIndex
+
+WORDS = (
+    '庭園', '竹林', '鳥居', '夜景', '紅葉', '温泉', '美術館', '商店街', '写真映え', '体験工房', '静かな境内', '駅近',
+    '城下町', '渓谷', '滝', '展望台', '古民家', '茶屋', '市場', '食べ歩き', '寺院', '神社', '博物館', '公園',
+    '桜並木', '湖畔', '海岸', '灯台', '水族館', 'テーマパーク', '劇場', '花街', '酒蔵', '陶芸', '着物', '屋台',
+)
+MOODS = ('静か', '賑やか', '落ち着いた', '開放的', '荘厳', 'レトロ', '幻想的', '家族向け')
+
+
+def generate_texts(count: int):
+    rng = random.Random(0)
+    return [
+        f"スポット{i:06d} {rng.choice(WORDS)}と{rng.choice(WORDS)}が楽しめる{rng.choice(MOODS)}な場所 "
+        f"{' '.join(rng.sample(WORDS, 3))}"
+        for i in range(count)
+    ]
+
+
+def generate_queries(count: int):
+    rng = random.Random(1)
+    return [f"{rng.choice(MOODS)}で{rng.choice(WORDS)}や{rng.choice(WORDS)}を楽しみたい" for _ in range(count)]
+
+
+def measure(label: str, fn, queries) -> None:
+    for query in queries[:20]:
+        fn(query)
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append(time.perf_counter() - start)
+    print(
+        f"  {label}: p50 {percentile(samples, 0.50) * 1e3:.3f}ms / "
+        f"p99 {percentile(samples, 0.99) * 1e3:.3f}ms / "
+        f"{len(samples) / sum(samples):,.0f} 回/秒"
+    )
+
+
+def run_benchmark(spot_count: int, query_count: int, k: int, n_lists: Optional[int], n_probe: Optional[int]) -> None:
+    texts = generate_texts(spot_count)
+    embedder = HashingEmbedder()
+
+    print(f"📦 埋め込み計算中: {spot_count:,}件（{embedder.dimension}次元）")
+    start = time.perf_counter()
+    vectors = embedder.fit_transform(texts)
+    print(f"  埋め込み: {time.perf_counter() - start:.2f}秒")
+
+    ids = list(range(spot_count))
+    brute = BruteForceVectorIndex(vectors, ids)
+    start = time.perf_counter()
+    ivf = IVFVectorIndex(vectors, ids, n_lists=n_lists, n_probe=n_probe)
+    print(f"  IVF構築: {time.perf_counter() - start:.2f}秒（{ivf.n_lists}リスト / n_probe={ivf.n_probe}）")
+    print(f"  メモリ: 全件 {vectors.nbytes / 1e6:.0f}MB / IVF(int8) {ivf._codes.nbytes / 1e6:.0f}MB")
+
+    queries = generate_queries(query_count)
+    query_vectors = embedder(queries)
+
+    # recall@k: 近似検索のk件のうち厳密検索の上位k件に入るものの割合
+    # （合成データは同点が多いため、厳密なk位のスコア以上なら正解とみなす）
+    recalls = []
+    for vector in query_vectors:
+        expected = brute.search(vector, k)
+        threshold = expected[-1][0] - 1e-6 if expected else 0.0
+        actual = [item for _, item in ivf.search(vector, k)]
+        exact_scores = vectors[actual] @ vector if actual else np.zeros(0)
+        recalls.append(float((exact_scores >= threshold).sum()) / max(len(expected), 1))
+
+    vectors_by_query = list(query_vectors)
+    print(f"\n📊 結果（{query_count:,}クエリ / top-{k}）")
+    measure("全件内積（厳密）", lambda vector: brute.search(vector, k), vectors_by_query)
+    measure("IVF + int8（近似）", lambda vector: ivf.search(vector, k), vectors_by_query)
+    measure("クエリ埋め込み", lambda text: embedder([text]), queries)
+    print(f"  recall@{k}: 平均 {np.mean(recalls):.3f} / 最小 {np.min(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="意味検索インデックス ベンチマーク")
+    parser.add_argument('--spots', type=int, default=100000, help="スポット件数")
+    parser.add_argument('--queries', type=int, default=500, help="クエリ数")
+    parser.add_argument('--k', type=int, default=10, help="取得件数")
+    parser.add_argument('--n-lists', type=int, default=None, help="IVFのリスト数（省略時は件数から自動決定）")
+    parser.add_argument('--n-probe', type=int, default=None, help="IVFで走査するリスト数（省略時はリスト数の約1割）")
+    args = parser.parse_args()
+
+    run_benchmark(args.spots, args.queries, args.k, args.n_lists, args.n_probe)
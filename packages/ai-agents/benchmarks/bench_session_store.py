@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+SQLiteセッションサービス ベンチマーク
+session_store.SQLiteSessionService に大量のイベント（デフォルト100万件）を追記し、追記と読み込みのスループットを測る。
+比較として、同じサービスで1イベントごとにコミットする設定と、ADK標準の SqliteSessionService（aiosqlite）を
+少ないイベント数で測る。複数プロセス（gunicornのワーカー相当）から同じDBファイルに同時に書く場合も測る
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from google.adk.events.event import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from bench_agent_pipeline import RESULTS_DIR, summarize
+from session_store import SQLiteSessionService
+
+APP_NAME = 'bench'
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 別プロセスで追記して（flushもcloseも呼ばずに）普通に終了する。残ったかは親プロセスで開き直して確かめる
+RESTART_WRITER = '''
+import asyncio, sys
+from google.adk.events.event import Event, EventActions
+from session_store import SQLiteSessionService
+
+async def main():
+    service = SQLiteSessionService(sys.argv[1], flush_interval_ms=60_000)
+    session = await service.create_session(app_name='bench', user_id='restart', session_id='restart')
+    for i in range(int(sys.argv[2])):
+        await service.append_event(session, Event(
+            author='BenchAgent', invocation_id=f'e-{i}', actions=EventActions(state_delta={'turn': i})))
+
+asyncio.run(main())
+'''
+
+
+def make_event(index: int, payload_bytes: int, state_every: int) -> Event:
+    """エージェントの応答に近いイベント（state_every件ごとにstate_deltaを持つ）"""
+    text = (f"応答{index} " + 'あ' * payload_bytes)[:max(1, payload_bytes // 3)]
+    actions = EventActions(state_delta={'turn': index, 'last_text': text[:40]}) if index % state_every == 0 else EventActions()
+    return Event(
+        author='BenchAgent', invocation_id=f'e-{index // 8}',
+        content=types.Content(role='model', parts=[types.Part(text=text)]), actions=actions,
+    )
+
+
+async def create_sessions(service, count: int, prefix: str = 'user'):
+    return await asyncio.gather(*[
+        service.create_session(app_name=APP_NAME, user_id=f'{prefix}{i % 100}', session_id=f'{prefix}-session-{i}')
+        for i in range(count)
+    ])
+
+
+async def append_events(service, sessions, total: int, concurrency: int, payload_bytes: int, state_every: int):
+    """total件のイベントをconcurrency並列で追記し、(経過秒, append_eventの呼び出し時間のサンプル) を返す"""
+    per_worker = total // concurrency
+    samples = []
+
+    async def worker(worker_index: int) -> None:
+        rng = random.Random(worker_index)
+        # 並列の各ワーカーは別々のセッションに書く（実サーバーでも1セッションへの要求は同時に1件）
+        own = sessions[worker_index::concurrency]
+        for i in range(per_worker):
+            session = own[rng.randrange(len(own))]
+            event = make_event(i, payload_bytes, state_every)
+            start = time.perf_counter()
+            await service.append_event(session, event)
+            if i % 100 == 0:
+                samples.append(time.perf_counter() - start)
+            # 100万件をメモリに載せないよう、メモリ上のセッションのイベントは捨てる（DBには残る）
+            if len(session.events) > 64:
+                session.events.clear()
+            if i % 64 == 0:
+                await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(w) for w in range(concurrency)])
+    await service.flush()
+    return time.perf_counter() - start, samples, per_worker * concurrency
+
+
+async def read_sessions(service, sessions, reads: int, concurrency: int, config=None, paged: bool = False):
+    """ランダムなセッションをreads回読み、(経過秒, 読んだイベント数, 1回ごとの時間) を返す"""
+    rng = random.Random(0)
+    targets = [sessions[rng.randrange(len(sessions))] for _ in range(reads)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, event_counts = [], []
+
+    async def read_one(session) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            if paged:
+                count = 0
+                async for _ in service.iter_events(app_name=APP_NAME, user_id=session.user_id, session_id=session.id):
+                    count += 1
+            else:
+                loaded = await service.get_session(
+                    app_name=APP_NAME, user_id=session.user_id, session_id=session.id, config=config
+                )
+                count = len(loaded.events)
+            latencies.append(time.perf_counter() - start)
+            event_counts.append(count)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[read_one(session) for session in targets])
+    return time.perf_counter() - start, sum(event_counts), latencies
+
+
+async def run_store(service, args, events: int, sessions_count: int, reads: int):
+    sessions = await create_sessions(service, max(sessions_count, args.concurrency))
+    elapsed, samples, written = await append_events(
+        service, sessions, events, args.concurrency, args.payload_bytes, args.state_every
+    )
+    result = {
+        'events': written,
+        'append': {'seconds': round(elapsed, 2), 'events_per_s': round(written / elapsed), 'call': summarize(samples)},
+    }
+    read_modes = {
+        'full': {},
+        'recent_20': {'config': GetSessionConfig(num_recent_events=20)},
+    }
+    if hasattr(service, 'iter_events'):
+        read_modes['paged'] = {'paged': True}
+    for label, options in read_modes.items():
+        elapsed, total_events, latencies = await read_sessions(service, sessions, reads, args.concurrency, **options)
+        result[f'read_{label}'] = {
+            'sessions_per_s': round(reads / elapsed, 1), 'events_per_s': round(total_events / elapsed),
+            'latency': summarize(latencies),
+        }
+    if hasattr(service, 'stats'):
+        result['writer'] = service.stats()
+    if hasattr(service, 'aclose'):
+        await service.aclose()
+    return result
+
+
+def check_restart(path: str, events: int = 5) -> dict:
+    """追記したプロセスが終了した後に開き直して、イベントとstateが全て残っているかを確かめる"""
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([os.path.dirname(BENCH_DIR), os.environ.get('PYTHONPATH', '')])}
+    subprocess.run([sys.executable, '-c', RESTART_WRITER, path, str(events)], check=True, env=env)
+
+    async def reopen():
+        service = SQLiteSessionService(path)
+        try:
+            return await service.get_session(app_name=APP_NAME, user_id='restart', session_id='restart')
+        finally:
+            await service.aclose()
+
+    session = asyncio.run(reopen())
+    restored = len(session.events) if session else 0
+    state = dict(session.state) if session else {}
+    return {'appended': events, 'restored': restored, 'state': state,
+            'ok': restored == events and state == {'turn': events - 1}}
+
+
+def db_bytes(path: str) -> int:
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def _process_worker(path: str, worker_index: int, events: int, args_dict, result_queue) -> None:
+    """別プロセスのワーカー: 自分のセッションを作り、同じDBファイルに追記する"""
+    args = argparse.Namespace(**args_dict)
+
+    async def run():
+        service = SQLiteSessionService(path)
+        sessions = await create_sessions(service, max(1, args.sessions // args.workers), prefix=f'w{worker_index}-')
+        _, _, written = await append_events(
+            service, sessions, events, args.concurrency, args.payload_bytes, args.state_every
+        )
+        # multiprocessing の子プロセスは atexit を呼ばずに終わるので、ここで閉じる
+        await service.aclose()
+        return written
+
+    result_queue.put(asyncio.run(run()))
+
+
+def run_processes(path: str, workers: int, events: int, args) -> dict:
+    """workers個のプロセスから同じDBに合計events件を同時に追記する"""
+    result_queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_process_worker, args=(path, w, events // workers, vars(args), result_queue))
+        for w in range(workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    written = sum(result_queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    return {'workers': workers, 'events': written, 'seconds': round(elapsed, 2), 'events_per_s': round(written / elapsed)}
+
+
+def print_store(label: str, result: dict) -> None:
+    append = result['append']
+    line = (f"  {label:<28} 追記 {append['events_per_s']:>8,}件/秒（append_event p50 {append['call']['p50_ms']:.3f}ms"
+            f" p99 {append['call']['p99_ms']:.3f}ms）")
+    print(line)
+    for key, name in (('read_full', '全件'), ('read_recent_20', '直近20件'), ('read_paged', 'ページ読み')):
+        if key in result:
+            read = result[key]
+            print(f"  {'':<28} 読込({name}) {read['sessions_per_s']:>8,.1f}セッション/秒"
+                  f" {read['events_per_s']:>10,}件/秒 p99 {read['latency']['p99_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLiteセッションサービスの追記・読み込みスループットのベンチマーク")
+    parser.add_argument('--events', type=int, default=1_000_000, help="追記するイベント数")
+    parser.add_argument('--sessions', type=int, default=1000, help="セッション数（イベントはランダムに振り分ける）")
+    parser.add_argument('--concurrency', type=int, default=16, help="同時に追記・読み込みするコルーチン数")
+    parser.add_argument('--payload-bytes', type=int, default=600, help="1イベントのテキストのおおよそのバイト数")
+    parser.add_argument('--state-every', type=int, default=4, help="state_deltaを持つイベントの間隔")
+    parser.add_argument('--reads', type=int, default=200, help="読み込みの回数")
+    parser.add_argument('--compare-events', type=int, default=20_000,
+                        help="比較対象（1イベント1コミット・ADK標準）に追記するイベント数（0で比較しない）")
+    parser.add_argument('--workers', default='1,4', help="同じDBに同時に書くプロセス数（カンマ区切り、空で測らない）")
+    parser.add_argument('--db-dir', default=None, help="DBファイルを置くディレクトリ（デフォルトは一時ディレクトリ）")
+    parser.add_argument('--output', default=None, help="結果JSONの出力先")
+    args = parser.parse_args()
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix='bench_session_store_')
+    os.makedirs(db_dir, exist_ok=True)
+    report = {'args': vars(args), 'stores': {}, 'workers': []}
+    compare_sessions = max(1, args.sessions * args.compare_events // max(1, args.events))
+    stores = [('SQLiteSessionService（バッチ）', 'batched', lambda path: SQLiteSessionService(path), args.events,
+               args.sessions)]
+    if args.compare_events:
+        # 比較は同じイベント数・セッション数でそろえる
+        stores.append(('SQLiteSessionService（バッチ）', 'batched_compare', lambda path: SQLiteSessionService(path),
+                       args.compare_events, compare_sessions))
+        stores.append(('1イベント1コミット', 'per_event_commit',
+                       lambda path: SQLiteSessionService(path, batch_size=1, flush_interval_ms=0),
+                       args.compare_events, compare_sessions))
+        try:
+            from google.adk.sessions.sqlite_session_service import SqliteSessionService
+            stores.append(('ADK標準 SqliteSessionService', 'adk_sqlite', SqliteSessionService, args.compare_events,
+                           compare_sessions))
+        except ImportError as e:
+            print(f"⚠️ ADK標準の SqliteSessionService を使えないため比較しません: {e}")
+
+    try:
+        restart = report['restart'] = check_restart(os.path.join(db_dir, 'restart.db'))
+        mark = '✅' if restart['ok'] else '❌'
+        print(f"\n{mark} 終了後に開き直したセッション: イベント {restart['restored']}/{restart['appended']}件、"
+              f"state {restart['state']}")
+
+        print(f"\n📊 追記と読み込み（{args.concurrency}並列、DB: {db_dir}）")
+        for label, key, factory, events, sessions_count in stores:
+            path = os.path.join(db_dir, f'{key}.db')
+            print(f"  ... {label}: {events:,}件を{sessions_count:,}セッションに追記中")
+            result = asyncio.run(run_store(factory(path), args, events, sessions_count, args.reads))
+            result['db_bytes'] = db_bytes(path)
+            report['stores'][key] = result
+            print_store(f"{label}（{result['events']:,}件）", result)
+            print(f"  {'':<28} DB {result['db_bytes'] / 1e6:,.1f}MB"
+                  f"（1件あたり {result['db_bytes'] // max(1, result['events']):,}B）")
+
+        worker_counts = [int(v) for v in args.workers.split(',') if v.strip()]
+        if worker_counts:
+            events = args.compare_events or args.events
+            print(f"\n📊 複数プロセスから同じDBに同時に追記（合計{events:,}件）")
+            for workers in worker_counts:
+                path = os.path.join(db_dir, f'workers_{workers}.db')
+                result = run_processes(path, workers, events, argparse.Namespace(**{**vars(args), 'workers': workers}))
+                report['workers'].append(result)
+                print(f"  {workers}プロセス: {result['events_per_s']:>8,}件/秒（{result['seconds']}秒）")
+    finally:
+        if not args.db_dir:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"session_store_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果を保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
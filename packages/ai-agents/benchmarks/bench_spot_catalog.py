@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+観光スポットカタログ マイクロベンチマーク
+合成データ（デフォルト1万件以上）で SpotCatalog.lookup の毎秒検索数を計測
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tourism_spots_agent.spot_catalog import SEASONS, SpotCatalog
+
+CATEGORIES = ('歴史', '自然', '現代', '文化')
+
+
+def generate_records(spot_count: int, area_count: int):
+    """合成スポットレコードを生成"""
+    rng = random.Random(0)
+    areas = [f'エリア{i:03d}' for i in range(area_count)]
+    for i in range(spot_count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        record = {
+            'name': f'スポット{i:06d}',
+            'area': areas[rng.randrange(area_count)],
+            'category': category,
+            'description': f'{category}スポット{i}の説明'
+        }
+        if rng.random() < 0.3:
+            record['best_season'] = rng.choice(SEASONS)
+        yield record
+
+
+def run_benchmark(spot_count: int, area_count: int, lookups: int) -> None:
+    print(f"📦 カタログ構築中: {spot_count:,}件 / {area_count}エリア")
+    build_start = time.perf_counter()
+    catalog = SpotCatalog.from_records(generate_records(spot_count, area_count))
+    build_seconds = time.perf_counter() - build_start
+    print(f"  構築時間: {build_seconds * 1000:.1f}ms（import時に1度のみ）")
+
+    rng = random.Random(1)
+    queries = [
+        (rng.choice(catalog.areas), rng.choice(CATEGORIES), rng.choice(SEASONS + (None,)))
+        for _ in range(lookups)
+    ]
+
+    # ウォームアップ
+    for area, category, season in queries[:1000]:
+        catalog.lookup(area, category, season)
+
+    start = time.perf_counter()
+    for area, category, season in queries:
+        catalog.lookup(area, category, season)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for area, category, season in queries:
+        [spot.to_dict() for spot in catalog.lookup(area, category, season)]
+    elapsed_with_dict = time.perf_counter() - start
+
+    print(f"\n📊 結果（{lookups:,}回検索）")
+    print(f"  lookup:           {lookups / elapsed:,.0f} 回/秒 ({elapsed / lookups * 1e6:.2f}µs/回)")
+    print(f"  lookup + to_dict: {lookups / elapsed_with_dict:,.0f} 回/秒 ({elapsed_with_dict / lookups * 1e6:.2f}µs/回)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SpotCatalog マイクロベンチマーク")
+    parser.add_argument('--spots', type=int, default=10000, help="スポット件数")
+    parser.add_argument('--areas', type=int, default=50, help="エリア数")
+    parser.add_argument('--lookups', type=int, default=100000, help="検索回数")
+    args = parser.parse_args()
+
+    run_benchmark(args.spots, args.areas, args.lookups)
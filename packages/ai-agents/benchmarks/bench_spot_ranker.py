@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+スコアリングエンジン ベンチマーク
+合成候補（デフォルト5,000件）に対する特徴量化・採点・MMR選定の1リクエストあたりの時間を計測
+全体の時間は、候補を初めて符号化する場合と符号化済みの特徴を再利用する場合を分けて計測する
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tourism_spots_agent.latency_metrics import percentile
+from tourism_spots_agent.spot_catalog import SEASONS
+from tourism_spots_agent.spot_ranker import CandidateMatrix, SpotRanker
+
+CATEGORIES = ('歴史', '自然', '現代', '文化')
+REQUESTS = ('写真撮影', '体験', '静か', 'アクセス')
+WORDS = ('庭園', '竹林', '鳥居', '夜景', '紅葉', '写真映え', '体験工房', '静かな境内', '駅近')
+
+
+def generate_candidates(count: int, area_count: int):
+    """合成候補スポット（検索結果のtourism_spotsと同じ形式）"""
+    rng = random.Random(0)
+    return [
+        {
+            'name': f'スポット{i:05d}',
+            'area': f'エリア{rng.randrange(area_count):02d}',
+            'category': rng.choice(CATEGORIES),
+            'description': f"{rng.choice(WORDS)}と{rng.choice(WORDS)}が楽しめる",
+            'features': ['写真撮影可', rng.choice(WORDS)],
+            'best_season': rng.choice(SEASONS + ('通年', '春・秋')),
+            'atmosphere': '落ち着いた',
+            'distance_m': rng.uniform(0, 5000) if rng.random() < 0.5 else None
+        }
+        for i in range(count)
+    ]
+
+
+def measure(label: str, fn, repeat: int) -> None:
+    for _ in range(min(repeat, 20)):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    print(f"  {label}: p50 {percentile(samples, 0.50) * 1e6:,.1f}µs / p99 {percentile(samples, 0.99) * 1e6:,.1f}µs")
+
+
+def run_benchmark(candidate_count: int, area_count: int, top_k: int, repeat: int) -> None:
+    spots = generate_candidates(candidate_count, area_count)
+    search_params = {'area': 'エリア00', 'category': '歴史', 'season': '春', 'requests': list(REQUESTS[:2])}
+    ranker = SpotRanker()
+    candidates = CandidateMatrix(spots)
+    matrix, _ = candidates.features(search_params)
+    relevance = ranker.relevance(matrix)
+
+    print(f"📊 結果（候補{candidate_count:,}件 / 上位{top_k}件選定）")
+    measure("採点（行列ベクトル積）", lambda: ranker.relevance(matrix), repeat)
+    measure("MMR選定", lambda: ranker.select(candidates, relevance, top_k), repeat)
+    measure("特徴量化（要望照合を含む）", lambda: candidates.features(search_params), repeat)
+    measure("全体（初回: 候補の符号化〜理由生成）", lambda: SpotRanker().rank(spots, search_params, top_k), repeat)
+    measure("全体（符号化済み: 行の取り出し〜理由生成）", lambda: ranker.rank(spots, search_params, top_k), repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SpotRanker ベンチマーク")
+    parser.add_argument('--candidates', type=int, default=5000, help="候補スポット数")
+    parser.add_argument('--areas', type=int, default=20, help="エリア数")
+    parser.add_argument('--top-k', type=int, default=5, help="選定件数")
+    parser.add_argument('--repeat', type=int, default=200, help="計測回数")
+    args = parser.parse_args()
+
+    run_benchmark(args.candidates, args.areas, args.top_k, args.repeat)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+SQLite観光スポットストア ベンチマーク
+合成データ（デフォルト10万件）を取り込み、lookup / 全文検索のレイテンシを計測
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tourism_spots_agent.latency_metrics import percentile
+from tourism_spots_agent.spot_catalog import SEASONS
+from tourism_spots_agent.spot_store import SQLiteSpotStore, ingest_records
+
+CATEGORIES = ('歴史', '自然', '現代', '文化')
+REQUESTS = ('写真撮影', '体験', '静か', 'アクセス')
+WORDS = ('庭園', '竹林', '鳥居', '夜景', '紅葉', '温泉', '美術館', '商店街', '写真映え', '体験工房')
+
+
+def generate_records(spot_count: int, area_count: int):
+    """合成スポットレコードを生成"""
+    rng = random.Random(0)
+    for i in range(spot_count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        record = {
+            'name': f'スポット{i:06d}',
+            'area': f'エリア{rng.randrange(area_count):03d}',
+            'category': category,
+            'description': f"{rng.choice(WORDS)}と{rng.choice(WORDS)}が楽しめる{category}スポット"
+        }
+        if rng.random() < 0.3:
+            record['best_season'] = rng.choice(SEASONS)
+        yield record
+
+
+def measure(label: str, fn, queries) -> None:
+    for query in queries[:200]:
+        fn(*query)
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(*query)
+        samples.append(time.perf_counter() - start)
+    print(
+        f"  {label}: p50 {percentile(samples, 0.50) * 1e3:.3f}ms / "
+        f"p99 {percentile(samples, 0.99) * 1e3:.3f}ms / "
+        f"{len(samples) / sum(samples):,.0f} 回/秒"
+    )
+
+
+def run_benchmark(spot_count: int, area_count: int, lookups: int) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'spots.db')
+
+        print(f"📦 取り込み中: {spot_count:,}件 / {area_count}エリア")
+        start = time.perf_counter()
+        ingest_records(db_path, generate_records(spot_count, area_count))
+        elapsed = time.perf_counter() - start
+        print(f"  取り込み: {elapsed:.2f}秒 ({spot_count / elapsed:,.0f} 件/秒)")
+
+        store = SQLiteSpotStore(db_path)
+        areas = store.areas
+        rng = random.Random(1)
+        lookup_queries = [
+            (rng.choice(areas), rng.choice(CATEGORIES), rng.choice(SEASONS + (None,)),
+             rng.sample(REQUESTS, rng.randrange(3)))
+            for _ in range(lookups)
+        ]
+        text_queries = [
+            (rng.choice(WORDS), rng.choice(areas), 10)
+            for _ in range(max(1, lookups // 10))
+        ]
+
+        print("\n📊 結果")
+        measure("lookup（area/category/season/requests）", store.lookup, lookup_queries)
+        measure("search_text（FTS5 + エリア絞り込み）", store.search_text, text_queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLiteSpotStore ベンチマーク")
+    parser.add_argument('--spots', type=int, default=100000, help="スポット件数")
+    parser.add_argument('--areas', type=int, default=50, help="エリア数")
+    parser.add_argument('--lookups', type=int, default=10000, help="lookup回数")
+    args = parser.parse_args()
+
+    run_benchmark(args.spots, args.areas, args.lookups)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+ステージ出力の検証 ベンチマーク
+LLMが返しがちな形（正しいJSON・コードブロック付き・前後に説明文・末尾のカンマ・途中で切れたJSON・リストのみ）について、
+従来の parse_state_json（json.loads + 正規表現）と stage_schemas.parse_stage（スキーマ検証 + ローカル修復）の
+成功可否と1回あたりの時間を比較する
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tourism_spots_agent.spot_catalog import SPOT_CATALOG
+from tourism_spots_agent.stage_schemas import parse_stage
+
+
+def legacy_parse_state_json(value):
+    """従来の parse_state_json（全体を囲むコードブロックと最初の {...} のみ対応）"""
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    fence_match = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, re.DOTALL)
+    if fence_match:
+        text = fence_match.group(1)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    object_match = re.search(r'\{.*\}', text, re.DOTALL)
+    if object_match:
+        try:
+            return json.loads(object_match.group(0))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def build_cases():
+    """(ステージ, 形, テキスト)"""
+    search_params = json.dumps(
+        {'area': '京都', 'category': '歴史', 'season': '秋', 'requests': ['写真撮影', '静か'], 'near': ''},
+        ensure_ascii=False
+    )
+    spots = [spot.to_dict() for spot in SPOT_CATALOG.lookup('京都', '歴史', None, [])][:5]
+    selected = json.dumps({'selected_spots': spots}, ensure_ascii=False)
+    descriptions = json.dumps(
+        {'descriptions': [{'name': spot['name'], 'description': spot['description'] * 4} for spot in spots]},
+        ensure_ascii=False
+    )
+    cases = []
+    for key, text in (('search_params', search_params), ('selected_spots', selected), ('descriptions', descriptions)):
+        cases += [
+            (key, '正しいJSON', text),
+            (key, 'コードブロック', f"```json\n{text}\n```"),
+            (key, '前後に説明文', f"抽出結果は以下のとおりです。\n```json\n{text}\n```\nご確認ください。"),
+            (key, '末尾のカンマ', text[:-1] + ',}'),
+            (key, '途中で切れた', text[:int(len(text) * 0.8)]),
+        ]
+    list_text = json.dumps(json.loads(descriptions)['descriptions'], ensure_ascii=False)
+    cases.append(('descriptions', 'リストのみ', list_text))
+    return cases
+
+
+def legacy_ok(key, value) -> bool:
+    """従来の実装で後続ステージが使える値になったか"""
+    if key == 'search_params':
+        return isinstance(value, dict)
+    if isinstance(value, dict):
+        value = value.get(key)
+    return isinstance(value, list) and bool(value)
+
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ステージ出力の検証・修復のベンチマーク")
+    parser.add_argument('--iterations', type=int, default=2000, help="1ケースあたりの反復回数")
+    args = parser.parse_args()
+
+    print(f"\n📊 結果（{args.iterations}回の平均）")
+    print(f"  {'ステージ':<16} {'形':<14} {'従来':>4} {'時間':>9} {'スキーマ':>8} {'時間':>9}")
+    legacy_total, schema_total, cases = 0, 0, build_cases()
+    for key, label, text in cases:
+        legacy_success = legacy_ok(key, legacy_parse_state_json(text))
+        schema_success = parse_stage(key, text) is not None
+        legacy_total += legacy_success
+        schema_total += schema_success
+        legacy_us = time_per_call(lambda: legacy_parse_state_json(text), args.iterations) * 1e6
+        schema_us = time_per_call(lambda: parse_stage(key, text), args.iterations) * 1e6
+        print(f"  {key:<16} {label:<14} {'✅' if legacy_success else '❌':>4} {legacy_us:7.1f}µs"
+              f" {'✅' if schema_success else '❌':>8} {schema_us:7.1f}µs")
+
+    print(f"\n✅ 後続ステージで使える値: 従来 {legacy_total}/{len(cases)} / スキーマ検証 {schema_total}/{len(cases)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+セッションstateの保持ポリシー ベンチマーク
+観光スポット検索の root_agent を模擬モデルで実行し、1セッションで検索を繰り返したときのstateのサイズを
+保持ポリシーなし（全キー保持）と compact（中間キー削除 + 直近N件の圧縮履歴）で比較する
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+# bench_agent_pipeline の import 時に結果キャッシュが無効化される
+from bench_agent_pipeline import TOURISM_MESSAGES
+from scripted_model import install_scripted_models
+from tourism_spots_agent.agent import root_agent
+from tourism_spots_agent.state_retention import StateRetention, state_bytes
+
+
+def event_bytes(session) -> int:
+    """セッションのイベント履歴のJSONバイト数"""
+    return sum(len(event.model_dump_json(exclude_none=True).encode('utf-8')) for event in session.events)
+
+
+async def run_session(retention, turns: int):
+    """1セッションで turns 回検索し、各回の後のstateのバイト数と最後のセッションを返す"""
+    root_agent.retention = retention
+    runner = InMemoryRunner(agent=root_agent, app_name='retention')
+    session = await runner.session_service.create_session(app_name='retention', user_id='user')
+    sizes = []
+    for turn in range(turns):
+        message = types.Content(role='user', parts=[types.Part(text=TOURISM_MESSAGES[turn % len(TOURISM_MESSAGES)])])
+        async for _ in runner.run_async(user_id='user', session_id=session.id, new_message=message):
+            pass
+        current = await runner.session_service.get_session(app_name='retention', user_id='user', session_id=session.id)
+        sizes.append(state_bytes(current.state))
+    return sizes, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="セッションstateの保持ポリシーのベンチマーク（模擬モデル）")
+    parser.add_argument('--turns', type=int, default=10, help="1セッションでの検索回数")
+    parser.add_argument('--max-results', default='1,3', help="compactで履歴に残す結果の件数（カンマ区切り）")
+    args = parser.parse_args()
+
+    install_scripted_models(root_agent, first_token_seconds=0, seconds_per_input_token=0, seconds_per_output_token=0, jitter=0)
+    policies = {'全キー保持': None}
+    for max_results in (int(v) for v in args.max_results.split(',') if v.strip()):
+        policies[f'compact（直近{max_results}件）'] = StateRetention(max_results=max_results)
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for label, retention in policies.items():
+            results[label] = asyncio.run(run_session(retention, args.turns))
+
+    print(f"\n📊 1セッションで{args.turns}回検索したときのstateのバイト数")
+    checkpoints = sorted({1, min(3, args.turns), args.turns})
+    print(f"  {'ポリシー':<22}" + ''.join(f" {f'{n}回目':>10}" for n in checkpoints)
+          + f" {'最新の結果以外':>14} {'イベント履歴':>12}")
+    for label, (sizes, session) in results.items():
+        # 最新の結果（html・search_params）を除いた分: 中間キー、または履歴
+        overhead = sizes[-1] - state_bytes({key: session.state.get(key) for key in ('html', 'search_params')})
+        print(f"  {label:<22}" + ''.join(f" {sizes[n - 1]:>9,}B" for n in checkpoints)
+              + f" {overhead:>13,}B {event_bytes(session):>11,}B")
+    for label, (sizes, session) in results.items():
+        keys = sorted(key for key, value in session.state.items() if value is not None)
+        print(f"  {label}のキー: {json.dumps(keys, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
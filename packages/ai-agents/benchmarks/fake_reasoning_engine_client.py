@@ -0,0 +1,156 @@
+"""
+ローカルのフェイク ReasoningEngineServiceClient
+list_reasoning_engines（ページ単位・ページごとの遅延）/ delete_reasoning_engine を、1分あたりの要求数クォータ・
+同時オペレーション数の上限・オペレーションの所要時間・一時的な失敗込みで模擬する（Vertex AI不要）。
+複数のプロジェクト・リージョンにエンジンを振り分けられ、時間は time_scale 倍に縮めて実行できる
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+
+class FakeApiError(Exception):
+    """google.api_core の例外と同じく code にHTTPステータスを持つエラー"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+
+
+@dataclass
+class FakeReasoningEngine:
+    name: str
+    display_name: str
+    create_time: datetime
+
+
+@dataclass
+class FakeListPage:
+    reasoning_engines: List[FakeReasoningEngine]
+    next_page_token: str
+
+
+class FakePager:
+    """ListReasoningEnginesPager と同じく pages でページ単位、反復でエンジン単位に読む（ページごとに遅延）"""
+
+    def __init__(self, engines: List[FakeReasoningEngine], page_size: int, page_seconds: float):
+        self._engines = engines
+        self._page_size = max(1, page_size)
+        self._page_seconds = page_seconds
+
+    @property
+    def pages(self) -> Iterator[FakeListPage]:
+        for start in range(0, max(1, len(self._engines)), self._page_size):
+            time.sleep(self._page_seconds)
+            end = start + self._page_size
+            yield FakeListPage(self._engines[start:end], str(end) if end < len(self._engines) else '')
+
+    def __iter__(self) -> Iterator[FakeReasoningEngine]:
+        for page in self.pages:
+            yield from page.reasoning_engines
+
+
+class FakeOperation:
+    """削除の長時間実行オペレーション（result() で完了まで待つ）"""
+
+    def __init__(self, client: 'FakeReasoningEngineServiceClient', name: str, seconds: float, error: Optional[FakeApiError]):
+        self._client = client
+        self._name = name
+        self._seconds = seconds
+        self._error = error
+
+    def result(self, timeout: Optional[float] = None) -> None:
+        if timeout is not None and self._seconds > timeout:
+            time.sleep(timeout)
+            self._client._finish(self._name, deleted=False)
+            raise TimeoutError(f"operation for {self._name} did not finish in {timeout}s")
+        time.sleep(self._seconds)
+        self._client._finish(self._name, deleted=self._error is None)
+        if self._error is not None:
+            raise self._error
+
+
+class FakeReasoningEngineServiceClient:
+    """クォータを模擬するフェイククライアント"""
+
+    def __init__(
+        self,
+        engines: int = 300,
+        projects: Sequence[str] = ('fake-project',),
+        locations: Sequence[str] = ('us-central1',),
+        requests_per_minute: int = 60,
+        max_concurrent_operations: int = 8,
+        operation_seconds: float = 20.0,
+        transient_error_rate: float = 0.02,
+        page_seconds: float = 1.0,
+        time_scale: float = 1.0,
+        seed: int = 0
+    ):
+        self.parents = [f"projects/{p}/locations/{l}" for p in projects for l in locations]
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrent_operations = max_concurrent_operations
+        self.operation_seconds = operation_seconds * time_scale
+        self.page_seconds = page_seconds * time_scale
+        self.window_seconds = 60.0 * time_scale
+        self.transient_error_rate = transient_error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._accepted = deque()
+        self._operations = set()
+        created = datetime(2025, 1, 1)
+        self.engines: Dict[str, FakeReasoningEngine] = {}
+        for i in range(engines):
+            name = f"{self.parents[i % len(self.parents)]}/reasoningEngines/{1000000000 + i}"
+            self.engines[name] = FakeReasoningEngine(name, f"Agent {i % 3}", created + timedelta(hours=i))
+        self.stats = {
+            'requests': 0, 'rate_limited': 0, 'transient_errors': 0, 'deleted': 0, 'peak_operations': 0, 'list_pages': 0
+        }
+
+    def list_reasoning_engines(self, request: Any = None) -> FakePager:
+        """request の parent 配下のエンジン（parent 省略時は全て）"""
+        request = request or {}
+        parent = request.get('parent') if isinstance(request, dict) else getattr(request, 'parent', None)
+        page_size = (request.get('page_size') if isinstance(request, dict) else getattr(request, 'page_size', 0)) or 100
+        with self._lock:
+            engines = [e for e in self.engines.values() if not parent or e.name.startswith(f"{parent}/")]
+            self.stats['list_pages'] += max(1, -(-len(engines) // page_size))
+        return FakePager(engines, page_size, self.page_seconds)
+
+    def delete_reasoning_engine(self, request: Any = None, name: Optional[str] = None) -> FakeOperation:
+        name = name or (request['name'] if isinstance(request, dict) else getattr(request, 'name', None))
+        now = time.monotonic()
+        with self._lock:
+            self.stats['requests'] += 1
+            while self._accepted and now - self._accepted[0] >= self.window_seconds:
+                self._accepted.popleft()
+            if len(self._accepted) >= self.requests_per_minute:
+                self.stats['rate_limited'] += 1
+                raise FakeApiError(429, "RATE_LIMIT_EXCEEDED: Quota exceeded for aiplatform.googleapis.com/reasoning_engine_service_write_requests")
+            if len(self._operations) >= self.max_concurrent_operations:
+                self.stats['rate_limited'] += 1
+                raise FakeApiError(429, "RATE_LIMIT_EXCEEDED: Too many concurrent operations")
+            self._accepted.append(now)
+            if name not in self.engines:
+                raise FakeApiError(404, f"NOT_FOUND: {name}")
+            if name in self._operations:
+                raise FakeApiError(409, f"ABORTED: operation already in progress for {name}")
+            error = None
+            if self._rng.random() < self.transient_error_rate:
+                self.stats['transient_errors'] += 1
+                error = FakeApiError(503, "UNAVAILABLE: The service is currently unavailable")
+            self._operations.add(name)
+            self.stats['peak_operations'] = max(self.stats['peak_operations'], len(self._operations))
+            seconds = self.operation_seconds * self._rng.uniform(0.5, 1.5)
+        return FakeOperation(self, name, seconds, error)
+
+    def _finish(self, name: str, deleted: bool) -> None:
+        with self._lock:
+            self._operations.discard(name)
+            if deleted and self.engines.pop(name, None) is not None:
+                self.stats['deleted'] += 1
@@ -0,0 +1,215 @@
+"""
+ベンチマーク用のスクリプト化されたモデル（Vertex AIを呼ばないローカルの代替）
+エージェントごとに定型の応答を返し、応答遅延とトークン数を設定どおりに模擬する
+"""
+
+import asyncio
+import json
+import random
+import re
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, Optional, Union
+
+from google.adk.agents import BaseAgent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+# 応答: 固定テキスト、またはLlmRequestから応答テキストを作る関数
+Script = Union[str, Callable[[LlmRequest], str]]
+
+# 日本語テキストのおおよその1トークンあたり文字数
+DEFAULT_CHARS_PER_TOKEN = 2.0
+
+
+def request_text(llm_request: LlmRequest) -> str:
+    """リクエスト中のテキスト（会話履歴のみ、システム指示は含まない）"""
+    return ''.join(
+        part.text
+        for content in llm_request.contents or []
+        for part in content.parts or []
+        if part.text
+    )
+
+
+def estimate_tokens(text: str, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN) -> int:
+    return max(1, int(round(len(text) / chars_per_token))) if text else 0
+
+
+class ScriptedModel(BaseLlm):
+    """定型応答を返すモデル
+
+    遅延 = (最初のトークンまでの時間 + 入力トークン数 × 入力トークンあたりの時間
+            + 出力トークン数 × 出力トークンあたりの時間) × 対数正規分布のゆらぎ
+    slow_rate の割合の呼び出しは slow_factor 倍に遅くなる（まれな遅い応答の裾を模擬）
+    """
+
+    script: Any = ''
+    first_token_seconds: float = 0.3
+    seconds_per_input_token: float = 0.00005
+    seconds_per_output_token: float = 0.005
+    jitter: float = 0.25
+    slow_rate: float = 0.0
+    slow_factor: float = 5.0
+    output_tokens: Optional[int] = None
+    chars_per_token: float = DEFAULT_CHARS_PER_TOKEN
+    seed: int = 0
+
+    _rng: random.Random = PrivateAttr(default=None)
+    _stats: Dict[str, float] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._rng = random.Random(self.seed)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self._stats = {'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'simulated_seconds': 0.0}
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return dict(self._stats)
+
+    def simulated_latency(self, prompt_tokens: int, output_tokens: int) -> float:
+        base = (
+            self.first_token_seconds
+            + prompt_tokens * self.seconds_per_input_token
+            + output_tokens * self.seconds_per_output_token
+        )
+        if self.slow_rate > 0 and self._rng.random() < self.slow_rate:
+            base *= self.slow_factor
+        if self.jitter <= 0:
+            return base
+        return base * self._rng.lognormvariate(0.0, self.jitter)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        text = self.script(llm_request) if callable(self.script) else str(self.script)
+        system_instruction = str(llm_request.config.system_instruction or '') if llm_request.config else ''
+        prompt_tokens = estimate_tokens(system_instruction + request_text(llm_request), self.chars_per_token)
+        output_tokens = self.output_tokens if self.output_tokens is not None else estimate_tokens(text, self.chars_per_token)
+
+        latency = self.simulated_latency(prompt_tokens, output_tokens)
+        await asyncio.sleep(latency)
+
+        self._stats['calls'] += 1
+        self._stats['prompt_tokens'] += prompt_tokens
+        self._stats['output_tokens'] += output_tokens
+        self._stats['simulated_seconds'] += latency
+
+        yield LlmResponse(
+            content=types.Content(role='model', parts=[types.Part(text=text)]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens
+            )
+        )
+
+
+# ===== 定型応答 =====
+
+_AREAS = ('東京', '京都', '大阪')
+_CATEGORIES = ('歴史', '自然', '現代', '文化')
+_SEASONS = ('春', '夏', '秋', '冬')
+
+
+def _first_match(text: str, candidates, default: str = '') -> str:
+    return next((c for c in candidates if c in text), default)
+
+
+def intent_response(llm_request: LlmRequest) -> str:
+    """SimpleIntentAgent: 入力文に含まれる語からsearch_paramsのJSONを返す"""
+    text = request_text(llm_request)
+    return json.dumps({
+        'area': _first_match(text, _AREAS, '東京'),
+        'category': _first_match(text, _CATEGORIES, '歴史'),
+        'season': _first_match(text, _SEASONS),
+        'requests': [],
+        'near': ''
+    }, ensure_ascii=False)
+
+
+def description_response(llm_request: LlmRequest) -> str:
+    """SimpleDescriptionAgent: スポット名を含む約100文字の説明文"""
+    match = re.search(r'"name":\s*"([^"]*)"', request_text(llm_request))
+    name = match.group(1) if match else '観光スポット'
+    return (
+        f"{name}は四季折々の景色と歴史ある街並みを楽しめる人気のスポットです。"
+        "朝の静かな時間帯に訪れると、混雑を避けてゆっくりと散策できます。"
+        "周辺には食事処やお土産店も多く、半日かけて巡るのがおすすめです。"
+    )
+
+
+_SAMPLE_HTML = (
+    "<!DOCTYPE html><html lang='ja'><head><meta charset='UTF-8'><title>観光スポット</title></head>"
+    "<body><div class='spot-container'>"
+    + ''.join(f"<div class='spot-card'><h3>スポット{i}</h3><p>説明文</p></div>" for i in range(5))
+    + "</div></body></html>"
+)
+
+
+def ui_response(llm_request: LlmRequest) -> str:
+    """SimpleUIAgent（output_schema=HTMLOutput）"""
+    return json.dumps({'html': _SAMPLE_HTML}, ensure_ascii=False)
+
+
+def analysis_response(llm_request: LlmRequest) -> str:
+    """analysis_specialist: 指示の出力形式に沿った約1,500文字のレポート"""
+    sections = ['## 分析結果サマリー', '## 詳細分析', '### 1. データ概要', '### 2. 主要な傾向',
+                '### 3. 統計的分析', '### 4. 課題と機会', '## 推奨事項', '## 次のステップ']
+    body = "売上は前年同期比で12.4%増加し、特に週末の来客数が伸びています。平均客単価は横ばいで推移しています。" * 2
+    return '\n\n'.join(f"{heading}\n{body}" for heading in sections)
+
+
+def map_reduce_response(llm_request: LlmRequest) -> str:
+    """analysis_map_reduce: 部分分析（約300文字）または統合レポート"""
+    system_instruction = str(llm_request.config.system_instruction or '') if llm_request.config else ''
+    if '部分分析を作成' in system_instruction:
+        return "- このチャンクの売上合計は約4,200万円で、週末の来客数が平日より18%多い\n- 食品カテゴリの構成比が最も高い\n" * 3
+    return analysis_response(llm_request)
+
+
+# エージェント名ごとの定型応答
+DEFAULT_SCRIPTS: Dict[str, Script] = {
+    'SimpleIntentAgent': intent_response,
+    'SimpleDescriptionAgent': description_response,
+    'SimpleUIAgent': ui_response,
+    'HTMLExtractorAgent': _SAMPLE_HTML,
+    'analysis_specialist': analysis_response,
+    'analysis_map_reduce': map_reduce_response,
+}
+
+
+def iter_agents(agent: BaseAgent) -> Iterator[BaseAgent]:
+    """エージェントツリーを深さ優先で列挙"""
+    yield agent
+    for sub_agent in agent.sub_agents:
+        yield from iter_agents(sub_agent)
+
+
+def install_scripted_models(
+    root: BaseAgent,
+    scripts: Optional[Dict[str, Script]] = None,
+    seed: int = 0,
+    **model_options: Any
+) -> Dict[str, ScriptedModel]:
+    """ツリー内のモデルを持つエージェントをScriptedModelに差し替え、エージェント名 -> モデルを返す
+
+    model_options: ScriptedModelの設定（first_token_seconds, seconds_per_input_token, seconds_per_output_token, jitter,
+                   slow_rate, slow_factor など）
+    """
+    scripts = {**DEFAULT_SCRIPTS, **(scripts or {})}
+    models: Dict[str, ScriptedModel] = {}
+    for index, agent in enumerate(iter_agents(root)):
+        if not hasattr(agent, 'model'):
+            continue
+        model = ScriptedModel(
+            model=f"scripted-{agent.name}",
+            script=scripts.get(agent.name, ''),
+            seed=seed + index,
+            **model_options
+        )
+        agent.model = model
+        models[agent.name] = model
+    return models
@@ -2,16 +2,24 @@
 """
 Agent Engine 古いバージョン削除スクリプト
 最新のエージェント以外を削除して、Vertex AI リソースを整理します
+（削除の並列化・レート制限対応・中断後の再開は engine_cleanup.py）
 """
 
+import argparse
+import asyncio
 import os
 import re
 import sys
-import time
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-import vertexai
-from vertexai.agent_engines import AgentEngine
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from engine_cleanup import (
+    BURST, DEFAULT_JOURNAL_PATH, INITIAL_CONCURRENCY, MAX_CONCURRENCY, RATE_PER_MINUTE,
+    CleanupResult, EngineDeleter, ProgressJournal
+)
+from engine_inventory import (
+    DEFAULT_CACHE_PATH, INVENTORY_MAX_AGE_SECONDS, EngineRecord, Target, cached_inventory, create_client,
+    forget_engines, get_inventory, parse_targets, scan_inventory, target_label
+)
 
 
 def extract_engine_id(url: str) -> Optional[str]:
@@ -44,161 +52,248 @@ def get_current_agents() -> Dict[str, str]:
     return agents
 
 
-def list_all_reasoning_engines() -> List[Tuple[str, str, str]]:
-    """全てのReasoning Engineを一覧取得
+def list_all_reasoning_engines(client=None) -> List[Tuple[str, str, str]]:
+    """VERTEX_AI_PROJECT_ID / VERTEX_AI_LOCATION のReasoning Engineを一覧取得
     
     Returns:
         List of (resource_name, display_name, create_time)
     """
     try:
-        from google.cloud import aiplatform_v1
-        from google.api_core import client_options
-        
         project_id = os.getenv('VERTEX_AI_PROJECT_ID')
         location = os.getenv('VERTEX_AI_LOCATION', 'us-central1')
         
         if not project_id:
             raise ValueError("VERTEX_AI_PROJECT_ID not found in .env")
         
-        # リージョナルエンドポイントを使用
-        api_endpoint = f"{location}-aiplatform.googleapis.com"
-        client_opts = client_options.ClientOptions(api_endpoint=api_endpoint)
-        client = aiplatform_v1.ReasoningEngineServiceClient(client_options=client_opts)
-        
-        parent = f"projects/{project_id}/locations/{location}"
-        
-        engines = []
-        request = aiplatform_v1.ListReasoningEnginesRequest(parent=parent)
-        page_result = client.list_reasoning_engines(request=request)
-        
-        for engine in page_result:
-            create_time = engine.create_time.strftime('%Y-%m-%d %H:%M:%S') if engine.create_time else 'Unknown'
-            engines.append((engine.name, engine.display_name or 'No Name', create_time))
-        
-        return engines
+        client_factory = (lambda _: client) if client is not None else create_client
+        inventory = scan_inventory([(project_id, location)], client_factory=client_factory)
+        if inventory.errors:
+            raise RuntimeError('; '.join(inventory.errors.values()))
+        return [(e.name, e.display_name, e.create_time) for e in inventory.engines]
         
     except Exception as e:
         print(f"❌ Reasoning Engine一覧取得エラー: {e}")
         return []
 
 
-def cleanup_old_agents(dry_run: bool = True) -> None:
-    """古いエージェントを削除"""
+def protect_engines(engines: Iterable[EngineRecord], current_ids: Set[str]) -> Tuple[Set[str], Dict[Target, str]]:
+    """(プロジェクト, リージョン) ごとに保護するエンジンを決める
+
+    このチェックアウトの *_agent_url.txt のエージェントが見つかった対象では、それらのみ保護する。
+    見つからない対象（他の環境からデプロイされたエージェントかもしれない）では、表示名ごとに最新のエンジンを保護する
+
+    Returns:
+        (保護するエンジンID, 対象ごとの保護の方法)
+    """
+    by_target: Dict[Target, List[EngineRecord]] = {}
+    for engine in engines:
+        by_target.setdefault((engine.project, engine.location), []).append(engine)
+    protected: Set[str] = set()
+    modes: Dict[Target, str] = {}
+    for target, target_engines in by_target.items():
+        known = {extract_engine_id(e.name) for e in target_engines} & current_ids
+        if known:
+            protected |= known
+            modes[target] = 'current'
+            continue
+        newest: Dict[str, EngineRecord] = {}
+        for engine in target_engines:
+            # 作成日時が不明なものは最も古いとみなす
+            created = engine.create_time if engine.create_time != 'Unknown' else ''
+            latest = newest.get(engine.display_name)
+            if latest is None or created > (latest.create_time if latest.create_time != 'Unknown' else ''):
+                newest[engine.display_name] = engine
+        protected |= {extract_engine_id(e.name) for e in newest.values()}
+        modes[target] = 'newest'
+    return protected, modes
+
+
+def _print_event(display_names: Dict[str, str], total: int):
+    """削除の進捗を1行ずつ表示するコールバック"""
+    done = [0]
+
+    def on_event(event: str, engine_name: str, detail: Dict) -> None:
+        display_name = display_names.get(engine_name, engine_name)
+        if event in ('deleted', 'not_found', 'failed'):
+            done[0] += 1
+        if event == 'deleted':
+            print(f"✅ 削除成功 ({done[0]}/{total}): {display_name}")
+        elif event == 'not_found':
+            print(f"✅ 削除済み ({done[0]}/{total}): {display_name}")
+        elif event == 'failed':
+            print(f"❌ 削除失敗 ({done[0]}/{total}): {display_name} - {detail['error']}")
+        elif event == 'retry':
+            print(f"🔄 リトライ予定: {display_name}（{detail['attempts']}回目失敗・{detail['delay']:.1f}秒後）")
+        elif event == 'throttle':
+            print(f"⚠️  レート制限: 同時実行数 {detail['concurrency']:.1f} / 開始ペース {detail['rate_per_minute']:.1f}件/分に減速")
+
+    return on_event
+
+
+def cleanup_old_agents(dry_run: bool = True, targets: Optional[List[Target]] = None, client_factory=create_client,
+                       inventory_path: str = DEFAULT_CACHE_PATH, max_age: Optional[float] = INVENTORY_MAX_AGE_SECONDS,
+                       refresh: bool = False, from_cache: bool = False, journal_path: str = DEFAULT_JOURNAL_PATH,
+                       resume: bool = True, **deleter_options) -> Optional[CleanupResult]:
+    """古いエージェントを削除
+    
+    対象の (プロジェクト, リージョン) を同時に一覧取得し、期限内のインベントリキャッシュがあればそれを使う。
+    削除はリージョンごとにトークンバケットで開始ペースを制限しつつ並列に行い、レート制限エラーで同時実行数を下げる。
+    結果は journal_path に記録し、中断後の再実行では削除済みのエンジンを省略する
+    """
     
     print("🧹 Agent Engine クリーンアップスクリプト")
     print("=" * 50)
     
+    targets = targets or parse_targets()
+    if not targets:
+        print("❌ 対象のプロジェクトがありません（VERTEX_AI_PROJECT_ID または INVENTORY_TARGETS を設定してください）")
+        return None
+    
     # 現在使用中のエージェントを取得
     current_agents = get_current_agents()
     print(f"\n📋 現在使用中のエージェント: {len(current_agents)}個")
     for agent_type, engine_id in current_agents.items():
         print(f"  • {agent_type}: {engine_id}")
     
-    # 全てのReasoning Engineを取得
-    print(f"\n🔍 全Reasoning Engine検索中...")
-    all_engines = list_all_reasoning_engines()
+    # 全てのReasoning Engineを取得（保護するエンジンは対象ごとに決まるので、対象の一覧取得が終わるたびに表示）
+    current_ids = set(current_agents.values())
     
-    if not all_engines:
-        print("❌ Reasoning Engineが見つかりませんでした")
-        return
+    def show_target(target_engines: List[EngineRecord]) -> None:
+        protected_ids, modes = protect_engines(target_engines, current_ids)
+        for target, mode in modes.items():
+            reason = "使用中のエージェントを保護" if mode == 'current' else "使用中のエージェントがないため表示名ごとの最新を保護"
+            print(f"  📍 {target_label(target)}: {reason}")
+        for engine in target_engines:
+            engine_id = extract_engine_id(engine.name)
+            mark = "🔒 保護" if engine_id in protected_ids else "🗑️  削除対象"
+            print(f"  {mark}: {engine.display_name} ({engine_id}) - {engine.create_time} [{engine.project}/{engine.location}]")
     
-    print(f"📊 検出されたReasoning Engine: {len(all_engines)}個")
+    received: Dict[Target, List[EngineRecord]] = {}
     
-    # 削除対象を特定
-    engines_to_delete = []
-    protected_engines = []
+    def show_page(page) -> None:
+        received.setdefault(page.target, []).extend(page.engines)
+        if page.error:
+            print(f"  ❌ {target_label(page.target)}: 一覧取得エラー - {page.error}")
+        if page.done:
+            show_target(received.pop(page.target))
     
-    for engine_name, display_name, create_time in all_engines:
-        engine_id = extract_engine_id(engine_name)
-        
-        if engine_id and engine_id in current_agents.values():
-            protected_engines.append((engine_name, display_name, create_time))
-            print(f"  🔒 保護: {display_name} ({engine_id}) - {create_time}")
-        else:
-            engines_to_delete.append((engine_name, display_name, create_time))
-            print(f"  🗑️  削除対象: {display_name} ({engine_id}) - {create_time}")
+    print(f"\n🔍 全Reasoning Engine検索中... ({', '.join(target_label(t) for t in targets)})")
+    if from_cache:
+        inventory = cached_inventory(targets, inventory_path, max_age=None)
+        if inventory is None:
+            print(f"❌ 対象を含むインベントリキャッシュがありません: {inventory_path}")
+            return None
+        cached = True
+    else:
+        inventory, cached = get_inventory(
+            targets, inventory_path, max_age, refresh, on_page=show_page, client_factory=client_factory
+        )
+    if cached:
+        print(f"📦 インベントリキャッシュを使用（{inventory.age_seconds() / 60:.0f}分前に取得: {inventory_path}、"
+              f"取り直すには --refresh）")
+        show_target(inventory.engines)
+    
+    if not inventory.engines:
+        print("❌ Reasoning Engineが見つかりませんでした")
+        return None
+    
+    print(f"📊 検出されたReasoning Engine: {len(inventory.engines)}個")
+    
+    # 削除対象を特定（一覧取得に失敗した対象は、最新のエンジンが一覧にないかもしれないので削除しない）
+    protected_ids, _ = protect_engines(inventory.engines, current_ids)
+    failed_targets = set(inventory.errors)
+    engines_to_delete = [
+        e for e in inventory.engines
+        if extract_engine_id(e.name) not in protected_ids and target_label((e.project, e.location)) not in failed_targets
+    ]
+    protected_count = len(inventory.engines) - len(engines_to_delete)
     
     print(f"\n📈 サマリー")
-    print(f"  • 保護されるエージェント: {len(protected_engines)}個")
+    print(f"  • 保護されるエージェント: {protected_count}個")
     print(f"  • 削除対象エージェント: {len(engines_to_delete)}個")
+    if inventory.errors:
+        print(f"  • 一覧取得に失敗した対象（削除しない）: {', '.join(inventory.errors)}")
     
     if not engines_to_delete:
         print("\n✨ 削除対象のエージェントはありません")
-        return
+        return None
     
     if dry_run:
         print(f"\n⚠️  ドライランモード: 実際の削除は行われません")
         print(f"実際に削除するには --execute オプションを使用してください")
-        return
+        return None
     
     # 実際の削除実行
+    if not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    journal = ProgressJournal(journal_path)
+    on_event = _print_event({e.name: e.display_name for e in engines_to_delete}, len(engines_to_delete))
+    # クォータはプロジェクト・リージョンごとなので、それぞれ別のスケジューラで並列に削除
+    groups: Dict[Target, List[str]] = {}
+    for engine in engines_to_delete:
+        groups.setdefault((engine.project, engine.location), []).append(engine.name)
+    clients = {location: client_factory(location) for _, location in groups}
+    deleters = {
+        target: EngineDeleter(clients[target[1]], journal=journal, on_event=on_event, **deleter_options)
+        for target in groups
+    }
+    deleter = next(iter(deleters.values()))
     print(f"\n🚨 削除を開始します...")
-    print(f"⏱️  レート制限対応: 削除間隔6秒で実行します")
-    
-    successful_deletions = 0
-    failed_deletions = 0
-    retry_list = []  # リトライ対象
-    
-    for i, (engine_name, display_name, create_time) in enumerate(engines_to_delete):
-        try:
-            print(f"🗑️  削除中 ({i+1}/{len(engines_to_delete)}): {display_name} ({create_time})")
-            
-            # AgentEngineインスタンスを作成して削除
-            agent_engine = AgentEngine(resource_name=engine_name)
-            agent_engine.delete(force=True)
-            
-            print(f"✅ 削除成功: {display_name}")
-            successful_deletions += 1
-            
-            # レート制限対応: 6秒間隔
-            if i < len(engines_to_delete) - 1:  # 最後の削除以外
-                print(f"⏳ 6秒待機中...")
-                time.sleep(6)
-            
-        except Exception as e:
-            error_msg = str(e)
-            if "RATE_LIMIT_EXCEEDED" in error_msg:
-                print(f"⚠️  レート制限: {display_name} - リトライキューに追加")
-                retry_list.append((engine_name, display_name, create_time))
-            else:
-                print(f"❌ 削除失敗: {display_name} - {e}")
-                failed_deletions += 1
-    
-    # リトライ処理
-    if retry_list:
-        print(f"\n🔄 リトライ処理開始: {len(retry_list)}個")
-        print(f"⏱️  60秒待機後、30秒間隔でリトライします")
-        time.sleep(60)  # 1分待機
-        
-        for i, (engine_name, display_name, create_time) in enumerate(retry_list):
-            try:
-                print(f"🔄 リトライ中 ({i+1}/{len(retry_list)}): {display_name}")
-                agent_engine = AgentEngine(resource_name=engine_name)
-                agent_engine.delete(force=True)
-                
-                print(f"✅ リトライ成功: {display_name}")
-                successful_deletions += 1
-                
-                # リトライ間隔: 30秒
-                if i < len(retry_list) - 1:
-                    print(f"⏳ 30秒待機中...")
-                    time.sleep(30)
-                    
-            except Exception as e:
-                print(f"❌ リトライ失敗: {display_name} - {e}")
-                failed_deletions += 1
+    print(f"⏱️  レート制限対応: 開始ペース {deleter.rate_per_minute:.0f}件/分・同時実行 {deleter.initial_concurrency}〜{deleter.max_concurrency}"
+          f"（プロジェクト・リージョンごと、レート制限で自動的に減速）")
+    print(f"📝 進捗ジャーナル: {journal_path}")
+    
+    async def run_all():
+        return await asyncio.gather(*(deleters[target].run(names) for target, names in groups.items()))
+    
+    result = CleanupResult()
+    for partial in asyncio.run(run_all()):
+        result.deleted += partial.deleted
+        result.not_found += partial.not_found
+        result.failed.update(partial.failed)
+        result.skipped += partial.skipped
+        result.requests += partial.requests
+        result.rate_limited += partial.rate_limited
+        result.retries += partial.retries
+        result.seconds = max(result.seconds, partial.seconds)
+        result.peak_concurrency = max(result.peak_concurrency, partial.peak_concurrency)
+    # 削除したエンジンをインベントリキャッシュから除く（次のドライランに反映）
+    forget_engines(result.deleted + result.not_found, inventory_path)
     
     print(f"\n📊 削除結果")
-    print(f"  • 成功: {successful_deletions}個")
-    print(f"  • 失敗: {failed_deletions}個")
+    print(f"  • 成功: {len(result.deleted) + len(result.not_found)}個")
+    print(f"  • 失敗: {len(result.failed)}個")
+    if result.skipped:
+        print(f"  • 前回までに削除済み（ジャーナル）: {result.skipped}個")
+    print(f"  • 所要時間: {result.seconds:.1f}秒 / 要求 {result.requests}回（レート制限 {result.rate_limited}回・リトライ {result.retries}回）")
     
-    if successful_deletions > 0:
+    if result.failed:
+        print(f"\n🔄 失敗したエンジンは再実行で再試行されます")
+    elif result.deleted or result.not_found:
         print(f"\n✨ クリーンアップ完了")
+    
+    return result
 
 
 def main():
     """メイン関数"""
     
+    parser = argparse.ArgumentParser(description="最新のエージェント以外のAgent Engineを削除")
+    parser.add_argument('-e', '--execute', action='store_true', help="実際に削除する（省略時はドライラン）")
+    parser.add_argument('--rate-per-minute', type=float, default=RATE_PER_MINUTE, help="削除要求の開始ペース（件/分）")
+    parser.add_argument('--burst', type=int, default=BURST, help="まとめて開始できる削除要求の数")
+    parser.add_argument('--concurrency', type=int, default=INITIAL_CONCURRENCY, help="同時に削除するエンジン数（開始値）")
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY, help="同時に削除するエンジン数の上限")
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_PATH, help="進捗ジャーナルのパス")
+    parser.add_argument('--fresh', action='store_true', help="進捗ジャーナルを消して最初から実行")
+    parser.add_argument('--targets', default=None,
+                        help="対象の プロジェクト:リージョン（カンマ区切り、省略時は INVENTORY_TARGETS または VERTEX_AI_PROJECT_ID / VERTEX_AI_LOCATION）")
+    parser.add_argument('--refresh', action='store_true', help="インベントリキャッシュを使わずに一覧を取り直す")
+    parser.add_argument('--from-cache', action='store_true', help="期限に関係なくインベントリキャッシュから実行（APIで一覧取得しない）")
+    parser.add_argument('--max-age', type=float, default=INVENTORY_MAX_AGE_SECONDS, help="インベントリキャッシュを使う期限（秒）")
+    parser.add_argument('--inventory', default=DEFAULT_CACHE_PATH, help="インベントリキャッシュのパス")
+    args = parser.parse_args()
+    
     # .envから環境変数を読み込み
     from dotenv import load_dotenv
     
@@ -207,26 +302,40 @@ def main():
     
     # Vertex AI初期化
     project_id = os.getenv('VERTEX_AI_PROJECT_ID')
-    if not project_id:
+    targets = parse_targets(args.targets)
+    if not targets:
         print("❌ VERTEX_AI_PROJECT_ID not found in .env. Please set VERTEX_AI_PROJECT_ID in .env")
         sys.exit(1)
     
     try:
+        import vertexai
         location = os.getenv('VERTEX_AI_LOCATION', 'us-central1')
-        vertexai.init(project=project_id, location=location)
+        vertexai.init(project=project_id or targets[0][0], location=location)
     except Exception as e:
         print(f"❌ Vertex AI初期化エラー: {e}")
         sys.exit(1)
     
-    # コマンドライン引数チェック
-    execute_mode = '--execute' in sys.argv or '-e' in sys.argv
+    execute_mode = args.execute
     
     if not execute_mode:
         print("⚠️  注意: これはドライランです。実際の削除は行われません。")
         print("実際に削除するには --execute または -e オプションを追加してください。\n")
     
     try:
-        cleanup_old_agents(dry_run=not execute_mode)
+        cleanup_old_agents(
+            dry_run=not execute_mode,
+            targets=targets,
+            inventory_path=args.inventory,
+            max_age=args.max_age,
+            refresh=args.refresh,
+            from_cache=args.from_cache,
+            journal_path=args.journal,
+            resume=not args.fresh,
+            rate_per_minute=args.rate_per_minute,
+            burst=args.burst,
+            initial_concurrency=args.concurrency,
+            max_concurrency=args.max_concurrency
+        )
         
     except KeyboardInterrupt:
         print("\n\n⚠️ クリーンアップが中断されました")
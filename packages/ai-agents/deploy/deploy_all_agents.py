@@ -1,125 +1,153 @@
 """
 All Agents Deployment Script
-全ての専用Agent Engineを順次デプロイ
+全ての専用Agent Engineを並列にデプロイ
+パッケージ（ソース・requirements）の内容ハッシュが前回のデプロイと同じエージェントは省略する
 """
 
+import argparse
 import os
 import sys
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 各デプロイスクリプトをインポート
-from deploy_analysis import deploy_analysis_agent
-from deploy_tourism_spots import deploy_tourism_spots_agent
+import deploy_analysis
+import deploy_tourism_spots
+from package_hash import read_agent_url, read_deployed_hash
 
+# (キー, 表示名, デプロイスクリプト, デプロイ関数, URLの環境変数名)
+AGENTS = [
+    ('analysis', 'Analysis Agent', deploy_analysis,
+     deploy_analysis.deploy_analysis_agent, 'ANALYSIS_AGENT_URL'),
+    ('tourism_spots_search', 'Tourism Spots Search Agent', deploy_tourism_spots,
+     deploy_tourism_spots.deploy_tourism_spots_agent, 'TOURISM_SPOTS_SEARCH_AGENT_URL'),
+]
 
-def deploy_all_agents():
-    """全ての専用エージェントをデプロイ"""
-    
-    print("🚀 AIエージェントデプロイ開始")
-    print("=" * 40)
-    
-    deployment_results = {}
-    
-    try:
-        # 1. Analysis Agent デプロイ
-        print("\n[1/2] Analysis Agent")
-        analysis_app = deploy_analysis_agent()
-        deployment_results['analysis'] = {
-            'status': 'success',
-            'resource_name': analysis_app.resource_name
-        }
-        # 完了メッセージは個別スクリプトが出力
-        
-    except Exception as e:
-        print(f"❌ Analysis Agent デプロイ失敗: {e}")
-        deployment_results['analysis'] = {
-            'status': 'failed',
-            'error': str(e)
+# 同時にデプロイするエージェント数
+DEPLOY_WORKERS = int(os.getenv('DEPLOY_WORKERS', str(len(AGENTS))))
+
+
+def _deploy_target():
+    project_id = os.getenv('PROJECT_ID') or os.getenv('VERTEX_AI_PROJECT_ID')
+    location = os.getenv('REGION') or os.getenv('VERTEX_AI_LOCATION', 'us-central1')
+    return project_id, location
+
+
+def _deploy_agent(label, module, deploy, force):
+    """1エージェントのデプロイ（変更がなければ省略）。結果と所要時間を返す"""
+    start = time.perf_counter()
+    project_id, location = _deploy_target()
+    agent_hash = module.agent_package_hash(project_id, location)
+    if not force and read_deployed_hash(module.URL_FILE) == agent_hash:
+        print(f"⏭️  {label}: 変更なし（ハッシュ {agent_hash[:12]}）のためデプロイを省略")
+        return {
+            'status': 'skipped',
+            'hash': agent_hash,
+            'seconds': time.perf_counter() - start
         }
-    
+
     try:
-        # 2. Tourism Spots Search Agent デプロイ
-        print("\n[2/2] Tourism Spots Search Agent")
-        tourism_spots_app = deploy_tourism_spots_agent()
-        deployment_results['tourism_spots_search'] = {
-            'status': 'success',
-            'resource_name': tourism_spots_app.resource_name
-        }
-        # 完了メッセージは個別スクリプトが出力
-        
+        remote_app = deploy()
     except Exception as e:
-        print(f"❌ Tourism Spots Search Agent デプロイ失敗: {e}")
-        deployment_results['tourism_spots_search'] = {
+        print(f"❌ {label} デプロイ失敗: {e}")
+        return {
             'status': 'failed',
-            'error': str(e)
+            'error': str(e),
+            'seconds': time.perf_counter() - start
         }
-    
-    # 結果サマリー
+    # 完了メッセージは個別スクリプトが出力
+    return {
+        'status': 'success',
+        'resource_name': remote_app.resource_name,
+        'hash': agent_hash,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def deploy_all_agents(agents=None, workers=DEPLOY_WORKERS, force=False):
+    """全ての専用エージェントを並列にデプロイ（変更のないエージェントは省略）"""
+    targets = [agent for agent in AGENTS if not agents or agent[0] in agents]
+
+    print("🚀 AIエージェントデプロイ開始")
+    print(f"  対象: {len(targets)}エージェント / 同時実行: {workers}{' / 強制再デプロイ' if force else ''}")
+    print("=" * 40)
+
+    deployment_results = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(_deploy_agent, label, module, deploy, force): key
+            for key, label, module, deploy, _ in targets
+        }
+        for future in as_completed(futures):
+            deployment_results[futures[future]] = future.result()
+    wall_seconds = time.perf_counter() - start
+
+    # 結果サマリー（定義順）
     print("\n" + "=" * 40)
     print("📋 デプロイ結果")
-    
-    successful_deployments = 0
-    failed_deployments = 0
-    
-    for agent_name, result in deployment_results.items():
-        status_emoji = "✅" if result['status'] == 'success' else "❌"
-        print(f"{status_emoji} {agent_name.upper()}: {result['status']}")
-        
-        if result['status'] == 'success':
-            successful_deployments += 1
-        else:
-            failed_deployments += 1
+
+    counts = {'success': 0, 'skipped': 0, 'failed': 0}
+    status_emojis = {'success': "✅", 'skipped': "⏭️ ", 'failed': "❌"}
+    for key, _, _, _, _ in targets:
+        result = deployment_results[key]
+        counts[result['status']] += 1
+        print(f"{status_emojis[result['status']]} {key.upper()}: {result['status']} ({result['seconds']:.1f}秒)")
+        if result['status'] == 'failed':
             print(f"   エラー: {result.get('error', 'Unknown error')}")
-    
-    print(f"\n成功: {successful_deployments}/2 | 失敗: {failed_deployments}/2")
-    
+
+    total = len(targets)
+    agent_seconds = sum(result['seconds'] for result in deployment_results.values())
+    print(f"\n成功: {counts['success']}/{total} | 省略: {counts['skipped']}/{total} | 失敗: {counts['failed']}/{total}")
+    print(f"所要時間: {wall_seconds:.1f}秒（エージェントごとの合計 {agent_seconds:.1f}秒）")
+
     # 環境変数設定ガイド
-    if successful_deployments > 0:
+    deployed = [
+        (module, env_name) for key, _, module, _, env_name in targets
+        if deployment_results[key]['status'] != 'failed'
+    ]
+    if deployed:
         print("\n🔧 環境変数設定")
         print("-" * 40)
-        
-        if 'analysis' in deployment_results and deployment_results['analysis']['status'] == 'success':
-            try:
-                with open('../analysis_agent_url.txt', 'r') as f:
-                    url = f.read().strip()
-                print(f"ANALYSIS_AGENT_URL={url}")
-            except FileNotFoundError:
-                print("ANALYSIS_AGENT_URL=<analysis_agent_url.txtから取得>")
-        
-        
-        if 'tourism_spots_search' in deployment_results and deployment_results['tourism_spots_search']['status'] == 'success':
-            try:
-                with open('../tourism_spots_search_agent_url.txt', 'r') as f:
-                    url = f.read().strip()
-                print(f"TOURISM_SPOTS_SEARCH_AGENT_URL={url}")
-            except FileNotFoundError:
-                print("TOURISM_SPOTS_SEARCH_AGENT_URL=<tourism_spots_search_agent_url.txtから取得>")
-    
+        for module, env_name in deployed:
+            url = read_agent_url(module.URL_FILE)
+            print(f"{env_name}={url or f'<{module.URL_FILE}から取得>'}")
+
     return deployment_results
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="全エージェントを並列にデプロイ（変更のないエージェントは省略）")
+    parser.add_argument('--workers', type=int, default=DEPLOY_WORKERS, help="同時にデプロイするエージェント数")
+    parser.add_argument('--force', action='store_true', help="変更がなくても再デプロイ")
+    parser.add_argument('--agents', nargs='+', choices=[agent[0] for agent in AGENTS], help="デプロイするエージェント（省略時は全て）")
+    args = parser.parse_args()
+
     # .envから環境変数を読み込み
     from dotenv import load_dotenv
-    
+
     env_path = os.path.join(os.path.dirname(__file__), "../../../scripts/.env")
     load_dotenv(env_path)
-    
+
     # 環境変数チェック
     if not os.getenv('VERTEX_AI_PROJECT_ID'):
         print("❌ VERTEX_AI_PROJECT_ID not found in .env. Please set VERTEX_AI_PROJECT_ID in .env")
         sys.exit(1)
-    
+
     try:
-        results = deploy_all_agents()
-        
+        results = deploy_all_agents(args.agents, args.workers, args.force)
+
         # 全て失敗した場合は終了コード1
         if all(result['status'] == 'failed' for result in results.values()):
             sys.exit(1)
-            
+
     except KeyboardInterrupt:
         print("\n\n⚠️ デプロイ中断されました")
         sys.exit(1)
     except Exception as e:
         print(f"\n❌ 予期しないエラー: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
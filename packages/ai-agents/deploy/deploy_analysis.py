@@ -6,18 +6,32 @@ Analysis Agent Deployment Script
 import os
 import sys
 import logging
-from datetime import datetime
 from dotenv import load_dotenv
 from vertexai import init, agent_engines
 
 # ADK標準構造からエージェントをインポート
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from analysis_agent.agent import root_agent as analysis_agent
+from package_hash import package_hash, write_deployment
 
 # ログ設定（警告以上のみ表示）
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# デプロイするパッケージ（この内容が変わらなければ deploy_all_agents は再デプロイを省略）
+REQUIREMENTS = [
+    "google-cloud-aiplatform[adk,agent_engines]>=1.88.0",
+    "pydantic>=2.0.0",
+    "numpy>=1.24.0"
+]
+EXTRA_PACKAGES = ["analysis_agent", "agent_telemetry"]
+URL_FILE = "analysis_agent_url.txt"
+
+
+def agent_package_hash(project_id: str, location: str) -> str:
+    """Analysis Agentのパッケージ（ソース・requirements・デプロイ先）の内容ハッシュ"""
+    return package_hash(EXTRA_PACKAGES, REQUIREMENTS, os.path.abspath(__file__), f"{project_id}/{location}")
+
 
 def deploy_analysis_agent():
     """Analysis AgentをAgent Engineにデプロイ"""
@@ -34,6 +48,7 @@ def deploy_analysis_agent():
         raise ValueError("PROJECT_ID not found in .env file. Please set PROJECT_ID in .env")
     
     print(f"🚀 Analysis Agent デプロイ中...")
+    agent_hash = agent_package_hash(project_id, location)
     
     # Vertex AI初期化
     init(project=project_id, location=location, 
@@ -42,10 +57,10 @@ def deploy_analysis_agent():
     # Agent Engineにデプロイ
     remote_app = agent_engines.create(
         analysis_agent,
-        requirements=[
-            "google-cloud-aiplatform[adk,agent_engines]>=1.88.0",
-            "pydantic>=2.0.0"
-        ],
+        requirements=REQUIREMENTS,
+        extra_packages=EXTRA_PACKAGES,
+        # 他のエージェントと並列にデプロイしてもステージングのファイルが衝突しないようにする
+        gcs_dir_name="analysis_agent",
         env_vars={"VERTEX_AI_PROJECT_ID": project_id},
         display_name="AI Chat Starter Kit - Analysis Agent",
         description="データ分析とレポート作成専用エージェント"
@@ -61,8 +76,7 @@ def deploy_analysis_agent():
     # URLを保存
     agent_url = f"https://{location}-aiplatform.googleapis.com/v1/{remote_app.resource_name}:streamQuery?alt=sse"
     
-    with open("analysis_agent_url.txt", "w") as f:
-        f.write(agent_url)
+    write_deployment(URL_FILE, agent_url, agent_hash)
     
     print(f"✅ Analysis Agent デプロイ完了")
     print(f"URL: {agent_url}")
@@ -12,11 +12,26 @@ from vertexai import init, agent_engines
 # ADK標準構造からエージェントをインポート
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tourism_spots_agent.agent import root_agent as tourism_spots_agent
+from package_hash import package_hash, write_deployment
 
 # ログ設定（警告以上のみ表示）
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# デプロイするパッケージ（この内容が変わらなければ deploy_all_agents は再デプロイを省略）
+REQUIREMENTS = [
+    "google-cloud-aiplatform[adk,agent_engines]>=1.88.0",
+    "pydantic>=2.0.0",
+    "numpy>=1.24.0"
+]
+EXTRA_PACKAGES = ["tourism_spots_agent", "agent_telemetry"]
+URL_FILE = "tourism_spots_search_agent_url.txt"
+
+
+def agent_package_hash(project_id: str, location: str) -> str:
+    """観光スポット検索エージェントのパッケージ（ソース・requirements・デプロイ先）の内容ハッシュ"""
+    return package_hash(EXTRA_PACKAGES, REQUIREMENTS, os.path.abspath(__file__), f"{project_id}/{location}")
+
 def deploy_tourism_spots_agent():
     """観光スポット検索エージェントをAgent Engineにデプロイ"""
     # .envファイルから環境変数を読み込み
@@ -32,6 +47,7 @@ def deploy_tourism_spots_agent():
         raise ValueError("PROJECT_ID not found in .env file. Please set PROJECT_ID in .env")
     
     print(f"🚀 観光スポット検索エージェントデプロイ中...")
+    agent_hash = agent_package_hash(project_id, location)
     
     # Vertex AI初期化
     init(project=project_id, location=location, 
@@ -40,11 +56,10 @@ def deploy_tourism_spots_agent():
     # Agent Engineにデプロイ
     remote_app = agent_engines.create(
         tourism_spots_agent,
-        requirements=[
-            "google-cloud-aiplatform[adk,agent_engines]>=1.88.0",
-            "pydantic>=2.0.0"
-        ],
-        extra_packages=["tourism_spots_agent"],
+        requirements=REQUIREMENTS,
+        extra_packages=EXTRA_PACKAGES,
+        # 他のエージェントと並列にデプロイしてもステージングのファイルが衝突しないようにする
+        gcs_dir_name="tourism_spots_agent",
         env_vars={"VERTEX_AI_PROJECT_ID": project_id},
         display_name="AI Chat Starter Kit - Tourism Spots Search Agent",
         description="観光スポット検索とHTML記事生成専用エージェント"
@@ -59,8 +74,7 @@ def deploy_tourism_spots_agent():
         # URL生成とファイル保存
         agent_url = f"https://{location}-aiplatform.googleapis.com/v1/{remote_app.resource_name}:streamQuery?alt=sse"
         
-        with open('tourism_spots_search_agent_url.txt', 'w') as f:
-            f.write(agent_url)
+        write_deployment(URL_FILE, agent_url, agent_hash)
         
         print("✅ 観光スポット検索エージェントデプロイ完了")
         print(f"URL: {agent_url}")
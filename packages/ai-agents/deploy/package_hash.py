@@ -0,0 +1,77 @@
+"""
+エージェントパッケージの内容ハッシュ
+ソース（extra_packages のファイルとデプロイスクリプト）・requirements・デプロイ先から計算し、
+*_agent_url.txt の隣（*_agent_hash.txt）に保存して、変更のないエージェントの再デプロイを省略する
+"""
+
+import hashlib
+import os
+from typing import Iterable, Optional
+
+# packages/ai-agents（extra_packages・URLファイルの基準ディレクトリ）
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ハッシュに含めないディレクトリ・拡張子
+IGNORED_DIRS = {'__pycache__', '.pytest_cache', '.mypy_cache'}
+IGNORED_SUFFIXES = ('.pyc', '.pyo', '.log')
+
+
+def _package_files(path: str) -> Iterable[str]:
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS and not d.startswith('.'))
+        for name in sorted(files):
+            if not name.endswith(IGNORED_SUFFIXES) and not name.startswith('.'):
+                yield os.path.join(root, name)
+
+
+def package_hash(extra_packages: Iterable[str], requirements: Iterable[str],
+                 deploy_script: str, target: str = '') -> str:
+    """エージェントパッケージの内容ハッシュ（ファイルの相対パスと内容・requirements・デプロイ先）"""
+    digest = hashlib.sha256()
+    paths = [os.path.join(PACKAGE_DIR, p) for p in extra_packages] + [deploy_script]
+    for path in paths:
+        for file_path in _package_files(path):
+            digest.update(os.path.relpath(file_path, PACKAGE_DIR).replace(os.sep, '/').encode('utf-8'))
+            digest.update(b'\0')
+            with open(file_path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    for requirement in sorted(requirements):
+        digest.update(f"requirement:{requirement}\n".encode('utf-8'))
+    digest.update(f"target:{target}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def hash_file_path(url_file: str) -> str:
+    """analysis_agent_url.txt -> packages/ai-agents/analysis_agent_hash.txt"""
+    base = url_file[:-len('_url.txt')] if url_file.endswith('_url.txt') else os.path.splitext(url_file)[0]
+    return os.path.join(PACKAGE_DIR, f"{base}_hash.txt")
+
+
+def read_deployed_hash(url_file: str) -> Optional[str]:
+    """前回デプロイしたパッケージのハッシュ（URLファイルがなければ未デプロイとみなす）"""
+    if not os.path.exists(os.path.join(PACKAGE_DIR, url_file)):
+        return None
+    try:
+        with open(hash_file_path(url_file), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_deployment(url_file: str, agent_url: str, agent_hash: str) -> None:
+    """デプロイしたエージェントのURLとパッケージのハッシュを保存"""
+    with open(os.path.join(PACKAGE_DIR, url_file), 'w') as f:
+        f.write(agent_url)
+    with open(hash_file_path(url_file), 'w') as f:
+        f.write(agent_hash)
+
+
+def read_agent_url(url_file: str) -> Optional[str]:
+    try:
+        with open(os.path.join(PACKAGE_DIR, url_file), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,355 @@
+"""
+Reasoning Engine の一括削除スケジューラ
+トークンバケットで削除要求の開始ペースを制限し、同時実行数はレート制限エラーに応じてAIMD（加算増加・乗算減少）で調整する。
+失敗した削除はエンジンごとにジッター付き指数バックオフで再試行し、結果は進捗ジャーナル（JSON Lines）に記録して中断後に再開できる
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# 削除要求の開始ペース（1分あたり）と、まとめて開始できる数
+RATE_PER_MINUTE = float(os.getenv('CLEANUP_RATE_PER_MINUTE', '30'))
+BURST = int(os.getenv('CLEANUP_BURST', '5'))
+# 同時に削除するエンジン数（開始値と上限）
+INITIAL_CONCURRENCY = int(os.getenv('CLEANUP_CONCURRENCY', '4'))
+MAX_CONCURRENCY = int(os.getenv('CLEANUP_MAX_CONCURRENCY', '16'))
+# エンジンごとの再試行
+MAX_ATTEMPTS = int(os.getenv('CLEANUP_MAX_ATTEMPTS', '8'))
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_CAP_SECONDS = 120.0
+# 削除オペレーションの完了待ちの上限
+OPERATION_TIMEOUT_SECONDS = 600.0
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cleanup_journal.jsonl')
+
+# 再試行するHTTPステータス（429はレート制限として同時実行数も下げる）
+RATE_LIMIT_CODES = {429}
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_MARKERS = ('RATE_LIMIT_EXCEEDED', 'Quota exceeded', 'RESOURCE_EXHAUSTED')
+
+# ジャーナル上で完了扱いにする状態（再開時に省略）
+DONE_STATUSES = ('deleted', 'not_found')
+
+
+def _error_code(error: Exception) -> Optional[int]:
+    """google.api_core の例外はHTTPステータスを code に持つ"""
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    message = str(error)
+    return _error_code(error) in RATE_LIMIT_CODES or any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+def is_not_found(error: Exception) -> bool:
+    return _error_code(error) == 404 or 'NOT_FOUND' in str(error)
+
+
+def is_retryable(error: Exception) -> bool:
+    return (
+        is_rate_limited(error)
+        or _error_code(error) in RETRYABLE_CODES
+        or isinstance(error, (TimeoutError, ConnectionError))
+    )
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_CAP_SECONDS,
+                  rng: Optional[random.Random] = None) -> float:
+    """attempt回目の失敗後の待ち時間（Full Jitter: 0〜min(cap, base*2^(attempt-1)) の一様乱数）"""
+    return (rng or random).uniform(0.0, min(cap, base * (2 ** max(0, attempt - 1))))
+
+
+class TokenBucket:
+    """削除要求の開始ペースを制限するトークンバケット（レート制限時は減速し、成功が続くと設定値まで戻す）"""
+
+    def __init__(self, rate_per_second: float, burst: int = BURST, min_rate_per_second: Optional[float] = None):
+        self.base_rate = rate_per_second
+        self.rate = rate_per_second
+        self.min_rate = min_rate_per_second or rate_per_second / 16
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # ロックを持ったまま待つので、待っている要求は到着順に開始する
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def slow_down(self) -> None:
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        # 溜まったトークンでまとめて開始して再びレート制限に当たらないようにする
+        self.tokens = min(self.tokens, 0.0)
+
+    def recover(self) -> None:
+        if self.rate < self.base_rate:
+            self._refill()
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 20)
+
+
+class AdaptiveConcurrency:
+    """同時実行数の上限をAIMDで調整（成功ごとに +1/上限、レート制限で半減）"""
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, maximum: int = MAX_CONCURRENCY, minimum: int = 1):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.peak = 0
+        self.decreases = 0
+        self._decreased_at = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        """空きを待って実行枠を確保し、開始時刻を返す"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return time.monotonic()
+
+    async def release(self, started_at: float, rate_limited: bool) -> bool:
+        """実行枠を返す。上限を下げた場合は True"""
+        async with self._condition:
+            self.in_flight -= 1
+            decreased = False
+            if rate_limited:
+                # 前回の減少より前に開始した要求のレート制限は同じ混雑によるものなので重ねて下げない
+                if started_at >= self._decreased_at:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased_at = time.monotonic()
+                    self.decreases += 1
+                    decreased = True
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+            return decreased
+
+
+class ProgressJournal:
+    """エンジンごとの削除結果を追記するJSON Linesファイル（同じエンジンは最後の記録が有効）"""
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で中断された最終行
+                        continue
+                    if isinstance(record, dict) and record.get('name'):
+                        self.records[record['name']] = record
+
+    def is_done(self, name: str) -> bool:
+        return self.records.get(name, {}).get('status') in DONE_STATUSES
+
+    def record(self, name: str, status: str, attempts: int, error: Optional[str] = None) -> None:
+        record = {'name': name, 'status': status, 'attempts': attempts, 'time': time.time()}
+        if error:
+            record['error'] = error
+        self.records[name] = record
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+@dataclass
+class CleanupResult:
+    """一括削除の結果"""
+
+    deleted: List[str] = field(default_factory=list)
+    not_found: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    skipped: int = 0
+    requests: int = 0
+    rate_limited: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    peak_concurrency: int = 0
+    final_concurrency: float = 0.0
+    final_rate_per_minute: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'deleted': len(self.deleted),
+            'not_found': len(self.not_found),
+            'failed': len(self.failed),
+            'skipped': self.skipped,
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'retries': self.retries,
+            'seconds': round(self.seconds, 2),
+            'peak_concurrency': self.peak_concurrency,
+            'final_concurrency': round(self.final_concurrency, 2),
+            'final_rate_per_minute': round(self.final_rate_per_minute, 2),
+        }
+
+
+class EngineDeleter:
+    """ReasoningEngineServiceClient（または同じインターフェースのフェイク）でエンジンを一括削除"""
+
+    def __init__(
+        self,
+        client: Any,
+        rate_per_minute: float = RATE_PER_MINUTE,
+        burst: int = BURST,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_base: float = BACKOFF_BASE_SECONDS,
+        backoff_cap: float = BACKOFF_CAP_SECONDS,
+        operation_timeout: float = OPERATION_TIMEOUT_SECONDS,
+        journal: Optional[ProgressJournal] = None,
+        on_event: Optional[Callable[[str, str, Dict[str, Any]], None]] = None,
+        seed: Optional[int] = None
+    ):
+        self.client = client
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.operation_timeout = operation_timeout
+        self.journal = journal
+        # (イベント名, エンジン名, 詳細) を受け取る進捗表示用コールバック
+        self.on_event = on_event or (lambda event, name, detail: None)
+        self._rng = random.Random(seed)
+
+    def _delete_sync(self, name: str) -> None:
+        operation = self.client.delete_reasoning_engine(request={'name': name, 'force': True})
+        if operation is not None and hasattr(operation, 'result'):
+            operation.result(timeout=self.operation_timeout)
+
+    async def run(self, names: Iterable[str]) -> CleanupResult:
+        result = CleanupResult()
+        pending = []
+        for name in dict.fromkeys(names):
+            if self.journal is not None and self.journal.is_done(name):
+                result.skipped += 1
+            else:
+                pending.append(name)
+
+        start = time.perf_counter()
+        bucket = TokenBucket(self.rate_per_minute / 60.0, self.burst)
+        limiter = AdaptiveConcurrency(self.initial_concurrency, self.max_concurrency)
+        # (再試行可能になる時刻, 順番, エンジン名, 試行回数)
+        ready = [(0.0, i, name, 0) for i, name in enumerate(pending)]
+        heapq.heapify(ready)
+        sequence = len(ready)
+        remaining = len(ready)
+        changed = asyncio.Condition()
+
+        async def next_item():
+            async with changed:
+                while remaining > 0:
+                    if ready and ready[0][0] <= time.monotonic():
+                        return heapq.heappop(ready)
+                    timeout = ready[0][0] - time.monotonic() if ready else None
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                return None
+
+        async def finish(name: str, status: str, attempts: int, error: Optional[str] = None) -> None:
+            nonlocal remaining
+            if status == 'deleted':
+                result.deleted.append(name)
+            elif status == 'not_found':
+                result.not_found.append(name)
+            else:
+                result.failed[name] = error or status
+            if self.journal is not None:
+                self.journal.record(name, status, attempts, error)
+            self.on_event(status, name, {'attempts': attempts, 'error': error})
+            async with changed:
+                remaining -= 1
+                changed.notify_all()
+
+        async def retry(name: str, attempts: int) -> None:
+            nonlocal sequence
+            delay = backoff_delay(attempts, self.backoff_base, self.backoff_cap, self._rng)
+            result.retries += 1
+            async with changed:
+                heapq.heappush(ready, (time.monotonic() + delay, sequence, name, attempts))
+                sequence += 1
+                changed.notify_all()
+            self.on_event('retry', name, {'attempts': attempts, 'delay': delay})
+
+        async def worker():
+            while True:
+                item = await next_item()
+                if item is None:
+                    return
+                _, _, name, attempts = item
+                started_at = await limiter.acquire()
+                await bucket.acquire()
+                attempts += 1
+                result.requests += 1
+                error = None
+                try:
+                    await loop.run_in_executor(executor, self._delete_sync, name)
+                except Exception as e:
+                    error = e
+                rate_limited = error is not None and is_rate_limited(error)
+                if await limiter.release(started_at, rate_limited):
+                    bucket.slow_down()
+                    self.on_event('throttle', name, {
+                        'concurrency': limiter.limit, 'rate_per_minute': bucket.rate * 60
+                    })
+                if error is None:
+                    bucket.recover()
+                    await finish(name, 'deleted', attempts)
+                elif is_not_found(error):
+                    # 前回の実行や別の削除で既に消えている
+                    await finish(name, 'not_found', attempts)
+                elif is_retryable(error) and attempts < self.max_attempts:
+                    result.rate_limited += int(rate_limited)
+                    await retry(name, attempts)
+                else:
+                    result.rate_limited += int(rate_limited)
+                    await finish(name, 'failed', attempts, str(error))
+
+        workers = max(1, min(self.max_concurrency, len(pending)))
+        # 削除オペレーションの完了待ちはブロッキングなので、同時実行数の上限分のスレッドで待つ
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='engine-cleanup')
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            executor.shutdown(wait=False)
+        result.seconds = time.perf_counter() - start
+        result.peak_concurrency = limiter.peak
+        result.final_concurrency = limiter.limit
+        result.final_rate_per_minute = bucket.rate * 60
+        return result
+
+
+def delete_engines(client: Any, names: Iterable[str], **options) -> CleanupResult:
+    """EngineDeleter を同期的に実行"""
+    return asyncio.run(EngineDeleter(client, **options).run(names))
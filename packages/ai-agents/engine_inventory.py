@@ -0,0 +1,265 @@
+"""
+Reasoning Engine のインベントリ
+複数の (プロジェクト, リージョン) をスレッドプールで同時に一覧取得し、ページ単位で逐次返す。
+結果は取得時刻付きでローカルのJSONにキャッシュし、期限内の再実行（ドライランなど）ではAPIを呼ばずに使う
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# (プロジェクト, リージョン)
+Target = Tuple[str, str]
+
+# 一覧取得の同時実行数・1ページの件数
+INVENTORY_WORKERS = int(os.getenv('INVENTORY_WORKERS', '8'))
+PAGE_SIZE = int(os.getenv('INVENTORY_PAGE_SIZE', '100'))
+# キャッシュを使う期限（秒）
+INVENTORY_MAX_AGE_SECONDS = float(os.getenv('INVENTORY_MAX_AGE_SECONDS', '3600'))
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'engine_inventory.json')
+
+
+def target_label(target: Target) -> str:
+    return f"{target[0]}/{target[1]}"
+
+
+def parse_targets(text: Optional[str] = None) -> List[Target]:
+    """'proj-a:us-central1,proj-a:asia-northeast1,proj-b' -> [(プロジェクト, リージョン), ...]
+
+    リージョンを省略した項目は VERTEX_AI_LOCATION、全体を省略した場合は VERTEX_AI_PROJECT_ID と VERTEX_AI_LOCATION の1組
+    """
+    default_location = os.getenv('VERTEX_AI_LOCATION', 'us-central1')
+    text = text if text is not None else os.getenv('INVENTORY_TARGETS', '')
+    targets = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        project, _, location = item.partition(':')
+        targets.append((project.strip(), location.strip() or default_location))
+    if not targets and os.getenv('VERTEX_AI_PROJECT_ID'):
+        targets.append((os.getenv('VERTEX_AI_PROJECT_ID'), default_location))
+    # 重複を除いて指定順を保つ
+    return list(dict.fromkeys(targets))
+
+
+def create_client(location: str):
+    """リージョナルエンドポイントの ReasoningEngineServiceClient"""
+    from google.cloud import aiplatform_v1
+    from google.api_core import client_options
+
+    api_endpoint = f"{location}-aiplatform.googleapis.com"
+    client_opts = client_options.ClientOptions(api_endpoint=api_endpoint)
+    return aiplatform_v1.ReasoningEngineServiceClient(client_options=client_opts)
+
+
+@dataclass
+class EngineRecord:
+    """インベントリの1エンジン"""
+
+    name: str
+    display_name: str
+    create_time: str
+    project: str
+    location: str
+
+
+@dataclass
+class InventoryPage:
+    """1ターゲットの1ページ分の結果（done のときは engines が空で、失敗なら error）"""
+
+    target: Target
+    engines: List[EngineRecord] = field(default_factory=list)
+    done: bool = False
+    error: Optional[str] = None
+
+
+@dataclass
+class Inventory:
+    """全ターゲットの一覧取得結果"""
+
+    scanned_at: float
+    targets: List[Target]
+    engines: List[EngineRecord] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.scanned_at)
+
+    def subset(self, targets: Iterable[Target]) -> 'Inventory':
+        wanted = list(targets)
+        keys = set(wanted)
+        return Inventory(
+            scanned_at=self.scanned_at,
+            targets=wanted,
+            engines=[e for e in self.engines if (e.project, e.location) in keys],
+            errors={k: v for k, v in self.errors.items() if tuple(k.split('/', 1)) in keys}
+        )
+
+    def remove(self, names: Iterable[str]) -> int:
+        """削除済みのエンジンを除く（除いた件数を返す）"""
+        removed = set(names)
+        before = len(self.engines)
+        self.engines = [e for e in self.engines if e.name not in removed]
+        return before - len(self.engines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'scanned_at': self.scanned_at,
+            'targets': [list(t) for t in self.targets],
+            'engines': [asdict(e) for e in self.engines],
+            'errors': self.errors,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Inventory':
+        return cls(
+            scanned_at=float(data['scanned_at']),
+            targets=[tuple(t) for t in data['targets']],
+            engines=[EngineRecord(**e) for e in data.get('engines', [])],
+            errors=dict(data.get('errors', {}))
+        )
+
+
+def _to_record(engine: Any, target: Target) -> EngineRecord:
+    create_time = getattr(engine, 'create_time', None)
+    return EngineRecord(
+        name=engine.name,
+        display_name=getattr(engine, 'display_name', '') or 'No Name',
+        create_time=create_time.strftime('%Y-%m-%d %H:%M:%S') if create_time else 'Unknown',
+        project=target[0],
+        location=target[1]
+    )
+
+
+def _list_pages(client: Any, target: Target, page_size: int) -> Iterator[List[Any]]:
+    """ページャーをページ単位で読む（全ページを待たずに1ページずつ返す）"""
+    parent = f"projects/{target[0]}/locations/{target[1]}"
+    pager = client.list_reasoning_engines(request={'parent': parent, 'page_size': page_size})
+    pages = getattr(pager, 'pages', None)
+    if pages is None:
+        yield list(pager)
+        return
+    for page in pages:
+        yield list(page.reasoning_engines)
+
+
+def stream_inventory(
+    targets: Iterable[Target],
+    client_factory: Callable[[str], Any] = create_client,
+    workers: int = INVENTORY_WORKERS,
+    page_size: int = PAGE_SIZE
+) -> Iterator[InventoryPage]:
+    """全ターゲットを同時に一覧取得し、届いた順にページを返す（ターゲットごとに最後に done のページ）"""
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        return
+    pages: 'queue.Queue[InventoryPage]' = queue.Queue()
+    clients: Dict[str, Any] = {}
+    clients_lock = threading.Lock()
+
+    def scan(target: Target) -> None:
+        try:
+            # クライアントはリージョナルエンドポイントごとに1つ（スレッド間で共有可能）
+            with clients_lock:
+                if target[1] not in clients:
+                    clients[target[1]] = client_factory(target[1])
+                client = clients[target[1]]
+            for engines in _list_pages(client, target, page_size):
+                pages.put(InventoryPage(target, [_to_record(e, target) for e in engines]))
+        except Exception as e:
+            pages.put(InventoryPage(target, done=True, error=str(e)))
+            return
+        pages.put(InventoryPage(target, done=True))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets))), thread_name_prefix='inventory')
+    try:
+        for target in targets:
+            executor.submit(scan, target)
+        finished = 0
+        while finished < len(targets):
+            page = pages.get()
+            finished += int(page.done)
+            yield page
+    finally:
+        # 途中で読むのをやめた場合は残りの取得を待たない
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_inventory(
+    targets: Iterable[Target],
+    on_page: Optional[Callable[[InventoryPage], None]] = None,
+    **options
+) -> Inventory:
+    """全ターゲットを一覧取得してインベントリを作る（on_page はページが届くたびに呼ぶ）"""
+    targets = list(dict.fromkeys(targets))
+    inventory = Inventory(scanned_at=time.time(), targets=targets)
+    for page in stream_inventory(targets, **options):
+        inventory.engines.extend(page.engines)
+        if page.error:
+            inventory.errors[target_label(page.target)] = page.error
+        if on_page:
+            on_page(page)
+    return inventory
+
+
+def load_inventory(path: str = DEFAULT_CACHE_PATH) -> Optional[Inventory]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return Inventory.from_dict(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        return None
+
+
+def save_inventory(inventory: Inventory, path: str = DEFAULT_CACHE_PATH) -> None:
+    # 書き込み途中で中断しても壊れたキャッシュを残さない
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(inventory.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def cached_inventory(targets: Iterable[Target], path: str = DEFAULT_CACHE_PATH,
+                     max_age: Optional[float] = INVENTORY_MAX_AGE_SECONDS) -> Optional[Inventory]:
+    """全ターゲットを含み、期限内（max_age=None なら期限なし）のキャッシュ"""
+    targets = list(dict.fromkeys(targets))
+    inventory = load_inventory(path)
+    if inventory is None or not set(targets) <= set(inventory.targets):
+        return None
+    if max_age is not None and inventory.age_seconds() > max_age:
+        return None
+    return inventory.subset(targets)
+
+
+def get_inventory(
+    targets: Iterable[Target],
+    path: str = DEFAULT_CACHE_PATH,
+    max_age: Optional[float] = INVENTORY_MAX_AGE_SECONDS,
+    refresh: bool = False,
+    on_page: Optional[Callable[[InventoryPage], None]] = None,
+    **options
+) -> Tuple[Inventory, bool]:
+    """(インベントリ, キャッシュから取得したか)。期限内のキャッシュがなければ一覧取得して保存"""
+    targets = list(dict.fromkeys(targets))
+    if not refresh:
+        inventory = cached_inventory(targets, path, max_age)
+        if inventory is not None:
+            return inventory, True
+    inventory = scan_inventory(targets, on_page=on_page, **options)
+    # 失敗したターゲットがある結果は次回も取り直す
+    if not inventory.errors:
+        save_inventory(inventory, path)
+    return inventory, False
+
+
+def forget_engines(names: Iterable[str], path: str = DEFAULT_CACHE_PATH) -> None:
+    """削除したエンジンをキャッシュから除く（取得時刻は変えない）"""
+    inventory = load_inventory(path)
+    if inventory is not None and inventory.remove(names):
+        save_inventory(inventory, path)
@@ -0,0 +1,8 @@
+"""
+セルフホスト実行用のセッション保存モジュール
+ADKの BaseSessionService をSQLite（WALモード）で実装し、再起動後もセッションを残す・ワーカー間で共有する
+"""
+
+from .sqlite_session_service import SQLiteSessionService, create_session_service
+
+__all__ = ['SQLiteSessionService', 'create_session_service']
@@ -0,0 +1,581 @@
+"""
+SQLiteのセッションサービス（ローカル・オンプレ実行用）
+セッションをWALモードのSQLiteに保存し、再起動後も残す・同じDBファイルを使うgunicornワーカー間で共有する。
+
+- 書き込み: append_event はメモリ上のセッションを更新してキューに積むだけで戻る。
+  ワーカーごとに1本の書き込みスレッド（専用の接続）がキューを取り出し、複数イベントを1トランザクションでまとめて書く
+- 読み込み: ワーカーごとの読み込み用接続プール（スレッドごとに1接続）で、イベントはページ単位（キーセット）で読む
+- 同じワーカー内では、読む前に未書き込みのイベントを書き込む（自分の書いたイベントは必ず読める）。
+  他のワーカーからは、最大でフラッシュ間隔だけ遅れて見える
+- 終了時: close()（atexitにも登録）でキューを全て書き込んでから書き込みスレッドを止め、接続を閉じる
+"""
+
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events.event import Event
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.session import Session
+from google.adk.sessions.state import State
+
+# セッションサービス: memory（ADKのInMemorySessionService、デフォルト） / sqlite
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'agent_sessions.db')
+# 1トランザクションで書くイベントの最大数と、最初のイベントから書き込むまでの最大待ち時間
+SESSION_BATCH_SIZE = int(os.getenv('SESSION_BATCH_SIZE', '256'))
+SESSION_FLUSH_INTERVAL_MS = float(os.getenv('SESSION_FLUSH_INTERVAL_MS', '20'))
+# イベントを読むときの1ページの件数と、読み込み用接続の数
+SESSION_READ_PAGE_SIZE = int(os.getenv('SESSION_READ_PAGE_SIZE', '500'))
+SESSION_READ_POOL = int(os.getenv('SESSION_READ_POOL', '4'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    pk INTEGER PRIMARY KEY,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    UNIQUE (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    session_pk INTEGER NOT NULL REFERENCES sessions (pk) ON DELETE CASCADE,
+    timestamp REAL NOT NULL,
+    event_data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session_pk, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """WALモードの接続（ロック待ちはbusy_timeoutで待つ）"""
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+def split_state_delta(delta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """state_delta を (app:, user:, セッション) に分ける（temp: は保存しない）"""
+    app_delta, user_delta, session_delta = {}, {}, {}
+    for key, value in delta.items():
+        if key.startswith(State.APP_PREFIX):
+            app_delta[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_delta[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_delta[key] = value
+    return app_delta, user_delta, session_delta
+
+
+def merge_state(app_state: Dict[str, Any], user_state: Dict[str, Any], session_state: Dict[str, Any]) -> Dict[str, Any]:
+    state = dict(session_state)
+    state.update({State.APP_PREFIX + key: value for key, value in app_state.items()})
+    state.update({State.USER_PREFIX + key: value for key, value in user_state.items()})
+    return state
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+@dataclass
+class _WriteOp:
+    """書き込みスレッドに渡す操作。done があれば呼び出し側が完了を待つ（すぐにコミットする）"""
+
+    kind: str
+    key: Optional[SessionKey] = None
+    payload: Dict[str, Any] = field(default_factory=dict)
+    done: Optional[Future] = None
+    seq: int = 0
+
+
+class _Writer(threading.Thread):
+    """キューの操作をまとめて1トランザクションで書き込むスレッド（ワーカーごとに1本・専用の接続）"""
+
+    def __init__(self, path: str, batch_size: int, flush_interval: float):
+        super().__init__(name='session-store-writer', daemon=True)
+        self.queue: 'queue.Queue[_WriteOp]' = queue.Queue()
+        self._path = path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._session_pks: Dict[SessionKey, int] = {}
+        self.batches = 0
+        self.events_written = 0
+        # コミット済みの操作の通し番号（キューは先入れ先出しなので、これ以下の操作は全て書き込み済み）
+        self.committed_seq = 0
+
+    def run(self) -> None:
+        conn = connect(self._path)
+        try:
+            while True:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + self._flush_interval
+                # 完了を待つ操作（作成・削除・フラッシュ・停止）が来たらすぐにコミットする
+                while batch[-1].done is None and len(batch) < self._batch_size:
+                    try:
+                        batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                self._commit(conn, batch)
+                # stop: それより前に積まれた操作は全て書き込んだので終わる
+                if batch[-1].kind == 'stop':
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_WriteOp]) -> None:
+        try:
+            self._apply(conn, batch)
+            results = [None] * len(batch)
+        except Exception:
+            # 1件の失敗でバッチ全体を失わないよう、1件ずつ書き直す
+            # （他のワーカーが削除したセッションのpkが残っているかもしれないので引き直す）
+            self._session_pks.clear()
+            results = []
+            for op in batch:
+                try:
+                    self._apply(conn, [op])
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+                    if op.done is None:
+                        print(f"⚠️ セッションの書き込みに失敗しました ({op.kind} {op.key}): {e}")
+        self.batches += 1
+        self.committed_seq = batch[-1].seq
+        for op, error in zip(batch, results):
+            if op.done is None:
+                continue
+            if error is None:
+                op.done.set_result(None)
+            else:
+                op.done.set_exception(error)
+
+    def _session_pk(self, conn: sqlite3.Connection, key: SessionKey) -> int:
+        pk = self._session_pks.get(key)
+        if pk is None:
+            row = conn.execute('SELECT pk FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?', key).fetchone()
+            if row is None:
+                raise ValueError(f"セッションが見つかりません: {key}")
+            pk = self._session_pks[key] = row[0]
+        return pk
+
+    def _apply(self, conn: sqlite3.Connection, batch: List[_WriteOp]) -> None:
+        """バッチを1トランザクションで書き込む。stateはバッチ内でまとめてマージし、キーごとに1回だけ更新する"""
+        session_states: Dict[int, Dict[str, Any]] = {}
+        update_times: Dict[int, float] = {}
+        app_states: Dict[str, Dict[str, Any]] = {}
+        user_states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        event_rows = []
+
+        def loaded(cache, cache_key, sql, params):
+            if cache_key not in cache:
+                row = conn.execute(sql, params).fetchone()
+                cache[cache_key] = json.loads(row[0]) if row else {}
+            return cache[cache_key]
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for op in batch:
+                if op.kind == 'delete':
+                    pk = self._session_pks.pop(op.key, None)
+                    if pk is None:
+                        row = conn.execute(
+                            'SELECT pk FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?', op.key
+                        ).fetchone()
+                        pk = row[0] if row else None
+                    if pk is not None:
+                        # 同じバッチで先に積まれたイベントは書かない（既存のイベントはCASCADEで削除）
+                        event_rows = [row for row in event_rows if row[0] != pk]
+                        conn.execute('DELETE FROM sessions WHERE pk = ?', (pk,))
+                        session_states.pop(pk, None)
+                        update_times.pop(pk, None)
+                    continue
+                if op.kind == 'create':
+                    app_name, user_id, session_id = op.key
+                    try:
+                        cursor = conn.execute(
+                            'INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) '
+                            'VALUES (?, ?, ?, ?, ?, ?)',
+                            (*op.key, _dumps(op.payload['state']), op.payload['time'], op.payload['time'])
+                        )
+                    except sqlite3.IntegrityError:
+                        raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+                    self._session_pks[op.key] = cursor.lastrowid
+                elif op.kind == 'append':
+                    pk = self._session_pk(conn, op.key)
+                    event_rows.append((pk, op.payload['timestamp'], op.payload['event_data']))
+                    update_times[pk] = max(update_times.get(pk, 0.0), op.payload['timestamp'])
+                else:
+                    # flush / stop: 直前までの操作をコミットさせるだけ
+                    continue
+                app_name, user_id, _ = op.key
+                app_delta, user_delta, session_delta = op.payload['deltas']
+                if app_delta:
+                    loaded(app_states, app_name, 'SELECT state FROM app_states WHERE app_name = ?',
+                           (app_name,)).update(app_delta)
+                if user_delta:
+                    loaded(user_states, (app_name, user_id),
+                           'SELECT state FROM user_states WHERE app_name = ? AND user_id = ?',
+                           (app_name, user_id)).update(user_delta)
+                if session_delta and op.kind == 'append':
+                    loaded(session_states, pk, 'SELECT state FROM sessions WHERE pk = ?', (pk,)).update(session_delta)
+
+            if event_rows:
+                conn.executemany('INSERT INTO events (session_pk, timestamp, event_data) VALUES (?, ?, ?)', event_rows)
+            for pk, update_time in update_times.items():
+                if pk in session_states:
+                    conn.execute('UPDATE sessions SET state = ?, update_time = MAX(update_time, ?) WHERE pk = ?',
+                                 (_dumps(session_states[pk]), update_time, pk))
+                else:
+                    conn.execute('UPDATE sessions SET update_time = MAX(update_time, ?) WHERE pk = ?',
+                                 (update_time, pk))
+            conn.executemany('INSERT OR REPLACE INTO app_states (app_name, state) VALUES (?, ?)',
+                             [(app_name, _dumps(state)) for app_name, state in app_states.items()])
+            conn.executemany('INSERT OR REPLACE INTO user_states (app_name, user_id, state) VALUES (?, ?, ?)',
+                             [(app_name, user_id, _dumps(state)) for (app_name, user_id), state in user_states.items()])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            # ロールバックで作成が取り消されたセッションのpkを忘れる
+            for op in batch:
+                if op.kind == 'create':
+                    self._session_pks.pop(op.key, None)
+            raise
+        self.events_written += len(event_rows)
+
+
+class SQLiteSessionService(BaseSessionService):
+    """WALモードのSQLiteに保存するセッションサービス
+
+    path: DBファイルのパス（gunicornの各ワーカーが同じファイルを開く）
+    batch_size: 1トランザクションで書くイベントの最大数
+    flush_interval_ms: 最初のイベントをキューに積んでから書き込むまでの最大待ち時間
+    read_page_size: イベントを読むときの1ページの件数
+    read_pool: 読み込み用接続の数
+    """
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        batch_size: int = SESSION_BATCH_SIZE,
+        flush_interval_ms: float = SESSION_FLUSH_INTERVAL_MS,
+        read_page_size: int = SESSION_READ_PAGE_SIZE,
+        read_pool: int = SESSION_READ_POOL,
+    ):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000
+        self.read_page_size = max(1, read_page_size)
+        self.read_pool = max(1, read_pool)
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._writer: Optional[_Writer] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._reader_conns: List[sqlite3.Connection] = []
+        self._atexit_registered = False
+        # セッションごとの最後に書き込みスレッドに渡した操作の通し番号
+        self._pending: Dict[SessionKey, int] = {}
+        self._seq = itertools.count(1)
+
+    def _ensure_started(self) -> None:
+        """初回利用時（fork後のワーカー内）にスキーマ作成・書き込みスレッド・読み込みプールを用意する"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            conn = connect(self.path)
+            conn.executescript(SCHEMA)
+            conn.close()
+            # fork前の親プロセスの接続・スレッドは引き継がない
+            self._local = threading.local()
+            self._reader_conns = []
+            self._pending = {}
+            self._seq = itertools.count(1)
+            self._writer = _Writer(self.path, self.batch_size, self.flush_interval)
+            self._writer.start()
+            self._readers = ThreadPoolExecutor(max_workers=self.read_pool, thread_name_prefix='session-store-reader')
+            self._pid = pid
+            # 書き込みスレッドはデーモンなので、プロセス終了時に close() でキューを書き切ってから止める
+            # （fork後の子プロセスにも登録は引き継がれ、close() は自分のプロセスで始めたものだけを閉じる）
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def _reader_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            conn.execute('PRAGMA query_only=ON')
+            self._reader_conns.append(conn)
+        return conn
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        self._ensure_started()
+        return await asyncio.get_running_loop().run_in_executor(self._readers, lambda: fn(self._reader_conn()))
+
+    def _submit(self, op: _WriteOp) -> None:
+        self._ensure_started()
+        op.seq = next(self._seq)
+        if op.key is not None:
+            self._pending[op.key] = op.seq
+        self._writer.queue.put(op)
+
+    def _is_pending(self, key: Optional[SessionKey] = None) -> bool:
+        """未コミットの操作があるか（key を指定すればそのセッションについて）"""
+        if self._pid != os.getpid():
+            return False
+        committed = self._writer.committed_seq
+        if key is not None:
+            return self._pending.get(key, 0) > committed
+        return any(seq > committed for seq in self._pending.values())
+
+    async def _submit_and_wait(self, op: _WriteOp) -> None:
+        op.done = Future()
+        self._submit(op)
+        await asyncio.wrap_future(op.done)
+
+    async def flush(self) -> None:
+        """キューに積んだ書き込みを全て書き込む"""
+        if not self._is_pending():
+            return
+        await self._submit_and_wait(_WriteOp('flush'))
+        committed = self._writer.committed_seq
+        self._pending = {key: seq for key, seq in self._pending.items() if seq > committed}
+
+    def close(self) -> None:
+        """キューに積んだ書き込みを全て書き込み、書き込みスレッドを止めて接続を閉じる（atexitからも呼ばれる）
+
+        閉じた後に使うと、次の操作で書き込みスレッドと読み込みプールを作り直す
+        """
+        with self._start_lock:
+            if self._pid != os.getpid():
+                return
+            writer, readers, reader_conns = self._writer, self._readers, self._reader_conns
+            self._pid, self._writer, self._readers, self._reader_conns = None, None, None, []
+        writer.queue.put(_WriteOp('stop', done=Future(), seq=next(self._seq)))
+        writer.join()
+        self._pending = {}
+        readers.shutdown(wait=True)
+        for conn in reader_conns:
+            conn.close()
+
+    async def aclose(self) -> None:
+        """close() をイベントループを止めずに行う"""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def _flush_session(self, key: SessionKey) -> None:
+        if self._is_pending(key):
+            await self.flush()
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        app_delta, user_delta, session_state = split_state_delta(state or {})
+        now = time.time()
+        await self._submit_and_wait(_WriteOp('create', key, {
+            'state': session_state, 'time': now, 'deltas': (app_delta, user_delta, {}),
+        }))
+        app_state, user_state = await self._read(lambda conn: self._load_shared_state(conn, app_name, user_id))
+        return Session(
+            id=session_id, app_name=app_name, user_id=user_id,
+            state=merge_state(app_state, user_state, session_state), last_update_time=now,
+        )
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        await self._flush_session(key)
+        num_recent = config.num_recent_events if config else None
+        after = config.after_timestamp if config else None
+        if num_recent is not None and num_recent < 0:
+            raise ValueError('num_recent_events must be non-negative')
+
+        def load(conn: sqlite3.Connection):
+            row = conn.execute(
+                'SELECT pk, state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?', key
+            ).fetchone()
+            if row is None:
+                return None
+            pk, state, update_time = row
+            if num_recent is not None:
+                # 新しい方から num_recent 件（after_timestamp の条件も満たすもの）
+                sql = 'SELECT event_data FROM events WHERE session_pk = ?'
+                params: Tuple[Any, ...] = (pk,)
+                if after is not None:
+                    sql += ' AND timestamp >= ?'
+                    params += (after,)
+                rows = conn.execute(sql + ' ORDER BY seq DESC LIMIT ?', params + (num_recent,)).fetchall()
+                event_data = [data for (data,) in reversed(rows)]
+            else:
+                event_data = [data for _, data in self._event_pages(conn, pk, after)]
+            return pk, json.loads(state), update_time, event_data, self._load_shared_state(conn, app_name, user_id)
+
+        loaded = await self._read(load)
+        if loaded is None:
+            return None
+        _, session_state, update_time, event_data, (app_state, user_state) = loaded
+        return Session(
+            id=session_id, app_name=app_name, user_id=user_id,
+            state=merge_state(app_state, user_state, session_state),
+            events=[Event.model_validate_json(data) for data in event_data],
+            last_update_time=update_time,
+        )
+
+    def _event_pages(self, conn: sqlite3.Connection, pk: int, after: Optional[float] = None, start_seq: int = 0,
+                     limit: Optional[int] = None):
+        """(seq, event_data) をページ単位（seqのキーセット）で読む"""
+        last_seq, remaining = start_seq, limit
+        while remaining is None or remaining > 0:
+            page_size = self.read_page_size if remaining is None else min(self.read_page_size, remaining)
+            sql = 'SELECT seq, event_data FROM events WHERE session_pk = ? AND seq > ?'
+            params: Tuple[Any, ...] = (pk, last_seq)
+            if after is not None:
+                sql += ' AND timestamp >= ?'
+                params += (after,)
+            rows = conn.execute(sql + ' ORDER BY seq LIMIT ?', params + (page_size,)).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_seq = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    async def iter_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+    ) -> AsyncIterator[Event]:
+        """セッションのイベントを1ページずつ読んで順に返す（全イベントをメモリに載せない）"""
+        key = (app_name, user_id, session_id)
+        await self._flush_session(key)
+        row = await self._read(lambda conn: conn.execute(
+            'SELECT pk FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?', key
+        ).fetchone())
+        if row is None:
+            return
+        last_seq = 0
+        while True:
+            page = await self._read(
+                lambda conn: list(self._event_pages(conn, row[0], after_timestamp, last_seq, self.read_page_size))
+            )
+            for _, data in page:
+                yield Event.model_validate_json(data)
+            if len(page) < self.read_page_size:
+                return
+            last_seq = page[-1][0]
+
+    @staticmethod
+    def _load_shared_state(conn: sqlite3.Connection, app_name: str, user_id: str):
+        app_row = conn.execute('SELECT state FROM app_states WHERE app_name = ?', (app_name,)).fetchone()
+        user_row = conn.execute(
+            'SELECT state FROM user_states WHERE app_name = ? AND user_id = ?', (app_name, user_id)
+        ).fetchone()
+        return json.loads(app_row[0]) if app_row else {}, json.loads(user_row[0]) if user_row else {}
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        await self.flush()
+
+        def load(conn: sqlite3.Connection):
+            sql = 'SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ?'
+            params: Tuple[Any, ...] = (app_name,)
+            if user_id is not None:
+                sql += ' AND user_id = ?'
+                params += (user_id,)
+            rows = conn.execute(sql + ' ORDER BY update_time, user_id, id', params).fetchall()
+            shared = {uid: self._load_shared_state(conn, app_name, uid) for uid in {row[0] for row in rows}}
+            return rows, shared
+
+        rows, shared = await self._read(load)
+        return ListSessionsResponse(sessions=[
+            Session(
+                id=session_id, app_name=app_name, user_id=uid,
+                state=merge_state(*shared[uid], json.loads(state)), last_update_time=update_time,
+            )
+            for uid, session_id, state, update_time in rows
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        await self._submit_and_wait(_WriteOp('delete', key))
+        self._pending.pop(key, None)
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> Dict[str, Any]:
+        await self.flush()
+        _, user_state = await self._read(lambda conn: self._load_shared_state(conn, app_name, user_id))
+        return user_state
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        """メモリ上のセッションを更新し、書き込みはキューに積む（バッチで書き込まれる）"""
+        if event.partial:
+            return event
+        event = await super().append_event(session, event)
+        delta = event.actions.state_delta if event.actions else None
+        self._submit(_WriteOp('append', (session.app_name, session.user_id, session.id), {
+            'timestamp': event.timestamp,
+            'event_data': event.model_dump_json(exclude_none=True),
+            'deltas': split_state_delta(delta or {}),
+        }))
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        writer = self._writer
+        if writer is None:
+            return {'batches': 0, 'events_written': 0, 'queued': 0}
+        return {'batches': writer.batches, 'events_written': writer.events_written, 'queued': writer.queue.qsize()}
+
+
+def create_session_service() -> BaseSessionService:
+    """環境変数 SESSION_BACKEND に応じたセッションサービス"""
+    if SESSION_BACKEND.lower() == 'sqlite':
+        print(f"🗄️ SQLiteセッションサービス: {SESSION_DB_PATH}")
+        return SQLiteSessionService()
+    from google.adk.sessions import InMemorySessionService
+    return InMemorySessionService()
@@ -1,192 +1,692 @@
-from google.adk.agents import LlmAgent, SequentialAgent
+from google.adk.agents import BaseAgent, LlmAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models import BaseLlm, LLMRegistry, LlmRequest
 from google.adk.tools import google_search, BaseTool
-from typing import Dict, List, Any
-from pydantic import BaseModel, Field
+from google.genai import types
+from typing import AsyncGenerator, Dict, List, Any, Optional, Tuple, Union
+from pydantic import PrivateAttr
+import asyncio
 import json
-import re
+import os
+import time
 
-# Pydanticモデル定義
-class HTMLOutput(BaseModel):
-    """1行形式の純粋なHTML出力用のスキーマ"""
-    html: str = Field(
-        description="Complete HTML document in single line format starting with <!DOCTYPE html> and ending with </html>. No newlines, no indentation, no code blocks, no JSON, just raw HTML in one line."
-    )
+from agent_telemetry import instrument, telemetry, telemetry_enabled
+
+from .geo_index import DEFAULT_NEARBY_RADIUS_M, haversine_m, travel_phrase, travel_text, walking_route
+from .html_renderer import PAGE_TAIL, render_page_head, render_spot_card, render_tourism_html
+from .latency_metrics import latency_tracker
+from .result_cache import CACHED_STATE_KEYS, get_result_cache, normalize_search_params
+from .intent_rules import DEFAULT_CONFIDENCE_THRESHOLD, extract_search_params, intent_stats
+from .spot_catalog import DEFAULT_AREA, DEFAULT_CATEGORY, SPOT_CATALOG, SpotCatalog
+from .spot_ranker import RankingWeights, SpotRanker
+from .spot_store import SQLiteSpotStore
+from .stage_schemas import (
+    HTMLOutput, SearchParams, html_output_callback, parse_stage, stage_output, stage_state,
+    structured_output_callback
+)
+from .state_retention import StateRetention, retention_stats
+from .state_projection import (
+    KeyProjection, StateProjection, estimate_tokens, record_projection
+)
+
+# HTML生成モード: template（テンプレート描画、デフォルト） / creative（LLMによる自由レイアウト）
+HTML_MODE = os.getenv('TOURISM_HTML_MODE', 'template')
+
+# 観光スポットデータソース: SQLiteファイルを指定するとSQLiteストア、未指定なら組み込みカタログ
+SPOT_DB_PATH = os.getenv('TOURISM_SPOT_DB')
+
+# ストリーミングモード: ページ骨組みとスポットごとのカードHTML断片を順次イベント送出
+STREAM_CARDS = os.getenv('TOURISM_STREAM_CARDS', 'false').lower() in ('1', 'true', 'yes')
+
+# ルールベース意図抽出の信頼度がこの値未満の場合のみLLMで抽出
+INTENT_CONFIDENCE_THRESHOLD = float(
+    os.getenv('TOURISM_INTENT_CONFIDENCE_THRESHOLD', str(DEFAULT_CONFIDENCE_THRESHOLD))
+)
+
+# 候補取得方式: structured（エリア・カテゴリの索引、デフォルト） / semantic（自由記述の意味検索） / hybrid（両方を併合）
+RETRIEVAL_MODE = os.getenv('TOURISM_RETRIEVAL_MODE', 'structured')
+# hybridモードで選定ステージに渡す候補数の上限
+HYBRID_MAX_CANDIDATES = 10
+
+# 選定するスポット数
+SELECTION_TOP_K = int(os.getenv('TOURISM_SELECTION_TOP_K', '5'))
+
+# 入力の射影: LLMステージには会話履歴の代わりに必要なstateのキー・フィールドだけを渡す（off で従来どおり全履歴）
+STATE_PROJECTION = os.getenv('TOURISM_STATE_PROJECTION', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+# 計測コールバック（実行時間・トークン数・stateサイズ）: AGENT_TELEMETRY=off で無効
+TELEMETRY_ENABLED = telemetry_enabled()
+
+# 説明文生成の同時実行数上限（スポットごとに1回ずつモデルを呼び出す）
+DESCRIPTION_CONCURRENCY = int(os.getenv('TOURISM_DESCRIPTION_CONCURRENCY', '5'))
 
 # カスタムツールとして実装（より安定）
 class TourismSpotsSearchTool(BaseTool):
     """観光スポット検索を行うツール"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        catalog: Union[SpotCatalog, SQLiteSpotStore] = SPOT_CATALOG,
+        retrieval_mode: str = RETRIEVAL_MODE
+    ):
         super().__init__(
             name="tourism_spots_search",
             description="観光スポットの検索を実行"
         )
+        self.catalog = catalog
+        self.retrieval_mode = retrieval_mode
     
     async def run_async(self, search_params: Dict[str, Any]) -> str:
         """固定観光スポットデータを返す"""
+        return json.dumps(self.search(search_params), ensure_ascii=False, indent=2)
+    
+    def search(self, search_params: Dict[str, Any]) -> Dict[str, Any]:
+        """検索パラメータから観光スポットを検索（LLM不要の同期処理）"""
         try:
             # パラメータの取得
             area = search_params.get('area', '')
             category = search_params.get('category', '')
             season = search_params.get('season', '')
             requests = search_params.get('requests', [])
+            near = search_params.get('near', '')
             
             # 検索クエリを構築（ログ用）
             basic_query = f"{area} {category} {season} 観光スポット"
             if requests:
                 basic_query += " " + " ".join(requests)
+            if near:
+                basic_query += f" {near}周辺"
             
             print(f"固定データ検索: {basic_query}")
             
-            # 固定データを取得
-            spots = self._get_tourism_spots_data(search_params)
+            # 近接条件があれば位置情報インデックスで検索し、該当なしの場合は通常検索
+            spots = self._get_nearby_spots(search_params) if near else []
+            if not spots:
+                spots = self._retrieve(search_params)
             
-            return json.dumps({
+            return {
                 "tourism_spots": spots,
                 "total_found": len(spots),
                 "search_query": basic_query,
                 "status": "success"
-            }, ensure_ascii=False, indent=2)
+            }
             
         except Exception as e:
-            return json.dumps({
-                "tourism_spots": self._get_tourism_spots_data(search_params),
-                "total_found": 5,
+            spots = self._get_tourism_spots_data({})
+            return {
+                "tourism_spots": spots,
+                "total_found": len(spots),
                 "status": "error",
                 "error_message": str(e)
-            }, ensure_ascii=False, indent=2)
+            }
     
     def _get_tourism_spots_data(self, params: Dict) -> List[Dict]:
-        """エリアとカテゴリに応じた固定観光スポットデータ"""
-        area = params.get('area', '東京')
-        category = params.get('category', '歴史')
+        """エリアとカテゴリに応じた観光スポットデータ（事前構築済みカタログを参照）"""
+        area = params.get('area') or DEFAULT_AREA
+        category = params.get('category') or DEFAULT_CATEGORY
+        season = params.get('season') or None
+        requests = params.get('requests') or []
+        if isinstance(requests, str):
+            requests = [requests]
         
-        # エリア別の観光スポットデータベース
-        tourism_database = {
-            '東京': {
-                '歴史': [
-                    {'name': '浅草寺', 'description': '東京最古の寺院として親しまれる由緒ある観光地'},
-                    {'name': '明治神宮', 'description': '明治天皇を祀る神社で都心のオアシス'},
-                    {'name': '東京国立博物館', 'description': '日本と東洋の文化財を展示する国内最大の博物館'},
-                ],
-                '自然': [
-                    {'name': '上野恩賜公園', 'description': '桜の名所として有名で多くの文化施設も併設'},
-                    {'name': '新宿御苑', 'description': '都心にある広大な庭園で四季を感じられる'},
-                ],
-                '現代': [
-                    {'name': '東京スカイツリー', 'description': '東京の新しいシンボルタワー'},
-                    {'name': 'お台場', 'description': '未来的な街並みとエンターテイメントが楽しめる'},
-                ],
-                '文化': [
-                    {'name': '歌舞伎座', 'description': '伝統的な歌舞伎を楽しめる劇場'},
-                    {'name': '国立新美術館', 'description': '現代アートの展示で有名な美術館'},
-                ]
-            },
-            '京都': {
-                '歴史': [
-                    {'name': '清水寺', 'description': '世界遺産に登録された古都京都の象徴的な寺院'},
-                    {'name': '金閣寺', 'description': '金色に輝く美しい舎利殿で有名'},
-                    {'name': '伏見稲荷大社', 'description': '千本鳥居で有名な稲荷神社の総本宮'},
-                ],
-                '自然': [
-                    {'name': '嵐山', 'description': '美しい竹林と渡月橋で有名な景勝地'},
-                    {'name': '哲学の道', 'description': '桜並木が美しい散歩道'},
-                ],
-                '文化': [
-                    {'name': '祇園', 'description': '舞妓さんが歩く伝統的な花街'},
-                    {'name': '二条城', 'description': '徳川将軍の京都での居住地として使われた城'},
-                ]
-            },
-            '大阪': {
-                '歴史': [
-                    {'name': '大阪城', 'description': '豊臣秀吉が築いた名城'},
-                    {'name': '住吉大社', 'description': '全国の住吉神社の総本社'},
-                ],
-                '現代': [
-                    {'name': '通天閣', 'description': '大阪のシンボルタワー'},
-                    {'name': 'ユニバーサル・スタジオ・ジャパン', 'description': '人気のテーマパーク'},
-                ],
-                '文化': [
-                    {'name': '道頓堀', 'description': '大阪の食文化とエンターテイメントが集まる繁華街'},
-                ]
-            }
-        }
+        return [spot.to_dict() for spot in self.catalog.lookup(area, category, season, requests)]
+    
+    def _retrieve(self, params: Dict) -> List[Dict]:
+        """候補取得方式に応じてスポットを取得（意味検索で該当なしの場合は索引検索）"""
+        if self.retrieval_mode == 'semantic':
+            return self._get_semantic_spots(params, HYBRID_MAX_CANDIDATES) or self._get_tourism_spots_data(params)
+        spots = self._get_tourism_spots_data(params)
+        if self.retrieval_mode == 'hybrid':
+            names = {spot['name'] for spot in spots}
+            for spot in self._get_semantic_spots(params, HYBRID_MAX_CANDIDATES):
+                if len(spots) >= HYBRID_MAX_CANDIDATES:
+                    break
+                if spot['name'] not in names:
+                    names.add(spot['name'])
+                    spots.append(spot)
+        return spots
+    
+    def _get_semantic_spots(self, params: Dict, k: int) -> List[Dict]:
+        """入力文（なければ要望・カテゴリ・季節）に意味が近いスポットをエリア内から取得"""
+        text = semantic_query(params)
+        spots = []
+        for score, spot in self.catalog.semantic_search(text, params.get('area') or None, k):
+            spot_dict = spot.to_dict()
+            spot_dict['similarity'] = round(score, 4)
+            spots.append(spot_dict)
+        return spots
+    
+    def _get_nearby_spots(self, params: Dict) -> List[Dict]:
+        """基準地点（駅名・スポット名）から半径内のスポットを近い順に取得"""
+        near = str(params.get('near') or '').strip()
+        coordinates = self.catalog.place_coordinates(near)
+        if coordinates is None:
+            print(f"基準地点が見つかりません: {near}")
+            return []
         
-        # デフォルトエリア（指定がない場合）
-        if area not in tourism_database:
-            area = '東京'
+        try:
+            radius_m = float(params.get('radius_km') or 0) * 1000 or DEFAULT_NEARBY_RADIUS_M
+        except (TypeError, ValueError):
+            radius_m = DEFAULT_NEARBY_RADIUS_M
         
-        area_spots = tourism_database[area]
         spots = []
+        for distance, spot in self.catalog.near(*coordinates, radius_m, params.get('category') or None):
+            if spot.name == near:
+                continue
+            spot_dict = spot.to_dict()
+            spot_dict['distance_m'] = round(distance)
+            spot_dict['proximity'] = travel_text(near, distance)
+            spots.append(spot_dict)
+        return spots
+
+
+def semantic_query(search_params: Dict[str, Any]) -> str:
+    """意味検索のクエリ文（入力文があればそのまま、なければ抽出済みの条件を連結）"""
+    query = str(search_params.get('query') or '').strip()
+    if query:
+        return query
+    requests = search_params.get('requests') or []
+    if isinstance(requests, str):
+        requests = [requests]
+    return ' '.join(str(v) for v in (*requests, search_params.get('category'), search_params.get('season')) if v)
+
+
+class SpotSearchAgent(BaseAgent):
+    """TourismSpotsSearchToolを直接実行する検索ステージ（LLM呼び出しなし）"""
+    
+    search_tool: TourismSpotsSearchTool
+    
+    model_config = {"arbitrary_types_allowed": True}
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        search_params = stage_state(ctx.session.state, 'search_params')
+        search_results = stage_output('search_results', self.search_tool.search(search_params))
         
-        # 指定カテゴリから優先的に選択、他カテゴリからも補完
-        if category in area_spots:
-            spots.extend(area_spots[category][:3])  # 指定カテゴリから最大3つ
+        # 後続のLLMステージが会話履歴から参照できるようにテキストとしても出力
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(
+                role='model',
+                parts=[types.Part(text=json.dumps(search_results, ensure_ascii=False))]
+            ),
+            actions=EventActions(state_delta={'search_results': search_results})
+        )
+
+
+class HTMLRenderAgent(BaseAgent):
+    """テンプレートから1行形式HTMLを生成するステージ（LLM呼び出しなし）"""
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        html = render_tourism_html(
+            stage_state(state, 'search_params'),
+            stage_state(state, 'selected_spots')['selected_spots'],
+            stage_state(state, 'descriptions')['descriptions']
+        )
         
-        # 他のカテゴリからも補完
-        for cat, places in area_spots.items():
-            if cat != category and len(spots) < 6:
-                spots.extend(places[:2])  # 他カテゴリから各2つまで
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role='model', parts=[types.Part(text=html)]),
+            actions=EventActions(state_delta={'html': html})
+        )
+
+
+class SpotRankingAgent(BaseAgent):
+    """検索結果の全候補を特徴量配列で一括採点し、多様性を考慮して上位を選定するステージ（LLM呼び出しなし）"""
+    
+    ranker: SpotRanker
+    top_k: int = SELECTION_TOP_K
+    
+    model_config = {"arbitrary_types_allowed": True}
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        search_params = stage_state(state, 'search_params')
+        candidates = stage_state(state, 'search_results')['tourism_spots']
         
-        # データを構造化
-        structured_spots = []
-        for i, spot in enumerate(spots[:6]):  # 最大6件
-            structured_spots.append({
-                'name': spot['name'],
-                'area': f'{area}',
-                'category': self._get_spot_category(spot['name']),
-                'description': spot['description'],
-                'features': self._get_features_for_category(category),
-                'access': f'{area}駅から電車で30分以内',
-                'best_season': self._get_best_season(category),
-                'atmosphere': self._get_atmosphere(category)
-            })
+        selected = self.ranker.rank(candidates, search_params, self.top_k)
+        print(f"スポット選定: {len(candidates)}件中{len(selected)}件 ({', '.join(spot['name'] for spot in selected)})")
         
-        return structured_spots
-    
-    def _get_spot_category(self, name: str) -> str:
-        """スポット名からカテゴリを推測"""
-        if any(word in name for word in ['寺', '神社', '城', '宮']):
-            return '歴史'
-        elif any(word in name for word in ['公園', '山', '川', '海']):
-            return '自然'
-        elif any(word in name for word in ['タワー', 'スタジオ', 'センター']):
-            return '現代'
-        else:
-            return '文化'
+        output = stage_output('selected_spots', {"selected_spots": selected})
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(
+                role='model',
+                parts=[types.Part(text=json.dumps(output, ensure_ascii=False))]
+            ),
+            actions=EventActions(state_delta={'selected_spots': output})
+        )
+
+
+def spot_coordinates(spot: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """スポットdictの座標（未登録ならNone）"""
+    lat, lon = spot.get('lat'), spot.get('lon')
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return float(lat), float(lon)
+    return None
+
+
+class WalkingRouteAgent(BaseAgent):
+    """選定スポットを巡る距離が短い順に並べ替え、区間ごとの移動目安を付与するステージ（LLM呼び出しなし）"""
     
-    def _get_features_for_category(self, category: str) -> List[str]:
-        """カテゴリに応じた特徴を返す"""
-        base_features = ['写真撮影可', 'アクセス良好']
+    search_tool: TourismSpotsSearchTool
+    
+    model_config = {"arbitrary_types_allowed": True}
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        search_params = stage_state(state, 'search_params')
+        spots = stage_state(state, 'selected_spots')['selected_spots']
         
-        if '歴史' in category:
-            return base_features + ['文化財', '由緒ある']
-        elif '自然' in category:
-            return base_features + ['四季が美しい', 'リラックス']
-        elif '現代' in category:
-            return base_features + ['最新技術', 'エンターテイメント']
-        else:
-            return base_features + ['伝統文化', '体験可能']
-    
-    def _get_best_season(self, category: str) -> str:
-        """カテゴリに応じたベストシーズンを返す"""
-        if '自然' in category:
-            return '春・秋'
-        elif '歴史' in category:
-            return '通年'
-        else:
-            return '通年'
-    
-    def _get_atmosphere(self, category: str) -> str:
-        """カテゴリに応じた雰囲気を返す"""
-        if '歴史' in category:
-            return '荘厳で静寂'
-        elif '自然' in category:
-            return '開放的で癒される'
-        elif '現代' in category:
-            return '活気あふれる'
+        # 選定結果に座標が含まれない場合（キャッシュ済みの旧形式など）は検索結果・カタログから補う
+        known = {spot['name']: spot for spot in stage_state(state, 'search_results')['tourism_spots']}
+        for spot in spots:
+            source = known.get(spot.get('name'), {})
+            for key in ('lat', 'lon', 'access', 'proximity'):
+                if key not in spot and key in source:
+                    spot[key] = source[key]
+            if spot_coordinates(spot) is None:
+                coordinates = self.search_tool.catalog.place_coordinates(str(spot.get('name') or ''))
+                if coordinates is not None:
+                    spot['lat'], spot['lon'] = coordinates
+        
+        located = [spot for spot in spots if spot_coordinates(spot) is not None]
+        if len(located) >= 2:
+            # 基準地点の指定があればそこを始点に固定
+            origin = self.search_tool.catalog.place_coordinates(str(search_params.get('near') or '')) \
+                if search_params.get('near') else None
+            points = ([origin] if origin else []) + [spot_coordinates(spot) for spot in located]
+            order = walking_route(points, start=0 if origin else None)
+            if origin:
+                order = [index - 1 for index in order if index != 0]
+            ordered = [located[index] for index in order]
+            for current, following in zip(ordered, ordered[1:]):
+                distance = haversine_m(*spot_coordinates(current), *spot_coordinates(following))
+                current['next_leg'] = f"次の「{following.get('name', '')}」まで{travel_phrase(distance)}"
+            # 座標不明のスポットは末尾に残す
+            spots = ordered + [spot for spot in spots if spot_coordinates(spot) is None]
+            print(f"巡回順: {' → '.join(str(spot.get('name')) for spot in ordered)}")
+        
+        output = stage_output('selected_spots', {"selected_spots": spots})
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(
+                role='model',
+                parts=[types.Part(text=json.dumps(output, ensure_ascii=False))]
+            ),
+            actions=EventActions(state_delta={'selected_spots': output})
+        )
+
+
+def user_message_text(ctx: InvocationContext) -> str:
+    """呼び出し元のユーザーメッセージをテキストとして取り出す"""
+    if not ctx.user_content or not ctx.user_content.parts:
+        return ''
+    return ''.join(part.text for part in ctx.user_content.parts if part.text)
+
+
+class IntentRouterAgent(BaseAgent):
+    """ルールベース抽出で十分な信頼度が得られればLLMを呼ばずにsearch_paramsを確定するステージ"""
+    
+    confidence_threshold: float = INTENT_CONFIDENCE_THRESHOLD
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        message = user_message_text(ctx)
+        search_params = extract_search_params(message)
+        # 意味検索用に入力文も保持
+        search_params['query'] = message.strip()
+        search_params = stage_output('search_params', search_params)
+        fast_path = search_params['confidence'] >= self.confidence_threshold
+        intent_stats.record(fast_path)
+        
+        print(
+            f"意図抽出: {'ルールベース' if fast_path else 'LLMフォールバック'} "
+            f"(confidence={search_params['confidence']:.2f}, "
+            f"fast pathヒット率={intent_stats.hit_rate:.1%} / {intent_stats.total}件)"
+        )
+        
+        if fast_path:
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                content=types.Content(
+                    role='model',
+                    parts=[types.Part(text=json.dumps(search_params, ensure_ascii=False))]
+                ),
+                actions=EventActions(state_delta={'search_params': search_params})
+            )
+            return
+        
+        # 信頼度不足: LLMによる抽出にフォールバック
+        for sub_agent in self.sub_agents:
+            async for event in sub_agent.run_async(ctx):
+                yield event
+
+
+def fragment_event(
+    ctx: InvocationContext, author: str, html: str, metadata: Dict[str, Any]
+) -> Event:
+    """逐次表示用のHTML断片イベント（partialのためセッションには保存されない）"""
+    return Event(
+        invocation_id=ctx.invocation_id,
+        author=author,
+        branch=ctx.branch,
+        partial=True,
+        content=types.Content(role='model', parts=[types.Part(text=html)]),
+        custom_metadata=metadata
+    )
+
+
+def fallback_description(spot: Dict[str, Any]) -> str:
+    """説明文生成に失敗したスポット用の代替説明文"""
+    description = spot.get('description')
+    if description:
+        return description
+    return f"{spot.get('area', '')}の{spot.get('category', '')}スポット「{spot.get('name', '')}」"
+
+
+class ParallelDescriptionAgent(BaseAgent):
+    """スポットごとに短いモデル呼び出しを並列実行し、説明文を元の順序でまとめるステージ"""
+    
+    model: Union[str, BaseLlm]
+    instruction: str
+    max_concurrency: int = DESCRIPTION_CONCURRENCY
+    stream_cards: bool = STREAM_CARDS
+    input_projection: Optional[StateProjection] = None
+    
+    _llm: Union[BaseLlm, None] = PrivateAttr(default=None)
+    
+    model_config = {"arbitrary_types_allowed": True}
+    
+    @property
+    def llm(self) -> BaseLlm:
+        if self._llm is None:
+            self._llm = self.model if isinstance(self.model, BaseLlm) else LLMRegistry.new_llm(self.model)
+        return self._llm
+    
+    async def _describe_spot(
+        self,
+        ctx: InvocationContext,
+        spot: Dict[str, Any],
+        search_params: Dict[str, Any],
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        """1スポット分の説明文を生成"""
+        payload = {"spot": spot, "search_params": search_params}
+        if self.input_projection is not None:
+            prompt = self.input_projection.render(payload)
+            record_projection(
+                ctx.invocation_id, self.name, estimate_tokens(json.dumps(payload, ensure_ascii=False)), estimate_tokens(prompt)
+            )
         else:
-            return '文化的で洗練された'
+            prompt = json.dumps(payload, ensure_ascii=False)
+        llm_request = LlmRequest(
+            model=self.llm.model,
+            contents=[types.Content(role='user', parts=[types.Part(text=prompt)])],
+            config=types.GenerateContentConfig(system_instruction=self.instruction)
+        )
+        
+        text = ''
+        usage = None
+        async with semaphore:
+            # LlmAgentを経由しないため、モデル呼び出しの計測はここで記録
+            started = time.perf_counter()
+            try:
+                async for llm_response in self.llm.generate_content_async(llm_request):
+                    if llm_response.usage_metadata:
+                        usage = llm_response.usage_metadata
+                    if llm_response.content and llm_response.content.parts:
+                        text += ''.join(
+                            part.text for part in llm_response.content.parts
+                            if part.text and not part.thought
+                        )
+            except Exception as e:
+                if TELEMETRY_ENABLED:
+                    telemetry.record_model_call(
+                        ctx.invocation_id, self.name, llm_request.model, time.perf_counter() - started, error=e
+                    )
+                raise
+            if TELEMETRY_ENABLED:
+                telemetry.record_model_call(
+                    ctx.invocation_id, self.name, llm_request.model, time.perf_counter() - started, usage=usage
+                )
+        
+        description = ' '.join(text.split())
+        if not description:
+            raise ValueError("空の説明文が返されました")
+        return description
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        search_params = stage_state(state, 'search_params')
+        spots = stage_state(state, 'selected_spots')['selected_spots']
+        
+        if self.stream_cards:
+            yield fragment_event(
+                ctx, self.name, render_page_head(search_params, len(spots)),
+                {"fragment": "page_head", "spot_count": len(spots)}
+            )
+        
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        
+        async def describe(index: int, spot: Dict[str, Any]):
+            try:
+                return index, await self._describe_spot(ctx, spot, search_params, semaphore)
+            except Exception as e:
+                # 失敗したスポットのみ代替説明文に差し替え
+                print(f"説明文生成失敗: {spot.get('name')} - {e}")
+                return index, fallback_description(spot)
+        
+        tasks = [asyncio.ensure_future(describe(i, spot)) for i, spot in enumerate(spots)]
+        results: List[str] = [''] * len(spots)
+        try:
+            # 完了した順に受け取り、ストリーミングモードではカードを即時送出
+            for future in asyncio.as_completed(tasks):
+                index, description = await future
+                results[index] = description
+                if self.stream_cards:
+                    ttfc = latency_tracker.mark_first_card(ctx.invocation_id)
+                    if ttfc is not None:
+                        print(f"最初のカード送出: {ttfc:.3f}秒")
+                    yield fragment_event(
+                        ctx, self.name, render_spot_card(spots[index], description),
+                        {"fragment": "spot_card", "index": index, "name": spots[index].get('name', '')}
+                    )
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if self.stream_cards:
+            yield fragment_event(ctx, self.name, PAGE_TAIL, {"fragment": "page_tail"})
+        
+        # 元の順序でまとめる
+        descriptions = [
+            {"name": spot.get('name', ''), "description": description}
+            for spot, description in zip(spots, results)
+        ]
+        
+        output = stage_output('descriptions', {"descriptions": descriptions})
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(
+                role='model',
+                parts=[types.Part(text=json.dumps(output, ensure_ascii=False))]
+            ),
+            actions=EventActions(state_delta={'descriptions': output})
+        )
+
+
+def _produces_html(event: Event) -> bool:
+    """イベントがstateのhtmlを書き込むか"""
+    return bool(event.actions and event.actions.state_delta and event.actions.state_delta.get('html'))
+
+
+class CachedWorkflowAgent(BaseAgent):
+    """意図抽出後のsearch_paramsをキーに、以降のステージの結果をキャッシュするワークフロー
+    
+    sub_agents[0]: 意図抽出ステージ、sub_agents[1]: 検索〜HTML生成パイプライン
+    retention: htmlを生成した後のstateの保持ポリシー（Noneなら全てのキーを保持）
+    """
+    
+    retention: Optional[StateRetention] = None
+    
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        latency_tracker.start(ctx.invocation_id)
+        # 最新の結果の履歴が参照しているhtml（今回のhtmlで上書きされる前に履歴へ移す）
+        previous_html = ctx.session.state.get('html')
+        try:
+            async for event in self._run_stages(ctx):
+                if self.retention is not None and _produces_html(event):
+                    self._compact_into(ctx, event, previous_html)
+                    previous_html = event.actions.state_delta['html']
+                yield event
+        finally:
+            latency = latency_tracker.finish(ctx.invocation_id)
+            if latency['total_latency'] is not None:
+                if TELEMETRY_ENABLED:
+                    telemetry.record_workflow_latency(self.name, latency['total_latency'], latency['time_to_first_card'])
+                # 非ストリーミングではカードを順次送出しないため、最初のカードまでの時間はない
+                ttfc = latency['time_to_first_card']
+                first_card = f"{ttfc:.3f}秒" if ttfc is not None else 'なし'
+                print(f"レイテンシ: 最初のカード {first_card} / 合計 {latency['total_latency']:.3f}秒")
+    
+    def _compact_into(self, ctx: InvocationContext, event: Event, previous_html: Optional[str]) -> None:
+        """htmlを書き込むイベントのstate_deltaに、中間キーの削除と直近N件の履歴の更新を加える（別のイベントにしない）"""
+        state_delta = event.actions.state_delta
+        delta = self.retention.compact({**ctx.session.state, **state_delta}, previous_html)
+        if not delta:
+            return
+        state_delta.update(delta)
+        before, after = retention_stats.last
+        print(f"state保持: {before:,}B → {after:,}B（削除 {', '.join(k for k, v in delta.items() if v is None) or 'なし'}）")
+    
+    async def _run_stages(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        intent_stage, pipeline = self.sub_agents
+        
+        async for event in intent_stage.run_async(ctx):
+            yield event
+        
+        cache = get_result_cache()
+        search_params = parse_stage('search_params', ctx.session.state.get('search_params'))
+        if cache is None or search_params is None:
+            async for event in pipeline.run_async(ctx):
+                yield event
+            return
+        
+        cache_key = normalize_search_params(search_params.model_dump(exclude_none=True), include_query=RETRIEVAL_MODE != 'structured')
+        cached = cache.get(cache_key)
+        print(f"結果キャッシュ: {'ヒット' if cached else 'ミス'} {cache_key} {cache.metrics.to_dict()}")
+        
+        if cached is not None:
+            # キャッシュヒット: 残りのステージを省略して保存済みの結果を返す
+            # （保持ポリシーで削除する中間キーは、_compact_into がこのイベントのstate_deltaでNoneに置き換える）
+            # ストリーミングモードでは保存済みのページ全体が最初のカードになる
+            if STREAM_CARDS:
+                latency_tracker.mark_first_card(ctx.invocation_id)
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                content=types.Content(role='model', parts=[types.Part(text=cached['html'])]),
+                actions=EventActions(state_delta=dict(cached))
+            )
+            return
+        
+        results = None
+        async for event in pipeline.run_async(ctx):
+            if _produces_html(event):
+                # 保持ポリシーで中間キーが削除される前の値を保存する
+                state = {**ctx.session.state, **event.actions.state_delta}
+                results = {key: state.get(key) for key in CACHED_STATE_KEYS}
+            yield event
+        
+        # 今回の実行でhtmlを書いた場合のみ保存（前回の結果のhtmlが残っていても今回の検索条件では保存しない）
+        if results is not None:
+            cache.set(cache_key, results)
+
+
+# ステージごとの入力の射影（LLMに渡すstateのキー・フィールド）
+SEARCH_PARAMS_PROJECTION = KeyProjection(fields=('area', 'category', 'season', 'requests', 'near'))
+
+# 意図抽出: 今回のユーザー入力のみ（過去の会話・検索結果は不要）
+INTENT_PROJECTION = StateProjection(include_user_message=True)
+
+# 説明文: スポット1件の説明に使う項目と検索条件のみ（座標・スコア・移動目安は除外）
+DESCRIPTION_PROJECTION = StateProjection({
+    'spot': KeyProjection(
+        fields=('name', 'area', 'category', 'description', 'features', 'atmosphere', 'best_season', 'access', 'proximity'),
+        max_items=6,
+        max_chars=200
+    ),
+    'search_params': SEARCH_PARAMS_PROJECTION
+})
+
+# creativeモードのHTML生成: カード描画に使う項目のみ（検索結果全件・会話履歴は除外）
+UI_PROJECTION = StateProjection({
+    'search_params': SEARCH_PARAMS_PROJECTION,
+    'selected_spots': KeyProjection(
+        fields=('name', 'area', 'category', 'access', 'proximity', 'best_season', 'features', 'next_leg'),
+        max_items=10,
+        max_chars=120
+    ),
+    'descriptions': KeyProjection(fields=('name', 'description'), max_chars=300)
+})
+
+# HTML抽出: 直前のUI生成の出力のみ
+EXTRACTOR_PROJECTION = StateProjection({'structured_html': KeyProjection()})
+
+
+def projection_callback(projection: StateProjection):
+    """射影が有効な場合のbefore_model_callback"""
+    return projection.before_model_callback if STATE_PROJECTION else None
+
+
+def rule_based_search_params(callback_context) -> Dict[str, Any]:
+    """意図抽出の応答を修復できない場合の代替値（ルールベース抽出の結果）"""
+    content = callback_context.user_content
+    message = ''.join(part.text for part in content.parts if part.text) if content and content.parts else ''
+    search_params = extract_search_params(message)
+    search_params['query'] = message.strip()
+    return search_params
+
+
+def template_html_output(callback_context) -> Dict[str, Any]:
+    """creativeモードのHTML生成の応答を修復できない場合の代替値（テンプレート描画のHTML）"""
+    state = callback_context.state
+    return {"html": render_tourism_html(
+        stage_state(state, 'search_params'),
+        stage_state(state, 'selected_spots')['selected_spots'],
+        stage_state(state, 'descriptions')['descriptions']
+    )}
+
 
 # エージェントの定義
 # 1. 意図理解エージェント
@@ -200,118 +700,75 @@ simple_intent_agent = LlmAgent(
     2. カテゴリ（例：歴史、自然、現代、文化）
     3. 季節（例：春、夏、秋、冬）
     4. 特別な要望（例：写真撮影、体験、静か、アクセス）
+    5. 基準地点（「〇〇駅の近く」「〇〇周辺」などの駅名・スポット名。なければ空文字）
     
     必ずJSONで出力：
     {
         "area": "東京",
         "category": "歴史",
         "season": "春",
-        "requests": ["写真撮影", "静か"]
+        "requests": ["写真撮影", "静か"],
+        "near": "上野駅"
     }""",
-    output_key="search_params"
+    output_schema=SearchParams,
+    output_key="search_params",
+    before_model_callback=projection_callback(INTENT_PROJECTION),
+    after_model_callback=structured_output_callback('search_params', fallback=rule_based_search_params)
 )
 
-# 2. 検索実行エージェント（固定データ返却）
-simple_search_agent = LlmAgent(
-    name="SimpleSearchAgent",
-    model="gemini-2.0-flash-exp",
-    description="観光スポット情報を取得（固定データ）",
-    instruction="""以下の固定観光スポットデータを返してください：
+# 1'. 意図理解ルーター（ルールベース抽出 + LLMフォールバック）
+intent_router_agent = IntentRouterAgent(
+    name="IntentRouterAgent",
+    description="ルールベースで検索条件を抽出し、信頼度不足時のみLLMで抽出",
+    sub_agents=[simple_intent_agent]
+)
 
-    {
-        "tourism_spots": [
-            {"name": "浅草寺", "area": "東京", "category": "歴史", "description": "東京最古の寺院として親しまれる由緒ある観光地", "url": "https://example.com/sensoji"},
-            {"name": "明治神宮", "area": "東京", "category": "歴史", "description": "明治天皇を祀る神社で都心のオアシス", "url": "https://example.com/meiji"},
-            {"name": "上野恩賜公園", "area": "東京", "category": "自然", "description": "桜の名所として有名で多くの文化施設も併設", "url": "https://example.com/ueno"},
-            {"name": "東京スカイツリー", "area": "東京", "category": "現代", "description": "東京の新しいシンボルタワー", "url": "https://example.com/skytree"},
-            {"name": "清水寺", "area": "京都", "category": "歴史", "description": "世界遺産に登録された古都京都の象徴的な寺院", "url": "https://example.com/kiyomizu"},
-            {"name": "金閣寺", "area": "京都", "category": "歴史", "description": "金色に輝く美しい舎利殿で有名", "url": "https://example.com/kinkaku"},
-            {"name": "嵐山", "area": "京都", "category": "自然", "description": "美しい竹林と渡月橋で有名な景勝地", "url": "https://example.com/arashiyama"},
-            {"name": "大阪城", "area": "大阪", "category": "歴史", "description": "豊臣秀吉が築いた名城", "url": "https://example.com/osaka-castle"},
-            {"name": "通天閣", "area": "大阪", "category": "現代", "description": "大阪のシンボルタワー", "url": "https://example.com/tsutenkaku"},
-            {"name": "道頓堀", "area": "大阪", "category": "文化", "description": "大阪の食文化とエンターテイメントが集まる繁華街", "url": "https://example.com/dotonbori"}
-        ],
-        "total_found": 10,
-        "search_query": "観光スポット検索",
-        "status": "success"
-    }""",
-    output_key="search_results"
+# 2. 検索実行エージェント（TourismSpotsSearchToolを直接実行）
+simple_search_agent = SpotSearchAgent(
+    name="SimpleSearchAgent",
+    description="観光スポット情報を取得（固定データ、LLM呼び出しなし）",
+    search_tool=TourismSpotsSearchTool(
+        catalog=SQLiteSpotStore(SPOT_DB_PATH) if SPOT_DB_PATH else SPOT_CATALOG
+    )
 )
 
-# 3. スポット選定エージェント
-simple_selection_agent = LlmAgent(
+# 3. スポット選定エージェント（NumPyによる一括採点 + MMR、LLM呼び出しなし）
+simple_selection_agent = SpotRankingAgent(
     name="SimpleSelectionAgent",
-    model="gemini-2.0-flash-exp",
-    description="検索結果から5つの観光スポットを選定",
-    instruction="""検索結果（state['search_results']）から、
-    ユーザーの条件（state['search_params']）に最も合う
-    5つの観光スポットを必ず選んでください。
-    
-    重要: tourism_spots配列から必ず5スポットを選択し、以下の形式で出力してください：
-    {
-        "selected_spots": [
-            {
-                "name": "浅草寺",
-                "area": "東京",
-                "category": "歴史",
-                "description": "東京最古の寺院として親しまれる由緒ある観光地",
-                "reason": "歴史を感じられる代表的なスポット"
-            },
-            {
-                "name": "明治神宮",
-                "area": "東京", 
-                "category": "歴史",
-                "description": "明治天皇を祀る神社で都心のオアシス",
-                "reason": "都心で自然も感じられる神聖な場所"
-            },
-            {
-                "name": "上野恩賜公園",
-                "area": "東京",
-                "category": "自然", 
-                "description": "桜の名所として有名で多くの文化施設も併設",
-                "reason": "自然と文化が同時に楽しめる"
-            },
-            {
-                "name": "東京スカイツリー",
-                "area": "東京",
-                "category": "現代",
-                "description": "東京の新しいシンボルタワー", 
-                "reason": "現代的な東京の象徴"
-            },
-            {
-                "name": "清水寺",
-                "area": "京都",
-                "category": "歴史",
-                "description": "世界遺産に登録された古都京都の象徴的な寺院",
-                "reason": "日本の伝統美を体現する名所"
-            }
-        ]
-    }""",
-    output_key="selected_spots"
+    description="検索結果から条件に最適な観光スポットを選定（ローカル採点、LLM呼び出しなし）",
+    ranker=SpotRanker(RankingWeights.from_env()),
+    top_k=SELECTION_TOP_K
 )
 
-# 4. 説明文生成
-simple_description_agent = LlmAgent(
+# 3'. 巡回順の並べ替え（位置情報から徒歩ルート順と区間の移動目安を計算）
+walking_route_agent = WalkingRouteAgent(
+    name="WalkingRouteAgent",
+    description="選定スポットを巡回距離が短い順に並べ替え（LLM呼び出しなし）",
+    search_tool=simple_search_agent.search_tool
+)
+
+# 4. 説明文生成（スポットごとに並列実行）
+simple_description_agent = ParallelDescriptionAgent(
     name="SimpleDescriptionAgent",
     model="gemini-2.0-flash-exp",
-    description="各観光スポットの説明文を生成",
-    instruction="""選定された5つの観光スポット（state['selected_spots']）について、
-    ユーザーの希望（state['search_params']）を考慮して、
-    それぞれ150文字程度の魅力的な説明文を生成してください。
+    description="各観光スポットの説明文を並列生成",
+    instruction="""入力JSONのspot（観光スポット1件）について、
+    search_params（ユーザーの希望）を考慮して、
+    150文字程度の魅力的な説明文を1つ生成してください。
     
-    出力形式：
-    {
-        "descriptions": [
-            {
-                "name": "スポット名",
-                "description": "150文字程度の説明文..."
-            }
-        ]
-    }""",
-    output_key="descriptions"
+    説明文の本文のみを出力してください（JSON・見出し・コードブロックは不要）。""",
+    max_concurrency=DESCRIPTION_CONCURRENCY,
+    stream_cards=STREAM_CARDS,
+    input_projection=DESCRIPTION_PROJECTION if STATE_PROJECTION else None
+)
+
+# 5. HTML生成エージェント（テンプレート描画）
+html_render_agent = HTMLRenderAgent(
+    name="HTMLRenderAgent",
+    description="テンプレートから1行形式のHTML記事を生成（LLM呼び出しなし）"
 )
 
-# 5. UI生成エージェント（1行形式HTML出力）
+# 5'. UI生成エージェント（creativeモード: LLMによる1行形式HTML出力）
 simple_ui_agent = LlmAgent(
     name="SimpleUIAgent",
     model="gemini-2.0-flash-exp",
@@ -360,10 +817,12 @@ simple_ui_agent = LlmAgent(
     
     必ずHTMLOutputスキーマ形式で出力してください。""",
     output_schema=HTMLOutput,
-    output_key="structured_html"
+    output_key="structured_html",
+    before_model_callback=projection_callback(UI_PROJECTION),
+    after_model_callback=structured_output_callback('structured_html', fallback=template_html_output)
 )
 
-# 6. HTML抽出エージェント（1行形式で出力）
+# 6'. HTML抽出エージェント（creativeモード: 1行形式で出力）
 html_extractor_agent = LlmAgent(
     name="HTMLExtractorAgent",
     model="gemini-2.0-flash-exp",
@@ -384,19 +843,40 @@ html_extractor_agent = LlmAgent(
     - インデントや余分な空白は除去
     
     例: <!DOCTYPE html><html><head>...</head><body>...</body></html>""",
-    output_key="html"
+    output_key="html",
+    before_model_callback=projection_callback(EXTRACTOR_PROJECTION),
+    after_model_callback=html_output_callback
 )
 
-# ワークフロー
-root_agent = SequentialAgent(
-    name="TourismSpotsSearchWorkflow",
+# HTML生成ステージ（creativeモードのみLLMで自由レイアウトを生成）
+if HTML_MODE == 'creative':
+    html_stages = [simple_ui_agent, html_extractor_agent]
+else:
+    html_stages = [html_render_agent]
+
+# 検索〜HTML生成パイプライン（キャッシュヒット時は省略）
+generation_pipeline = SequentialAgent(
+    name="TourismSpotsGenerationPipeline",
     sub_agents=[
-        simple_intent_agent,
         simple_search_agent,
         simple_selection_agent,
+        walking_route_agent,
         simple_description_agent,
-        simple_ui_agent,
-        html_extractor_agent
+        *html_stages
     ],
-    description="観光スポット検索フロー（HTML生成付き）"
-)
\ No newline at end of file
+    description="観光スポット検索・選定・説明文・HTML生成"
+)
+
+# ワークフロー
+root_agent = CachedWorkflowAgent(
+    name="TourismSpotsSearchWorkflow",
+    sub_agents=[
+        intent_router_agent,
+        generation_pipeline
+    ],
+    description="観光スポット検索フロー（HTML生成付き）",
+    retention=StateRetention.from_env()
+)
+
+# 全ステージに計測コールバックを追加
+instrument(root_agent)
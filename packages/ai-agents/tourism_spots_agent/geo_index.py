@@ -0,0 +1,324 @@
+"""
+観光スポットの位置情報インデックス
+緯度経度の等間隔グリッドで半径検索・k近傍検索を行い、最寄り駅からのアクセス表記と徒歩ルート順を計算する
+"""
+
+import math
+from itertools import permutations
+from typing import Dict, Generic, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+
+EARTH_RADIUS_M = 6371008.8
+# 1度あたりの南北方向の距離
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+# デフォルトのグリッド幅（約1.1km四方）
+DEFAULT_CELL_DEGREES = 0.01
+
+# 徒歩速度（分速80m）と、道なりの距離を直線距離から見積もる係数
+WALKING_METERS_PER_MINUTE = 80
+ROUTE_DETOUR_FACTOR = 1.25
+# この時間を超える場合は徒歩ではなくバス・タクシー等の移動として表記
+MAX_WALKING_MINUTES = 20
+# 市街地のバス・タクシーの平均速度（時速20km）と乗り換え・待ち時間
+TRANSIT_METERS_PER_MINUTE = 20000 / 60
+TRANSIT_OVERHEAD_MINUTES = 5
+# 「近く」の検索半径のデフォルト（徒歩約20分）
+DEFAULT_NEARBY_RADIUS_M = 1500
+# 最寄り駅として扱う距離の上限（登録駅から遠い地域のスポットは駅からの表記にしない）
+MAX_STATION_DISTANCE_M = 5000
+
+# 主要駅の座標（アクセス表記と「〇〇駅の近く」の検索基準）
+STATIONS: Dict[str, Tuple[float, float]] = {
+    '東京駅': (35.6812, 139.7671),
+    '上野駅': (35.7138, 139.7770),
+    '浅草駅': (35.7107, 139.7976),
+    '押上駅': (35.7104, 139.8132),
+    '新宿駅': (35.6896, 139.7006),
+    '新宿御苑前駅': (35.6885, 139.7107),
+    '原宿駅': (35.6702, 139.7027),
+    '渋谷駅': (35.6580, 139.7016),
+    '乃木坂駅': (35.6663, 139.7262),
+    '東銀座駅': (35.6695, 139.7670),
+    '台場駅': (35.6257, 139.7714),
+    '京都駅': (34.9858, 135.7588),
+    '清水五条駅': (34.9962, 135.7686),
+    '祇園四条駅': (35.0036, 135.7721),
+    '蹴上駅': (35.0055, 135.7903),
+    '二条城前駅': (35.0108, 135.7511),
+    '北野白梅町駅': (35.0300, 135.7316),
+    '稲荷駅': (34.9669, 135.7702),
+    '嵐山駅': (35.0153, 135.6779),
+    '大阪駅': (34.7025, 135.4959),
+    '大阪城公園駅': (34.6880, 135.5343),
+    '難波駅': (34.6627, 135.5013),
+    '恵美須町駅': (34.6524, 135.5059),
+    '天王寺駅': (34.6466, 135.5138),
+    '住吉大社駅': (34.6118, 135.4904),
+    'ユニバーサルシティ駅': (34.6675, 135.4356),
+}
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """2点間の大円距離（メートル）"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoGridIndex(Generic[T]):
+    """緯度経度の等間隔グリッドによる空間インデックス（構築後は参照のみ）
+
+    距離は検索中心での正距円筒近似（数十km以内なら大円距離との誤差0.1%未満）で計算する。
+    半径検索は円と交差するセルのみ、
+    k近傍検索は中心セルから外側へリング状に探索し、未探索の範囲に近い点が残り得なくなった時点で打ち切る
+    """
+
+    def __init__(self, points: Iterable[Tuple[float, float, T]], cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.items: List[T] = []
+        cells: Dict[Tuple[int, int], Tuple[List[float], List[float], List[int]]] = {}
+
+        for lat, lon, item in points:
+            lats, lons, indices = cells.setdefault(self._cell(lat, lon), ([], [], []))
+            lats.append(lat)
+            lons.append(lon)
+            indices.append(len(self.items))
+            self.items.append(item)
+
+        # セルごとに緯度・経度・要素番号の列を保持（走査時の属性参照を減らす）
+        self._cells: Dict[Tuple[int, int], Tuple[Tuple[float, ...], Tuple[float, ...], Tuple[int, ...]]] = {
+            key: (tuple(lats), tuple(lons), tuple(indices)) for key, (lats, lons, indices) in cells.items()
+        }
+        if cells:
+            rows = [key[0] for key in cells]
+            cols = [key[1] for key in cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+        else:
+            self._bounds = (0, -1, 0, -1)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    @staticmethod
+    def _scales(lat: float) -> Tuple[float, float]:
+        """検索中心での緯度1度・経度1度あたりの距離（メートル）"""
+        return METERS_PER_DEGREE, METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+
+    def _scan_cell(
+        self,
+        key: Tuple[int, int],
+        lat: float,
+        lon: float,
+        lat_scale: float,
+        lon_scale: float,
+        limit_sq: float,
+        results: List[Tuple[float, int]]
+    ) -> None:
+        """セル内の点のうち近似距離の2乗がlimit_sq以下のものを (距離の2乗, 要素番号) で追加"""
+        cell = self._cells.get(key)
+        if cell is None:
+            return
+        lats, lons, indices = cell
+        for p_lat, p_lon, index in zip(lats, lons, indices):
+            dy = (p_lat - lat) * lat_scale
+            dx = (p_lon - lon) * lon_scale
+            d_sq = dx * dx + dy * dy
+            if d_sq <= limit_sq:
+                results.append((d_sq, index))
+
+    def _cell_min_distance_sq(
+        self, key: Tuple[int, int], lat: float, lon: float, lat_scale: float, lon_scale: float
+    ) -> float:
+        """検索中心からセル（矩形）までの最短距離の2乗"""
+        size = self.cell_degrees
+        south, west = key[0] * size, key[1] * size
+        dy = max(south - lat, 0.0, lat - (south + size)) * lat_scale
+        dx = max(west - lon, 0.0, lon - (west + size)) * lon_scale
+        return dx * dx + dy * dy
+
+    def _finish(self, candidates: List[Tuple[float, int]]) -> List[Tuple[float, T]]:
+        items = self.items
+        return [(math.sqrt(d_sq), items[index]) for d_sq, index in candidates]
+
+    def radius(
+        self, lat: float, lon: float, radius_m: float, limit: Optional[int] = None
+    ) -> List[Tuple[float, T]]:
+        """中心から半径radius_m以内の点を近い順に返す（距離, 要素）"""
+        lat_scale, lon_scale = self._scales(lat)
+        row_span = int(math.ceil(radius_m / (self.cell_degrees * lat_scale)))
+        col_span = int(math.ceil(radius_m / (self.cell_degrees * lon_scale)))
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        radius_sq = radius_m * radius_m
+
+        candidates: List[Tuple[float, int]] = []
+        for r in range(max(row - row_span, min_row), min(row + row_span, max_row) + 1):
+            for c in range(max(col - col_span, min_col), min(col + col_span, max_col) + 1):
+                key = (r, c)
+                if key in self._cells and self._cell_min_distance_sq(key, lat, lon, lat_scale, lon_scale) <= radius_sq:
+                    self._scan_cell(key, lat, lon, lat_scale, lon_scale, radius_sq, candidates)
+
+        candidates.sort()
+        if limit is not None:
+            del candidates[limit:]
+        return self._finish(candidates)
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 1, max_distance_m: Optional[float] = None
+    ) -> List[Tuple[float, T]]:
+        """中心に近いk件を近い順に返す（距離, 要素）"""
+        if k <= 0 or not self.items:
+            return []
+        lat_scale, lon_scale = self._scales(lat)
+        cell_size = self.cell_degrees * min(lat_scale, lon_scale)
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        limit_sq = max_distance_m * max_distance_m if max_distance_m is not None else math.inf
+
+        candidates: List[Tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            for r in range(max(row - ring, min_row), min(row + ring, max_row) + 1):
+                if abs(r - row) == ring:
+                    cols: Iterable[int] = range(max(col - ring, min_col), min(col + ring, max_col) + 1)
+                else:
+                    cols = (col - ring, col + ring)
+                for c in cols:
+                    self._scan_cell((r, c), lat, lon, lat_scale, lon_scale, limit_sq, candidates)
+
+            if len(candidates) >= k:
+                candidates.sort()
+                del candidates[k:]
+                # 以降は候補のk番目より遠い点しか追加しない
+                limit_sq = min(limit_sq, candidates[-1][0])
+            # リングringまで探索すれば、中心からring * セル幅以内の点はすべて走査済み
+            covered = ring * cell_size
+            if covered * covered >= limit_sq:
+                break
+
+        candidates.sort()
+        return self._finish(candidates[:k])
+
+
+# 駅インデックスはimport時に1度だけ構築（駅は疎なので約5km四方のセル）
+STATION_INDEX: GeoGridIndex[str] = GeoGridIndex(
+    ((lat, lon, name) for name, (lat, lon) in STATIONS.items()),
+    cell_degrees=0.05
+)
+
+
+def station_coordinates(place: str) -> Optional[Tuple[float, float]]:
+    """駅名（「駅」の有無を問わない）から座標を返す"""
+    place = place.strip()
+    return STATIONS.get(place) or STATIONS.get(f'{place}駅')
+
+
+def walking_minutes(distance_m: float) -> int:
+    """直線距離から徒歩分数を見積もる（道なり係数込み、最低1分）"""
+    return max(1, int(math.ceil(distance_m * ROUTE_DETOUR_FACTOR / WALKING_METERS_PER_MINUTE)))
+
+
+def travel_phrase(distance_m: float) -> str:
+    """移動の目安を「徒歩N分」または「約Nkm（バス・タクシーで約M分）」と表記"""
+    minutes = walking_minutes(distance_m)
+    if minutes <= MAX_WALKING_MINUTES:
+        return f"徒歩{minutes}分"
+    transit_minutes = int(math.ceil(
+        distance_m * ROUTE_DETOUR_FACTOR / TRANSIT_METERS_PER_MINUTE + TRANSIT_OVERHEAD_MINUTES
+    ))
+    return f"約{distance_m / 1000:.1f}km（バス・タクシーで約{transit_minutes}分）"
+
+
+def travel_text(origin: str, distance_m: float) -> str:
+    """起点からの移動の目安（例: '京都駅から徒歩5分'）"""
+    return f"{origin}から{travel_phrase(distance_m)}"
+
+
+def nearest_station(
+    lat: float, lon: float, max_distance_m: Optional[float] = MAX_STATION_DISTANCE_M
+) -> Optional[Tuple[float, str]]:
+    """max_distance_m 以内の最寄り駅（距離, 駅名）。なければNone"""
+    nearest = STATION_INDEX.nearest(lat, lon, 1, max_distance_m)
+    return nearest[0] if nearest else None
+
+
+def access_text(lat: float, lon: float, max_distance_m: Optional[float] = MAX_STATION_DISTANCE_M) -> Optional[str]:
+    """最寄り駅からのアクセス表記（max_distance_m 以内に駅がなければNone）"""
+    station = nearest_station(lat, lon, max_distance_m)
+    if station is None:
+        return None
+    distance, name = station
+    return travel_text(name, distance)
+
+
+def distance_matrix(points: Sequence[Tuple[float, float]]) -> List[List[float]]:
+    """全地点間の距離行列（メートル）"""
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            matrix[i][j] = matrix[j][i] = haversine_m(*points[i], *points[j])
+    return matrix
+
+
+# この件数以下は全順列で最短ルートを求める（始点を固定しない場合 7! = 5040通り）
+EXACT_ROUTE_MAX_POINTS = 7
+
+
+def walking_route(
+    points: Sequence[Tuple[float, float]], start: Optional[int] = None
+) -> List[int]:
+    """各地点を1度ずつ巡る総距離が短い順序（添字のリスト）を返す
+
+    少数の場合は全順列で最短を、それ以上は最近傍法 + 2-optで近似する
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+    dist = distance_matrix(points)
+
+    if n <= EXACT_ROUTE_MAX_POINTS:
+        starts = [start] if start is not None else range(n)
+        best_length = math.inf
+        best_order: List[int] = list(range(n))
+        for first in starts:
+            rest = [i for i in range(n) if i != first]
+            for perm in permutations(rest):
+                length = dist[first][perm[0]]
+                for a, b in zip(perm, perm[1:]):
+                    length += dist[a][b]
+                if length < best_length:
+                    best_length = length
+                    best_order = [first, *perm]
+        return best_order
+
+    # 最近傍法で初期解
+    current = start if start is not None else 0
+    order = [current]
+    remaining = set(range(n)) - {current}
+    while remaining:
+        current = min(remaining, key=lambda i: dist[order[-1]][i])
+        order.append(current)
+        remaining.remove(current)
+
+    # 2-opt改善（始点は固定、終点は自由）
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b, c = order[i - 1], order[i], order[j]
+                d = order[j + 1] if j + 1 < n else None
+                before = dist[a][b] + (dist[c][d] if d is not None else 0.0)
+                after = dist[a][c] + (dist[b][d] if d is not None else 0.0)
+                if after < before - 1e-6:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+    return order
@@ -0,0 +1,133 @@
+"""
+観光スポット特集記事HTMLのテンプレートレンダラー
+SimpleUIAgentのインラインスタイル設計をそのままテンプレート化し、LLMを使わずに1行形式HTMLを生成
+"""
+
+from html import escape
+from string import Template
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+# インラインスタイル（SimpleUIAgentのinstructionと同一）
+_BODY_STYLE = 'font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif; background-color: #f8fafc; margin: 0; padding: 20px;'
+_HEADER_STYLE = 'max-width: 1200px; margin: 0 auto 24px;'
+_HEADING_STYLE = 'font-size: 28px; font-weight: bold; color: #1f2937; margin: 0 0 8px;'
+_SUBHEADING_STYLE = 'color: #6b7280; font-size: 14px; margin: 0;'
+_CONTAINER_STYLE = 'display: grid; grid-template-columns: repeat(auto-fill, minmax(300px, 1fr)); gap: 24px; max-width: 1200px; margin: 0 auto;'
+_CARD_STYLE = 'background: white; border-radius: 12px; box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1); padding: 20px; transition: transform 0.2s, box-shadow 0.2s; border: 1px solid #e5e7eb;'
+_TITLE_STYLE = 'font-size: 20px; font-weight: bold; color: #1f2937; margin-bottom: 12px; line-height: 1.3;'
+_META_STYLE = 'color: #3b82f6; font-size: 12px; font-weight: 500; margin-bottom: 8px;'
+_DESCRIPTION_STYLE = 'color: #6b7280; margin-bottom: 16px; line-height: 1.6; font-size: 14px;'
+_ACCESS_STYLE = 'color: #059669; margin-bottom: 12px; font-size: 13px; line-height: 1.5;'
+_REASON_STYLE = 'color: #374151; margin-bottom: 16px; font-size: 13px; line-height: 1.5;'
+_BUTTON_STYLE = 'background-color: #3b82f6; color: white; padding: 8px 16px; border: none; border-radius: 6px; font-weight: 500; cursor: pointer; text-decoration: none; display: inline-block; transition: background-color 0.2s;'
+_BUTTON_HOVER = 'onmouseover=\'this.style.backgroundColor="#2563eb"\' onmouseout=\'this.style.backgroundColor="#3b82f6"\''
+_RESPONSIVE_CSS = '@media (max-width: 768px) { .spot-container { grid-template-columns: 1fr !important; gap: 16px !important; padding: 16px !important; } .spot-card { padding: 16px !important; } }'
+
+# テンプレートはimport時に1度だけ組み立てる（静的部分は事前連結済み）
+# 静的なstyle値はシングルクォートを含まないため、属性値としてそのまま埋め込める
+PAGE_HEAD_TEMPLATE = Template(
+    "<!DOCTYPE html><html lang='ja'><head><meta charset='UTF-8'>"
+    "<meta name='viewport' content='width=device-width, initial-scale=1.0'>"
+    "<title>$title</title><style>" + _RESPONSIVE_CSS + "</style></head>"
+    "<body style='" + _BODY_STYLE + "'>"
+    "<header style='" + _HEADER_STYLE + "'>"
+    "<h1 style='" + _HEADING_STYLE + "'>$title</h1>"
+    "<p style='" + _SUBHEADING_STYLE + "'>$subtitle</p></header>"
+    "<div class='spot-container' style='" + _CONTAINER_STYLE + "'>"
+)
+PAGE_TAIL = "</div></body></html>"
+
+CARD_TEMPLATE = Template(
+    "<div class='spot-card' style='" + _CARD_STYLE + "'>"
+    "<h2 style='" + _TITLE_STYLE + "'>$name</h2>"
+    "<div style='" + _META_STYLE + "'>$meta</div>"
+    "<p style='" + _DESCRIPTION_STYLE + "'>$description</p>"
+    "$reason"
+    "$access"
+    "<a href='$map_url' target='_blank' rel='noopener noreferrer' style='" + _BUTTON_STYLE + "' " + _BUTTON_HOVER + ">地図で見る</a>"
+    "</div>"
+)
+REASON_TEMPLATE = Template("<p style='" + _REASON_STYLE + "'>おすすめ理由: $reason</p>")
+ACCESS_TEMPLATE = Template("<p style='" + _ACCESS_STYLE + "'>$access</p>")
+
+_MAP_SEARCH_URL = 'https://www.google.com/maps/search/?api=1&query='
+
+
+def _text(value: Any) -> str:
+    """HTMLに埋め込む文字列をエスケープし、改行を除去して1行化"""
+    if value is None:
+        return ''
+    return escape(' '.join(str(value).split()), quote=True)
+
+
+def map_query(spot: Dict[str, Any]) -> str:
+    """地図リンクの検索語（座標があれば座標、なければ名前 + エリア）"""
+    lat, lon = spot.get('lat'), spot.get('lon')
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return quote(f"{lat},{lon}")
+    return quote(f"{spot.get('name') or ''} {spot.get('area') or ''}".strip())
+
+
+def build_title(search_params: Dict[str, Any]) -> str:
+    """検索条件から記事タイトルを組み立てる"""
+    area = search_params.get('area') or ''
+    category = search_params.get('category') or ''
+    season = search_params.get('season') or ''
+
+    title = f"{season}の" if season else ''
+    title += f"{area}" if area else ''
+    title += f"で{category}を楽しむ" if category else ''
+    return f"{title}観光スポット特集" if title else '観光スポット特集'
+
+
+def render_page_head(search_params: Dict[str, Any], spot_count: int) -> str:
+    """ページ先頭（<!DOCTYPE html>〜カードコンテナ開始タグ）を生成"""
+    requests = search_params.get('requests') or []
+    subtitle = f"厳選{spot_count}スポット"
+    if requests:
+        subtitle += ' / ' + '・'.join(str(r) for r in requests)
+    return PAGE_HEAD_TEMPLATE.substitute(
+        title=_text(build_title(search_params)),
+        subtitle=_text(subtitle)
+    )
+
+
+def render_spot_card(spot: Dict[str, Any], description: Optional[str] = None) -> str:
+    """スポット1件分のカードHTMLを生成"""
+    name = spot.get('name') or ''
+    meta = ' / '.join(str(v) for v in (spot.get('area'), spot.get('category')) if v)
+    reason = spot.get('reason')
+    # アクセス表記（基準地点からの距離 > 最寄り駅）と次のスポットへの移動目安
+    access = ' / '.join(
+        str(v) for v in (spot.get('proximity') or spot.get('access'), spot.get('next_leg')) if v
+    )
+
+    return CARD_TEMPLATE.substitute(
+        name=_text(name),
+        meta=_text(meta),
+        description=_text(description or spot.get('description')),
+        reason=REASON_TEMPLATE.substitute(reason=_text(reason)) if reason else '',
+        access=ACCESS_TEMPLATE.substitute(access=_text(access)) if access else '',
+        map_url=escape(_MAP_SEARCH_URL + map_query(spot), quote=True)
+    )
+
+
+def render_tourism_html(
+    search_params: Dict[str, Any],
+    selected_spots: List[Dict[str, Any]],
+    descriptions: List[Dict[str, Any]]
+) -> str:
+    """検索条件・選定スポット・説明文から1行形式の完全なHTMLを生成"""
+    description_by_name = {
+        d.get('name'): d.get('description')
+        for d in descriptions
+        if isinstance(d, dict)
+    }
+    spots = [spot for spot in selected_spots if isinstance(spot, dict)]
+
+    parts = [render_page_head(search_params, len(spots))]
+    for spot in spots:
+        parts.append(render_spot_card(spot, description_by_name.get(spot.get('name'))))
+    parts.append(PAGE_TAIL)
+    return ''.join(parts)
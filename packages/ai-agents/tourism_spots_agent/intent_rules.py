@@ -0,0 +1,178 @@
+"""
+ルールベース意図抽出
+辞書・正規表現でユーザー入力から search_params を抽出し、信頼度スコアを付与する
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .geo_index import ROUTE_DETOUR_FACTOR, WALKING_METERS_PER_MINUTE
+
+# エリア: 正規化名 -> 表記ゆれ
+AREA_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    '東京': ('東京', 'とうきょう', 'トウキョウ', 'tokyo', '都内', '浅草', '新宿', '渋谷', '上野', 'お台場'),
+    '京都': ('京都', 'きょうと', 'キョウト', 'kyoto', '嵐山', '祇園', '洛中', '洛外'),
+    '大阪': ('大阪', 'おおさか', 'オオサカ', 'osaka', 'なにわ', '浪速', '難波', 'なんば', '梅田', '道頓堀'),
+}
+
+# カテゴリ: 正規化名 -> キーワード（カテゴリ名そのものの一致を最優先）
+CATEGORY_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    '歴史': ('歴史', '史跡', '寺', '神社', '城', '古都', '由緒', '世界遺産', '遺跡'),
+    '自然': ('自然', '公園', '庭園', '景色', '絶景', '竹林', '散歩', '散策', 'ハイキング'),
+    '現代': ('現代', 'モダン', '最新', 'タワー', 'テーマパーク', '夜景', 'ショッピング', 'エンタメ'),
+    '文化': ('文化', '芸術', 'アート', '美術館', '博物館', '伝統', '劇場', '歌舞伎', 'グルメ', '食文化'),
+}
+
+# 季節: 正規化名 -> キーワード
+SEASON_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    '春': ('春', '桜', 'さくら', '花見', '3月', '4月', '5月'),
+    '夏': ('夏', '花火', '祭り', '避暑', '6月', '7月', '8月'),
+    '秋': ('秋', '紅葉', 'もみじ', '9月', '10月', '11月'),
+    '冬': ('冬', '雪', 'イルミネーション', '12月', '1月', '2月'),
+}
+
+# 特別な要望: 正規化名 -> キーワード（SimpleIntentAgentのinstructionと同じ語彙）
+REQUEST_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    '写真撮影': ('写真', '撮影', '映え', 'フォト', 'インスタ'),
+    '体験': ('体験', 'ワークショップ', '参加型'),
+    '静か': ('静か', '落ち着', 'のんびり', '穴場', '人混みを避け'),
+    'アクセス': ('アクセス', '駅近', '駅から近', '近い', '便利'),
+}
+
+# 信頼度の重み（エリアとカテゴリが揃えばLLM不要と判断できる配分）
+AREA_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.4
+SEASON_WEIGHT = 0.1
+# 候補が複数ある項目の減点
+AMBIGUITY_PENALTY = 0.2
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.9
+
+
+def _compile(keywords: Dict[str, Tuple[str, ...]]) -> List[Tuple[str, 're.Pattern']]:
+    """キーワード辞書を正規化名ごとの正規表現にまとめる（import時に1度だけ）"""
+    return [
+        (name, re.compile('|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True)), re.IGNORECASE))
+        for name, words in keywords.items()
+    ]
+
+
+_AREA_PATTERNS = _compile(AREA_KEYWORDS)
+_CATEGORY_PATTERNS = _compile(CATEGORY_KEYWORDS)
+_SEASON_PATTERNS = _compile(SEASON_KEYWORDS)
+_REQUEST_PATTERNS = _compile(REQUEST_KEYWORDS)
+# 月の表記は「11月」が「1月」に誤一致しないよう数字の直後を除外
+_MONTH_PATTERN = re.compile(r'(?<![0-9０-９])(1[0-2]|[1-9])月')
+# 近接条件: 「京都駅の近く」「清水寺周辺」など（地名は漢字・カタカナ・英数字の連続）
+_NEAR_PATTERN = re.compile(
+    r'([一-龥々ァ-ヶーA-Za-z0-9・]{2,20})(?:から)?(?:の)?(?:近く|周辺|付近|近辺|そば|徒歩圏|歩いて)'
+)
+# 「徒歩15分」「歩いて10分」
+_WALK_MINUTES_PATTERN = re.compile(r'(?:徒歩|歩いて)([0-9０-９]{1,3})分')
+# 徒歩分数から半径へ換算（道なり係数を除いた直線距離）
+_METERS_PER_WALK_MINUTE = WALKING_METERS_PER_MINUTE / ROUTE_DETOUR_FACTOR
+_FULLWIDTH_DIGITS = str.maketrans('０１２３４５６７８９', '0123456789')
+
+
+def _match_all(patterns: List[Tuple[str, 're.Pattern']], text: str) -> List[str]:
+    """一致した正規化名を出現位置順に返す"""
+    positions = []
+    for name, pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            positions.append((match.start(), name))
+    return [name for _, name in sorted(positions)]
+
+
+def _match_category(text: str) -> List[str]:
+    """カテゴリ名そのものの一致を優先し、なければキーワード一致で判定"""
+    explicit = [name for name in CATEGORY_KEYWORDS if name in text]
+    return explicit or _match_all(_CATEGORY_PATTERNS, text)
+
+
+def _match_season(text: str) -> List[str]:
+    """季節語と月表記から季節を判定"""
+    seasons = _match_all(_SEASON_PATTERNS, _MONTH_PATTERN.sub('', text))
+    for month in _MONTH_PATTERN.findall(text):
+        for name, words in SEASON_KEYWORDS.items():
+            if f'{month}月' in words and name not in seasons:
+                seasons.append(name)
+    return seasons
+
+
+def _match_near(text: str) -> Tuple[str, Optional[float]]:
+    """近接条件の基準地点と半径（km、徒歩分数の指定がある場合のみ）を抽出"""
+    match = _NEAR_PATTERN.search(text)
+    near = match.group(1) if match else ''
+    radius_km = None
+    minutes = _WALK_MINUTES_PATTERN.search(text)
+    if minutes:
+        radius_km = round(int(minutes.group(1).translate(_FULLWIDTH_DIGITS)) * _METERS_PER_WALK_MINUTE / 1000, 2)
+    return near, radius_km
+
+
+def extract_search_params(message: str) -> Dict[str, Any]:
+    """ユーザー入力からsearch_paramsを抽出し、confidence（0.0〜1.0）を付与"""
+    # 「東京都」が「京都」に誤一致しないよう正規化
+    text = (message or '').replace('東京都', '東京')
+    areas = _match_all(_AREA_PATTERNS, text)
+    categories = _match_category(text)
+    seasons = _match_season(text)
+    requests = _match_all(_REQUEST_PATTERNS, text)
+    near, radius_km = _match_near(text)
+
+    confidence = 0.0
+    for candidates, weight in ((areas, AREA_WEIGHT), (categories, CATEGORY_WEIGHT), (seasons, SEASON_WEIGHT)):
+        if candidates:
+            confidence += weight if len(candidates) == 1 else weight - AMBIGUITY_PENALTY
+    # 季節の指定がないこと自体は曖昧さではないため、エリア・カテゴリが確定していれば満点扱い
+    if not seasons and len(areas) == 1 and len(categories) == 1:
+        confidence += SEASON_WEIGHT
+
+    search_params = {
+        'area': areas[0] if areas else '',
+        'category': categories[0] if categories else '',
+        'season': seasons[0] if seasons else '',
+        'requests': requests,
+        'near': near,
+        'confidence': round(max(0.0, min(confidence, 1.0)), 2)
+    }
+    if radius_km is not None:
+        search_params['radius_km'] = radius_km
+    return search_params
+
+
+class IntentStats:
+    """ルールベース抽出（fast path）のヒット率集計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast_path_hits = 0
+        self.llm_fallbacks = 0
+
+    def record(self, fast_path: bool) -> None:
+        with self._lock:
+            if fast_path:
+                self.fast_path_hits += 1
+            else:
+                self.llm_fallbacks += 1
+
+    @property
+    def total(self) -> int:
+        return self.fast_path_hits + self.llm_fallbacks
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.total
+        return self.fast_path_hits / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'fast_path_hits': self.fast_path_hits,
+            'llm_fallbacks': self.llm_fallbacks,
+            'hit_rate': round(self.hit_rate, 4)
+        }
+
+
+intent_stats = IntentStats()
@@ -0,0 +1,84 @@
+"""
+観光スポット検索ワークフローのレイテンシ計測
+最初のカード表示までの時間（time-to-first-card）と全体レイテンシをinvocation単位で記録する
+カードを順次送出しない（非ストリーミングの）invocationでは time-to-first-card は記録しない
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """値列のパーセンタイル（最近傍法、未ソートの値列を受け付ける）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(ratio * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """invocationごとの開始・最初のカード・完了時刻を記録し、分布を集計する"""
+
+    def __init__(self, max_samples: int = 1000):
+        self._lock = threading.Lock()
+        self._started: Dict[str, float] = {}
+        self._first_card: Dict[str, float] = {}
+        self.max_samples = max_samples
+        self.time_to_first_card: List[float] = []
+        self.total_latency: List[float] = []
+
+    def start(self, invocation_id: str) -> None:
+        with self._lock:
+            self._started[invocation_id] = time.perf_counter()
+
+    def mark_first_card(self, invocation_id: str) -> Optional[float]:
+        """最初のカードを送出した時刻を記録（2回目以降は無視）し、開始からの経過秒数を返す"""
+        now = time.perf_counter()
+        with self._lock:
+            started = self._started.get(invocation_id)
+            if started is None or invocation_id in self._first_card:
+                return None
+            self._first_card[invocation_id] = now
+            return now - started
+
+    def finish(self, invocation_id: str) -> Dict[str, Optional[float]]:
+        """完了を記録して、このinvocationの計測値を返す（カードを送出しなかった場合 time_to_first_card はNone）"""
+        now = time.perf_counter()
+        with self._lock:
+            started = self._started.pop(invocation_id, None)
+            first_card = self._first_card.pop(invocation_id, None)
+            if started is None:
+                return {'time_to_first_card': None, 'total_latency': None}
+            ttfc = first_card - started if first_card is not None else None
+            total = now - started
+            if ttfc is not None:
+                self._append(self.time_to_first_card, ttfc)
+            self._append(self.total_latency, total)
+        return {'time_to_first_card': ttfc, 'total_latency': total}
+
+    def _append(self, samples: List[float], value: float) -> None:
+        samples.append(value)
+        if len(samples) > self.max_samples:
+            del samples[0]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            ttfc = list(self.time_to_first_card)
+            total = list(self.total_latency)
+        return {
+            'count': len(total),
+            'time_to_first_card': {
+                'count': len(ttfc),
+                'p50': round(percentile(ttfc, 0.50), 4),
+                'p95': round(percentile(ttfc, 0.95), 4)
+            },
+            'total_latency': {
+                'p50': round(percentile(total, 0.50), 4),
+                'p95': round(percentile(total, 0.95), 4)
+            }
+        }
+
+
+latency_tracker = LatencyTracker()
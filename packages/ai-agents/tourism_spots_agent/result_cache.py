@@ -0,0 +1,259 @@
+"""
+観光スポット検索結果キャッシュ
+正規化したsearch_paramsをキーに selected_spots / descriptions / html を保存する
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# キャッシュ対象のstateキー
+CACHED_STATE_KEYS = ('selected_spots', 'descriptions', 'html')
+
+
+def normalize_search_params(search_params: Dict[str, Any], include_query: bool = False) -> str:
+    """search_paramsを正規化してキャッシュキーにする（confidenceなど抽出経路に依存する値は除外）
+
+    include_query: 意味検索モードでは入力文そのものが結果に影響するため、空白を詰めた入力文もキーに含める
+    """
+    requests = search_params.get('requests') or []
+    if isinstance(requests, str):
+        requests = [requests]
+    normalized = {
+        'area': str(search_params.get('area') or '').strip(),
+        'category': str(search_params.get('category') or '').strip(),
+        'season': str(search_params.get('season') or '').strip(),
+        'requests': sorted({str(r).strip() for r in requests if str(r).strip()}),
+        'near': str(search_params.get('near') or '').strip()
+    }
+    if search_params.get('radius_km'):
+        normalized['radius_km'] = search_params['radius_km']
+    if include_query:
+        normalized['query'] = ' '.join(str(search_params.get('query') or '').split())
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+class CacheMetrics:
+    """キャッシュのヒット・ミス・退避件数の集計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def record_evictions(self, count: int) -> None:
+        if count:
+            with self._lock:
+                self.evictions += count
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hit_rate, 4)
+        }
+
+
+class ResultCache(ABC):
+    """検索結果キャッシュのバックエンド共通インターフェース（LRU + TTL + サイズ上限）"""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.metrics = CacheMetrics()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """キャッシュを参照（期限切れは削除してミス扱い）"""
+        value = self._get(key, time.time())
+        self.metrics.record(value is not None)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """キャッシュに保存（上限を超えた分はLRU順に退避）"""
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        if len(payload.encode('utf-8')) > self.max_bytes:
+            return
+        self.metrics.record_evictions(self._set(key, payload, time.time()))
+
+    @abstractmethod
+    def _get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, payload: str, now: float) -> int:
+        """保存して退避した件数を返す"""
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class InMemoryResultCache(ResultCache):
+    """プロセス内キャッシュ（デフォルト）"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        # key -> (作成時刻, シリアライズ済みサイズ, 値)
+        self._entries: 'OrderedDict[str, Tuple[float, int, Dict[str, Any]]]' = OrderedDict()
+        self._total_bytes = 0
+
+    def _get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, size, value = entry
+            if now - created_at > self.ttl_seconds:
+                del self._entries[key]
+                self._total_bytes -= size
+                return None
+            self._entries.move_to_end(key)
+        # 呼び出し側（セッションstate）とキャッシュ内の値でオブジェクトを共有しない
+        return copy.deepcopy(value)
+
+    def _set(self, key: str, payload: str, now: float) -> int:
+        size = len(payload.encode('utf-8'))
+        value = json.loads(payload)
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (now, size, value)
+            self._total_bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+class SQLiteResultCache(ResultCache):
+    """SQLiteファイルキャッシュ（複数ワーカー間で共有）"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_result_cache_accessed ON result_cache(accessed_at)"
+            )
+
+    def _get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE result_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(payload)
+
+    def _set(self, key: str, payload: str, now: float) -> int:
+        size = len(payload.encode('utf-8'))
+        evicted = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, payload, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now)
+            )
+            evicted += self._conn.execute(
+                "DELETE FROM result_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache"
+            ).fetchone()
+            if count > self.max_entries or total_bytes > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM result_cache ORDER BY accessed_at ASC"
+                ).fetchall()
+                for evict_key, evict_size in rows:
+                    if count <= self.max_entries and total_bytes <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM result_cache WHERE key = ?", (evict_key,))
+                    count -= 1
+                    total_bytes -= evict_size
+                    evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM result_cache")
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """環境変数からキャッシュバックエンドを生成（TOURISM_CACHE_BACKEND=memory|sqlite|none）"""
+    backend = os.getenv('TOURISM_CACHE_BACKEND', 'memory')
+    options = {
+        'max_entries': int(os.getenv('TOURISM_CACHE_MAX_ENTRIES', '1000')),
+        'max_bytes': int(os.getenv('TOURISM_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+        'ttl_seconds': float(os.getenv('TOURISM_CACHE_TTL_SECONDS', '3600'))
+    }
+
+    if backend == 'none':
+        return None
+    if backend == 'sqlite':
+        return SQLiteResultCache(os.getenv('TOURISM_CACHE_PATH', 'tourism_result_cache.db'), **options)
+    return InMemoryResultCache(**options)
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_initialized = False
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """プロセスごとに1度だけキャッシュを生成して返す（エージェントのpickle対象に含めないため遅延生成）"""
+    global _result_cache, _result_cache_initialized
+    if not _result_cache_initialized:
+        with _result_cache_lock:
+            if not _result_cache_initialized:
+                _result_cache = create_result_cache()
+                _result_cache_initialized = True
+    return _result_cache
@@ -0,0 +1,267 @@
+"""
+観光スポットの意味検索インデックス（オフライン動作）
+文字n-gramのハッシュ + TF-IDF埋め込み（差し替え可能）で説明文・特徴をベクトル化し、
+小規模カタログはNumPyの全件内積、大規模カタログはIVF（転置リスト + int8量子化）で近似検索する
+"""
+
+import math
+import re
+import unicodedata
+import zlib
+from typing import Callable, Dict, Generic, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+
+# 埋め込み関数: テキスト列 -> (件数 × 次元) のL2正規化済みfloat32行列
+EmbeddingFunction = Callable[[Sequence[str]], np.ndarray]
+
+DEFAULT_DIMENSION = 512
+# この件数を超えるカタログはIVFで近似検索
+APPROXIMATE_MIN_SIZE = 50000
+
+# IVFで走査するリスト数の下限
+DEFAULT_MIN_PROBES = 8
+
+# n-gramの区切り（空白・句読点・記号）
+_SEPARATOR_PATTERN = re.compile(r'[\s、。，．,.!！?？・/／「」『』（）()\[\]【】]+')
+
+
+class HashingEmbedder:
+    """文字n-gramを固定次元にハッシュするTF-IDF埋め込み（語彙の保存不要、完全にオフライン）
+
+    fit() でコーパスの文書頻度からIDFを求める。fit前はTFのみで重み付けする
+    """
+
+    def __init__(self, dimension: int = DEFAULT_DIMENSION, ngram_range: Tuple[int, int] = (1, 3)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+        self.idf: Optional[np.ndarray] = None
+        self._bucket_cache: Dict[str, int] = {}
+
+    def _grams(self, text: str) -> List[str]:
+        text = unicodedata.normalize('NFKC', text or '').lower()
+        low, high = self.ngram_range
+        grams = []
+        for token in _SEPARATOR_PATTERN.split(text):
+            for n in range(low, high + 1):
+                grams.extend(token[i:i + n] for i in range(len(token) - n + 1))
+        return grams
+
+    def _bucket(self, gram: str) -> int:
+        """n-gramのバケット番号（負値は符号反転、符号付きハッシュで衝突の偏りを打ち消す）"""
+        h = zlib.crc32(gram.encode('utf-8'))
+        bucket = h % self.dimension + 1
+        return bucket if (h >> 31) & 1 else -bucket
+
+    def term_frequencies(self, texts: Sequence[str]) -> np.ndarray:
+        """対数スケールのTF行列（件数 × 次元）"""
+        cache = self._bucket_cache
+        rows: List[int] = []
+        buckets: List[int] = []
+        for row, text in enumerate(texts):
+            for gram in self._grams(text):
+                bucket = cache.get(gram)
+                if bucket is None:
+                    bucket = cache[gram] = self._bucket(gram)
+                rows.append(row)
+                buckets.append(bucket)
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if buckets:
+            signed = np.array(buckets, dtype=np.int64)
+            np.add.at(matrix, (np.array(rows, dtype=np.int64), np.abs(signed) - 1), np.sign(signed).astype(np.float32))
+        return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+    def fit(self, texts: Sequence[str], batch_size: int = 10000) -> 'HashingEmbedder':
+        """コーパスの文書頻度からIDFを計算"""
+        self.fit_transform(texts, batch_size)
+        return self
+
+    def fit_transform(self, texts: Sequence[str], batch_size: int = 10000) -> np.ndarray:
+        """IDFを計算し、同じTF行列からコーパスの埋め込みも返す（n-gram分解を1回で済ませる）"""
+        batches = [self.term_frequencies(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+        document_frequency = np.zeros(self.dimension, dtype=np.float64)
+        for batch in batches:
+            document_frequency += (batch != 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        if not batches:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate([self._normalize(batch * self.idf) for batch in batches])
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = self.term_frequencies(texts)
+        if self.idf is not None:
+            matrix *= self.idf
+        return self._normalize(matrix)
+
+
+class BruteForceVectorIndex(Generic[T]):
+    """全件の内積を1回の行列ベクトル積で計算する厳密検索"""
+
+    def __init__(self, vectors: np.ndarray, items: Sequence[T], groups: Optional[np.ndarray] = None):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.items = list(items)
+        self.groups = groups
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def search(self, query: np.ndarray, k: int, group: Optional[int] = None) -> List[Tuple[float, T]]:
+        """類似度の高い順にk件（group指定時はそのグループ内のみ）"""
+        scores = self.vectors @ query
+        if group is not None and self.groups is not None:
+            scores = np.where(self.groups == group, scores, -np.inf)
+        return _top_k(scores, k, self.items)
+
+
+class IVFVectorIndex(Generic[T]):
+    """IVF（球面k-meansによる転置リスト）+ int8量子化による近似検索
+
+    検索時は中心ベクトルとの類似度が高いn_probe個のリストのみを走査する。
+    ベクトルは行ごとのスケールでint8に量子化して保持する（float32の1/4のメモリ）
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        items: Sequence[T],
+        groups: Optional[np.ndarray] = None,
+        n_lists: Optional[int] = None,
+        n_probe: Optional[int] = None,
+        training_size: int = 20000,
+        iterations: int = 10,
+        seed: int = 0
+    ):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.items = list(items)
+        n = len(vectors)
+        self.n_lists = n_lists or max(1, int(math.sqrt(n)))
+
+        self.centroids = self._train(vectors, training_size, iterations, seed)
+        # 文字n-gramの埋め込みは近傍がクラスタをまたぎやすいため、デフォルトでは約1割のリストを走査
+        self.n_probe = n_probe or max(DEFAULT_MIN_PROBES, self.n_lists // 10)
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + 20000] @ self.centroids.T, axis=1)
+            for start in range(0, n, 20000)
+        ]) if n else np.zeros(0, dtype=np.int64)
+
+        # リストごとに連続領域へ並べ替え（走査時のメモリアクセスを連続にする）
+        order = np.argsort(assignments, kind='stable')
+        self._ids = order
+        self._offsets = np.searchsorted(assignments[order], np.arange(self.n_lists + 1))
+        scales = np.abs(vectors[order]).max(axis=1) / 127
+        self._scales = np.maximum(scales, 1e-12).astype(np.float32)
+        self._codes = np.round(vectors[order] / self._scales[:, None]).astype(np.int8)
+        self._groups = groups[order] if groups is not None else None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _train(self, vectors: np.ndarray, training_size: int, iterations: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        if n == 0:
+            return np.zeros((self.n_lists, vectors.shape[1] if vectors.ndim == 2 else 1), dtype=np.float32)
+        sample = vectors[rng.choice(n, size=min(training_size, n), replace=False)]
+        self.n_lists = min(self.n_lists, len(sample))
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            # クラスタごとの和を所属行列との積で一括計算
+            membership = np.zeros((len(sample), self.n_lists), dtype=np.float32)
+            membership[np.arange(len(sample)), labels] = 1.0
+            sums = membership.T @ sample
+            counts = np.bincount(labels, minlength=self.n_lists)
+            # 空のクラスタは前回の中心を維持
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        return centroids
+
+    def search(
+        self, query: np.ndarray, k: int, group: Optional[int] = None, n_probe: Optional[int] = None
+    ) -> List[Tuple[float, T]]:
+        """類似度の高い順に近似k件（group指定時はそのグループ内のみ）"""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        probes = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        ranges = [(self._offsets[p], self._offsets[p + 1]) for p in probes]
+        positions = np.concatenate([np.arange(start, end) for start, end in ranges]) if ranges else np.zeros(0, dtype=np.int64)
+        if group is not None and self._groups is not None:
+            positions = positions[self._groups[positions] == group]
+        if len(positions) == 0:
+            return []
+        scores = (self._codes[positions].astype(np.float32) @ query) * self._scales[positions]
+        top = _top_k_indices(scores, k)
+        items = self.items
+        ids = self._ids
+        return [(float(scores[i]), items[ids[positions[i]]]) for i in top]
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def _top_k(scores: np.ndarray, k: int, items: Sequence[T]) -> List[Tuple[float, T]]:
+    return [
+        (float(scores[i]), items[i])
+        for i in _top_k_indices(scores, k)
+        if np.isfinite(scores[i])
+    ]
+
+
+class SemanticSpotIndex(Generic[T]):
+    """スポットのテキストを埋め込み、自由記述の要望に近いスポットを返すインデックス"""
+
+    def __init__(
+        self,
+        entries: Iterable[Tuple[T, str, str]],
+        embedder: Optional[EmbeddingFunction] = None,
+        approximate: Optional[bool] = None
+    ):
+        """entries: (要素, エリア, 照合用テキスト) の列"""
+        items: List[T] = []
+        areas: List[str] = []
+        texts: List[str] = []
+        for item, area, text in entries:
+            items.append(item)
+            areas.append(area)
+            texts.append(text)
+
+        if embedder is None:
+            embedder = HashingEmbedder()
+            vectors = embedder.fit_transform(texts)
+        elif texts:
+            vectors = np.concatenate([embedder(texts[start:start + 10000]) for start in range(0, len(texts), 10000)])
+        else:
+            vectors = np.zeros((0, getattr(embedder, 'dimension', 1)), dtype=np.float32)
+        self.embedder = embedder
+
+        self._area_codes = {area: code for code, area in enumerate(dict.fromkeys(areas))}
+        groups = np.fromiter((self._area_codes[a] for a in areas), dtype=np.int32, count=len(areas))
+
+        if approximate is None:
+            approximate = len(items) > APPROXIMATE_MIN_SIZE
+        self.approximate = approximate
+        self.index = (IVFVectorIndex if approximate else BruteForceVectorIndex)(vectors, items, groups)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def search(self, text: str, k: int = 10, area: Optional[str] = None) -> List[Tuple[float, T]]:
+        """自由記述に近い順にk件（area指定時はそのエリア内のみ、未知のエリアは全体から）"""
+        if not text.strip() or not len(self.index):
+            return []
+        query = self.embedder([text])[0]
+        group = self._area_codes.get(area) if area else None
+        return [(score, item) for score, item in self.index.search(query, k, group) if score > 0]
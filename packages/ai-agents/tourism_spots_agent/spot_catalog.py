@@ -0,0 +1,385 @@
+"""
+観光スポットカタログ
+import時に1度だけ構築する不変カタログと (エリア, カテゴリ) / (エリア, 季節) / 位置情報インデックス
+"""
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .geo_index import DEFAULT_NEARBY_RADIUS_M, GeoGridIndex, access_text, station_coordinates
+from .semantic_index import SemanticSpotIndex
+
+SEASONS = ('春', '夏', '秋', '冬')
+DEFAULT_AREA = '東京'
+DEFAULT_CATEGORY = '歴史'
+# 要望キーワードで並べ替える際に参照する候補数（カテゴリの件数によらず検索時間を一定に保つ）
+CANDIDATE_WINDOW = 20
+
+# エリア別の観光スポットデータベース
+TOURISM_DATABASE: Dict[str, Dict[str, List[Dict[str, str]]]] = {
+    '東京': {
+        '歴史': [
+            {'name': '浅草寺', 'description': '東京最古の寺院として親しまれる由緒ある観光地', 'lat': 35.7148, 'lon': 139.7967},
+            {'name': '明治神宮', 'description': '明治天皇を祀る神社で都心のオアシス', 'lat': 35.6764, 'lon': 139.6993},
+            {'name': '東京国立博物館', 'description': '日本と東洋の文化財を展示する国内最大の博物館', 'lat': 35.7188, 'lon': 139.7765},
+        ],
+        '自然': [
+            {'name': '上野恩賜公園', 'description': '桜の名所として有名で多くの文化施設も併設', 'lat': 35.7156, 'lon': 139.7745},
+            {'name': '新宿御苑', 'description': '都心にある広大な庭園で四季を感じられる', 'lat': 35.6852, 'lon': 139.7101},
+        ],
+        '現代': [
+            {'name': '東京スカイツリー', 'description': '東京の新しいシンボルタワー', 'lat': 35.7101, 'lon': 139.8107},
+            {'name': 'お台場', 'description': '未来的な街並みとエンターテイメントが楽しめる', 'lat': 35.6298, 'lon': 139.7745},
+        ],
+        '文化': [
+            {'name': '歌舞伎座', 'description': '伝統的な歌舞伎を楽しめる劇場', 'lat': 35.6695, 'lon': 139.7679},
+            {'name': '国立新美術館', 'description': '現代アートの展示で有名な美術館', 'lat': 35.6653, 'lon': 139.7263},
+        ]
+    },
+    '京都': {
+        '歴史': [
+            {'name': '清水寺', 'description': '世界遺産に登録された古都京都の象徴的な寺院', 'lat': 34.9949, 'lon': 135.785},
+            {'name': '金閣寺', 'description': '金色に輝く美しい舎利殿で有名', 'lat': 35.0394, 'lon': 135.7292},
+            {'name': '伏見稲荷大社', 'description': '千本鳥居で有名な稲荷神社の総本宮', 'lat': 34.9671, 'lon': 135.7727},
+        ],
+        '自然': [
+            {'name': '嵐山', 'description': '美しい竹林と渡月橋で有名な景勝地', 'lat': 35.0129, 'lon': 135.6777},
+            {'name': '哲学の道', 'description': '桜並木が美しい散歩道', 'lat': 35.0241, 'lon': 135.7946},
+        ],
+        '文化': [
+            {'name': '祇園', 'description': '舞妓さんが歩く伝統的な花街', 'lat': 35.0037, 'lon': 135.775},
+            {'name': '二条城', 'description': '徳川将軍の京都での居住地として使われた城', 'lat': 35.0142, 'lon': 135.7482},
+        ]
+    },
+    '大阪': {
+        '歴史': [
+            {'name': '大阪城', 'description': '豊臣秀吉が築いた名城', 'lat': 34.6873, 'lon': 135.5262},
+            {'name': '住吉大社', 'description': '全国の住吉神社の総本社', 'lat': 34.6126, 'lon': 135.4933},
+        ],
+        '現代': [
+            {'name': '通天閣', 'description': '大阪のシンボルタワー', 'lat': 34.6525, 'lon': 135.5063},
+            {'name': 'ユニバーサル・スタジオ・ジャパン', 'description': '人気のテーマパーク', 'lat': 34.6654, 'lon': 135.4323},
+        ],
+        '文化': [
+            {'name': '道頓堀', 'description': '大阪の食文化とエンターテイメントが集まる繁華街', 'lat': 34.6687, 'lon': 135.5013},
+        ]
+    }
+}
+
+
+def get_features_for_category(category: str) -> Tuple[str, ...]:
+    """カテゴリに応じた特徴を返す"""
+    base_features = ('写真撮影可', 'アクセス良好')
+
+    if '歴史' in category:
+        return base_features + ('文化財', '由緒ある')
+    elif '自然' in category:
+        return base_features + ('四季が美しい', 'リラックス')
+    elif '現代' in category:
+        return base_features + ('最新技術', 'エンターテイメント')
+    else:
+        return base_features + ('伝統文化', '体験可能')
+
+
+def get_best_season(category: str) -> str:
+    """カテゴリに応じたベストシーズンを返す"""
+    if '自然' in category:
+        return '春・秋'
+    else:
+        return '通年'
+
+
+def get_atmosphere(category: str) -> str:
+    """カテゴリに応じた雰囲気を返す"""
+    if '歴史' in category:
+        return '荘厳で静寂'
+    elif '自然' in category:
+        return '開放的で癒される'
+    elif '現代' in category:
+        return '活気あふれる'
+    else:
+        return '文化的で洗練された'
+
+
+def parse_seasons(best_season: str) -> Tuple[str, ...]:
+    """ベストシーズン表記（例: '春・秋', '通年'）を季節のタプルに展開"""
+    if not best_season or '通年' in best_season:
+        return SEASONS
+    return tuple(season for season in SEASONS if season in best_season)
+
+
+@dataclass(frozen=True)
+class CatalogSpot:
+    """派生フィールドを事前計算済みの観光スポット"""
+
+    name: str
+    area: str
+    category: str
+    description: str
+    features: Tuple[str, ...]
+    access: str
+    best_season: str
+    atmosphere: str
+    seasons: Tuple[str, ...]
+    # 要望キーワード照合用（名前・説明・特徴・雰囲気の連結）
+    search_text: str = field(default='', compare=False, repr=False)
+    # 緯度経度（未登録のスポットはNone）
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ツール出力用のdictに変換"""
+        spot = {
+            'name': self.name,
+            'area': self.area,
+            'category': self.category,
+            'description': self.description,
+            'features': list(self.features),
+            'access': self.access,
+            'best_season': self.best_season,
+            'atmosphere': self.atmosphere
+        }
+        if self.lat is not None and self.lon is not None:
+            spot['lat'] = self.lat
+            spot['lon'] = self.lon
+        return spot
+
+
+def build_spot(record: Mapping[str, Any]) -> CatalogSpot:
+    """1レコード分のスポット情報から派生フィールドを計算してCatalogSpotを生成"""
+    area = record['area']
+    category = record['category']
+    name = record['name']
+    description = record.get('description', '')
+    best_season = record.get('best_season') or get_best_season(category)
+    features = tuple(record.get('features') or ()) or get_features_for_category(category)
+    atmosphere = record.get('atmosphere') or get_atmosphere(category)
+    lat, lon = _coordinate(record.get('lat')), _coordinate(record.get('lon'))
+    if lat is None or lon is None:
+        lat = lon = None
+
+    # アクセス表記: 明示指定 > 最寄り駅からの距離 > エリア代表駅からの目安
+    access = record.get('access') or (access_text(lat, lon) if lat is not None else None)
+
+    return CatalogSpot(
+        name=name,
+        area=area,
+        category=category,
+        description=description,
+        features=features,
+        access=access or f'{area}駅から電車で30分以内',
+        best_season=best_season,
+        atmosphere=atmosphere,
+        seasons=parse_seasons(best_season),
+        search_text=' '.join((name, description, ' '.join(features), atmosphere)),
+        lat=lat,
+        lon=lon
+    )
+
+
+def _coordinate(value: Any) -> Optional[float]:
+    """緯度・経度の値（CSVでは文字列）をfloatに変換"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def request_terms(requests: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """要望キーワードを照合用の語に分解（例: '写真撮影' -> '写真撮影', '写真'）"""
+    terms: List[str] = []
+    for request in requests or ():
+        request = str(request).strip()
+        if not request:
+            continue
+        terms.append(request)
+        # 4文字以上の複合語は前半2文字でも照合（'写真撮影' -> '写真'）
+        if len(request) >= 4:
+            terms.append(request[:2])
+    return tuple(dict.fromkeys(terms))
+
+
+def rank_by_requests(spots: Iterable[CatalogSpot], terms: Tuple[str, ...], limit: int) -> List[CatalogSpot]:
+    """要望キーワードの一致数が多い順に安定ソートしてlimit件を返す"""
+    spots = list(spots)
+    if not terms:
+        return spots[:limit]
+    return sorted(
+        spots,
+        key=lambda spot: -sum(1 for term in terms if term in spot.search_text)
+    )[:limit]
+
+
+class SpotCatalog:
+    """不変の観光スポットカタログ（構築後はインデックス参照のみ）"""
+
+    def __init__(self, spots: Iterable[CatalogSpot]):
+        self.spots: Tuple[CatalogSpot, ...] = tuple(spots)
+
+        by_area_category: Dict[Tuple[str, str], List[CatalogSpot]] = {}
+        by_area_season: Dict[Tuple[str, str], List[CatalogSpot]] = {}
+        categories_by_area: Dict[str, List[str]] = {}
+
+        for spot in self.spots:
+            by_area_category.setdefault((spot.area, spot.category), []).append(spot)
+            for season in spot.seasons:
+                by_area_season.setdefault((spot.area, season), []).append(spot)
+            area_categories = categories_by_area.setdefault(spot.area, [])
+            if spot.category not in area_categories:
+                area_categories.append(spot.category)
+
+        self.by_area_category: Mapping[Tuple[str, str], Tuple[CatalogSpot, ...]] = MappingProxyType(
+            {key: tuple(value) for key, value in by_area_category.items()}
+        )
+        self.by_area_season: Mapping[Tuple[str, str], Tuple[CatalogSpot, ...]] = MappingProxyType(
+            {key: tuple(value) for key, value in by_area_season.items()}
+        )
+        self.categories_by_area: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+            {key: tuple(value) for key, value in categories_by_area.items()}
+        )
+        self._by_area_category_season: Mapping[Tuple[str, str, str], Tuple[CatalogSpot, ...]] = MappingProxyType({
+            (area, category, season): in_season
+            for (area, category), spots in self.by_area_category.items()
+            for season in SEASONS
+            for in_season in [tuple(spot for spot in spots if season in spot.seasons)]
+            if in_season
+        })
+        self.by_name: Mapping[str, CatalogSpot] = MappingProxyType({
+            spot.name: spot for spot in reversed(self.spots)
+        })
+        self.geo_index: GeoGridIndex[CatalogSpot] = GeoGridIndex(
+            (spot.lat, spot.lon, spot) for spot in self.spots if spot.lat is not None
+        )
+        # 意味検索インデックスは埋め込み計算を伴うため初回の意味検索時に構築
+        self._semantic_index: Optional[SemanticSpotIndex[CatalogSpot]] = None
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> 'SpotCatalog':
+        """フラットなレコード列（name/area/category/description...）からカタログを構築"""
+        return cls(build_spot(record) for record in records)
+
+    @classmethod
+    def from_database(cls, database: Mapping[str, Mapping[str, List[Mapping[str, Any]]]]) -> 'SpotCatalog':
+        """{エリア: {カテゴリ: [スポット]}} 形式のデータベースからカタログを構築"""
+        return cls.from_records(
+            {**spot, 'area': area, 'category': category}
+            for area, categories in database.items()
+            for category, spots in categories.items()
+            for spot in spots
+        )
+
+    @property
+    def areas(self) -> Tuple[str, ...]:
+        return tuple(self.categories_by_area)
+
+    def spots_for(
+        self,
+        area: str,
+        category: str,
+        season: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[CatalogSpot, ...]:
+        """(エリア, カテゴリ) のスポットを最大limit件。季節指定時はその季節に適したスポットを優先（O(limit)）"""
+        spots = self.by_area_category.get((area, category), ())
+        if limit is None:
+            limit = len(spots)
+        in_season = self._by_area_category_season.get((area, category, season), ()) if season else spots
+        if len(in_season) >= limit or len(in_season) == len(spots):
+            return in_season[:limit]
+
+        # 季節外のスポットで補完（スキップするのは採用済みの最大limit件のみ）
+        selected = list(in_season)
+        taken = set(selected)
+        for spot in spots:
+            if len(selected) >= limit:
+                break
+            if spot not in taken:
+                selected.append(spot)
+        return tuple(selected)
+
+    def lookup(
+        self,
+        area: str,
+        category: str,
+        season: Optional[str] = None,
+        requests: Optional[Iterable[str]] = None,
+        primary_limit: int = 3,
+        secondary_limit: int = 2,
+        max_results: int = 6
+    ) -> List[CatalogSpot]:
+        """指定カテゴリから優先的に選択し、他カテゴリからも補完する（要望キーワードで並べ替え）"""
+        terms = request_terms(requests)
+        window = CANDIDATE_WINDOW if terms else None
+        if area not in self.categories_by_area:
+            area = DEFAULT_AREA if DEFAULT_AREA in self.categories_by_area else next(iter(self.categories_by_area), area)
+
+        # 指定カテゴリから最大primary_limit件
+        spots = rank_by_requests(
+            self.spots_for(area, category, season, window or primary_limit), terms, primary_limit
+        )
+
+        # 他のカテゴリから各secondary_limit件まで補完
+        for other in self.categories_by_area.get(area, ()):
+            if len(spots) >= max_results:
+                break
+            if other != category:
+                spots.extend(rank_by_requests(
+                    self.spots_for(area, other, season, window or secondary_limit), terms, secondary_limit
+                ))
+
+        return spots[:max_results]
+
+
+    def place_coordinates(self, place: str) -> Optional[Tuple[float, float]]:
+        """駅名・スポット名から座標を求める（見つからなければNone）"""
+        coordinates = station_coordinates(place)
+        if coordinates is not None:
+            return coordinates
+        spot = self.by_name.get(place.strip())
+        if spot is not None and spot.lat is not None:
+            return spot.lat, spot.lon
+        return None
+
+    def near(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float = DEFAULT_NEARBY_RADIUS_M,
+        category: Optional[str] = None,
+        max_results: int = 6
+    ) -> List[Tuple[float, CatalogSpot]]:
+        """半径radius_m以内のスポットを近い順に返す（指定カテゴリのスポットを優先）"""
+        return prefer_category(self.geo_index.radius(lat, lon, radius_m), category, max_results)
+
+    @property
+    def semantic_index(self) -> SemanticSpotIndex[CatalogSpot]:
+        if self._semantic_index is None:
+            self._semantic_index = SemanticSpotIndex(
+                (spot, spot.area, semantic_text(spot)) for spot in self.spots
+            )
+        return self._semantic_index
+
+    def semantic_search(self, text: str, area: Optional[str] = None, k: int = 10) -> List[Tuple[float, CatalogSpot]]:
+        """自由記述（例: '静かで写真映えする場所'）に近いスポットを類似度順に返す"""
+        return self.semantic_index.search(text, k, area)
+
+
+def semantic_text(spot: CatalogSpot) -> str:
+    """意味検索でスポットを表すテキスト（名前・説明・特徴・雰囲気・カテゴリ）"""
+    return f"{spot.search_text} {spot.category}"
+
+
+def prefer_category(
+    nearby: List[Tuple[float, CatalogSpot]], category: Optional[str], max_results: int
+) -> List[Tuple[float, CatalogSpot]]:
+    """距離順のスポット列を、指定カテゴリのものを先頭にして安定ソートする"""
+    if category:
+        nearby = sorted(nearby, key=lambda pair: pair[1].category != category)
+    return nearby[:max_results]
+
+
+# import時に1度だけ構築
+SPOT_CATALOG = SpotCatalog.from_database(TOURISM_DATABASE)
@@ -0,0 +1,358 @@
+"""
+観光スポットのスコアリングエンジン
+候補スポットとsearch_paramsをNumPyの特徴量配列に変換し、1回のベクトル演算で全候補を採点して
+MMR（Maximal Marginal Relevance）でカテゴリ・エリアの多様性を考慮しながら上位を選定する
+クエリに依存しない特徴（カテゴリ・エリアのコード、季節ビット、要望の照合結果）はスポットごとに一度だけ符号化して再利用する
+"""
+
+import json
+import math
+import os
+import threading
+from dataclasses import asdict, dataclass, fields
+from functools import lru_cache
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .spot_catalog import SEASONS, parse_seasons, request_terms
+
+# 特徴量の列（RankingWeightsのフィールド名と対応）
+FEATURES = ('category', 'season', 'requests', 'area', 'proximity', 'prior')
+
+# 季節の全ビット（通年スポットの判定用）
+_ALL_SEASONS_MASK = (1 << len(SEASONS)) - 1
+# 近接スコアが1/eになる距離
+PROXIMITY_SCALE_M = 1000.0
+# 多様性の類似度: 同じカテゴリ / 同じエリアの重み
+CATEGORY_SIMILARITY = 0.7
+AREA_SIMILARITY = 0.3
+# 符号化済みの特徴を保持するスポット数（超えたら作り直す）・要望語の照合結果を保持する語数の上限
+FEATURE_CACHE_MAX_SPOTS = int(os.getenv('TOURISM_RANKER_CACHE_SPOTS', '200000'))
+FEATURE_CACHE_MAX_TERMS = 1024
+
+
+@dataclass(frozen=True)
+class RankingWeights:
+    """特徴量ごとの重みと多様性の強さ（diversity: 0で関連度のみ、1で多様性のみ）"""
+
+    category: float = 1.0
+    season: float = 0.5
+    requests: float = 0.8
+    area: float = 0.3
+    proximity: float = 0.6
+    prior: float = 0.2
+    diversity: float = 0.3
+
+    @classmethod
+    def from_env(cls) -> 'RankingWeights':
+        """環境変数 TOURISM_RANKING_WEIGHTS（JSON、例: {"season": 1.0, "diversity": 0.5}）で上書き"""
+        raw = os.getenv('TOURISM_RANKING_WEIGHTS')
+        if not raw:
+            return cls()
+        try:
+            overrides = json.loads(raw)
+        except json.JSONDecodeError as e:
+            print(f"TOURISM_RANKING_WEIGHTS の解析に失敗しました（デフォルトを使用）: {e}")
+            return cls()
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: float(value) for key, value in overrides.items() if key in names})
+
+    def vector(self) -> np.ndarray:
+        return np.array([getattr(self, name) for name in FEATURES], dtype=np.float64)
+
+    def to_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+
+def normalize_requests(search_params: Mapping[str, Any]) -> List[str]:
+    """search_params['requests']を空要素を除いた文字列リストにする"""
+    requests = search_params.get('requests') or []
+    if isinstance(requests, str):
+        requests = [requests]
+    return [str(r).strip() for r in requests if str(r).strip()]
+
+
+@lru_cache(maxsize=256)
+def _season_mask(best_season: str) -> int:
+    """ベストシーズン表記を季節ビットに変換（表記の種類は少ないためメモ化）"""
+    mask = 0
+    for season in parse_seasons(best_season):
+        mask |= 1 << SEASONS.index(season)
+    return mask
+
+
+def _search_text(spot: Mapping[str, Any]) -> str:
+    features = spot.get('features') or ()
+    if isinstance(features, str):
+        features = (features,)
+    return f"{spot.get('name', '')} {spot.get('description', '')} {' '.join(map(str, features))} {spot.get('atmosphere', '')}"
+
+
+# スポットの識別キー（カタログ・スポットストアと同じく (エリア, 名前) で一意）
+_KEY_FIELDS = itemgetter('area', 'name')
+
+
+class _FeatureTable:
+    """符号化済みの特徴の表（行の追加のみ。上限を超えたら新しい表に置き換え、古い表は参照中の候補がそのまま使う）"""
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.rows: Dict[Tuple[str, str], int] = {}
+        self.category_labels: Dict[str, int] = {}
+        self.area_labels: Dict[str, int] = {}
+        self._category_codes: List[int] = []
+        self._area_codes: List[int] = []
+        self._season_masks: List[int] = []
+        self._search_texts: List[str] = []
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        # 行を追加したら配列と照合結果を作り直す（追加は初めて見たスポットがある場合に限られる）
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._texts: Optional[np.ndarray] = None
+        self._term_hits: Dict[str, np.ndarray] = {}
+
+    def append(self, spot: Mapping[str, Any]) -> int:
+        """スポットを符号化して行を追加（ロックを取得した状態で呼ぶ）"""
+        category_labels, area_labels = self.category_labels, self.area_labels
+        self._category_codes.append(category_labels.setdefault(str(spot.get('category', '')), len(category_labels)))
+        self._area_codes.append(area_labels.setdefault(str(spot.get('area', '')), len(area_labels)))
+        self._season_masks.append(_season_mask(str(spot.get('best_season') or '')))
+        self._search_texts.append(_search_text(spot))
+        if self._arrays is not None or self._term_hits:
+            self._invalidate()
+        return len(self._category_codes) - 1
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """全行のカテゴリコード・エリアコード・季節ビット"""
+        with self._lock:
+            if self._arrays is None:
+                self._arrays = (
+                    np.array(self._category_codes, dtype=np.int64),
+                    np.array(self._area_codes, dtype=np.int64),
+                    np.array(self._season_masks, dtype=np.int64)
+                )
+            return self._arrays
+
+    def term_hits(self, term: str) -> np.ndarray:
+        """全行に対する要望語の一致（固定長Unicode配列にしてnp.char.findで一括照合した結果を語ごとに保持）"""
+        with self._lock:
+            hits = self._term_hits.get(term)
+            if hits is None:
+                if self._texts is None:
+                    self._texts = np.array(self._search_texts, dtype=np.str_)
+                if len(self._term_hits) >= FEATURE_CACHE_MAX_TERMS:
+                    self._term_hits.clear()
+                hits = self._term_hits[term] = np.char.find(self._texts, term) >= 0
+            return hits
+
+
+class SpotFeatureCache:
+    """スポットごとのクエリ非依存な特徴（カテゴリ・エリアのコード、季節ビット、要望語の照合結果）を
+    (エリア, 名前) をキーに一度だけ符号化して保持する
+
+    リクエストでは候補の行番号で配列を取り出すだけで、初めて見たスポットのみ符号化する。
+    カタログを入れ替えて同じキーのスポットの内容が変わる場合は clear() で作り直す
+    """
+
+    def __init__(self, max_spots: int = FEATURE_CACHE_MAX_SPOTS):
+        self.max_spots = max_spots
+        self._lock = threading.Lock()
+        self._table = _FeatureTable(self._lock)
+
+    def __getstate__(self):
+        # ロックはpickleできないため、デプロイ先では上限のみ引き継いで空のキャッシュから始める
+        return {'max_spots': self.max_spots}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._table = _FeatureTable(self._lock)
+
+    def __len__(self) -> int:
+        return len(self._table.rows)
+
+    def encode(self, spots: Sequence[Mapping[str, Any]]) -> Tuple[_FeatureTable, np.ndarray]:
+        """候補スポットの表と行番号（未登録のスポットはここで符号化して追加）"""
+        try:
+            keys = list(map(_KEY_FIELDS, spots))
+        except KeyError:
+            keys = [(spot.get('area', ''), spot.get('name', '')) for spot in spots]
+        with self._lock:
+            if len(self._table.rows) >= self.max_spots:
+                self._table = _FeatureTable(self._lock)
+            table = self._table
+            indices = np.fromiter(map(table.rows.get, keys, repeat(-1)), dtype=np.int64, count=len(keys))
+            for position in np.flatnonzero(indices < 0):
+                key = keys[position]
+                index = table.rows.get(key, -1)
+                if index < 0:
+                    index = table.rows[key] = table.append(spots[position])
+                indices[position] = index
+        return table, indices
+
+
+class CandidateMatrix:
+    """候補スポットの特徴（符号化済みの特徴を行番号で取り出し、距離と事前スコアはリクエストごとに求める）
+
+    cache: スポットごとの符号化を再利用するキャッシュ（省略時はこの候補だけを符号化する）
+    """
+
+    def __init__(self, spots: Sequence[Mapping[str, Any]], cache: Optional[SpotFeatureCache] = None):
+        self.spots = list(spots)
+        n = len(self.spots)
+        self.table, self.rows = (cache if cache is not None else SpotFeatureCache()).encode(self.spots)
+        category_codes, area_codes, season_masks = self.table.arrays()
+        self.category_labels = self.table.category_labels
+        self.area_labels = self.table.area_labels
+        self.category_codes = category_codes[self.rows]
+        self.area_codes = area_codes[self.rows]
+        self.season_masks = season_masks[self.rows]
+        distances = [s.get('distance_m') for s in self.spots]
+        try:
+            # 距離のない候補（None）はNaNになる
+            self.distances = np.array(distances, dtype=np.float64).reshape(n)
+        except (TypeError, ValueError):
+            self.distances = np.fromiter(
+                (float(d) if isinstance(d, (int, float)) else math.nan for d in distances), dtype=np.float64, count=n
+            )
+        # 検索結果の順位（カタログ側の並び）を弱い事前スコアとして使う
+        self.prior = 1.0 - np.arange(n, dtype=np.float64) / max(n, 1)
+
+    def __len__(self) -> int:
+        return len(self.spots)
+
+    @staticmethod
+    def _code(labels: Mapping[str, int], value: Any) -> int:
+        return labels.get(str(value), -1)
+
+    def request_matches(self, requests: Sequence[str]) -> np.ndarray:
+        """要望ごとの一致（候補数 × 要望数 の0/1行列）"""
+        matrix = np.zeros((len(self.spots), len(requests)), dtype=np.float64)
+        if not requests or not self.spots:
+            return matrix
+        for j, request in enumerate(requests):
+            hits = np.zeros(len(self.spots), dtype=np.bool_)
+            for term in request_terms([request]):
+                hits |= self.table.term_hits(term)[self.rows]
+            matrix[:, j] = hits
+        return matrix
+
+    def features(self, search_params: Mapping[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """search_paramsに対する特徴量行列（候補数 × len(FEATURES)）と要望一致行列"""
+        n = len(self.spots)
+        matrix = np.zeros((n, len(FEATURES)), dtype=np.float64)
+
+        category_code = self._code(self.category_labels, search_params.get('category') or '')
+        matrix[:, 0] = self.category_codes == category_code
+
+        season = search_params.get('season') or ''
+        if season in SEASONS:
+            in_season = (self.season_masks & (1 << SEASONS.index(season))) != 0
+            # 通年スポットより、その季節が見頃のスポットを高く評価
+            matrix[:, 1] = np.where(in_season, np.where(self.season_masks == _ALL_SEASONS_MASK, 0.5, 1.0), 0.0)
+
+        requests = normalize_requests(search_params)
+        request_matrix = self.request_matches(requests)
+        if requests:
+            matrix[:, 2] = request_matrix.mean(axis=1)
+
+        area_code = self._code(self.area_labels, search_params.get('area') or '')
+        matrix[:, 3] = self.area_codes == area_code
+
+        matrix[:, 4] = np.nan_to_num(np.exp(-self.distances / PROXIMITY_SCALE_M), nan=0.0)
+        matrix[:, 5] = self.prior
+        return matrix, request_matrix
+
+
+class SpotRanker:
+    """特徴量の重み付き和で関連度を求め、MMRで多様性を考慮して上位を選ぶ
+
+    feature_cache: スポットごとの符号化済みの特徴（リクエスト間で共有）
+    """
+
+    def __init__(self, weights: Optional[RankingWeights] = None, feature_cache: Optional[SpotFeatureCache] = None):
+        self.weights = weights or RankingWeights()
+        self._weight_vector = self.weights.vector()
+        self.feature_cache = feature_cache if feature_cache is not None else SpotFeatureCache()
+
+    def relevance(self, matrix: np.ndarray) -> np.ndarray:
+        """全候補の関連度（1回の行列ベクトル積）"""
+        return matrix @ self._weight_vector
+
+    def select(self, candidates: CandidateMatrix, relevance: np.ndarray, top_k: int) -> List[int]:
+        """MMR: λ・関連度 − (1−λ)・選定済みスポットとの最大類似度 が最大の候補を順に選ぶ"""
+        n = len(candidates)
+        top_k = min(top_k, n)
+        if top_k <= 0:
+            return []
+        scale = relevance.max() if n and relevance.max() > 0 else 1.0
+        normalized = relevance / scale
+        trade_off = 1.0 - min(max(self.weights.diversity, 0.0), 1.0)
+
+        selected: List[int] = []
+        max_similarity = np.zeros(n, dtype=np.float64)
+        available = np.ones(n, dtype=np.bool_)
+        for _ in range(top_k):
+            mmr = trade_off * normalized - (1.0 - trade_off) * max_similarity
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            # 類似度は選定済みスポットとの比較分のみ逐次更新（候補数 × 選定数）
+            similarity = (
+                CATEGORY_SIMILARITY * (candidates.category_codes == candidates.category_codes[best])
+                + AREA_SIMILARITY * (candidates.area_codes == candidates.area_codes[best])
+            )
+            np.maximum(max_similarity, similarity, out=max_similarity)
+        return selected
+
+    def rank(
+        self, spots: Sequence[Mapping[str, Any]], search_params: Mapping[str, Any], top_k: int = 5
+    ) -> List[Dict[str, Any]]:
+        """候補スポットから上位top_k件を選び、score と reason を付けて返す"""
+        if not spots:
+            return []
+        candidates = CandidateMatrix(spots, self.feature_cache)
+        matrix, request_matrix = candidates.features(search_params)
+        relevance = self.relevance(matrix)
+        requests = normalize_requests(search_params)
+
+        ranked = []
+        for index in self.select(candidates, relevance, top_k):
+            spot = dict(candidates.spots[index])
+            spot['score'] = round(float(relevance[index]), 4)
+            spot['reason'] = build_reason(spot, matrix[index], request_matrix[index], requests, search_params)
+            ranked.append(spot)
+        return ranked
+
+
+def build_reason(
+    spot: Mapping[str, Any],
+    feature_row: np.ndarray,
+    request_row: np.ndarray,
+    requests: Sequence[str],
+    search_params: Mapping[str, Any]
+) -> str:
+    """スコアに寄与した特徴から選定理由を組み立てる"""
+    category = spot.get('category') or ''
+    parts = []
+    if feature_row[0]:
+        parts.append(f"{category}の条件に合致")
+    elif category:
+        parts.append(f"{category}の魅力も楽しめる")
+    if feature_row[1] == 1.0:
+        parts.append(f"{search_params.get('season')}が見頃")
+    elif feature_row[1]:
+        parts.append(f"{search_params.get('season')}も楽しめる")
+    matched = [request for request, hit in zip(requests, request_row) if hit]
+    if matched:
+        parts.append(f"{'・'.join(matched)}の希望に合う")
+    if feature_row[4] and spot.get('proximity'):
+        parts.append(str(spot['proximity']))
+    return '、'.join(parts) if parts else f"{spot.get('area', '')}の代表的なスポット"
@@ -0,0 +1,520 @@
+"""
+SQLite観光スポットストア
+WALモードのSQLiteファイル + FTS5全文検索で数万〜数十万件のスポットを扱う。
+読み取りは読み取り専用コネクションプール経由、取り込みはCLI（spot_store_cli.py）で行う。
+"""
+
+import csv
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .geo_index import DEFAULT_NEARBY_RADIUS_M, GeoGridIndex, station_coordinates
+from .semantic_index import SemanticSpotIndex
+from .spot_catalog import (
+    CANDIDATE_WINDOW,
+    DEFAULT_AREA,
+    SEASONS,
+    TOURISM_DATABASE,
+    CatalogSpot,
+    build_spot,
+    request_terms,
+)
+
+# features列の区切り文字（JSONより高速に復元できる単位区切り文字）
+FEATURE_SEPARATOR = '\x1f'
+
+# 季節のビット（'春・秋' -> 春|秋）
+SEASON_BITS = {season: 1 << i for i, season in enumerate(SEASONS)}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spots (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    area TEXT NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    features TEXT NOT NULL,
+    access TEXT NOT NULL,
+    best_season TEXT NOT NULL,
+    atmosphere TEXT NOT NULL,
+    season_mask INTEGER NOT NULL,
+    search_text TEXT NOT NULL,
+    lat REAL,
+    lon REAL,
+    scope TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_spots_area_category ON spots(area, category, id);
+CREATE INDEX IF NOT EXISTS idx_spots_name ON spots(name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_spots_area_name ON spots(area, name);
+CREATE TABLE IF NOT EXISTS spot_seasons (
+    area TEXT NOT NULL,
+    category TEXT NOT NULL,
+    season TEXT NOT NULL,
+    spot_id INTEGER NOT NULL,
+    PRIMARY KEY (area, category, season, spot_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS spots_fts USING fts5(
+    name, description, features, scope,
+    content='spots', content_rowid='id', tokenize='trigram'
+);
+"""
+
+_SPOT_COLUMNS = "id, name, area, category, description, features, access, best_season, atmosphere, season_mask, search_text, lat, lon"
+
+# FTS5 trigramで検索できる最短の語長（それ未満はinstrで照合）
+_FTS_MIN_TERM_LENGTH = 3
+
+# scope列に使う文字（Unicodeの私用領域）
+_SCOPE_CODEPOINT = 0xE000
+_SCOPE_CODEPOINTS = 6400
+
+
+def _scope(area: str, category: str) -> str:
+    """scope列の値: (エリア, カテゴリ) ごとの私用領域の3文字（trigram 1つで、その (エリア, カテゴリ) の行だけに一致する）
+
+    エリア名そのものは多くの行と共通のtrigramを含み、MATCHでの絞り込みが遅くなるためハッシュ値を使う
+    """
+    digest = int.from_bytes(hashlib.blake2b(f'{area}\x1f{category}'.encode('utf-8'), digest_size=8).digest(), 'big')
+    return ''.join(chr(_SCOPE_CODEPOINT + (digest >> (13 * i)) % _SCOPE_CODEPOINTS) for i in range(3))
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _season_mask(seasons: Iterable[str]) -> int:
+    mask = 0
+    for season in seasons:
+        mask |= SEASON_BITS.get(season, 0)
+    return mask
+
+
+def _row_to_spot(row: Tuple) -> CatalogSpot:
+    _, name, area, category, description, features, access, best_season, atmosphere, season_mask, search_text, lat, lon = row
+    return CatalogSpot(
+        name=name,
+        area=area,
+        category=category,
+        description=description,
+        features=tuple(features.split(FEATURE_SEPARATOR)) if features else (),
+        access=access,
+        best_season=best_season,
+        atmosphere=atmosphere,
+        seasons=tuple(season for season, bit in SEASON_BITS.items() if season_mask & bit),
+        search_text=search_text,
+        lat=lat,
+        lon=lon
+    )
+
+
+class SQLiteSpotStore:
+    """SQLiteファイルを参照する観光スポットストア（SpotCatalogと同じlookupインターフェース）"""
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: Optional['queue.Queue[sqlite3.Connection]'] = None
+        self._pool_lock = threading.Lock()
+        self._categories_by_area: Optional[Dict[str, Tuple[str, ...]]] = None
+        self._geo_index: Optional[GeoGridIndex[int]] = None
+        self._semantic_index: Optional[SemanticSpotIndex[int]] = None
+
+    def __getstate__(self):
+        # コネクションはpickleできないため、デプロイ先ではプロセスごとに開き直す
+        return {'path': self.path, 'pool_size': self.pool_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """プールから読み取り専用コネクションを借りる"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    pool: 'queue.Queue[sqlite3.Connection]' = queue.Queue()
+                    for _ in range(self.pool_size):
+                        pool.put(self._connect())
+                    self._pool = pool
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @property
+    def categories_by_area(self) -> Dict[str, Tuple[str, ...]]:
+        if self._categories_by_area is None:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    "SELECT area, category, MIN(id) AS first_id FROM spots"
+                    " GROUP BY area, category ORDER BY area, first_id"
+                ).fetchall()
+            categories: Dict[str, List[str]] = {}
+            for area, category, _ in rows:
+                categories.setdefault(area, []).append(category)
+            self._categories_by_area = {area: tuple(cats) for area, cats in categories.items()}
+        return self._categories_by_area
+
+    @property
+    def areas(self) -> Tuple[str, ...]:
+        return tuple(self.categories_by_area)
+
+    def candidate_ids(
+        self,
+        conn: sqlite3.Connection,
+        area: str,
+        category: str,
+        season: Optional[str],
+        limit: int
+    ) -> List[int]:
+        """(エリア, カテゴリ) のスポットIDを最大limit件。季節指定時はその季節のスポットを優先（インデックスのみ参照）"""
+        ids: List[int] = []
+        if season in SEASON_BITS:
+            ids = [row[0] for row in conn.execute(
+                "SELECT spot_id FROM spot_seasons WHERE area = ? AND category = ? AND season = ?"
+                " ORDER BY spot_id LIMIT ?",
+                (area, category, season, limit)
+            )]
+        if len(ids) < limit:
+            # 季節外のスポットで補完
+            in_season = set(ids)
+            ids += [
+                row[0] for row in conn.execute(
+                    "SELECT id FROM spots WHERE area = ? AND category = ? ORDER BY id LIMIT ?",
+                    (area, category, limit + len(in_season))
+                )
+                if row[0] not in in_season
+            ][:limit - len(ids)]
+        return ids
+
+    def matching_ids(
+        self,
+        conn: sqlite3.Connection,
+        area: str,
+        category: str,
+        season: Optional[str],
+        terms: Tuple[str, ...],
+        limit: int
+    ) -> List[int]:
+        """要望キーワードに一致する (エリア, カテゴリ) のスポットIDを一致数の多い順に最大limit件（同数なら季節の合うもの優先）
+
+        3文字以上の語はFTS5（trigram）でscope列と合わせて (エリア, カテゴリ) 内に絞り込み、
+        trigramで扱えない短い語のみinstrで照合する。一致件数・行数によらず検索時間を一定に保つため、
+        並べ替えるのは語ごとのFTS5の一致のID順で先頭CANDIDATE_WINDOW件と、ID順で先頭CANDIDATE_WINDOW行のうち短い語に一致する行のみ
+        """
+        long_terms = [term for term in terms if len(term) >= _FTS_MIN_TERM_LENGTH]
+        short_terms = [term for term in terms if len(term) < _FTS_MIN_TERM_LENGTH]
+        branches: List[str] = []
+        params: List[Any] = []
+        if long_terms:
+            # 語ごとに先頭CANDIDATE_WINDOW件（多くの行に一致する語があっても、まれな語に一致する行を取りこぼさない）
+            scope = _fts_phrase(_scope(area, category))
+            fts_queries = ' UNION ALL '.join(
+                'SELECT * FROM (SELECT rowid FROM spots_fts WHERE spots_fts MATCH ? LIMIT ?)' for _ in long_terms
+            )
+            branches.append(
+                f"SELECT id, search_text, season_mask FROM spots WHERE id IN ({fts_queries}) AND area = ? AND category = ?"
+            )
+            for term in long_terms:
+                params.extend((f"scope : {scope} AND {{name description features}} : {_fts_phrase(term)}", CANDIDATE_WINDOW))
+            params.extend((area, category))
+        if short_terms:
+            branches.append(
+                "SELECT * FROM (SELECT id, search_text, season_mask FROM spots WHERE area = ? AND category = ?"
+                f" ORDER BY id LIMIT ?) WHERE {' OR '.join('instr(search_text, ?) > 0' for _ in short_terms)}"
+            )
+            params.extend((area, category, CANDIDATE_WINDOW, *short_terms))
+        score_expr = ' + '.join('(instr(search_text, ?) > 0)' for _ in terms)
+        sql = (
+            f"SELECT id FROM ({' UNION '.join(branches)})"
+            f" ORDER BY ({score_expr}) DESC, (season_mask & ?) != 0 DESC, id LIMIT ?"
+        )
+        params.extend((*terms, SEASON_BITS.get(season, 0), limit))
+        return [row[0] for row in conn.execute(sql, params)]
+
+    def select_spots(
+        self,
+        conn: sqlite3.Connection,
+        area: str,
+        category: str,
+        season: Optional[str],
+        terms: Tuple[str, ...],
+        limit: int
+    ) -> List[CatalogSpot]:
+        """要望キーワードに一致するスポットを優先し、足りない分を候補IDで補完して、上位limit件のみ行全体を読み込む"""
+        ids = self.matching_ids(conn, area, category, season, terms, limit) if terms else []
+        if len(ids) < limit:
+            matched = set(ids)
+            ids += [
+                spot_id for spot_id in self.candidate_ids(conn, area, category, season, limit + len(matched))
+                if spot_id not in matched
+            ][:limit - len(ids)]
+        if not ids:
+            return []
+        rows = {
+            row[0]: row for row in conn.execute(
+                f"SELECT {_SPOT_COLUMNS} FROM spots WHERE id IN ({', '.join('?' * len(ids))})", ids
+            )
+        }
+        return [_row_to_spot(rows[spot_id]) for spot_id in ids if spot_id in rows]
+
+    def lookup(
+        self,
+        area: str,
+        category: str,
+        season: Optional[str] = None,
+        requests: Optional[Iterable[str]] = None,
+        primary_limit: int = 3,
+        secondary_limit: int = 2,
+        max_results: int = 6
+    ) -> List[CatalogSpot]:
+        """指定カテゴリから優先的に選択し、他カテゴリからも補完する（SpotCatalog.lookupと同じ規則）"""
+        categories_by_area = self.categories_by_area
+        if area not in categories_by_area:
+            area = DEFAULT_AREA if DEFAULT_AREA in categories_by_area else next(iter(categories_by_area), area)
+
+        terms = request_terms(requests)
+        with self.connection() as conn:
+            spots = self.select_spots(conn, area, category, season, terms, primary_limit)
+            for other in categories_by_area.get(area, ()):
+                if len(spots) >= max_results:
+                    break
+                if other != category:
+                    spots.extend(self.select_spots(conn, area, other, season, terms, secondary_limit))
+        return spots[:max_results]
+
+    @property
+    def geo_index(self) -> GeoGridIndex[int]:
+        """スポットIDの位置情報インデックス（初回参照時に座標列のみ読み込んでメモリ上に構築）"""
+        if self._geo_index is None:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    "SELECT lat, lon, id FROM spots WHERE lat IS NOT NULL AND lon IS NOT NULL"
+                ).fetchall()
+            self._geo_index = GeoGridIndex(rows)
+        return self._geo_index
+
+    def place_coordinates(self, place: str) -> Optional[Tuple[float, float]]:
+        """駅名・スポット名から座標を求める（見つからなければNone）"""
+        coordinates = station_coordinates(place)
+        if coordinates is not None:
+            return coordinates
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT lat, lon FROM spots WHERE name = ? AND lat IS NOT NULL ORDER BY id LIMIT 1",
+                (place.strip(),)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def near(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float = DEFAULT_NEARBY_RADIUS_M,
+        category: Optional[str] = None,
+        max_results: int = 6
+    ) -> List[Tuple[float, CatalogSpot]]:
+        """半径radius_m以内のスポットを近い順に返す（指定カテゴリのスポットを優先）"""
+        nearby = self.geo_index.radius(lat, lon, radius_m)
+        if not nearby:
+            return []
+        with self.connection() as conn:
+            if category:
+                # カテゴリ優先の並べ替えには半径内全件のカテゴリのみ読み、行全体は上位max_results件のみ
+                categories = dict(self._fetch_in(conn, "id, category", [spot_id for _, spot_id in nearby]))
+                nearby = sorted(nearby, key=lambda pair: categories.get(pair[1]) != category)
+            nearby = nearby[:max_results]
+            rows = {row[0]: row for row in self._fetch_in(conn, _SPOT_COLUMNS, [spot_id for _, spot_id in nearby])}
+        return [(distance, _row_to_spot(rows[spot_id])) for distance, spot_id in nearby if spot_id in rows]
+
+    @property
+    def semantic_index(self) -> SemanticSpotIndex[int]:
+        """スポットIDの意味検索インデックス（初回参照時に照合用テキストのみ読み込んで構築）"""
+        if self._semantic_index is None:
+            with self.connection() as conn:
+                rows = conn.execute("SELECT id, area, search_text || ' ' || category FROM spots").fetchall()
+            self._semantic_index = SemanticSpotIndex(rows)
+        return self._semantic_index
+
+    def semantic_search(self, text: str, area: Optional[str] = None, k: int = 10) -> List[Tuple[float, CatalogSpot]]:
+        """自由記述に近いスポットを類似度順に返す（SpotCatalog.semantic_searchと同じ）"""
+        hits = self.semantic_index.search(text, k, area)
+        if not hits:
+            return []
+        with self.connection() as conn:
+            rows = {row[0]: row for row in self._fetch_in(conn, _SPOT_COLUMNS, [spot_id for _, spot_id in hits])}
+        return [(score, _row_to_spot(rows[spot_id])) for score, spot_id in hits if spot_id in rows]
+
+    @staticmethod
+    def _fetch_in(conn: sqlite3.Connection, columns: str, ids: List[int]) -> List[Tuple]:
+        """IDリストで行を取得（SQLiteの変数上限を超えないよう分割）"""
+        rows: List[Tuple] = []
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            rows.extend(conn.execute(
+                f"SELECT {columns} FROM spots WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return rows
+
+    def search_text(self, text: str, area: Optional[str] = None, limit: int = 10) -> List[CatalogSpot]:
+        """名前・説明・特徴の全文検索（空白区切りの語をOR検索）
+        
+        一致件数に比例する順位付けは行わず、先頭から最大limit件で打ち切ることで検索時間を抑える
+        """
+        terms = [term for term in re.split(r'\s+', text.strip()) if term]
+        long_terms = [term for term in terms if len(term) >= _FTS_MIN_TERM_LENGTH]
+        short_terms = [term for term in terms if len(term) < _FTS_MIN_TERM_LENGTH]
+        if not terms:
+            return []
+
+        with self.connection() as conn:
+            if long_terms:
+                match = ' OR '.join(_fts_phrase(term) for term in long_terms)
+                sql = (
+                    f"SELECT {', '.join('s.' + c.strip() for c in _SPOT_COLUMNS.split(','))}"
+                    " FROM spots_fts JOIN spots s ON s.id = spots_fts.rowid"
+                    " WHERE spots_fts MATCH ?"
+                )
+                params: List[Any] = [match]
+                if area:
+                    sql += " AND s.area = ?"
+                    params.append(area)
+                sql += " LIMIT ?"
+                params.append(limit)
+            else:
+                # trigramで扱えない短い語は部分一致で照合
+                sql = f"SELECT {_SPOT_COLUMNS} FROM spots WHERE ("
+                sql += ' OR '.join('instr(search_text, ?) > 0' for _ in short_terms) + ")"
+                params = list(short_terms)
+                if area:
+                    sql += " AND area = ?"
+                    params.append(area)
+                sql += " ORDER BY id LIMIT ?"
+                params.append(limit)
+            rows = conn.execute(sql, params).fetchall()
+        return [_row_to_spot(row) for row in rows]
+
+
+def ingest_records(path: str, records: Iterable[Mapping[str, Any]], batch_size: int = 5000) -> int:
+    """スポットレコードをSQLiteファイルに取り込む（WALモード、バッチ挿入）
+
+    (エリア, 名前) が同じスポットは同じIDのまま置き換えるため、同じファイルを何度取り込んでも件数は増えない
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+
+        count = 0
+        # (エリア, 名前) -> (行, 季節)。同じバッチ内の重複は後のレコードで置き換える
+        pending: Dict[Tuple[str, str], Tuple[Tuple, Tuple[str, ...]]] = {}
+        replaced_ids: List[int] = []
+
+        def flush():
+            spot_rows = [row for row, _ in pending.values()]
+            with conn:
+                if replaced_ids:
+                    # 置き換える行の全文検索エントリと季節を、書き換え前の値で削除する
+                    for start in range(0, len(replaced_ids), 900):
+                        chunk = replaced_ids[start:start + 900]
+                        placeholders = ', '.join('?' * len(chunk))
+                        conn.execute(
+                            "INSERT INTO spots_fts (spots_fts, rowid, name, description, features, scope)"
+                            f" SELECT 'delete', id, name, description, replace(features, ?, ' '), scope FROM spots"
+                            f" WHERE id IN ({placeholders})",
+                            (FEATURE_SEPARATOR, *chunk)
+                        )
+                        conn.execute(f"DELETE FROM spot_seasons WHERE spot_id IN ({placeholders})", chunk)
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO spots ({_SPOT_COLUMNS}, scope)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(*row, _scope(row[2], row[3])) for row in spot_rows]
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO spot_seasons (area, category, season, spot_id) VALUES (?, ?, ?, ?)",
+                    [(row[2], row[3], season, row[0]) for row, seasons in pending.values() for season in seasons]
+                )
+                conn.executemany(
+                    "INSERT INTO spots_fts (rowid, name, description, features, scope) VALUES (?, ?, ?, ?, ?)",
+                    [(row[0], row[1], row[4], row[5].replace(FEATURE_SEPARATOR, ' '), _scope(row[2], row[3]))
+                     for row in spot_rows]
+                )
+            pending.clear()
+            replaced_ids.clear()
+
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM spots").fetchone()[0]
+        for record in records:
+            spot = build_spot(record)
+            key = (spot.area, spot.name)
+            if key in pending:
+                spot_id = pending[key][0][0]
+            else:
+                existing = conn.execute("SELECT id FROM spots WHERE area = ? AND name = ?", key).fetchone()
+                if existing:
+                    spot_id = existing[0]
+                    replaced_ids.append(spot_id)
+                else:
+                    spot_id = next_id
+                    next_id += 1
+            pending[key] = ((
+                spot_id, spot.name, spot.area, spot.category, spot.description,
+                FEATURE_SEPARATOR.join(spot.features), spot.access,
+                spot.best_season, spot.atmosphere, _season_mask(spot.seasons), spot.search_text,
+                spot.lat, spot.lon
+            ), spot.seasons)
+            count += 1
+            if len(pending) >= batch_size:
+                flush()
+        if pending:
+            flush()
+
+        with conn:
+            conn.execute("INSERT INTO spots_fts (spots_fts) VALUES ('optimize')")
+        conn.execute("ANALYZE")
+        return count
+    finally:
+        conn.close()
+
+
+def _split_features(value: Any) -> List[str]:
+    """CSVの特徴列（'|' または '、' 区切り）をリストに変換"""
+    if isinstance(value, list):
+        return value
+    return [feature.strip() for feature in re.split(r'[|、,]', value or '') if feature.strip()]
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """JSONL / CSV ファイルからスポットレコードを読み込む"""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            rows: Iterable[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if 'features' in row:
+                row['features'] = _split_features(row['features'])
+            yield row
+
+
+def builtin_records() -> Iterator[Dict[str, Any]]:
+    """組み込みの固定データベースをレコード列として返す"""
+    for area, categories in TOURISM_DATABASE.items():
+        for category, spots in categories.items():
+            for spot in spots:
+                yield {**spot, 'area': area, 'category': category}
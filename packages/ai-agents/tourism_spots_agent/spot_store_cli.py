@@ -0,0 +1,54 @@
+"""
+観光スポットSQLiteストア管理CLI
+
+使い方:
+    python -m tourism_spots_agent.spot_store_cli ingest --db spots.db spots.jsonl spots.csv
+    python -m tourism_spots_agent.spot_store_cli ingest --db spots.db --builtin
+    python -m tourism_spots_agent.spot_store_cli search --db spots.db 写真映え --area 京都
+"""
+
+import argparse
+import sys
+
+from .spot_store import SQLiteSpotStore, builtin_records, ingest_records, read_records
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="観光スポットSQLiteストア管理")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help="JSONL/CSVからスポットを取り込む（同じエリア・名前のスポットは置き換え）")
+    ingest_parser.add_argument('--db', required=True, help="SQLiteファイルパス")
+    ingest_parser.add_argument('--builtin', action='store_true', help="組み込みの固定データも取り込む")
+    ingest_parser.add_argument('files', nargs='*', help="取り込むJSONL/CSVファイル")
+
+    search_parser = subparsers.add_parser('search', help="全文検索")
+    search_parser.add_argument('--db', required=True, help="SQLiteファイルパス")
+    search_parser.add_argument('--area', help="エリアで絞り込み")
+    search_parser.add_argument('--limit', type=int, default=10)
+    search_parser.add_argument('text', nargs='+', help="検索語（複数指定でOR検索）")
+
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        if not args.builtin and not args.files:
+            print("❌ 取り込むファイルまたは --builtin を指定してください")
+            return 1
+        total = 0
+        if args.builtin:
+            total += ingest_records(args.db, builtin_records())
+        for path in args.files:
+            count = ingest_records(args.db, read_records(path))
+            print(f"✅ {path}: {count:,}件")
+            total += count
+        print(f"📦 取り込み完了: {total:,}件 -> {args.db}")
+        return 0
+
+    store = SQLiteSpotStore(args.db, pool_size=1)
+    for spot in store.search_text(' '.join(args.text), area=args.area, limit=args.limit):
+        print(f"{spot.area} / {spot.category} / {spot.name}: {spot.description}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+パイプラインの各ステージ出力のスキーマと検証
+search_params / search_results / selected_spots / descriptions / structured_html をPydanticモデルで定義する。
+LLMの出力（コードブロック付き・前後に説明文・末尾のカンマ・途中で切れたJSON）は再プロンプトせずにローカルで修復してから検証し、
+stateには検証済みのdict（セッションに保存できるJSON互換の値）を書き込む。後続ステージは文字列を再パースせずにそのまま使う
+"""
+
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Type
+
+import pydantic_core
+from google.genai import types
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+
+def _drop_non_objects(value: Any, required: str) -> Any:
+    """リスト中のdict・モデル以外の要素（LLMが混ぜた文字列など）と required のない要素（途中で切れた末尾など）を除く"""
+    if isinstance(value, list):
+        return [
+            item for item in value
+            if isinstance(item, BaseModel) or (isinstance(item, dict) and item.get(required))
+        ]
+    return value
+
+
+def _string_list(value: Any) -> Any:
+    """None・単一の文字列もリストとして受け付ける"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, list):
+        return [item for item in value if item not in (None, '')]
+    return value
+
+
+# 検証器はクラス定義時（import時）に一度だけ構築される
+class SearchParams(BaseModel):
+    """意図抽出ステージの出力（search_params）"""
+
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    area: str = ''
+    category: str = ''
+    season: str = ''
+    requests: List[str] = Field(default_factory=list)
+    near: str = ''
+    radius_km: Optional[float] = None
+    query: Optional[str] = None
+    confidence: Optional[float] = None
+
+    @field_validator('area', 'category', 'season', 'near', mode='before')
+    @classmethod
+    def _none_to_empty(cls, value: Any) -> Any:
+        return '' if value is None else value
+
+    @field_validator('requests', mode='before')
+    @classmethod
+    def _requests_list(cls, value: Any) -> Any:
+        return _string_list(value)
+
+
+class Spot(BaseModel):
+    """観光スポット1件（ステージごとに付与される項目は追加フィールドとして保持）"""
+
+    model_config = ConfigDict(extra='allow', coerce_numbers_to_str=True)
+
+    name: str
+    area: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    features: Optional[List[str]] = None
+    access: Optional[str] = None
+    best_season: Optional[str] = None
+    atmosphere: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    proximity: Optional[str] = None
+    score: Optional[float] = None
+    reason: Optional[str] = None
+    next_leg: Optional[str] = None
+
+    @field_validator('features', mode='before')
+    @classmethod
+    def _features_list(cls, value: Any) -> Any:
+        return None if value is None else _string_list(value)
+
+
+class SearchResults(BaseModel):
+    """検索ステージの出力（search_results）"""
+
+    tourism_spots: List[Spot] = Field(default_factory=list)
+    total_found: int = 0
+    search_query: Optional[str] = None
+    status: str = 'success'
+    error_message: Optional[str] = None
+
+    @field_validator('tourism_spots', mode='before')
+    @classmethod
+    def _objects_only(cls, value: Any) -> Any:
+        return _drop_non_objects(value, 'name')
+
+
+class SelectedSpots(BaseModel):
+    """選定・巡回順ステージの出力（selected_spots）"""
+
+    selected_spots: List[Spot] = Field(default_factory=list)
+
+    @field_validator('selected_spots', mode='before')
+    @classmethod
+    def _objects_only(cls, value: Any) -> Any:
+        return _drop_non_objects(value, 'name')
+
+
+class SpotDescription(BaseModel):
+    """スポット1件の説明文"""
+
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    name: str = ''
+    description: str = ''
+
+
+class Descriptions(BaseModel):
+    """説明文生成ステージの出力（descriptions）"""
+
+    descriptions: List[SpotDescription] = Field(default_factory=list)
+
+    @field_validator('descriptions', mode='before')
+    @classmethod
+    def _objects_only(cls, value: Any) -> Any:
+        return _drop_non_objects(value, 'name')
+
+
+class HTMLOutput(BaseModel):
+    """1行形式の純粋なHTML出力用のスキーマ"""
+    html: str = Field(
+        description="Complete HTML document in single line format starting with <!DOCTYPE html> and ending with </html>. No newlines, no indentation, no code blocks, no JSON, just raw HTML in one line."
+    )
+
+
+# stateのキー → スキーマ
+STAGE_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    'search_params': SearchParams,
+    'search_results': SearchResults,
+    'selected_spots': SelectedSpots,
+    'descriptions': Descriptions,
+    'structured_html': HTMLOutput,
+}
+
+# リストだけが返された場合に包むフィールド（[...] → {key: [...]}）
+_LIST_FIELDS = {
+    'search_results': 'tourism_spots',
+    'selected_spots': 'selected_spots',
+    'descriptions': 'descriptions',
+}
+
+_FENCE_PATTERN = re.compile(r'```[ \t]*(?:json|JSON)?[ \t]*\n?(.*?)(?:```|\Z)', re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+_DECODER = json.JSONDecoder()
+
+
+def repair_json(text: str) -> Any:
+    """LLM出力のテキストからJSON値を取り出す（取り出せなければNone）
+
+    1. コードブロック（閉じていないものも含む、文中のどこにあってもよい）の中身を使う
+    2. 最初の { / [ より前の説明文を除き、最初のJSON値だけを読む（後ろの説明文は無視）
+    3. 末尾のカンマを除去する
+    4. 途中で切れたJSONは読めたところまでを使う（書きかけの文字列は捨てる）
+    """
+    text = text.strip()
+    fence = _FENCE_PATTERN.search(text)
+    if fence:
+        text = fence.group(1).strip()
+
+    starts = [index for index in (text.find('{'), text.find('[')) if index >= 0]
+    if not starts:
+        return None
+    text = text[min(starts):]
+
+    for candidate in (text, _TRAILING_COMMA_PATTERN.sub(r'\1', text)):
+        try:
+            return _DECODER.raw_decode(candidate)[0]
+        except json.JSONDecodeError:
+            continue
+
+    try:
+        return pydantic_core.from_json(_TRAILING_COMMA_PATTERN.sub(r'\1', text), allow_partial=True)
+    except ValueError:
+        return None
+
+
+class SchemaStats:
+    """ステージごとの文字列出力の検証結果（そのまま検証できた / 修復して検証できた / 失敗）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, outcome: str) -> None:
+        with self._lock:
+            stats = self.stages.setdefault(stage, {'valid': 0, 'repaired': 0, 'failed': 0})
+            stats[outcome] += 1
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {stage: dict(stats) for stage, stats in self.stages.items()}
+
+
+schema_stats = SchemaStats()
+
+
+def _coerce(key: str, value: Any) -> Any:
+    if isinstance(value, list) and key in _LIST_FIELDS:
+        return {_LIST_FIELDS[key]: value}
+    return value
+
+
+def parse_stage(key: str, value: Any) -> Optional[BaseModel]:
+    """state値・LLM出力（dict / JSON文字列 / 壊れたJSON文字列）をスキーマで検証（検証できなければNone）"""
+    model = STAGE_SCHEMAS[key]
+    if value is None or isinstance(value, model):
+        return value
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+
+    text = None
+    if isinstance(value, str):
+        # 速い経路: 正しいJSONはRust側で直接検証
+        try:
+            parsed = model.model_validate_json(value)
+            schema_stats.record(key, 'valid')
+            return parsed
+        except ValidationError:
+            pass
+        text = value
+        value = repair_json(text)
+        if value is None and model is HTMLOutput and '<html' in text.lower():
+            # JSONで包まれていない生のHTML
+            value = {'html': text.strip()}
+
+    try:
+        parsed = model.model_validate(_coerce(key, value))
+    except ValidationError:
+        schema_stats.record(key, 'failed')
+        return None
+    if text is not None:
+        schema_stats.record(key, 'repaired')
+    return parsed
+
+
+def stage_output(key: str, value: Any) -> Dict[str, Any]:
+    """決定的なステージの出力を検証してstateに書き込むdictにする（スキーマ違反は例外）"""
+    model = STAGE_SCHEMAS[key]
+    return model.model_validate(_coerce(key, value)).model_dump(exclude_none=True)
+
+
+def stage_state(state: Mapping[str, Any], key: str) -> Dict[str, Any]:
+    """stateの値を検証済みのdictとして取り出す（未設定・検証できない場合はスキーマの既定値）"""
+    parsed = parse_stage(key, state.get(key))
+    if parsed is None:
+        parsed = STAGE_SCHEMAS[key]()
+    return parsed.model_dump(exclude_none=True)
+
+
+def response_text(llm_response: Any) -> str:
+    """モデル応答のテキスト（思考部分を除く）"""
+    if not llm_response.content or not llm_response.content.parts:
+        return ''
+    return ''.join(part.text for part in llm_response.content.parts if part.text and not part.thought)
+
+
+def _replace_text(llm_response: Any, text: str) -> None:
+    # 後続の計測コールバックも実行されるよう、応答を返さずにその場で書き換える
+    llm_response.content = types.Content(role='model', parts=[types.Part(text=text)])
+
+
+def structured_output_callback(key: str, fallback: Optional[Callable[[Any], Any]] = None):
+    """LlmAgent用のafter_model_callback: 応答をスキーマで検証・修復し、正規化したJSONに置き換える
+
+    修復できない場合は fallback(callback_context) の値を使う（再プロンプトはしない）
+    """
+    def callback(callback_context, llm_response) -> None:
+        if llm_response.partial:
+            return None
+        text = response_text(llm_response)
+        if not text:
+            return None
+        parsed = parse_stage(key, text)
+        if parsed is None and fallback is not None:
+            print(f"⚠️ {callback_context.agent_name}: {key}を修復できないため代替値を使用")
+            parsed = parse_stage(key, fallback(callback_context))
+        if parsed is not None:
+            _replace_text(llm_response, parsed.model_dump_json(exclude_none=True))
+        return None
+
+    return callback
+
+
+def extract_html(text: str) -> str:
+    """HTML抽出ステージの出力から純粋な1行HTMLを取り出す（HTMLOutput形式・コードブロックも受け付ける）"""
+    stripped = text.strip()
+    if stripped.startswith(('{', '```')):
+        parsed = parse_stage('structured_html', stripped)
+        if parsed is not None:
+            stripped = parsed.html.strip()
+    return stripped
+
+
+def html_output_callback(callback_context, llm_response) -> None:
+    """HTML抽出ステージ用のafter_model_callback: JSON・コードブロックが残っていれば除去"""
+    if llm_response.partial:
+        return None
+    text = response_text(llm_response)
+    if text:
+        html = extract_html(text)
+        if html != text:
+            _replace_text(llm_response, html)
+    return None
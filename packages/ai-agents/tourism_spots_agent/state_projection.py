@@ -0,0 +1,148 @@
+"""
+ステージごとの入力の射影（state projection）
+各LLMステージに渡すstateのキーとフィールドを宣言的に指定し、不要な会話履歴を除いて
+切り詰め・コンパクトなJSONにしたものだけをプロンプトに入れる
+射影前後の入力トークン数（概算）はステージごとに集計し、計測が有効なら agent_telemetry にも記録する
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from google.genai import types
+
+from agent_telemetry import telemetry, telemetry_enabled
+
+from .stage_schemas import repair_json
+
+# 日本語テキストのおおよその1トークンあたり文字数（射影前の入力はモデルに送らないため、トークン数は概算する）
+CHARS_PER_TOKEN = float(os.getenv('TOURISM_CHARS_PER_TOKEN', '2.0'))
+
+
+def _parse_state_json(value: Any) -> Any:
+    """state上のLLM出力（コードブロック付き・前後に説明文・途中で切れたJSON文字列など）をPythonオブジェクトに変換"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return repair_json(value)
+
+
+def estimate_tokens(text: str) -> int:
+    """テキストのおおよそのトークン数"""
+    return max(1, int(round(len(text) / CHARS_PER_TOKEN))) if text else 0
+
+
+def compact_json(value: Any) -> str:
+    """区切りの空白を除いたJSON"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+@dataclass(frozen=True)
+class KeyProjection:
+    """1つのキーの射影: 残すフィールド（辞書・辞書のリストの要素に適用）、リストの最大件数、文字列の最大文字数"""
+
+    fields: Optional[Tuple[str, ...]] = None
+    max_items: Optional[int] = None
+    max_chars: Optional[int] = None
+
+    def apply(self, value: Any) -> Any:
+        if isinstance(value, list):
+            items = value[:self.max_items] if self.max_items is not None else value
+            return [self.apply(item) for item in items]
+        if isinstance(value, dict):
+            keys = self.fields if self.fields is not None else tuple(value)
+            return {key: self._trim(value[key]) for key in keys if key in value and value[key] not in (None, '', [])}
+        return self._trim(value)
+
+    def _trim(self, value: Any) -> Any:
+        if isinstance(value, str) and self.max_chars is not None and len(value) > self.max_chars:
+            return value[:self.max_chars - 1] + '…'
+        if isinstance(value, list) and self.max_items is not None:
+            return [self._trim(v) for v in value[:self.max_items]]
+        return value
+
+
+@dataclass(frozen=True)
+class StateProjection:
+    """ステージの入力に含めるキーと、その射影
+
+    include_user_message: 今回のユーザー入力をプロンプトに含めるか（会話履歴は常に除外）
+    """
+
+    keys: Mapping[str, KeyProjection] = field(default_factory=dict)
+    include_user_message: bool = False
+
+    def project(self, values: Mapping[str, Any]) -> Dict[str, Any]:
+        """指定キーのみを射影した辞書（{key: [...]} 形式のstate値はリストに展開）"""
+        projected = {}
+        for key, projection in self.keys.items():
+            value = _parse_state_json(values.get(key))
+            if isinstance(value, dict) and set(value) == {key} and isinstance(value[key], list):
+                value = value[key]
+            if value is None:
+                continue
+            projected[key] = projection.apply(value)
+        return projected
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        return compact_json(self.project(values))
+
+    def before_model_callback(self, callback_context, llm_request) -> None:
+        """LlmAgent用: 会話履歴を射影したstateのJSON（と今回のユーザー入力）に置き換える"""
+        original_tokens = _contents_tokens(llm_request.contents)
+        contents = []
+        if self.include_user_message and callback_context.user_content:
+            contents.append(callback_context.user_content)
+        if self.keys:
+            contents.append(types.Content(role='user', parts=[types.Part(text=self.render(callback_context.state))]))
+        llm_request.contents = contents
+        record_projection(
+            callback_context.invocation_id, callback_context.agent_name, original_tokens, _contents_tokens(contents)
+        )
+        return None
+
+
+def _contents_tokens(contents: Optional[List[types.Content]]) -> int:
+    return sum(estimate_tokens(part.text) for content in contents or [] for part in content.parts or [] if part.text)
+
+
+def record_projection(invocation_id: str, stage: str, original_tokens: int, projected_tokens: int) -> None:
+    """射影前後の入力トークン数を集計（計測が有効ならテレメトリのヒストグラムとエージェント単位のログにも出力）"""
+    projection_stats.record(stage, original_tokens, projected_tokens)
+    if telemetry_enabled():
+        telemetry.record_projection(invocation_id, stage, original_tokens, projected_tokens)
+
+
+class ProjectionStats:
+    """ステージごとの射影前後の入力トークン数（概算）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, original_tokens: int, projected_tokens: int) -> None:
+        with self._lock:
+            stats = self.stages.setdefault(stage, {'calls': 0, 'original_tokens': 0, 'projected_tokens': 0})
+            stats['calls'] += 1
+            stats['original_tokens'] += original_tokens
+            stats['projected_tokens'] += projected_tokens
+
+    def reduction(self, stage: str) -> float:
+        stats = self.stages.get(stage)
+        if not stats or not stats['original_tokens']:
+            return 0.0
+        return 1.0 - stats['projected_tokens'] / stats['original_tokens']
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                stage: {**stats, 'reduction': round(self.reduction(stage), 3)}
+                for stage, stats in self.stages.items()
+            }
+
+
+projection_stats = ProjectionStats()
@@ -0,0 +1,166 @@
+"""
+セッションstateの保持ポリシー
+パイプラインがhtmlを生成したあと、中間キー（検索結果・選定スポット・説明文・JSONで包んだHTML）を削除し、
+結果は直近N件だけを履歴に残す。同じセッションで検索を繰り返してもstateのサイズが一定に収まる。
+履歴はN個のスロットのリングバッファで、1回の結果で書き込むのは1スロット分だけ（イベント履歴に履歴全体を書き直さない）。
+最新の履歴はhtmlをコピーせず html キーを参照し、次の結果で最新でなくなったときに圧縮したhtmlを持つ
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .stage_schemas import stage_state
+
+# 保持方式: compact（中間キーを削除し直近N件の結果だけ残す、デフォルト） / off（全てのキーを保持）
+STATE_RETENTION = os.getenv('TOURISM_STATE_RETENTION', 'compact')
+# 1セッションに残す結果の件数
+MAX_RESULTS = int(os.getenv('TOURISM_STATE_MAX_RESULTS', '1'))
+
+# 直近の結果の履歴: スロット i のキーは result_history_<i>、書き込んだ結果の累計は result_history_count
+HISTORY_PREFIX = 'result_history_'
+HISTORY_COUNT_KEY = 'result_history_count'
+# html生成後に削除する中間キー（htmlは最新の結果として残す）
+INTERMEDIATE_KEYS = ('search_results', 'selected_spots', 'descriptions', 'structured_html')
+
+COMPRESSED_PREFIX = 'zlib+b64:'
+
+
+def compress_text(text: str) -> str:
+    """stateに保存できる圧縮文字列（zlib + base64）"""
+    return COMPRESSED_PREFIX + base64.b64encode(zlib.compress(text.encode('utf-8'), 6)).decode('ascii')
+
+
+def decompress_text(value: str) -> str:
+    """compress_text の逆変換（圧縮されていない文字列はそのまま）"""
+    if not value.startswith(COMPRESSED_PREFIX):
+        return value
+    return zlib.decompress(base64.b64decode(value[len(COMPRESSED_PREFIX):])).decode('utf-8')
+
+
+def state_bytes(state: Mapping[str, Any]) -> int:
+    """stateのJSONとしてのバイト数（値がNoneのキーは削除済みとして数えない）"""
+    live = {key: value for key, value in state.items() if value is not None}
+    return len(json.dumps(live, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def history_key(slot: int) -> str:
+    return f"{HISTORY_PREFIX}{slot}"
+
+
+def _history_slots(state: Mapping[str, Any]) -> List[int]:
+    slots = []
+    for key, value in state.items():
+        suffix = key[len(HISTORY_PREFIX):]
+        if key.startswith(HISTORY_PREFIX) and suffix.isdigit() and value is not None:
+            slots.append(int(suffix))
+    return slots
+
+
+def _entry_html(state: Mapping[str, Any], entry: Mapping[str, Any]) -> str:
+    if entry.get('html_key'):
+        return state.get(entry['html_key']) or ''
+    return decompress_text(entry.get('html') or '')
+
+
+def result_history(state: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """直近の結果（古い順、htmlは展開済み）"""
+    entries = [state[history_key(slot)] for slot in _history_slots(state)]
+    entries = sorted((entry for entry in entries if isinstance(entry, dict)), key=lambda entry: entry.get('created_at', 0))
+    return [
+        {**{key: value for key, value in entry.items() if key != 'html_key'}, 'html': _entry_html(state, entry)}
+        for entry in entries
+    ]
+
+
+@dataclass(frozen=True)
+class StateRetention:
+    """html生成後のstateの保持ポリシー
+
+    drop_keys: 削除する中間キー
+    max_results: 履歴に残す結果の件数（0なら履歴を残さない）
+    compress: 最新でなくなった履歴のhtmlを圧縮するか
+    """
+
+    drop_keys: Tuple[str, ...] = INTERMEDIATE_KEYS
+    max_results: int = MAX_RESULTS
+    compress: bool = True
+
+    @classmethod
+    def from_env(cls) -> Optional['StateRetention']:
+        if STATE_RETENTION.lower() in ('0', 'off', 'false', 'no'):
+            return None
+        return cls()
+
+    def compact(self, state: Mapping[str, Any], previous_html: Optional[str] = None) -> Dict[str, Any]:
+        """stateに適用するstate_delta（中間キーの削除と結果履歴の更新）。htmlがなければ空
+
+        state: 今回のhtmlを書き込んだ後のstate
+        previous_html: 今回のhtmlで上書きされる前のhtml（最新だった履歴が参照していたもの）
+        """
+        html = state.get('html')
+        if not html:
+            return {}
+
+        delta: Dict[str, Any] = {key: None for key in self.drop_keys if state.get(key) is not None}
+        # 件数を減らした場合などに残った範囲外のスロットは削除
+        for slot in _history_slots(state):
+            if slot >= self.max_results:
+                delta[history_key(slot)] = None
+        if self.max_results > 0:
+            count = int(state.get(HISTORY_COUNT_KEY) or 0)
+            # 最新だった履歴は html キーを参照しているので、上書きされる前のhtmlを持たせる（1件だけ残す場合は今回の結果で置き換わる）
+            latest_key = history_key((count - 1) % self.max_results)
+            latest = state.get(latest_key)
+            if self.max_results > 1 and count > 0 and latest_key not in delta and isinstance(latest, dict) \
+                    and latest.get('html_key'):
+                frozen = {key: value for key, value in latest.items() if key != 'html_key'}
+                frozen['html'] = (compress_text(previous_html) if self.compress else previous_html) if previous_html else ''
+                delta[latest_key] = frozen
+            delta[history_key(count % self.max_results)] = {
+                'search_params': stage_state(state, 'search_params'),
+                'spots': [spot['name'] for spot in stage_state(state, 'selected_spots')['selected_spots']],
+                'html_key': 'html',
+                'created_at': round(time.time(), 3),
+            }
+            delta[HISTORY_COUNT_KEY] = count + 1
+
+        before = state_bytes(state)
+        after = state_bytes({**state, **delta})
+        retention_stats.record(before, after)
+        return delta
+
+
+class RetentionStats:
+    """stateの保持ポリシーの適用前後のバイト数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compactions = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.last: Tuple[int, int] = (0, 0)
+
+    def record(self, before: int, after: int) -> None:
+        with self._lock:
+            self.compactions += 1
+            self.bytes_before += before
+            self.bytes_after += after
+            self.last = (before, after)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'compactions': self.compactions,
+                'mean_bytes_before': self.bytes_before // self.compactions if self.compactions else 0,
+                'mean_bytes_after': self.bytes_after // self.compactions if self.compactions else 0,
+                'reduction': round(1 - self.bytes_after / self.bytes_before, 3) if self.bytes_before else 0.0,
+            }
+
+
+retention_stats = RetentionStats()